@@ -0,0 +1,15 @@
+'''
+Benchmarks of the server_api and client_api endpoints on a seeded synthetic catalogue.
+
+Run from the `Backend System` folder:
+
+    python -m benchmarks --database sqlite --products 1000 --iterations 50
+    python -m benchmarks --database postgresql --compare benchmarks/results/<earlier commit>-postgresql.json
+
+Results are written as JSON (throughput, p50/p95/p99 latency, query counts and status codes per endpoint)
+so runs on different commits can be compared with `--compare`.
+
+Concurrent stock reservations have a benchmark of their own, see `benchmarks.stock_reservations`:
+
+    python -m benchmarks.stock_reservations --database postgresql --reservations 5000 --threads 64
+'''
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmark the server_api and client_api endpoints on a synthetic catalogue")
+    parser.add_argument('--database', choices=['sqlite', 'postgresql'], default='sqlite',
+                        help="sqlite (a temporary file) or postgresql (a test database next to the DEV_DATABASE_* one)")
+    parser.add_argument('--products', type=int, default=1000, help="Products in the synthetic catalogue, other tables follow from it")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the data generator")
+    parser.add_argument('--iterations', type=int, default=50, help="Measured requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per endpoint sent first")
+    parser.add_argument('--endpoint', action='append', default=[], help="Only run endpoints whose name contains this text, repeatable")
+    parser.add_argument('--output', default=None, help="Result file, defaults to benchmarks/results/<commit>-<database>.json")
+    parser.add_argument('--compare', default=None, help="Earlier result file to compare p95 latency and query counts with")
+    return parser.parse_args(argv)
+
+
+def setup_django(database):
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'e_commerce_app.settings')
+    from django.conf import settings
+    if database == 'sqlite':
+        #a file rather than memory, so the background error log writer shares the database
+        settings.DATABASES = {'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(PROJECT_DIR / 'benchmarks' / 'benchmark.sqlite3'),
+            'TEST': {'NAME': str(PROJECT_DIR / 'benchmarks' / 'benchmark.sqlite3')},
+        }}
+    import django
+    django.setup()
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    setup_django(arguments.database)
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from benchmarks.endpoints import all_endpoints
+    from benchmarks.runner import BenchmarkRunner, compare, uncovered
+    from benchmarks.synthetic_data import SyntheticCatalogue
+
+    endpoints = [endpoint for endpoint in all_endpoints()
+                 if not arguments.endpoint or any(text in endpoint.name for text in arguments.endpoint)]
+    setup_test_environment()
+    #never touch the configured database, the benchmark builds and drops a test database of its own
+    original_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        print(f"Building a catalogue of {arguments.products} products (seed {arguments.seed})...", file=sys.stderr)
+        catalogue = SyntheticCatalogue(products=arguments.products, seed=arguments.seed).build()
+        print(f"Running {len(endpoints)} endpoints, {arguments.iterations} requests each...", file=sys.stderr)
+        results = BenchmarkRunner(catalogue, endpoints, iterations=arguments.iterations, warmup=arguments.warmup).run()
+    finally:
+        connection.creation.destroy_test_db(original_name, verbosity=0)
+        teardown_test_environment()
+
+    results['meta']['products'] = arguments.products
+    #URLs the suite has no endpoint for, so new views do not go unmeasured
+    results['uncovered_endpoints'] = uncovered(all_endpoints())
+    output = Path(arguments.output) if arguments.output else \
+        PROJECT_DIR / 'benchmarks' / 'results' / f"{results['meta']['commit'] or 'unknown'}-{results['meta']['database']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4) + '\n', encoding='utf-8')
+
+    print(f"{'endpoint':60} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8} {'errors':>7}")
+    for name, result in results['endpoints'].items():
+        latency = result['latency_ms']
+        print(f"{name:60} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {result['throughput_rps']:>9} "
+              f"{result['queries']['max']:>8} {result['errors']:>7}")
+    if results['uncovered_endpoints']:
+        print(f"\nNot benchmarked: {', '.join(results['uncovered_endpoints'])}")
+
+    if arguments.compare:
+        previous = json.loads(Path(arguments.compare).read_text(encoding='utf-8'))
+        print(f"\nCompared with {previous['meta']['commit']} ({arguments.compare}):")
+        print(f"{'endpoint':60} {'p95 before':>11} {'p95 now':>9} {'change':>8} {'queries':>9}")
+        for name, old_p95, new_p95, change, old_queries, new_queries in compare(previous, results):
+            print(f"{name:60} {old_p95:>11} {new_p95:>9} {change:>+7}% {old_queries:>4}->{new_queries}")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
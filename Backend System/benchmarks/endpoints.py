@@ -0,0 +1,291 @@
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import uuid
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from business_admin.models import BusinessAdminUser
+from products.models import (Product_Category, Product_Sub_Category, Product_Brands, Product_Flavours, Product,
+                             Product_SKU, Product_Images, Product_Video_Upload)
+from products.video_upload import ManageVideoUploads
+from orders.models import Cart, CartItems, Order, OrderPayment
+from system.models import Accounts
+
+
+class Endpoint:
+
+    '''
+    One API call driven by the benchmark runner.
+
+    `build(catalogue, i)` returns the request of iteration `i` as a dict with `path` and optionally `data` and
+    `format` (sent like `APIClient` does), `content_type` and `headers` (a raw body and its request headers),
+    `body` (a JSON body, also for GET requests whose filters are read from the body) and `token` (credentials
+    other than the benchmark user's). `build` is not timed, so it
+    may create the row a DELETE call removes.
+    '''
+
+    def __init__(self, name, method, build, authenticated=True):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.authenticated = authenticated
+
+
+def _image_file(name):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color='pink').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def _import_file(i, rows=10):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['product_name', 'product_description', 'product_summary', 'brand', 'categories',
+                     'sub_categories', 'color', 'size', 'price', 'stock', 'flavours'])
+    for row in range(rows):
+        writer.writerow([f"Imported Product {i}-{row}", "Imported by the benchmarks", "Imported", "Brand 0",
+                         "Category 0", "Sub Category 0", "Red", "50ml", "450", "10", "Flavour 0"])
+    return SimpleUploadedFile(f"import_{i}.csv", output.getvalue().encode('utf-8'), content_type='text/csv')
+
+
+def _logout(catalogue, i):
+    #logging out deletes the token, so every iteration logs out a user of its own
+    user = Accounts.objects.create_user(email=f'logout{i}@example.com', username=f'logout{i}', password=None)
+    return {'path': reverse('server_api:logout_business_admin_user'), 'token': Token.objects.create(user=user).key}
+
+
+def _delete_admin(catalogue, i):
+    admin = BusinessAdminUser.objects.create(admin_full_name="Deleted Admin", admin_user_name=f"deleted_admin_{i}",
+                                             admin_position=catalogue.admin_position)
+    return {'path': reverse('server_api:delete_business_admin_user', args=[admin.admin_user_name])}
+
+
+def _delete(model, url_name, **fields):
+    def build(catalogue, i):
+        instance = model.objects.create(**{name: value(catalogue, i) if callable(value) else value for name, value in fields.items()})
+        return {'path': reverse(url_name, args=[instance.pk])}
+    return build
+
+
+#one chunk of a video upload, the size of a small clip
+VIDEO_CHUNK = bytes(range(256)) * 1024
+
+
+def _video_upload(catalogue, i, received=False):
+    upload = Product_Video_Upload.objects.create(product_id_id=catalogue.product_pks[i % len(catalogue.product_pks)],
+                                                 file_name=f"clip_{i}.mp4", color="Pink", size="M", total_size=len(VIDEO_CHUNK),
+                                                 checksum=hashlib.sha256(VIDEO_CHUNK).hexdigest())
+    if received:
+        ManageVideoUploads.write_chunk(upload, 0, io.BytesIO(VIDEO_CHUNK), len(VIDEO_CHUNK))
+    return upload
+
+
+def _in_stock(catalogue, i):
+    '''A SKU with stock to spare, the cart holds the stock of what is added to it'''
+    product_sku_pk = catalogue.sku_pks[i % len(catalogue.sku_pks)]
+    Product_SKU.objects.filter(pk=product_sku_pk).update(product_stock=100)
+    return product_sku_pk
+
+
+def _cart(catalogue, i, lines=5):
+    '''A cart of the benchmark user with `lines` SKUs that are in stock, held by none of them so checkout reserves it'''
+    product_sku_pks = [catalogue.sku_pks[(i * lines + line) % len(catalogue.sku_pks)] for line in range(lines)]
+    Product_SKU.objects.filter(pk__in=product_sku_pks).update(product_stock=100)
+    cart = Cart.objects.create(device_ip='127.0.0.1', customer_id=catalogue.user, cart_total_amount=0)
+    CartItems.objects.bulk_create([CartItems(cart_id=cart, product_sku_id=pk, quantity=1 + line % 2) for line, pk in enumerate(product_sku_pks)])
+    return cart
+
+
+def _payment_callback(catalogue, i):
+    '''A pending bKash payment and its signed result, a new transaction each time so the result is recorded, not replayed'''
+    order = Order.objects.create(order_id=f"ORD-BENCH-{uuid.uuid4().hex[:12]}", customer_id=catalogue.user, total_amount=450)
+    payment = OrderPayment.objects.create(order_id=order, payment_mode='bkash', payment_amount=450, payment_reference=uuid.uuid4().hex)
+    body = json.dumps({'payment_reference': payment.payment_reference, 'transaction_id': f"TRX-BENCH-{uuid.uuid4().hex[:12]}",
+                       'payment_status': 'success', 'amount': "450.00"}).encode('utf-8')
+    signature = hmac.new(settings.PAYMENT_CALLBACK_SECRETS['bkash'].encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return {'path': reverse('client_api:payment_callback', args=['bkash']), 'data': body, 'content_type': 'application/json',
+            'headers': {'HTTP_X_SIGNATURE': signature}}
+
+
+def _discount_dates():
+    now = timezone.now()
+    return (now - datetime.timedelta(days=1)).isoformat(), (now + datetime.timedelta(days=7)).isoformat()
+
+
+def server_api_endpoints():
+    return [
+        #business admin
+        Endpoint('server_api:fetch_token', 'post', lambda c, i: {
+            'path': reverse('server_api:fetch_token'), 'data': {'username': c.user.username}, 'format': 'json'}),
+        Endpoint('server_api:create_business_admin_user', 'post', lambda c, i: {
+            'path': reverse('server_api:create_business_admin_user'), 'format': 'json',
+            'data': {'admin_full_name': "Signed Up Admin", 'admin_user_name': f"signup_admin_{i}", 'password': c.PASSWORD,
+                     'confirm_password': c.PASSWORD, 'admin_position_pk': c.admin_position.pk}}, authenticated=False),
+        Endpoint('server_api:update_business_admin_user', 'put', lambda c, i: {
+            'path': reverse('server_api:update_business_admin_user', args=[c.business_admin.admin_user_name]), 'format': 'json',
+            'data': {'admin_full_name': f"Benchmark Admin {i}", 'admin_position_pk': c.admin_position.pk}}),
+        Endpoint('server_api:login_business_admin_user', 'post', lambda c, i: {
+            'path': reverse('server_api:login_business_admin_user'), 'format': 'json',
+            'data': {'username': c.user.email, 'password': c.PASSWORD}}, authenticated=False),
+        Endpoint('server_api:logout_business_admin_user', 'post', _logout),
+        Endpoint('server_api:update_business_admin_user_password', 'put', lambda c, i: {
+            'path': reverse('server_api:update_business_admin_user_password', args=[c.business_admin.admin_user_name]), 'format': 'json',
+            'data': {'old_password': c.PASSWORD, 'new_password': c.PASSWORD, 'new_password_confirm': c.PASSWORD}}),
+        Endpoint('server_api:delete_business_admin_user', 'delete', _delete_admin),
+
+        #categories and sub-categories
+        Endpoint('server_api:create_product_categories', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_categories'), 'format': 'json',
+            'data': {'category_name': f"Created Category {i}", 'description': "Created by the benchmarks"}}),
+        Endpoint('server_api:fetch_all_product_categories', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_all_product_categories')}),
+        Endpoint('server_api:fetch_a_product_category', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_a_product_category', args=[c.category_pks[i % len(c.category_pks)]])}),
+        Endpoint('server_api:update_product_categories', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_categories', args=[c.category_pks[-1]]), 'format': 'json',
+            'data': {'category_name': f"Updated Category ({i})", 'description': "Updated by the benchmarks"}}),
+        Endpoint('server_api:delete_product_categories', 'delete', _delete(
+            Product_Category, 'server_api:delete_product_categories',
+            category_name=lambda c, i: f"Deleted Category {i}", description="Deleted by the benchmarks")),
+        Endpoint('server_api:fetch_all_product_sub_categories_for_a_category', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_all_product_sub_categories_for_a_category', args=[c.category_pks[i % len(c.category_pks)]])}),
+        Endpoint('server_api:create_product_sub_categories', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_sub_categories', args=[c.category_pks[0]]), 'format': 'json',
+            'data': {'sub_category_name': f"Created Sub Category {i}", 'description': "Created by the benchmarks"}}),
+        Endpoint('server_api:update_product_sub_categories', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_sub_categories', args=[c.sub_category_pks[-1]]), 'format': 'json',
+            'data': {'category_pk_list': c.category_pks[:2], 'sub_category_name': f"Updated Sub Category ({i})",
+                     'description': "Updated by the benchmarks"}}),
+        Endpoint('server_api:delete_product_sub_categories', 'delete', _delete(
+            Product_Sub_Category, 'server_api:delete_product_sub_categories',
+            sub_category_name=lambda c, i: f"Deleted Sub Category {i}", description="Deleted by the benchmarks")),
+
+        #brands and flavours
+        Endpoint('server_api:fetch_product_brands', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_brands')}),
+        Endpoint('server_api:create_product_brand', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_brand'), 'format': 'json',
+            'data': {'brand_name': f"Created Brand {i}", 'brand_established_year': 2001, 'brand_country': "Bangladesh"}}),
+        Endpoint('server_api:update_product_brand', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_brand', args=[c.brand_pks[-1]]), 'format': 'json',
+            'data': {'brand_name': f"Updated Brand ({i})", 'brand_established_year': 2002, 'brand_country': "Korea"}}),
+        Endpoint('server_api:delete_product_brand', 'delete', _delete(
+            Product_Brands, 'server_api:delete_product_brand',
+            brand_name=lambda c, i: f"Deleted Brand {i}", brand_established_year=2000)),
+        Endpoint('server_api:fetch_product_flavour', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_flavour')}),
+        Endpoint('server_api:create_product_flavour', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_flavour'), 'format': 'json',
+            'data': {'product_flavour_name': f"Created Flavour {i}"}}),
+        Endpoint('server_api:update_product_flavour', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_flavour', args=[c.flavour_pks[-1]]), 'format': 'json',
+            'data': {'product_flavour_name': f"Updated Flavour ({i})"}}),
+        Endpoint('server_api:delete_product_flavour', 'delete', _delete(
+            Product_Flavours, 'server_api:delete_product_flavour', product_flavour_name=lambda c, i: f"Deleted Flavour {i}")),
+
+        #products
+        Endpoint('server_api:fetch_product', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product')}),
+        Endpoint('server_api:fetch_product?filters', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product'),
+            'body': {'product_category_pk_list': c.category_pks[:2], 'product_brand_pk': c.brand_pks[0]}}),
+        Endpoint('server_api:fetch_product_detail', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_detail'),
+            'data': {'product_pk_list': ",".join(str(pk) for pk in c.product_pks[:20])}}),
+        Endpoint('server_api:create_product', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product'), 'format': 'json',
+            'data': {'product_name': f"Created Product {i}", 'product_category_pk_list': c.category_pks[:1],
+                     'product_sub_category_pk_list': c.sub_category_pks[:1], 'product_description': "Created by the benchmarks",
+                     'product_summary': "Created", 'product_brand_pk': c.brand_pks[0]}}),
+        Endpoint('server_api:import_products', 'post', lambda c, i: {
+            'path': reverse('server_api:import_products'), 'format': 'multipart', 'data': {'file': _import_file(i)}}),
+        Endpoint('server_api:export_products', 'get', lambda c, i: {
+            'path': reverse('server_api:export_products')}),
+        Endpoint('server_api:update_product', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product', args=[c.product_pks[-1]]), 'format': 'json',
+            'data': {'product_name': f"Updated Product ({i})", 'product_category_pk_list': c.category_pks[:2],
+                     'product_sub_category_pk_list': c.sub_category_pks[:2], 'product_description': "Updated by the benchmarks",
+                     'product_summary': "Updated", 'product_brand_pk': c.brand_pks[1]}}),
+        Endpoint('server_api:delete_product', 'delete', _delete(
+            Product, 'server_api:delete_product', product_name=lambda c, i: f"Deleted Product {i}",
+            product_description="Deleted by the benchmarks", product_summary="Deleted")),
+
+        #SKUs
+        Endpoint('server_api:product_sku_fetch', 'get', lambda c, i: {
+            'path': reverse('server_api:product_sku_fetch'), 'data': {'product_id': c.product_pks[i % len(c.product_pks)]}}),
+        Endpoint('server_api:product_sku_create', 'post', lambda c, i: {
+            'path': reverse('server_api:product_sku_create'), 'format': 'json',
+            'data': {'product_pk': c.product_pks[i % len(c.product_pks)], 'product_price': 500, 'product_stock': 25,
+                     'product_flavours_pk_list': c.flavour_pks[:1], 'product_color': "Benchmark", 'product_size': f"{i}ml"}}),
+        Endpoint('server_api:update_product_sku', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_sku', args=[c.sku_pks[0]]), 'format': 'json',
+            'data': {'product_id': c.product_pks[0], 'product_price': 500 + i, 'product_stock': 30,
+                     'product_flavours_pk_list': c.flavour_pks[:2]}}),
+        Endpoint('server_api:delete_product_sku', 'delete', _delete(
+            Product_SKU, 'server_api:delete_product_sku', product_id_id=lambda c, i: c.product_pks[0],
+            product_color="Deleted", product_size=lambda c, i: f"{i}ml", product_price=100)),
+
+        #images
+        Endpoint('server_api:fetch_product_images', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_images'), 'data': {'product_pk': c.product_pks[i % len(c.product_pks)]}}),
+        Endpoint('server_api:create_product_images', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_images', args=[c.product_pks[0]]), 'format': 'multipart',
+            'data': {'product_image_list': [_image_file(f"created_{i}.png")], 'color': "Pink"}}),
+        Endpoint('server_api:update_product_image', 'put', lambda c, i: {
+            'path': reverse('server_api:update_product_image', args=[c.image_pks[0]]), 'format': 'multipart',
+            'data': {'new_image': _image_file(f"updated_{i}.png"), 'color': "Pink"}}),
+        Endpoint('server_api:delete_product_image', 'delete', _delete(
+            Product_Images, 'server_api:delete_product_image', product_id_id=lambda c, i: c.product_pks[0])),
+
+        #videos, uploaded in chunks
+        Endpoint('server_api:create_product_video_upload', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_video_upload', args=[c.product_pks[0]]), 'format': 'json',
+            'data': {'file_name': f"clip_{i}.mp4", 'total_size': len(VIDEO_CHUNK), 'color': "Pink", 'size': "M",
+                     'checksum': hashlib.sha256(VIDEO_CHUNK).hexdigest()}}),
+        Endpoint('server_api:fetch_product_video_upload', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_video_upload', args=[_video_upload(c, i).upload_id])}),
+        Endpoint('server_api:upload_product_video_chunk', 'put', lambda c, i: {
+            'path': reverse('server_api:upload_product_video_chunk', args=[_video_upload(c, i).upload_id]),
+            'data': VIDEO_CHUNK, 'content_type': 'application/offset+octet-stream', 'headers': {'HTTP_UPLOAD_OFFSET': '0'}}),
+        Endpoint('server_api:finalise_product_video_upload', 'post', lambda c, i: {
+            'path': reverse('server_api:finalise_product_video_upload', args=[_video_upload(c, i, received=True).upload_id])}),
+
+        #discounts, created from query parameters
+        Endpoint('server_api:fetch_product_discounts', 'get', lambda c, i: {
+            'path': reverse('server_api:fetch_product_discounts')}),
+        Endpoint('server_api:create_product_dicount', 'post', lambda c, i: {
+            'path': reverse('server_api:create_product_dicount', args=[c.product_pks[i % len(c.product_pks)]]) + '?' + '&'.join([
+                f"discount_name=Created+Discount+{i}", "discount_amount=10",
+                "start_date={}&end_date={}".format(*_discount_dates()).replace('+', '%2B')])}),
+    ]
+
+
+def client_api_endpoints():
+    return [
+        Endpoint('client_api:product_category_list', 'get', lambda c, i: {
+            'path': reverse('client_api:product_category_list')}, authenticated=False),
+        Endpoint('client_api:product_search', 'get', lambda c, i: {
+            'path': reverse('client_api:product_search'), 'data': {'q': c.ADJECTIVES[i % len(c.ADJECTIVES)]}}, authenticated=False),
+        Endpoint('client_api:product_facets', 'get', lambda c, i: {
+            'path': reverse('client_api:product_facets'), 'data': {'category': c.category_pks[i % len(c.category_pks)]}}, authenticated=False),
+        Endpoint('client_api:cart_items', 'post', lambda c, i: {
+            'path': reverse('client_api:cart_items'), 'format': 'json', 'data': {'product_sku_pk': _in_stock(c, i)}}),
+        Endpoint('client_api:cart_item', 'put', lambda c, i: {
+            'path': reverse('client_api:cart_item', args=[_in_stock(c, 0)]), 'format': 'json', 'data': {'quantity': 1 + i % 3}}),
+        Endpoint('client_api:cart', 'get', lambda c, i: {'path': reverse('client_api:cart')}),
+        Endpoint('client_api:checkout', 'post', lambda c, i: {
+            'path': reverse('client_api:checkout'), 'format': 'json',
+            'data': {'cart_pk': _cart(c, i).pk, 'payment_mode': 'cash_on_delivery', 'address_line1': "House 1, Road 2", 'city': "Dhaka"}}),
+        Endpoint('client_api:payment_callback', 'post', _payment_callback, authenticated=False),
+    ]
+
+
+def all_endpoints():
+    return server_api_endpoints() + client_api_endpoints()
@@ -0,0 +1,173 @@
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+import django
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import get_resolver
+from rest_framework.test import APIClient
+
+
+class QueryCounter:
+    '''`execute_wrapper` counting the statements run on a connection'''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, fraction):
+    '''Percentile of already sorted values with linear interpolation between the closest ranks'''
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class BenchmarkRunner:
+
+    '''
+    Drives every endpoint through the Django test client and measures each call.
+
+    For every endpoint the runner sends `warmup` unmeasured requests, then `iterations` measured ones, one
+    after the other. A measurement is the wall time of the request in the test client (middleware, view,
+    SQL and rendering, reading the whole body of streaming responses; no network) and the number of SQL
+    statements it ran. Rate limits are switched off, uploads go to a temporary `MEDIA_ROOT` and the bKash payment
+    gateway gets a callback secret, so the callback endpoint can be sent signed results.
+
+    Example Usage:
+        catalogue = SyntheticCatalogue(products=1000).build()
+        results = BenchmarkRunner(catalogue, all_endpoints(), iterations=50).run()
+    '''
+
+    def __init__(self, catalogue, endpoints, iterations=50, warmup=5):
+        self.catalogue = catalogue
+        self.endpoints = endpoints
+        self.iterations = iterations
+        self.warmup = warmup
+
+    def run(self):
+        performance_logger = logging.getLogger('e_commerce_app.performance')
+        level = performance_logger.level
+        #the middleware would log a line per request, the runner reports the numbers itself
+        performance_logger.setLevel(logging.ERROR)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(RATELIMIT_ENABLE=False, MEDIA_ROOT=media_root,
+                                      PAYMENT_CALLBACK_SECRETS={'bkash': 'benchmark-callback-secret'}):
+                results = {endpoint.name: self.run_endpoint(endpoint) for endpoint in self.endpoints}
+        finally:
+            performance_logger.setLevel(level)
+        return {
+            'meta': self.meta(),
+            'dataset': self.catalogue.counts(),
+            'endpoints': results,
+        }
+
+    def run_endpoint(self, endpoint):
+        client = APIClient()
+        latencies, query_counts, status_codes = [], [], Counter()
+        for i in range(self.warmup + self.iterations):
+            request = endpoint.build(self.catalogue, i)
+            token = request.get('token') or (self.catalogue.token.key if endpoint.authenticated else None)
+            if token:
+                client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+            else:
+                client.credentials()
+
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                request_started = time.perf_counter()
+                response = self.send(client, endpoint.method, request)
+                elapsed = time.perf_counter() - request_started
+            if i < self.warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            query_counts.append(counter.count)
+            status_codes[str(response.status_code)] += 1
+        #requests are sent one at a time, so throughput is the inverse of the time spent inside requests
+        busy_seconds = sum(latencies) / 1000
+        latencies.sort()
+        return {
+            'method': endpoint.method.upper(),
+            'requests': len(latencies),
+            'errors': sum(count for status, count in status_codes.items() if not status.startswith(('2', '3'))),
+            'status_codes': dict(status_codes),
+            'throughput_rps': round(len(latencies) / busy_seconds, 2) if busy_seconds else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'p50': round(percentile(latencies, 0.50), 3) if latencies else None,
+                'p95': round(percentile(latencies, 0.95), 3) if latencies else None,
+                'p99': round(percentile(latencies, 0.99), 3) if latencies else None,
+                'max': round(latencies[-1], 3) if latencies else None,
+            },
+            'queries': {
+                'mean': round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+                'max': max(query_counts) if query_counts else None,
+            },
+        }
+
+    def send(self, client, method, request):
+        if 'body' in request:
+            response = client.generic(method.upper(), request['path'], json.dumps(request['body']), content_type='application/json')
+        else:
+            response = getattr(client, method)(request['path'], request.get('data'), format=request.get('format'),
+                                               content_type=request.get('content_type'), **request.get('headers', {}))
+        if response.streaming:
+            #a streaming response does its work while the body is read
+            b''.join(response.streaming_content)
+        return response
+
+    def meta(self):
+        return dict(environment(), seed=self.catalogue.seed, iterations=self.iterations, warmup=self.warmup)
+
+
+def environment():
+    '''Commit, time, database and versions a result was measured with'''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+    }
+
+
+def uncovered(endpoints):
+    '''Names of server_api and client_api URLs none of `endpoints` calls'''
+    covered = {endpoint.name.split('?')[0] for endpoint in endpoints}
+    names = []
+    for namespace in ('server_api', 'client_api'):
+        resolver = get_resolver().namespace_dict[namespace][1]
+        names.extend(f"{namespace}:{name}" for name in resolver.reverse_dict if isinstance(name, str))
+    return sorted(set(names) - covered)
+
+
+def compare(previous, current):
+    '''
+    Rows of (endpoint, p95 before, p95 now, change %, queries before, queries now) for endpoints present in
+    both result files, largest p95 slow down first
+    '''
+    rows = []
+    for name, result in current['endpoints'].items():
+        before = previous['endpoints'].get(name)
+        if not before or before['latency_ms']['p95'] is None or result['latency_ms']['p95'] is None:
+            continue
+        old_p95, new_p95 = before['latency_ms']['p95'], result['latency_ms']['p95']
+        change = (new_p95 - old_p95) / old_p95 * 100 if old_p95 else 0.0
+        rows.append((name, old_p95, new_p95, round(change, 1), before['queries']['max'], result['queries']['max']))
+    return sorted(rows, key=lambda row: row[3], reverse=True)
@@ -0,0 +1,201 @@
+'''
+Concurrent stock reservations (orders.stock_management) against a small set of hot SKUs, as in a flash sale.
+
+Run from the `Backend System` folder:
+
+    python -m benchmarks.stock_reservations --database postgresql --reservations 5000 --threads 64
+
+Every thread has its own database connection and reserves a random batch of SKUs at a time. Once all the
+reservations are sent, half of the successful ones are released, the rest committed, and the stock is checked:
+for every SKU the stock left plus the quantity still reserved or committed must equal the starting stock, and no
+stock may be negative. Use PostgreSQL for the numbers that matter, SQLite serialises every write and has no row locks.
+'''
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from benchmarks.__main__ import PROJECT_DIR, setup_django
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.stock_reservations', description="Benchmark concurrent stock reservations")
+    parser.add_argument('--database', choices=['sqlite', 'postgresql'], default='postgresql',
+                        help="postgresql (a test database next to the DEV_DATABASE_* one) or sqlite (a temporary file)")
+    parser.add_argument('--reservations', type=int, default=5000, help="Reservation requests sent in total")
+    parser.add_argument('--threads', type=int, default=64, help="Concurrent clients, each with its own connection")
+    parser.add_argument('--skus', type=int, default=20, help="SKUs the requests compete for")
+    parser.add_argument('--stock', type=int, default=500, help="Starting stock of every SKU, lower it to measure sold out SKUs")
+    parser.add_argument('--batch', type=int, default=3, help="Most SKUs reserved by one request, each request picks 1 to this many")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the request generator")
+    parser.add_argument('--output', default=None, help="Result file, defaults to benchmarks/results/<commit>-stock-<database>.json")
+    return parser.parse_args(argv)
+
+
+class ReservationBenchmark:
+
+    '''
+    Sends `reservations` `ManageStock.reserve_stock` calls from `threads` threads and checks the stock afterwards.
+
+    Example Usage:
+        results = ReservationBenchmark(reservations=5000, threads=64, skus=20, stock=500).run()
+    '''
+
+    def __init__(self, reservations=5000, threads=64, skus=20, stock=500, batch=3, seed=42):
+        self.reservations = reservations
+        self.threads = threads
+        self.skus = skus
+        self.stock = stock
+        self.batch = batch
+        self.seed = seed
+        self.lock = threading.Lock()
+
+    def build(self):
+        from products.models import Product, Product_SKU
+        product = Product.objects.create(product_name="Flash Sale Product", product_description="Benchmark", product_summary="Benchmark")
+        product_skus = Product_SKU.assign_sku_codes(
+            [Product_SKU(product_id=product, product_color=f"Color {i}", product_price=100, product_stock=self.stock) for i in range(self.skus)],
+            product_names={product.pk: product.product_name})
+        return [product_sku.pk for product_sku in Product_SKU.objects.bulk_create(product_skus)]
+
+    def requests(self, product_sku_pks):
+        generator = random.Random(self.seed)
+        return [{product_sku_pk: generator.randint(1, 2)
+                 for product_sku_pk in generator.sample(product_sku_pks, generator.randint(1, min(self.batch, len(product_sku_pks))))}
+                for i in range(self.reservations)]
+
+    def in_threads(self, function, work):
+        '''Run `function` on every item of `work` from `threads` threads, closing each thread's connection at the end'''
+        from django.db import connection
+        pending = iter(work)
+        results = []
+
+        def worker():
+            try:
+                while True:
+                    with self.lock:
+                        item = next(pending, None)
+                    if item is None:
+                        return
+                    result = function(item)
+                    with self.lock:
+                        results.append(result)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for future in [executor.submit(worker) for i in range(self.threads)]:
+                future.result()
+        return results, time.perf_counter() - started
+
+    def reserve(self, quantities):
+        from orders.stock_management import ManageStock
+        started = time.perf_counter()
+        reservations, message = ManageStock.reserve_stock(quantities)
+        elapsed = (time.perf_counter() - started) * 1000
+        if reservations is not None:
+            outcome = 'reserved'
+        elif message.startswith("Only"):
+            outcome = 'out_of_stock'
+        else:
+            outcome = 'error'
+        return outcome, elapsed, [reservation.pk for reservation in reservations or []], message
+
+    def run(self):
+        from benchmarks.runner import percentile
+        from orders.models import StockReservation
+        from orders.stock_management import ManageStock
+        from products.models import Product_SKU
+
+        product_sku_pks = self.build()
+        results, seconds = self.in_threads(self.reserve, self.requests(product_sku_pks))
+        outcomes = Counter(outcome for outcome, elapsed, pks, message in results)
+        errors = Counter(message for outcome, elapsed, pks, message in results if outcome == 'error')
+        latencies = sorted(elapsed for outcome, elapsed, pks, message in results)
+
+        #half of the carts give their stock back, the others check out, both concurrently
+        reserved = [pks for outcome, elapsed, pks, message in results if outcome == 'reserved']
+        random.Random(self.seed).shuffle(reserved)
+        half = len(reserved) // 2
+        ended, end_seconds = self.in_threads(
+            lambda item: ManageStock.release_reservations(item[1]) if item[0] == 'release' else ManageStock.commit_reservations(item[1]),
+            [('release', pks) for pks in reserved[:half]] + [('commit', pks) for pks in reserved[half:]])
+
+        #committed, and active ones a failed release or commit left behind
+        held = Counter()
+        for product_sku_pk, quantity in StockReservation.objects.filter(reservation_status__in=['committed', 'active']) \
+                .values_list('product_sku_id', 'quantity'):
+            held[product_sku_pk] += quantity
+        stock = dict(Product_SKU.objects.filter(pk__in=product_sku_pks).values_list('pk', 'product_stock'))
+        return {
+            'threads': self.threads,
+            'skus': self.skus,
+            'starting_stock': self.stock,
+            'requests': len(results),
+            'outcomes': dict(outcomes),
+            'errors': dict(errors),
+            'throughput_rps': round(len(results) / seconds, 2) if seconds else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'p50': round(percentile(latencies, 0.50), 3) if latencies else None,
+                'p95': round(percentile(latencies, 0.95), 3) if latencies else None,
+                'p99': round(percentile(latencies, 0.99), 3) if latencies else None,
+                'max': round(latencies[-1], 3) if latencies else None,
+            },
+            'release_and_commit_seconds': round(end_seconds, 3),
+            'active_left': StockReservation.objects.filter(reservation_status='active').count(),
+            'negative_stock': sorted(pk for pk, left in stock.items() if left < 0),
+            #stock that is neither left nor held by a reservation was lost or sold twice
+            'stock_mismatch': {pk: left + held[pk] - self.stock for pk, left in stock.items() if left + held[pk] != self.stock},
+        }
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    setup_django(arguments.database)
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from benchmarks.runner import environment
+
+    setup_test_environment()
+    original_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        print(f"Sending {arguments.reservations} reservations from {arguments.threads} threads over {arguments.skus} SKUs...", file=sys.stderr)
+        results = ReservationBenchmark(reservations=arguments.reservations, threads=arguments.threads, skus=arguments.skus,
+                                       stock=arguments.stock, batch=arguments.batch, seed=arguments.seed).run()
+        meta = environment()
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(original_name, verbosity=0)
+        teardown_test_environment()
+
+    results = {'meta': dict(meta, seed=arguments.seed), 'stock_reservations': results}
+    output = Path(arguments.output) if arguments.output else \
+        PROJECT_DIR / 'benchmarks' / 'results' / f"{meta['commit'] or 'unknown'}-stock-{meta['database']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4) + '\n', encoding='utf-8')
+
+    summary = results['stock_reservations']
+    latency = summary['latency_ms']
+    print(f"{'requests':>9} {'reserved':>9} {'sold out':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print(f"{summary['requests']:>9} {summary['outcomes'].get('reserved', 0):>9} {summary['outcomes'].get('out_of_stock', 0):>9} "
+          f"{summary['outcomes'].get('error', 0):>7} {summary['throughput_rps']:>9} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9}")
+    for message, count in summary['errors'].items():
+        print(f"  {count} x {message}")
+    if summary['negative_stock'] or summary['stock_mismatch']:
+        print(f"\nStock check FAILED: negative {summary['negative_stock']}, mismatch {summary['stock_mismatch']}")
+    else:
+        print(f"\nStock check passed: nothing oversold, every unit is left, committed or in one of "
+              f"{summary['active_left']} reservations still active")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
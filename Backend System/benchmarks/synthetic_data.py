@@ -0,0 +1,202 @@
+import datetime
+import random
+from decimal import Decimal
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from business_admin.models import AdminPositions, BusinessAdminUser
+from products.models import (Product_Category, Product_Sub_Category, Product_Brands, Product_Flavours, Product,
+                             Product_SKU, Product_Images, Product_Discount)
+from products.product_search import ProductSearch
+from system.models import Accounts
+
+
+class SyntheticCatalogue:
+
+    '''
+    Seeded generator of a realistic catalogue for the benchmarks.
+
+    Every table is filled with `bulk_create`, so building a catalogue of some thousand products takes seconds.
+    The same `seed` and `products` always give the same names, relations, prices and stock, so runs made
+    on different commits measure the same data. Sizes follow the ratios below: a few categories with
+    sub-categories, a long tail of brands where a few brands own most products (Zipf weights), one to five
+    SKUs per product and a share of products with active, expired and upcoming discounts.
+
+    Example Usage:
+        catalogue = SyntheticCatalogue(products=1000, seed=42).build()
+        print(catalogue.counts())
+    '''
+
+    PRODUCTS_PER_CATEGORY = 100
+    SUB_CATEGORIES_PER_CATEGORY = 4
+    PRODUCTS_PER_BRAND = 20
+    PRODUCTS_PER_FLAVOUR = 50
+    SKUS_PER_PRODUCT = (1, 5)
+    IMAGES_PER_PRODUCT = (2, 4)
+    #share of SKUs that come in flavours, e.g. lip balm and body mist
+    FLAVOURED_SKU_SHARE = 0.4
+    ACTIVE_DISCOUNT_SHARE = 0.15
+    EXPIRED_DISCOUNT_SHARE = 0.10
+    UPCOMING_DISCOUNT_SHARE = 0.05
+
+    PASSWORD = 'benchmark-password'
+
+    COLORS = ['Red', 'Nude', 'Pink', 'Coral', 'Berry', 'Black', 'Brown', 'Clear', 'Gold', 'Rose']
+    SIZES = ['15ml', '30ml', '50ml', '100ml', '200ml', '5g', '10g', '50g']
+    ADJECTIVES = ['Hydrating', 'Gentle', 'Matte', 'Radiant', 'Soothing', 'Nourishing', 'Brightening', 'Silky',
+                  'Velvet', 'Daily', 'Intense', 'Fresh', 'Pure', 'Ultra', 'Calming', 'Renewing']
+    NOUNS = ['Cleanser', 'Moisturizer', 'Serum', 'Toner', 'Lipstick', 'Foundation', 'Sunscreen', 'Shampoo',
+             'Conditioner', 'Body Lotion', 'Face Mask', 'Eye Cream', 'Lip Balm', 'Body Mist', 'Primer', 'Concealer']
+
+    def __init__(self, products=1000, seed=42):
+        self.product_count = products
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+
+    def counts(self):
+        '''Rows created per table, reported with the benchmark results'''
+        return {
+            'categories': len(self.category_pks),
+            'sub_categories': len(self.sub_category_pks),
+            'brands': len(self.brand_pks),
+            'flavours': len(self.flavour_pks),
+            'products': len(self.product_pks),
+            'skus': len(self.sku_pks),
+            'images': len(self.image_pks),
+            'discounts': len(self.discount_pks),
+        }
+
+    def build(self):
+        self._build_users()
+        self._build_taxonomy()
+        self._build_products()
+        self._build_skus()
+        self._build_images()
+        self._build_discounts()
+        ProductSearch.update_search_vector()
+        return self
+
+    def _build_users(self):
+        self.user = Accounts.objects.create_user(email='benchmark@example.com', username='benchmark', password=SyntheticCatalogue.PASSWORD)
+        self.token = Token.objects.create(user=self.user)
+        self.admin_position = AdminPositions.objects.create(name="Benchmark Manager", description="Created by the benchmarks")
+        self.business_admin = BusinessAdminUser.objects.create(admin_full_name="Benchmark Admin", admin_user_name=self.user.username,
+                                                               admin_position=self.admin_position)
+
+    def _build_taxonomy(self):
+        category_count = max(2, round(self.product_count / SyntheticCatalogue.PRODUCTS_PER_CATEGORY))
+        categories = Product_Category.objects.bulk_create([
+            Product_Category(category_name=f"Category {i}", description=f"Synthetic category {i}") for i in range(category_count)
+        ])
+        self.category_pks = [category.pk for category in categories]
+
+        sub_categories = Product_Sub_Category.objects.bulk_create([
+            Product_Sub_Category(sub_category_name=f"Sub Category {i}", description=f"Synthetic sub category {i}")
+            for i in range(category_count * SyntheticCatalogue.SUB_CATEGORIES_PER_CATEGORY)
+        ])
+        self.sub_category_pks = [sub_category.pk for sub_category in sub_categories]
+        #every sub-category belongs to its own category, a few are shared with a second one
+        self.sub_categories_of = {pk: [] for pk in self.category_pks}
+        links = []
+        for i, sub_category_pk in enumerate(self.sub_category_pks):
+            linked = {self.category_pks[i % category_count]}
+            if self.random.random() < 0.2:
+                linked.add(self.random.choice(self.category_pks))
+            for category_pk in linked:
+                self.sub_categories_of[category_pk].append(sub_category_pk)
+                links.append(Product_Sub_Category.category_id.through(product_sub_category_id=sub_category_pk, product_category_id=category_pk))
+        Product_Sub_Category.category_id.through.objects.bulk_create(links)
+
+        brand_count = max(2, self.product_count // SyntheticCatalogue.PRODUCTS_PER_BRAND)
+        brands = Product_Brands.objects.bulk_create([
+            Product_Brands(brand_name=f"Brand {i}", brand_country=self.random.choice(['USA', 'France', 'Korea', 'Japan', 'Bangladesh']),
+                           brand_description=f"Synthetic brand {i}", brand_established_year=self.random.randint(1900, 2023),
+                           is_own_brand=self.random.random() < 0.05)
+            for i in range(brand_count)
+        ])
+        self.brand_pks = [brand.pk for brand in brands]
+        self.brand_weights = [1 / (rank + 1) for rank in range(brand_count)]
+
+        flavours = Product_Flavours.objects.bulk_create([
+            Product_Flavours(product_flavour_name=f"Flavour {i}")
+            for i in range(max(3, self.product_count // SyntheticCatalogue.PRODUCTS_PER_FLAVOUR))
+        ])
+        self.flavour_pks = [flavour.pk for flavour in flavours]
+
+    def _build_products(self):
+        products = []
+        for i in range(self.product_count):
+            name = f"{self.random.choice(SyntheticCatalogue.ADJECTIVES)} {self.random.choice(SyntheticCatalogue.NOUNS)} {i}"
+            products.append(Product(
+                product_name=name,
+                product_brand_id=self.random.choices(self.brand_pks, weights=self.brand_weights)[0],
+                product_description=f"{name} for everyday use. " * 4,
+                product_summary=f"{name}.",
+                product_ingredients="Aqua, Glycerin, Niacinamide, Tocopherol",
+                product_usage_direction="Apply twice daily.",
+            ))
+        products = Product.objects.bulk_create(products)
+        self.product_pks = [product.pk for product in products]
+        self.product_names = {product.pk: product.product_name for product in products}
+
+        category_links, sub_category_links = [], []
+        for product_pk in self.product_pks:
+            categories = self.random.sample(self.category_pks, self.random.randint(1, min(2, len(self.category_pks))))
+            candidates = sorted({pk for category_pk in categories for pk in self.sub_categories_of[category_pk]})
+            for category_pk in categories:
+                category_links.append(Product.product_category.through(product_id=product_pk, product_category_id=category_pk))
+            for sub_category_pk in self.random.sample(candidates, min(len(candidates), self.random.randint(1, 3))):
+                sub_category_links.append(Product.product_sub_category.through(product_id=product_pk, product_sub_category_id=sub_category_pk))
+        Product.product_category.through.objects.bulk_create(category_links)
+        Product.product_sub_category.through.objects.bulk_create(sub_category_links)
+
+    def _build_skus(self):
+        skus = []
+        for product_pk in self.product_pks:
+            variants = set()
+            for _ in range(self.random.randint(*SyntheticCatalogue.SKUS_PER_PRODUCT)):
+                variants.add((self.random.choice(SyntheticCatalogue.COLORS), self.random.choice(SyntheticCatalogue.SIZES)))
+            for color, size in sorted(variants):
+                skus.append(Product_SKU(product_id_id=product_pk, product_color=color, product_size=size,
+                                        product_price=Decimal(self.random.randint(150, 5000)),
+                                        product_stock=self.random.choice([0, 5, 20, 50, 100, 500])))
+        Product_SKU.assign_sku_codes(skus, product_names=self.product_names)
+        skus = Product_SKU.objects.bulk_create(skus)
+        self.sku_pks = [sku.pk for sku in skus]
+
+        flavour_links = []
+        for sku_pk in self.sku_pks:
+            if self.random.random() < SyntheticCatalogue.FLAVOURED_SKU_SHARE:
+                for flavour_pk in self.random.sample(self.flavour_pks, self.random.randint(1, 2)):
+                    flavour_links.append(Product_SKU.product_flavours.through(product_sku_id=sku_pk, product_flavours_id=flavour_pk))
+        Product_SKU.product_flavours.through.objects.bulk_create(flavour_links)
+
+    def _build_images(self):
+        images = []
+        for product_pk in self.product_pks:
+            for n in range(self.random.randint(*SyntheticCatalogue.IMAGES_PER_PRODUCT)):
+                #only the file name is stored, the benchmarks never read the image files
+                images.append(Product_Images(product_id_id=product_pk, product_image=f"product_images/{product_pk}/{n}.jpg",
+                                             color=self.random.choice(SyntheticCatalogue.COLORS)))
+        self.image_pks = [image.pk for image in Product_Images.objects.bulk_create(images)]
+
+    def _build_discounts(self):
+        windows = [
+            (SyntheticCatalogue.ACTIVE_DISCOUNT_SHARE, -7, 7),
+            (SyntheticCatalogue.EXPIRED_DISCOUNT_SHARE, -30, -10),
+            (SyntheticCatalogue.UPCOMING_DISCOUNT_SHARE, 10, 30),
+        ]
+        discounts = []
+        for product_pk in self.product_pks:
+            draw = self.random.random()
+            for share, start_days, end_days in windows:
+                if draw < share:
+                    discounts.append(Product_Discount(
+                        product_id_id=product_pk, discount_name=f"Discount {len(discounts)}",
+                        discount_amount=Decimal(self.random.choice([5, 10, 15, 20, 25])),
+                        start_date=self.now + datetime.timedelta(days=start_days),
+                        end_date=self.now + datetime.timedelta(days=end_days),
+                    ))
+                    break
+                draw -= share
+        self.discount_pks = [discount.pk for discount in Product_Discount.objects.bulk_create(discounts)]
@@ -1,7 +1,11 @@
 from .models import *
-from django.db import DatabaseError,OperationalError,IntegrityError,ProgrammingError
+from django.db import DatabaseError,OperationalError,IntegrityError,ProgrammingError,transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 from system.models import *
 from system.system_log import SystemLogs
+from system.manage_error_log import ManageErrorLog
+from system.image_pipeline import ImagePipeline
 from e_commerce_app import settings
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
@@ -65,7 +69,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -136,7 +140,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -213,7 +217,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -272,7 +276,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -347,7 +351,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -418,7 +422,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -431,6 +435,22 @@ class AdminManagement:
 
             return False, error_messages.get(error_type, "An unexpected error occurred while fetching admin users! Please try again later.")
     
+    def admin_user_name_exists(admin_user_name,exclude_admin_unique_id=None):
+        """
+        Check case-insensitively whether an admin user name is taken, with a single `EXISTS` query.
+
+        Args:
+            admin_user_name (str): User name to look for.
+            exclude_admin_unique_id (str, optional): Unique ID of the admin being updated, which is ignored.
+
+        Returns:
+            bool: `True` if another admin already uses the user name.
+        """
+        admins = BusinessAdminUser.objects.alias(name_lower=Lower('admin_user_name')).filter(name_lower=Lower(Value(admin_user_name)))
+        if exclude_admin_unique_id is not None:
+            admins = admins.exclude(pk=exclude_admin_unique_id)
+        return admins.exists()
+
     def create_business_admin_user(admin_full_name,admin_user_name,password,admin_position_pk,
                                    admin_contact_no=None,admin_email=None,admin_avatar=None):
         
@@ -484,15 +504,14 @@ class AdminManagement:
             - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
         """
         try:
-            #fetching all to check if this user
-            all_admins,message = AdminManagement.fetch_business_admin_user()
-            if any(p.admin_user_name.lower() == admin_user_name.lower() for p in all_admins):
+            #checking if this user name is taken (case-insensitive), served by the LOWER(admin_user_name) unique index
+            if AdminManagement.admin_user_name_exists(admin_user_name):
                 return False, "Admin with this username exists"
             #user = User.objects.create_user(username=admin_user_name,password=password)
             admin_position,message = AdminManagement.fetch_admin_position(pk=admin_position_pk)
-            business_admin = BusinessAdminUser.objects.create(admin_full_name=admin_full_name,admin_user_name=admin_user_name,
-                                                              admin_position = admin_position)#,user=user
-            business_admin.save()
+            with transaction.atomic():
+                business_admin = BusinessAdminUser.objects.create(admin_full_name=admin_full_name,admin_user_name=admin_user_name,
+                                                                  admin_position = admin_position)#,user=user
             if admin_contact_no:
                 business_admin.admin_contact_no = admin_contact_no
             if admin_email:
@@ -500,13 +519,15 @@ class AdminManagement:
             if admin_avatar:
                 business_admin.admin_avatar = admin_avatar
             business_admin.save()
+            if admin_avatar:
+                ImagePipeline.get().process_later(business_admin,'admin_avatar')
             return True, "Business Admin created successfully"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -580,7 +601,6 @@ class AdminManagement:
         try:
             #getting the admin user
             business_admin_user,message = AdminManagement.fetch_business_admin_user(admin_unique_id=admin_unique_id)
-            all_business_admin_user,message = AdminManagement.fetch_business_admin_user()
             admin_position,message = AdminManagement.fetch_admin_position(pk=admin_position_pk)
             #checking conditions to update as necessarily
             # if password:
@@ -593,9 +613,8 @@ class AdminManagement:
             if business_admin_user.admin_full_name.lower() != admin_full_name.lower():
                 business_admin_user.admin_full_name = admin_full_name
             if admin_user_name and business_admin_user.admin_user_name.lower() != admin_user_name.lower():
-                for p in all_business_admin_user:
-                    if p != business_admin_user and p.admin_user_name.lower() == admin_user_name.lower():
-                        return False, "This user name is taken"
+                if AdminManagement.admin_user_name_exists(admin_user_name,exclude_admin_unique_id=business_admin_user.pk):
+                    return False, "This user name is taken"
                 business_admin_user.admin_user_name = admin_user_name
             if business_admin_user.admin_position != admin_position:
                 business_admin_user.admin_position = admin_position
@@ -611,12 +630,12 @@ class AdminManagement:
             if admin_avatar:
                 if not business_admin_user.admin_avatar or business_admin_user.admin_avatar != admin_avatar:
                     if business_admin_user.admin_avatar:
-                        path = settings.MEDIA_ROOT+str(business_admin_user.admin_avatar)
-                        if os.path.exists(path):
-                            os.remove(path)
-                        business_admin_user.admin_avatar.delete()
+                        ImagePipeline.get().release(business_admin_user,'admin_avatar')
                 business_admin_user.admin_avatar = admin_avatar
-            business_admin_user.save()
+            with transaction.atomic():
+                business_admin_user.save()
+            if admin_avatar:
+                ImagePipeline.get().process_later(business_admin_user,'admin_avatar')
 
             #updated,message = SystemLogs.updated_by(request,business_admin_user)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated admin {business_admin_user.admin_user_name}",message="Updated")
@@ -626,7 +645,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -698,7 +717,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -768,7 +787,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -821,10 +840,7 @@ class AdminManagement:
             #getting the admin
             business_admin_user,message = AdminManagement.fetch_business_admin_user(admin_unique_id=admin_unique_id)
             if business_admin_user.admin_avatar:
-                path = settings.MEDIA_ROOT+str(business_admin_user.admin_avatar)
-                if os.path.exists(path):
-                    os.remove(path)
-                business_admin_user.admin_avatar.delete()
+                ImagePipeline.get().release(business_admin_user,'admin_avatar')
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted admin {business_admin_user.admin_user_name}",message="Deleted")
             business_admin_user.delete()
             return True, "Admin deleted successfully"
@@ -832,7 +848,7 @@ class AdminManagement:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:39
+
+from collections import defaultdict
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def deduplicate_admin_user_names(apps, schema_editor):
+    '''Admin user names that only differ in case keep the oldest account, the others get a numeric suffix'''
+    BusinessAdminUser = apps.get_model('business_admin', 'BusinessAdminUser')
+    groups = defaultdict(list)
+    for admin in BusinessAdminUser.objects.annotate(name_lower=Lower('admin_user_name')).order_by('admin_account_created_at', 'pk'):
+        groups[admin.name_lower].append(admin)
+    taken = set(groups)
+    for admins in groups.values():
+        for admin in admins[1:]:
+            suffix = 2
+            while f"{admin.name_lower[:95]}_{suffix}" in taken:
+                suffix += 1
+            admin.admin_user_name = f"{admin.admin_user_name[:95]}_{suffix}"
+            taken.add(admin.admin_user_name.lower())
+            admin.save(update_fields=['admin_user_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_admin', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_admin_user_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='businessadminuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('admin_user_name'), name='admin_user_name_lower_unique'),
+        ),
+    ]
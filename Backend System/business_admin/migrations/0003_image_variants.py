@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:52
+
+import business_admin.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_admin', '0002_lower_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessadminuser',
+            name='admin_avatar_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='businessadminuser',
+            name='admin_avatar',
+            field=models.ImageField(blank=True, null=True, upload_to=business_admin.models.get_admin_avatar_path),
+        ),
+    ]
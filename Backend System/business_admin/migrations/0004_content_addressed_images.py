@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:55
+
+import business_admin.models
+import system.content_storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_admin', '0003_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='businessadminuser',
+            name='admin_avatar',
+            field=models.ImageField(blank=True, null=True, storage=system.content_storage.ContentAddressedStorage(), upload_to=business_admin.models.get_admin_avatar_path),
+        ),
+    ]
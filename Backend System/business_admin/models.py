@@ -1,7 +1,8 @@
 from django.db import models
-from django_resized import ResizedImageField
 from django.contrib.auth.models import User
 import hashlib
+from django.db.models.functions import Lower
+from system.content_storage import content_addressed_storage
 # Create your models here.
 
 # Admin Positions Model
@@ -17,7 +18,7 @@ class AdminPositions(models.Model):
 
 
 def get_admin_avatar_path(instance, filename):
-    return f'admin_profile_picture/{instance.admin_unique_id}/{filename}'
+    return f'admin_profile_picture/{filename}'
 
 class BusinessAdminUser(models.Model):
     '''
@@ -27,7 +28,8 @@ class BusinessAdminUser(models.Model):
     admin_unique_id=models.CharField(null=False,blank=False,max_length=50,primary_key=True)
     admin_full_name=models.CharField(null=False,blank=False,max_length=100)
     admin_user_name = models.CharField(null=False,blank=False,max_length=100)
-    admin_avatar=ResizedImageField(size=[244,244],upload_to=get_admin_avatar_path,blank=True, null=True)
+    admin_avatar=models.ImageField(upload_to=get_admin_avatar_path,storage=content_addressed_storage,blank=True, null=True)
+    admin_avatar_variants=models.JSONField(blank=True,null=True)#resized copies made by system.image_pipeline
     admin_position=models.ForeignKey(AdminPositions,null=False,blank=False,on_delete=models.CASCADE)
     admin_email=models.EmailField(null=True,blank=True)
     admin_contact_no=models.CharField(null=True,blank=True,max_length=20)
@@ -40,6 +42,10 @@ class BusinessAdminUser(models.Model):
     class Meta:
         verbose_name="Admin User"
         verbose_name_plural="Admin Users"
+        constraints=[
+            #case-insensitive unique user name, also serves AdminManagement.admin_user_name_exists
+            models.UniqueConstraint(Lower('admin_user_name'),name='admin_user_name_lower_unique'),
+        ]
     
     def __str__(self):
         return str(self.admin_unique_id)
@@ -54,22 +60,11 @@ class BusinessAdminUser(models.Model):
         self.admin_unique_id = f"{base_sku}_{unique_hash.upper()}"
     
     def save(self, *args, **kwargs):
-        #if newly created only then
-        if not self.pk or self._is_admin_related_field_updated():
+        #only when newly created, the unique id is the primary key and the admin's login id, it never changes
+        if not self.pk:
             self.generate_and_save_unique_id()
         
         super(BusinessAdminUser, self).save(*args, **kwargs)
-    
-    def _is_admin_related_field_updated(self):
-        """Check if fields affecting admin unique id generation have been updated."""
-        if not self.pk:
-            return False
-
-        # Get the current state from the database
-        current = BusinessAdminUser.objects.get(pk=self.pk)
-        return (
-            current.admin_full_name != self.admin_full_name 
-        )
 
 
 # Permission Model
@@ -118,6 +118,12 @@ class BusinessAdminTest(TestCase):
         self.assertFalse(success,"Business Admin should not be created successfully")
         self.assertEqual(message,"Admin with this username exists","Error message is incorrect")
 
+        #same username in another case
+        success, message = AdminManagement.create_business_admin_user(admin_full_name="SAMI",admin_user_name="SAMI218686",
+                                                                      password='2186',admin_position_pk=self.adminposition2.pk)
+        self.assertFalse(success,"User names should be unique regardless of case")
+        self.assertEqual(message,"Admin with this username exists","Error message is incorrect")
+
     def test_update_business_admin(self):
         """
         Test for updating business admins
@@ -133,6 +139,18 @@ class BusinessAdminTest(TestCase):
         self.assertTrue(success,"business admin should be successfully updated")
         self.assertEqual(message,"Business Admin successfully updated","Success message is incorrect")
     
+    def test_rename_business_admin_keeps_unique_id(self):
+        """
+        Test that changing an admin's full name updates the same row instead of inserting one under a new id
+        """
+        admin_unique_id = self.businessadmin1.admin_unique_id
+        request = self.factory.post('/admins/update/')
+        success, message = AdminManagement.update_business_admin_user(request,admin_unique_id=admin_unique_id,
+                                                                 admin_full_name="Rafi Ahmed",admin_position_pk=self.adminposition1.pk)
+        self.assertTrue(success,message)
+        self.assertEqual(BusinessAdminUser.objects.count(),1)
+        self.assertEqual(BusinessAdminUser.objects.get(pk=admin_unique_id).admin_full_name,"Rafi Ahmed")
+
     def test_update_password_reset(self):
         """
         Test for reseting the password
@@ -2,5 +2,554 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_api_key.permissions import HasAPIKey
 from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
+from customer.models import CustomerAddress
+from orders.cart_management import ManageCart
+from orders.checkout import ManageCheckout
+from orders.guest_cart import GuestCart
+from orders.models import OrderPayment
+from orders.payments import ManagePayments
+from system.idempotency import Idempotency
+
+
+def cart_items(lines):
+    return [
+        {
+            "product_sku_pk": line['product_sku_id'],
+            "quantity": line['quantity'],
+            "unit_price": str(line['unit_price']),
+            "line_total": str(line['line_total']),
+        }
+        for line in lines
+    ]
+
+
+def cart_data(cart):
+    '''The customer's cart and its items as returned by the cart endpoints'''
+    cart, lines = ManageCart.cart_lines(cart)
+    return {
+        "cart_pk": cart.pk,
+        "cart_token": None,
+        "cart_total_amount": str(cart.cart_total_amount),
+        "items": cart_items(lines),
+    }
+
+
+def guest_cart_data(token):
+    '''A guest cart and its items, priced now'''
+    total, lines = GuestCart.priced_lines(token)
+    return {
+        "cart_pk": None,
+        "cart_token": token,
+        "cart_total_amount": str(total),
+        "items": cart_items(lines),
+    }
+
+
+def customer_cart(request):
+    '''The customer's open cart, with the guest cart of the `X-Cart-Token` header merged into it. Returns `(cart, message)`'''
+    cart, message = ManageCart.open_cart(request)
+    if cart is not None and request.headers.get(GuestCart.HEADER):
+        cart, message = GuestCart.merge(request.headers.get(GuestCart.HEADER), cart)
+    return cart, message
+
+
+def guest_token(request):
+    '''The cart token of the request, `None` if it has none or it does not verify'''
+    token = request.headers.get(GuestCart.HEADER)
+    return token if GuestCart.cart_key(token) else None
+
+
+def cart_change_response(request, customer_operation, guest_operation):
+    '''Run the change on the customer's cart, or on the guest cart of the request, and answer with the cart'''
+    if request.user.is_authenticated:
+        cart, message = customer_cart(request)
+        if cart:
+            cart, message = customer_operation(cart)
+        data = cart_data(cart) if cart else None
+    else:
+        token, message = guest_operation(guest_token(request))
+        data = guest_cart_data(token) if token else None
+    if data:
+        return Response(
+            {
+                "success": True,
+                "message": message,
+                "data": data,
+            },
+            status=status.HTTP_200_OK,
+        )
+    return Response(
+        {
+            "success": False,
+            "message": message,
+        },
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+class CartView(APIView):
+    """
+    API endpoint to fetch the cart of a customer or a guest.
+
+    A customer gets their open cart, created empty if there is none. The totals are kept up to date as items change
+    (`ManageCart.cart_lines`), only lines whose SKU price or discount changed since the cart was priced are priced
+    again. A guest cart sent in the `X-Cart-Token` header is merged into the customer's cart first.
+
+    A guest without a token gets an empty cart, a guest cart (`GuestCart`) is priced on every read.
+
+    Permissions:
+        - Customers (API token) and guests.
+
+    Headers:
+        - X-Cart-Token (str, optional): The token of a guest cart, returned by the cart endpoints as `cart_token`.
+
+    Responses:
+        - **200 OK**: The cart and its items.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            GET /client_api/orders/cart/
+
+        Response (Success):
+        {
+            "success": true,
+            "message": "Fetched cart",
+            "data": {
+                "cart_pk": 3,
+                "cart_token": null,
+                "cart_total_amount": "160.00",
+                "items": [{"product_sku_pk": 12, "quantity": 2, "unit_price": "80.00", "line_total": "160.00"}]
+            }
+        }
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = []
+
+    def get(self, request):
+        """
+        Handles GET requests to fetch the cart.
+
+        Returns:
+            Response: A JSON response containing the cart or an error message.
+        """
+        try:
+            if not request.user.is_authenticated:
+                return Response(
+                    {
+                        "success": True,
+                        "message": "Fetched cart",
+                        "data": guest_cart_data(guest_token(request)),
+                    },
+                    status=status.HTTP_200_OK,
+                )
+            cart, message = customer_cart(request)
+            if cart is None:
+                return Response(
+                    {
+                        "success": False,
+                        "message": message,
+                    },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            return Response(
+                {
+                    "success": True,
+                    "message": message,
+                    "data": cart_data(cart),
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            print(f"Unexpected error in Cart API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class CartItemsView(APIView):
+    """
+    API endpoint to add a product SKU to the cart of a customer or a guest.
+
+    Adding a SKU that is already in the cart adds to its quantity. A customer's cart total moves by the new line
+    total only (`ManageCart.add_item`). A guest's cart is kept out of the database (`GuestCart.add_item`), the
+    first add creates it and returns its `cart_token`, which the client sends back in the `X-Cart-Token` header.
+
+    Permissions:
+        - Customers (API token) and guests.
+
+    Request Body:
+        - product_sku_pk (int, required): The SKU to add.
+        - quantity (int, optional): Units to add, 1 by default.
+
+    Responses:
+        - **200 OK**: Item added, the cart is returned.
+        - **400 Bad Request**: Unknown SKU, invalid quantity, not enough stock or a full guest cart.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            POST /client_api/orders/cart/items/
+            {"product_sku_pk": 12, "quantity": 2}
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = []
+
+    def post(self, request):
+        """
+        Handles POST requests to add an item to the cart.
+
+        Returns:
+            Response: A JSON response containing the cart or an error message.
+        """
+        try:
+            product_sku_pk = request.data.get('product_sku_pk')
+            if not product_sku_pk:
+                return Response(
+                    {
+                        "success": False,
+                        "message": "product_sku_pk is required",
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            quantity = request.data.get('quantity', 1)
+            return cart_change_response(
+                request,
+                lambda cart: ManageCart.add_item(cart, product_sku_pk, quantity),
+                lambda token: GuestCart.add_item(token, product_sku_pk, quantity),
+            )
+        except Exception as e:
+            print(f"Unexpected error in Cart Items API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class CartItemView(APIView):
+    """
+    API endpoint to change the quantity of a product SKU in the cart of a customer or a guest, or remove it.
+
+    Permissions:
+        - Customers (API token) and guests.
+
+    Headers:
+        - X-Cart-Token (str, optional): The token of the guest cart to change.
+
+    Request Body (PUT):
+        - quantity (int, required): The new quantity, 0 removes the item.
+
+    Responses:
+        - **200 OK**: Cart updated, the cart is returned.
+        - **400 Bad Request**: The SKU is not in the cart, the quantity is invalid or there is not enough stock.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            PUT /client_api/orders/cart/items/12/
+            {"quantity": 3}
+
+            DELETE /client_api/orders/cart/items/12/
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = []
+
+    def put(self, request, product_sku_pk):
+        """
+        Handles PUT requests to change the quantity of an item.
+
+        Returns:
+            Response: A JSON response containing the cart or an error message.
+        """
+        quantity = request.data.get('quantity')
+        if quantity is None:
+            return Response(
+                {
+                    "success": False,
+                    "message": "quantity is required",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self.change(
+            request,
+            lambda cart: ManageCart.set_quantity(cart, product_sku_pk, quantity),
+            lambda token: GuestCart.set_quantity(token, product_sku_pk, quantity),
+        )
+
+    def delete(self, request, product_sku_pk):
+        """
+        Handles DELETE requests to remove an item.
+
+        Returns:
+            Response: A JSON response containing the cart or an error message.
+        """
+        return self.change(
+            request,
+            lambda cart: ManageCart.remove_item(cart, product_sku_pk),
+            lambda token: GuestCart.remove_item(token, product_sku_pk),
+        )
+
+    def change(self, request, customer_operation, guest_operation):
+        try:
+            return cart_change_response(request, customer_operation, guest_operation)
+        except Exception as e:
+            print(f"Unexpected error in Cart Item API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class CheckoutView(APIView):
+    """
+    API endpoint to place an order for the items of the customer's cart.
+
+    Uses `ManageCheckout.checkout`, which prices the cart, applies the coupon, commits the stock the cart holds and
+    writes the order, its lines, shipping address and pending payment in one transaction.
+
+    Permissions:
+        - Authenticated customers (API token), rate limited to 10 requests per minute per user.
+
+    Headers:
+        - Idempotency-Key (str, optional): A unique value per order attempt, sent again with every retry. A retry
+          gets the response of the first request back instead of placing a second order.
+        - X-Cart-Token (str, optional): The token of the customer's guest cart, merged into their open cart first.
+
+    Request Body:
+        - cart_pk (int, required): The customer's cart, optional with an `X-Cart-Token` (the open cart is checked out).
+        - payment_mode (str, required): One of the payment modes of `OrderPayment`.
+        - address_pk (int, optional): A saved `CustomerAddress` of the customer to ship to.
+        - address_line1, address_line2, country, city, postal_code (str): The shipping address when no `address_pk` is given.
+        - coupon_code (str, optional): A coupon of the customer.
+
+    Responses:
+        - **201 Created**: Order placed.
+        - **400 Bad Request**: Missing fields, empty cart, invalid coupon or not enough stock.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            POST /client_api/orders/checkout/
+            {"cart_pk": 3, "payment_mode": "bkash", "address_line1": "House 1, Road 2", "city": "Dhaka"}
+
+        Response (Success):
+        {
+            "success": true,
+            "message": "Order placed successfully",
+            "data": {
+                "order_id": "ORD-20260101-3F2A9C1B7E",
+                "total_amount": "1450.00",
+                "coupon_discount": "0.00",
+                "order_status": "pending"
+            }
+        }
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(ratelimit(key='user', rate='10/m', method='POST', block=True))
+    @Idempotency.idempotent('checkout')
+    def post(self, request):
+        """
+        Handles POST requests to check out a cart.
+
+        Returns:
+            Response: A JSON response containing the order placed or an error message.
+        """
+        try:
+            cart_pk = request.data.get('cart_pk')
+            payment_mode = request.data.get('payment_mode')
+            if request.headers.get(GuestCart.HEADER):
+                #a guest who logged in to check out, their guest cart becomes part of the order
+                cart, message = customer_cart(request)
+                if cart is None:
+                    return Response(
+                        {
+                            "success": False,
+                            "message": message,
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                cart_pk = cart_pk or cart.pk
+            if not cart_pk or not payment_mode:
+                return Response(
+                    {
+                        "success": False,
+                        "message": "cart_pk and payment_mode are required",
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            address_pk = request.data.get('address_pk')
+            if address_pk:
+                address = CustomerAddress.objects.filter(pk=address_pk, customer_id=request.user).first()
+                if address is None:
+                    return Response(
+                        {
+                            "success": False,
+                            "message": "Address does not exist",
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                shipping_address = {field: getattr(address, field) for field in ManageCheckout.SHIPPING_FIELDS}
+            else:
+                shipping_address = {field: request.data.get(field) for field in ManageCheckout.SHIPPING_FIELDS}
+
+            order, message = ManageCheckout.checkout(request, cart_pk, payment_mode, shipping_address,
+                                                     coupon_code=request.data.get('coupon_code') or None)
+            if order:
+                return Response(
+                    {
+                        "success": True,
+                        "message": message,
+                        "data": {
+                            "order_id": order.order_id,
+                            "total_amount": str(order.total_amount),
+                            "coupon_discount": str(order.coupon_discount),
+                            "order_status": order.order_status,
+                        },
+                    },
+                    status=status.HTTP_201_CREATED,
+                )
+            return Response(
+                {
+                    "success": False,
+                    "message": message,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            print(f"Unexpected error in Checkout API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class PaymentCallbackView(APIView):
+    """
+    API endpoint the payment gateways call with the result of a payment.
+
+    The raw body must be signed with the gateway's secret (settings.PAYMENT_CALLBACK_SECRETS): the hex
+    HMAC-SHA256 of the body in the `X-Signature` header. Gateways deliver a callback until it is acknowledged,
+    so the same delivery is answered from the idempotency store, keyed by the `Idempotency-Key` header or else
+    the transaction id, and `ManagePayments.record_result` only ever settles a pending payment once.
+
+    Permissions:
+        - Open endpoint, authenticated by the body signature.
+
+    Request Body:
+        - payment_reference (str, required): The reference of the payment given to the gateway at checkout.
+        - transaction_id (str, required): The gateway's id of the transaction.
+        - payment_status (str, required): 'success' or 'failed'.
+        - amount (str, required): The amount charged.
+
+    Responses:
+        - **200 OK**: Result recorded, or already recorded.
+        - **400 Bad Request**: Unknown payment, amount mismatch or a payment that is already settled differently.
+        - **401 Unauthorized**: Missing or wrong signature.
+        - **404 Not Found**: Unknown payment mode.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            POST /client_api/orders/payments/bkash/callback/
+            X-Signature: 5d41402abc4b2a76b9719d911017c592...
+            {"payment_reference": "9f1c...", "transaction_id": "TRX9A8B7C", "payment_status": "success", "amount": "1450.00"}
+
+        Response (Success):
+        {
+            "success": true,
+            "message": "Payment result recorded",
+            "data": {"payment_reference": "9f1c...", "payment_status": "success"}
+        }
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request, payment_mode):
+        """
+        Handles POST requests with a payment result.
+
+        Returns:
+            Response: A JSON response acknowledging the result or an error message.
+        """
+        try:
+            if payment_mode not in dict(OrderPayment.PAYMENT_MODE_CHOICES):
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Unknown payment mode",
+                    },
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            #the signature covers the raw body, read before the data is parsed
+            if not ManagePayments.verify_signature(payment_mode, request.body, request.headers.get('X-Signature')):
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Invalid signature",
+                    },
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+
+            key = request.headers.get(Idempotency.HEADER) or request.data.get('transaction_id')
+            return Idempotency.respond(request, f'payment_callback:{payment_mode}', key, None, lambda: self.record(request))
+        except Exception as e:
+            print(f"Unexpected error in PaymentCallback API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def record(self, request):
+        payment, message = ManagePayments.record_result(
+            request.data.get('payment_reference'),
+            request.data.get('transaction_id'),
+            request.data.get('payment_status'),
+            request.data.get('amount'),
+        )
+        if payment:
+            return Response(
+                {
+                    "success": True,
+                    "message": message,
+                    "data": {
+                        "payment_reference": payment.payment_reference,
+                        "payment_status": payment.payment_status,
+                    },
+                },
+                status=status.HTTP_200_OK,
+            )
+        return Response(
+            {
+                "success": False,
+                "message": message,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
@@ -1,7 +1,15 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_api_key.models import APIKey
-from products.models import Product_Category  # Assuming the model is named Product_Category
+from django.core.cache import cache
+from products.models import Product_Category, Product, Product_Brands, Product_SKU
+from rest_framework.authtoken.models import Token
+from system.models import Accounts
+from orders.models import Cart, CartItems, Order, OrderPayment
+from django.test import override_settings
+import hashlib
+import hmac
+import json
 
 class ProductCategoryListTests(APITestCase):
     @classmethod
@@ -14,6 +22,10 @@ class ProductCategoryListTests(APITestCase):
         Product_Category.objects.create(category_name="Electronics", description="Electronic items.")
         Product_Category.objects.create(category_name="Clothing", description="Apparel and fashion.")
 
+    def setUp(self):
+        # Responses are cached in the catalogue cache, which outlives the per-test database rollback
+        cache.clear()
+
     def test_fetch_all_categories_success(self):
         """
         Test case for successfully fetching all product categories.
@@ -37,6 +49,36 @@ class ProductCategoryListTests(APITestCase):
         self.assertEqual(response.data["success"], False)
         self.assertEqual(response.data["message"], "No product categories found")
 
+    def test_conditional_request_not_modified(self):
+        """
+        Test that a request carrying the current ETag or Last-Modified gets 304 without a body.
+        """
+        response = self.client.get("/client_api/product-categories/", headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        response_304 = self.client.get("/client_api/product-categories/", headers=self.headers, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response_304.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_304.content, b"")
+        self.assertEqual(response_304["ETag"], response["ETag"])
+
+        response_304 = self.client.get("/client_api/product-categories/", headers=self.headers, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response_304.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_conditional_request_after_change(self):
+        """
+        Test that changing or deleting a category changes the ETag.
+        """
+        response = self.client.get("/client_api/product-categories/", headers=self.headers)
+        etag = response["ETag"]
+
+        Product_Category.objects.filter(category_name="Clothing").delete()
+        response = self.client.get("/client_api/product-categories/", headers=self.headers, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([c["name"] for c in response.data["data"]], ["Electronics"], "Deleted category should not be served from cache.")
+
     def test_rate_limit_exceeded(self):
         """
         Test case for exceeding the rate limit.
@@ -64,4 +106,224 @@ class ProductCategoryListTests(APITestCase):
     #     headers = {"HTTP_X_API_KEY": "invalid_key"}
     #     response = self.client.get("/client_api/product-categories/", headers=headers)
     #     self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-    #     self.assertEqual(response.data["detail"], "Authentication credentials were not provided.")
\ No newline at end of file
+    #     self.assertEqual(response.data["detail"], "Authentication credentials were not provided.")
+
+class ProductSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Product_Brands.objects.create(brand_name="Loreal", brand_established_year=1909)
+        Product.objects.create(product_name="Loreal Moisturizer", product_brand=brand, product_description="A moisturizer by Loreal",
+                               product_summary="Hydrating moisturizer")
+        Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_products(self):
+        """
+        Test case for searching products by name and by brand name.
+        """
+        response = self.client.get("/client_api/products/search/", {"q": "moisturizer"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["name"] for p in response.data["data"]], ["Loreal Moisturizer"])
+
+        response = self.client.get("/client_api/products/search/", {"q": "loreal"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"][0]["brand"], "Loreal")
+
+    def test_search_without_results(self):
+        """
+        Test case for a search that matches no product.
+        """
+        response = self.client.get("/client_api/products/search/", {"q": "perfume"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data["message"], "No products found for this search")
+
+    def test_search_without_query(self):
+        """
+        Test case for a search request without the q parameter.
+        """
+        response = self.client.get("/client_api/products/search/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["success"], False)
+
+
+class ProductFacetsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Product_Category.objects.create(category_name="Skincare", description="Products for skincare.")
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        product.product_category.set([cls.category])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fetch_facets(self):
+        """
+        Test case for fetching facet counts with a category filter.
+        """
+        response = self.client.get("/client_api/products/facets/", {"category": str(self.category.pk)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["total"], 1)
+        self.assertEqual(response.data["data"]["categories"], [{"id": self.category.pk, "name": "Skincare", "count": 1}])
+
+    def test_fetch_facets_invalid_filter(self):
+        """
+        Test case for malformed filter parameters.
+        """
+        response = self.client.get("/client_api/products/facets/", {"category": "skincare"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Invalid filter parameters")
+
+
+class CartTests(APITestCase):
+    def setUp(self):
+        self.customer = Accounts.objects.create_user(email="buyer@example.com", username="buyer", password="password")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=self.customer).key)
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.product_sku = Product_SKU.objects.create(product_id=product, product_color="Red", product_price=250, product_stock=3)
+
+    def test_cart_items(self):
+        """
+        Test case for adding, changing and removing cart items.
+        """
+        response = self.client.post("/client_api/orders/cart/items/", {"product_sku_pk": self.product_sku.pk, "quantity": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["cart_total_amount"], "500.00")
+        response = self.client.put(f"/client_api/orders/cart/items/{self.product_sku.pk}/", {"quantity": 1}, format="json")
+        self.assertEqual(response.data["data"]["items"][0]["line_total"], "250.00")
+        response = self.client.delete(f"/client_api/orders/cart/items/{self.product_sku.pk}/")
+        self.assertEqual(response.data["data"]["cart_total_amount"], "0.00")
+        response = self.client.get("/client_api/orders/cart/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["items"], [])
+
+    def test_guest_cart_merges_on_login(self):
+        """
+        Test case for a guest cart kept out of the database until the customer is authenticated.
+        """
+        self.client.credentials()
+        response = self.client.post("/client_api/orders/cart/items/", {"product_sku_pk": self.product_sku.pk, "quantity": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.data["data"]["cart_token"]
+        self.assertEqual(response.data["data"]["cart_total_amount"], "500.00")
+        self.assertFalse(Cart.objects.exists())
+        response = self.client.get("/client_api/orders/cart/", HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data["data"]["items"][0]["quantity"], 2)
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.get(user=self.customer).key)
+        response = self.client.get("/client_api/orders/cart/", HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data["message"], "Guest cart merged")
+        self.assertEqual(response.data["data"]["cart_total_amount"], "500.00")
+        self.assertEqual(CartItems.objects.get(cart_id__customer_id=self.customer).quantity, 2)
+
+    def test_unknown_sku(self):
+        """
+        Test case for adding a product sku that does not exist.
+        """
+        response = self.client.post("/client_api/orders/cart/items/", {"product_sku_pk": self.product_sku.pk + 100}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Product sku does not exist")
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Accounts.objects.create_user(email="buyer@example.com", username="buyer", password="password")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=self.customer).key)
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.product_sku = Product_SKU.objects.create(product_id=product, product_color="Red", product_price=250, product_stock=3)
+        self.cart = Cart.objects.create(device_ip="127.0.0.1", customer_id=self.customer, cart_total_amount=0)
+        CartItems.objects.create(cart_id=self.cart, product_sku=self.product_sku, quantity=2)
+
+    def test_checkout(self):
+        """
+        Test case for placing an order for a cart.
+        """
+        response = self.client.post("/client_api/orders/checkout/", {"cart_pk": self.cart.pk, "payment_mode": "bkash",
+                                                                      "address_line1": "House 1", "city": "Dhaka"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["data"]["total_amount"], "500.00")
+        self.assertEqual(Order.objects.get().order_id, response.data["data"]["order_id"])
+
+    def test_checkout_merges_guest_cart(self):
+        """
+        Test case for checking out the open cart with a guest cart merged into it.
+        """
+        self.client.credentials()
+        token = self.client.post("/client_api/orders/cart/items/", {"product_sku_pk": self.product_sku.pk}, format="json").data["data"]["cart_token"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.get(user=self.customer).key)
+        response = self.client.post("/client_api/orders/checkout/", {"payment_mode": "bkash", "address_line1": "House 1"},
+                                    format="json", HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["data"]["total_amount"], "750.00")
+
+    def test_checkout_without_stock(self):
+        """
+        Test case for a cart asking for more than is in stock.
+        """
+        Product_SKU.objects.filter(pk=self.product_sku.pk).update(product_stock=1)
+        response = self.client.post("/client_api/orders/checkout/", {"cart_pk": self.cart.pk, "payment_mode": "bkash",
+                                                                      "address_line1": "House 1"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.data["success"])
+
+    def test_checkout_retry_is_replayed(self):
+        """
+        Test case for a retried checkout with the same idempotency key.
+        """
+        data = {"cart_pk": self.cart.pk, "payment_mode": "bkash", "address_line1": "House 1"}
+        first = self.client.post("/client_api/orders/checkout/", data, format="json", HTTP_IDEMPOTENCY_KEY="attempt-1")
+        retry = self.client.post("/client_api/orders/checkout/", data, format="json", HTTP_IDEMPOTENCY_KEY="attempt-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderPayment.objects.count(), 1)
+
+    def test_idempotency_key_reused_for_another_request(self):
+        """
+        Test case for an idempotency key sent with a different body.
+        """
+        self.client.post("/client_api/orders/checkout/", {"cart_pk": self.cart.pk, "payment_mode": "bkash", "address_line1": "House 1"},
+                         format="json", HTTP_IDEMPOTENCY_KEY="attempt-1")
+        response = self.client.post("/client_api/orders/checkout/", {"cart_pk": self.cart.pk, "payment_mode": "nagad", "address_line1": "House 1"},
+                                    format="json", HTTP_IDEMPOTENCY_KEY="attempt-1")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+@override_settings(PAYMENT_CALLBACK_SECRETS={"bkash": "gateway-secret"})
+class PaymentCallbackTests(APITestCase):
+    def setUp(self):
+        customer = Accounts.objects.create_user(email="buyer@example.com", username="buyer", password="password")
+        order = Order.objects.create(order_id="ORD-1", customer_id=customer, total_amount=500)
+        self.payment = OrderPayment.objects.create(order_id=order, payment_mode="bkash", payment_amount=500, payment_reference="ref-1")
+
+    def callback(self, data, secret="gateway-secret"):
+        body = json.dumps(data).encode("utf-8")
+        signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return self.client.post("/client_api/orders/payments/bkash/callback/", body, content_type="application/json",
+                                HTTP_X_SIGNATURE=signature)
+
+    def test_payment_callback_delivered_twice(self):
+        """
+        Test case for a gateway delivering the same successful payment twice.
+        """
+        data = {"payment_reference": "ref-1", "transaction_id": "TRX1", "payment_status": "success", "amount": "500.00"}
+        first = self.callback(data)
+        retry = self.callback(data)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.payment_status, self.payment.transaction_id), ("success", "TRX1"))
+
+    def test_payment_callback_with_wrong_signature(self):
+        """
+        Test case for a callback that is not signed with the gateway's secret.
+        """
+        response = self.callback({"payment_reference": "ref-1", "transaction_id": "TRX1", "payment_status": "success",
+                                  "amount": "500.00"}, secret="guessed")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, "pending")
@@ -1,8 +1,16 @@
 from django.urls import path
 from .views import *
+from .orders_api_view import CartView, CartItemsView, CartItemView, CheckoutView, PaymentCallbackView
 
 app_name='client_api'
 
 urlpatterns = [
-    path('product-categories/',ProductCategoryListView.as_view(),name='product_category_list')
+    path('product-categories/',ProductCategoryListView.as_view(),name='product_category_list'),
+    path('products/search/',ProductSearchView.as_view(),name='product_search'),
+    path('products/facets/',ProductFacetsView.as_view(),name='product_facets'),
+    path('orders/cart/',CartView.as_view(),name='cart'),
+    path('orders/cart/items/',CartItemsView.as_view(),name='cart_items'),
+    path('orders/cart/items/<int:product_sku_pk>/',CartItemView.as_view(),name='cart_item'), #pass parameters: product_sku_pk
+    path('orders/checkout/',CheckoutView.as_view(),name='checkout'),
+    path('orders/payments/<str:payment_mode>/callback/',PaymentCallbackView.as_view(),name='payment_callback'), #pass parameters: payment_mode
 ]
@@ -5,6 +5,12 @@ from rest_framework import status
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
 from products.product_management import ManageProducts
+from products.catalogue_cache import CatalogueCache
+from products.models import Product_Category
+from products.product_search import ProductSearch
+from products.product_facets import ProductFacets
+from decimal import Decimal
+from system.conditional_requests import ConditionalRequests
 
 class ProductCategoryListView(APIView):
     """
@@ -21,7 +27,8 @@ class ProductCategoryListView(APIView):
         GET: Fetches and returns all product categories.
 
     Responses:
-        - **200 OK**: Successfully fetched all product categories.
+        - **200 OK**: Successfully fetched all product categories. Carries `ETag` and `Last-Modified` headers.
+        - **304 Not Modified**: The `If-None-Match` or `If-Modified-Since` header matches the current categories.
         - **500 Internal Server Error**: An error occurred during the operation, with an appropriate error message.
 
     Error Handling:
@@ -67,6 +74,18 @@ class ProductCategoryListView(APIView):
             Response: A JSON response containing the product categories or an error message.
         """
         try:
+            # Answer 304 Not Modified before fetching anything if the client copy is current
+            cache_key = CatalogueCache.request_key(request)
+            etag, last_modified = ConditionalRequests.get_validators(Product_Category.objects.all(), cache_key)
+            not_modified = ConditionalRequests.not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            # Serve from the catalogue cache, keyed by the ETag so direct database changes are never served stale
+            cached_data, cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_CATEGORY, f"{cache_key}:{etag}")
+            if cached_data is not None:
+                return ConditionalRequests.set_validators(Response(cached_data, status=status.HTTP_200_OK), etag, last_modified)
+
             # Fetch all product categories
             product_categories, message = ManageProducts.fetch_product_categories()
 
@@ -80,16 +99,130 @@ class ProductCategoryListView(APIView):
                     }
                     for category in product_categories
                 ]
+                response_data = {
+                    "success": True,
+                    "message": message,
+                    "data": categories_data,
+                }
+                CatalogueCache.set(CatalogueCache.PRODUCT_CATEGORY, f"{cache_key}:{etag}", response_data, cache_version)
+                return ConditionalRequests.set_validators(Response(response_data, status=status.HTTP_200_OK), etag, last_modified)
+            else:
+                # Handle case where no categories are found
+                return Response(
+                    {
+                        "success": False,
+                        "message": message,
+                    },
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        except Exception as e:
+            # Log the unexpected error (optional, requires a logging setup)
+            print(f"Unexpected error in ProductCategoryList API: {str(e)}")
+
+            # Handle unexpected errors gracefully
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+class ProductSearchView(APIView):
+    """
+    API endpoint to search products by name, brand, summary, ingredients and description.
+
+    Uses `ProductSearch.search_products`, which ranks PostgreSQL full text matches first and tolerates typos
+    through trigram similarity on the product name.
+
+    Permissions:
+        - Open endpoint, rate limited to 30 requests per minute per IP address.
+
+    Query Parameters:
+        - q (str, required): Text to search for.
+        - limit (int, optional): Number of results, at most 50. Defaults to 20.
+        - offset (int, optional): Number of results to skip. Defaults to 0.
+
+    Responses:
+        - **200 OK**: Products found, best matches first.
+        - **400 Bad Request**: The `q` parameter is missing.
+        - **404 Not Found**: No product matches the search.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            GET /client_api/products/search/?q=moisturiser&limit=10
+
+        Response (Success):
+        {
+            "success": true,
+            "message": "Products searched successfully!",
+            "data": [
+                {
+                    "id": 1,
+                    "name": "Loreal Moisturizer",
+                    "summary": "Hydrating moisturizer",
+                    "brand": "Loreal",
+                    "rank": 0.6
+                }
+            ]
+        }
+    """
+    permission_classes = []
+
+    @method_decorator(ratelimit(key='ip', rate='30/m', method='GET', block=True))
+    def get(self, request):
+        """
+        Handles GET requests to search products.
+
+        Returns:
+            Response: A JSON response containing the matching products or an error message.
+        """
+        try:
+            query = request.query_params.get('q', '').strip()
+            if not query:
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Search query parameter 'q' is required",
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            products, message = ProductSearch.search_products(
+                query,
+                limit=request.query_params.get('limit', 20),
+                offset=request.query_params.get('offset', 0),
+            )
+
+            if products:
+                products_data = [
+                    {
+                        "id": product.pk,
+                        "name": product.product_name,
+                        "summary": product.product_summary,
+                        "brand": product.product_brand.brand_name if product.product_brand else None,
+                        "rank": round(float(product.rank or 0) + float(product.similarity or 0), 4),
+                    }
+                    for product in products
+                ]
                 return Response(
                     {
                         "success": True,
                         "message": message,
-                        "data": categories_data,
+                        "data": products_data,
                     },
                     status=status.HTTP_200_OK,
                 )
+            elif products is False:
+                return Response(
+                    {
+                        "success": False,
+                        "message": message,
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             else:
-                # Handle case where no categories are found
                 return Response(
                     {
                         "success": False,
@@ -98,14 +231,121 @@ class ProductCategoryListView(APIView):
                     status=status.HTTP_404_NOT_FOUND,
                 )
         except Exception as e:
-            # Log the unexpected error (optional, requires a logging setup)
-            print(f"Unexpected error in ProductCategoryList API: {str(e)}")
+            print(f"Unexpected error in ProductSearch API: {str(e)}")
+
+            return Response(
+                {
+                    "success": False,
+                    "message": "An unexpected error occurred! Please try again later.",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ProductFacetsView(APIView):
+    """
+    API endpoint returning facet counts for the storefront filters.
+
+    Counts are computed by `ProductFacets.fetch_facets` with one grouped query per facet and cached until the
+    catalogue changes. The counts of each facet ignore that facet's own selection.
+
+    Permissions:
+        - Open endpoint, rate limited to 30 requests per minute per IP address.
+
+    Query Parameters (all optional, lists are comma separated):
+        - category, sub_category, brand, flavour: Primary keys of the selected values.
+        - color, size: Selected SKU colours and sizes.
+        - min_price, max_price: Selected price range.
+        - q: Search text, restricts the facets to the search results.
+
+    Responses:
+        - **200 OK**: Facet counts for the filter set.
+        - **400 Bad Request**: A parameter is malformed or refers to a missing category, sub-category or brand.
+        - **500 Internal Server Error**: An error occurred during the operation.
+
+    Example Usage:
+        Request:
+            GET /client_api/products/facets/?category=1,2&max_price=1000
+
+        Response (Success):
+        {
+            "success": true,
+            "message": "Product facets fetched successfully!",
+            "data": {
+                "total": 12,
+                "categories": [{"id": 1, "name": "Skincare", "count": 9}],
+                "brands": [{"id": 3, "name": "Loreal", "count": 4}],
+                "colors": [{"value": "red", "count": 2}],
+                "price_bands": [{"min": "0", "max": "500", "count": 7}],
+                ...
+            }
+        }
+    """
+    permission_classes = []
+
+    @method_decorator(ratelimit(key='ip', rate='30/m', method='GET', block=True))
+    def get(self, request):
+        """
+        Handles GET requests to compute the facet counts.
+
+        Returns:
+            Response: A JSON response containing the facet counts or an error message.
+        """
+        try:
+            try:
+                filters = self.parse_filters(request)
+            except (ValueError, ArithmeticError):
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Invalid filter parameters",
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            facets, message = ProductFacets.fetch_facets(filters)
+            if facets:
+                return Response(
+                    {
+                        "success": True,
+                        "message": message,
+                        "data": facets,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+            else:
+                return Response(
+                    {
+                        "success": False,
+                        "message": message,
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        except Exception as e:
+            print(f"Unexpected error in ProductFacets API: {str(e)}")
 
-            # Handle unexpected errors gracefully
             return Response(
                 {
                     "success": False,
                     "message": "An unexpected error occurred! Please try again later.",
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
\ No newline at end of file
+            )
+
+    def parse_filters(self, request):
+        '''Read the filter set from the query string. Raises ValueError for malformed values'''
+        params = request.query_params
+        def split(name):
+            return [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+        filters = {
+            'category': [int(pk) for pk in split('category')],
+            'sub_category': [int(pk) for pk in split('sub_category')],
+            'brand': [int(pk) for pk in split('brand')],
+            'flavour': [int(pk) for pk in split('flavour')],
+            'color': split('color'),
+            'size': split('size'),
+            'min_price': Decimal(params['min_price']) if params.get('min_price') else None,
+            'max_price': Decimal(params['max_price']) if params.get('max_price') else None,
+            'query': params.get('q', '').strip(),
+        }
+        return filters
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework_simplejwt.token_blacklist',
@@ -65,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'system.performance.PerformanceMiddleware',#first, so it measures the whole request
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -98,6 +100,10 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Rows per page of the server_api fetch views (server_api.pagination.KeysetPagination) when the client sends no
+# page_size. Not REST_FRAMEWORK['PAGE_SIZE'], which DRF only expects together with a DEFAULT_PAGINATION_CLASS.
+KEYSET_PAGE_SIZE = int(os.environ.get('KEYSET_PAGE_SIZE',50))
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -167,6 +173,161 @@ else:
     pass
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# CACHE_BACKEND selects the backend: 'locmem' (default), 'file' or 'redis' (any Redis compatible server at REDIS_URL)
+
+if os.environ.get('CACHE_BACKEND')=='redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL','redis://127.0.0.1:6379/1'),
+        },
+        'guest_carts': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL','redis://127.0.0.1:6379/1'),
+            'KEY_PREFIX': 'guest_carts',
+        },
+    }
+elif os.environ.get('CACHE_BACKEND')=='file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION',os.path.join(BASE_DIR,'cache')),
+        },
+        'guest_carts': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(os.environ.get('CACHE_LOCATION',os.path.join(BASE_DIR,'cache')),'guest_carts'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+else:
+    #process local: guest carts only survive between requests served by the same process (`check --deploy` warns)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'e-commerce-app',
+        },
+        'guest_carts': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'guest-carts',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+# Cache alias and expiry in seconds of products.catalogue_cache.CatalogueCache
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get('CATALOGUE_CACHE_TIMEOUT',3600))
+
+# Per request performance metrics (system.performance). Requests slower than this are logged with their SQL.
+# The Prometheus endpoint /system/metrics/ only answers INTERNAL_IPS.
+PERFORMANCE_SLOW_REQUEST_MS = int(os.environ.get('PERFORMANCE_SLOW_REQUEST_MS',500))
+INTERNAL_IPS = [ip.strip() for ip in os.environ.get('INTERNAL_IPS','127.0.0.1').split(',') if ip.strip()]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'performance_console': {'class': 'logging.StreamHandler', 'formatter': 'json_line'},
+    },
+    'loggers': {
+        'e_commerce_app.performance': {
+            'handlers': ['performance_console'],
+            #INFO logs a line per request, WARNING only slow requests (the test settings)
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL','INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Error logs are written by a background thread in batches (system.error_log_sink). Identical errors within
+# DEDUPE_WINDOW seconds are counted on one row, and batches that cannot reach the database go to FALLBACK_PATH.
+# ERROR_LOG_ASYNC=false writes them in the request instead, as the test settings (e_commerce_app.test_settings) do.
+ERROR_LOG_SINK = {
+    'ASYNC': os.environ.get('ERROR_LOG_ASYNC','true').lower()=='true',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'DEDUPE_WINDOW': int(os.environ.get('ERROR_LOG_DEDUPE_WINDOW',60)),
+    'MAX_QUEUE_SIZE': 10000,
+    'FALLBACK_PATH': BASE_DIR / 'logs' / 'error_logs.jsonl',
+}
+
+# Uploaded images are stored as they are and resized after the request by a pool of MAX_WORKERS threads
+# (system.image_pipeline). IMAGE_PIPELINE_ASYNC=false resizes in the request, as the test settings do.
+IMAGE_PIPELINE = {
+    'ASYNC': os.environ.get('IMAGE_PIPELINE_ASYNC','true').lower()=='true',
+    'MAX_WORKERS': int(os.environ.get('IMAGE_PIPELINE_WORKERS',2)),
+    'QUALITY': 85,
+}
+
+# Product videos are uploaded in chunks of at most MAX_CHUNK_SIZE bytes (products.video_upload), streamed straight
+# to storage and joined when the upload is finalised. CHUNK_SIZE is the size suggested to clients. Uploads that
+# received nothing for ABANDON_SECONDS are failed and their chunks deleted by `manage.py expire_video_uploads` (cron).
+VIDEO_UPLOAD = {
+    'CHUNK_SIZE': 8 * 1024 * 1024,
+    'MAX_CHUNK_SIZE': 64 * 1024 * 1024,
+    'MAX_SIZE': int(os.environ.get('VIDEO_UPLOAD_MAX_SIZE',5 * 1024 ** 3)),
+    'EXTENSIONS': ('mp4','m4v','mov','webm'),
+    'ABANDON_SECONDS': int(os.environ.get('VIDEO_UPLOAD_ABANDON_SECONDS',24*60*60)),
+}
+
+# Poster frame and duration of uploaded videos, extracted after the request with ffmpeg and ffprobe
+# (system.video_pipeline). Videos are kept without them when the binaries are not installed.
+# VIDEO_PIPELINE_ASYNC=false extracts them in the request, as the test settings do.
+VIDEO_PIPELINE = {
+    'ASYNC': os.environ.get('VIDEO_PIPELINE_ASYNC','true').lower()=='true',
+    'MAX_WORKERS': int(os.environ.get('VIDEO_PIPELINE_WORKERS',1)),
+    'FFMPEG': os.environ.get('FFMPEG_PATH','ffmpeg'),
+    'FFPROBE': os.environ.get('FFPROBE_PATH','ffprobe'),
+    'TIMEOUT': 120,
+}
+
+# Files of deleted rows and replaced files are queued by system.signals and deleted in batches of BATCH_SIZE by
+# `manage.py collect_storage_garbage` (system.storage_gc), run from cron. Files modified in the last GRACE_SECONDS
+# are left alone, they may belong to an upload that is not committed yet.
+STORAGE_GC = {
+    'BATCH_SIZE': 500,
+    'GRACE_SECONDS': int(os.environ.get('STORAGE_GC_GRACE_SECONDS',3600)),
+}
+
+# The lines of a cart hold their stock (orders.stock_management) for TTL_SECONDS after they were added, then it
+# is given back in batches of BATCH_SIZE by `manage.py release_expired_reservations`, run from cron every minute
+# or so. Checkout commits what the cart still holds and reserves again what expired. Guest carts hold nothing.
+STOCK_RESERVATION = {
+    'TTL_SECONDS': int(os.environ.get('STOCK_RESERVATION_TTL_SECONDS',15*60)),
+    'BATCH_SIZE': 500,
+}
+
+# Responses stored under the Idempotency-Key of order and payment requests are replayed to retries for TTL_SECONDS
+# (system.idempotency), `manage.py purge_idempotency_keys` deletes older ones.
+IDEMPOTENCY = {
+    'TTL_SECONDS': int(os.environ.get('IDEMPOTENCY_TTL_SECONDS',24*60*60)),
+}
+
+# Carts of customers who are not logged in (orders.guest_cart), kept out of the database until they log in or check out.
+# BACKEND: 'cache' (the CACHE_ALIAS cache, Redis when CACHE_BACKEND=redis) or 'memory' (this process only, development and tests).
+# The carts have a cache of their own, so catalogue pages never evict them. With several worker processes it must be
+# shared (CACHE_BACKEND=redis, or 'file' on a single host).
+# A cart expires TTL_SECONDS after its last change, holds at most MAX_LINES SKUs; 'memory' keeps the newest MAX_CARTS carts.
+GUEST_CART = {
+    'BACKEND': os.environ.get('GUEST_CART_BACKEND','cache'),
+    'CACHE_ALIAS': 'guest_carts',
+    'TTL_SECONDS': int(os.environ.get('GUEST_CART_TTL_SECONDS',7*24*60*60)),
+    'MAX_LINES': 50,
+    'MAX_CARTS': 10000,
+}
+
+# Secrets the payment gateways sign their callbacks with (orders.payments), e.g. PAYMENT_CALLBACK_SECRET_BKASH
+PAYMENT_CALLBACK_SECRETS = {
+    mode: os.environ.get(f'PAYMENT_CALLBACK_SECRET_{mode.upper()}')
+    for mode in ('credit_card','debit_card','net_banking','wallet','bkash','rocket','nagad')
+    if os.environ.get(f'PAYMENT_CALLBACK_SECRET_{mode.upper()}')
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -220,7 +381,25 @@ if os.environ.get('SETTINGS')=='dev':
     MEDIA_URL= "/media_files/"
 else:
     # USE AWS Or production static file server
-    pass
+    STATIC_URL = 'static/'
+    STATIC_ROOT=os.environ.get('STATIC_ROOT',os.path.join(BASE_DIR,'staticfiles'))
+
+    # Media files, sent by the web server once system.views.media authorised the request (MEDIA_SERVING)
+    MEDIA_ROOT=os.environ.get('MEDIA_ROOT',os.path.join(BASE_DIR, 'Media/'))
+    MEDIA_URL= "/media_files/"
+
+# How system.views.media hands files off: 'python' (FileResponse, os.sendfile under gunicorn/uWSGI),
+# 'x-accel' (nginx, an internal location aliasing MEDIA_ROOT at X_ACCEL_PREFIX) or 'x-sendfile' (Apache/lighttpd).
+# RULES: (path prefix, 'public' | 'authenticated' | 'denied'), first match wins, other paths are public.
+MEDIA_SERVING = {
+    'BACKEND': os.environ.get('MEDIA_SERVING_BACKEND','python'),
+    'X_ACCEL_PREFIX': '/protected-media/',
+    'RULES': (
+        ('product_video_uploads/','denied'),#chunks of unfinished uploads
+        ('customer_profile_picture/','authenticated'),
+        ('admin_profile_picture/','authenticated'),
+    ),
+}
 
 
 
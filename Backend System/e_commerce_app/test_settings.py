@@ -0,0 +1,22 @@
+"""
+Settings for the test suite, the project settings with background work done in the request.
+
+Run the tests with them: python manage.py test --settings=e_commerce_app.test_settings
+(pytest-django: DJANGO_SETTINGS_MODULE=e_commerce_app.test_settings)
+"""
+
+import copy
+from .settings import *
+
+# Error logs are written before log_error returns, a writer thread would commit rows outside the test transaction
+ERROR_LOG_SINK = {**ERROR_LOG_SINK, 'ASYNC': False}
+
+# Only slow request warnings, not a line per test request
+LOGGING = copy.deepcopy(LOGGING)
+LOGGING['loggers']['e_commerce_app.performance']['level'] = 'WARNING'
+
+# Image variants are rendered before process_later returns, on_commit never fires inside a TestCase
+IMAGE_PIPELINE = {**IMAGE_PIPELINE, 'ASYNC': False}
+
+# Poster and duration are extracted before process_later returns
+VIDEO_PIPELINE = {**VIDEO_PIPELINE, 'ASYNC': False}
@@ -14,12 +14,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,re_path,include
+from system.views import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('client_api/',include('client_api.urls',namespace='client_api')),
     path('server_api/',include('server_api.urls',namespace='server_api')),
     path('customer/',include('customer.urls',namespace='customer')),
+    path('system/',include('system.urls',namespace='system')),
 ]
+
+if settings.MEDIA_URL.startswith('/'):
+    #uploaded media, authorised here and sent by the web server or os.sendfile (system.media_serving)
+    urlpatterns += [re_path(r'^%s/(?P<path>.*)$' % re.escape(settings.MEDIA_URL.strip('/')), media, name='media')]
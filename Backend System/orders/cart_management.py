@@ -0,0 +1,303 @@
+from decimal import Decimal
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from products.models import Product_SKU, Product_Discount, Product_Price_Clock
+from system.manage_error_log import ManageErrorLog
+from .checkout import ManageCheckout
+from .models import Cart, CartItems
+from .stock_management import ManageStock
+
+
+class _CartUnchanged(Exception):
+    '''Raised inside a cart transaction to roll it back with a message for the customer'''
+
+
+class ManageCart:
+
+    '''
+    Cart engine that keeps line and cart totals up to date as items change, instead of recomputing them on reads.
+
+    Every `CartItems` row stores its `unit_price` (the SKU price less the largest active product discount) and
+    `line_total`. Adding, removing or changing the quantity of a line locks the cart row, writes the line and
+    moves `cart_total_amount` by the difference, so the total is never rebuilt from the lines.
+
+    A cart holds the stock of its lines (`ManageStock.hold_for_cart`): units added are reserved for the cart in
+    the same transaction, units removed are given back. A change the stock cannot cover leaves the cart as it was.
+
+    Prices are refreshed lazily when the cart is read. A cart remembers the `Product_Price_Clock` value it was
+    priced at and the time its next discount starts or ends (`priced_until`). A read compares both with the
+    clock and the current time:
+
+        nothing changed   the stored lines and total are returned, `Product_SKU` is not read
+        otherwise         only the lines whose SKU was stamped after the cart's version, or whose discount
+                          window has passed, are priced again (one join and one discount query for all of them)
+
+    Example Usage:
+        cart, message = ManageCart.open_cart(request)
+        cart, message = ManageCart.add_item(cart, product_sku_pk=12, quantity=2)
+        cart, lines = ManageCart.cart_lines(cart)
+    '''
+
+    def unit_prices(product_skus, now=None):
+
+        """
+        Price SKUs against their active discounts with one query.
+
+        Args:
+            product_skus (dict): `{product sku pk: (product_price, product pk)}`.
+            now (datetime, optional): The time to price at, now by default.
+
+        Returns:
+            dict: `{product sku pk: (unit price, valid until)}`. The unit price is the SKU price less the largest
+            active `Product_Discount` of its product, never below zero, as `ManageCheckout.price_lines` prices it. It is valid until the next start or end of
+            a discount of the product, `None` if there is none to come.
+        """
+        now = now or timezone.now()
+        product_pks = {product_pk for price, product_pk in product_skus.values()}
+        best, boundary = {}, {}
+        for product_pk, amount, start_date, end_date in Product_Discount.objects.filter(product_id__in=product_pks, end_date__gte=now) \
+                .values_list('product_id', 'discount_amount', 'start_date', 'end_date'):
+            if start_date <= now:
+                best[product_pk] = max(best.get(product_pk, 0), amount)
+            for moment in (start_date, end_date):
+                if moment > now and (product_pk not in boundary or moment < boundary[product_pk]):
+                    boundary[product_pk] = moment
+        return {
+            product_sku_pk: (ManageCheckout.money(max(Decimal(price) - best.get(product_pk, 0), 0)), boundary.get(product_pk))
+            for product_sku_pk, (price, product_pk) in product_skus.items()
+        }
+
+    def open_cart(request):
+        '''The customer's cart that is not checked out yet, created if there is none. Returns `(cart, message)`'''
+        try:
+            cart = Cart.objects.filter(customer_id=request.user, cart_checkout_status=False).order_by('-pk').first()
+            if cart is not None:
+                return cart, "Fetched cart"
+            cart = Cart.objects.create(device_ip=request.META.get('REMOTE_ADDR') or '0.0.0.0', customer_id=request.user,
+                                       cart_total_amount=0, price_version=Product_Price_Clock.current())
+            return cart, "Created cart"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return None, "An unexpected error occurred while fetching cart! Please try again later."
+
+    def change_line(cart, product_sku_pk, quantity=None, add=0):
+
+        """
+        Set the quantity of a SKU in the cart (or add to it) and move the cart total by the difference.
+
+        Args:
+            cart (Cart): The cart to change.
+            product_sku_pk (int): The SKU of the line.
+            quantity (int, optional): The new quantity, 0 removes the line.
+            add (int, optional): Units to add to the current quantity instead, when `quantity` is not given.
+
+        Returns:
+            tuple:
+                - Cart or None: The cart with its new total, `None` if nothing was changed.
+                - str: A message indicating the success or failure of the operation.
+
+        Exception Handling:
+            - **DatabaseError**, **OperationalError**, **ProgrammingError**, **IntegrityError** and **Exception** are
+              logged in `ErrorLogs` and answered with a generic message.
+
+        Notes:
+            - A new line is priced straight away, an existing one keeps its stored price until the next read
+              finds it outdated.
+            - The cart holds the new quantity of the SKU, the change is refused if the stock cannot cover it.
+        """
+        try:
+            with transaction.atomic():
+                #the cart row lock serialises changes of the same cart, the total moves by exact differences
+                cart = Cart.objects.select_for_update().filter(pk=cart.pk).first()
+                if cart is None:
+                    raise _CartUnchanged("Cart does not exist")
+                if cart.cart_checkout_status:
+                    raise _CartUnchanged("Cart has already been checked out")
+                line = CartItems.objects.filter(cart_id=cart, product_sku_id=product_sku_pk).first()
+                current_quantity = line.quantity if line else 0
+                new_quantity = int(quantity) if quantity is not None else current_quantity + int(add)
+                if new_quantity < 0:
+                    raise _CartUnchanged("Quantity cannot be negative")
+                if line is None and new_quantity == 0:
+                    raise _CartUnchanged("Product sku is not in the cart")
+
+                if new_quantity == 0:
+                    line.delete()
+                    difference = -line.line_total
+                elif line is None:
+                    product_sku = Product_SKU.objects.filter(pk=product_sku_pk).values_list('product_price', 'product_id').first()
+                    if product_sku is None:
+                        raise _CartUnchanged("Product sku does not exist")
+                    unit_price, valid_until = ManageCart.unit_prices({product_sku_pk: product_sku})[product_sku_pk]
+                    line = CartItems.objects.create(cart_id=cart, product_sku_id=product_sku_pk, quantity=new_quantity, unit_price=unit_price,
+                                                    line_total=unit_price * new_quantity, price_valid_until=valid_until)
+                    difference = line.line_total
+                    if valid_until and (cart.priced_until is None or valid_until < cart.priced_until):
+                        cart.priced_until = valid_until
+                else:
+                    line_total = line.unit_price * new_quantity
+                    CartItems.objects.filter(pk=line.pk).update(quantity=new_quantity, line_total=line_total, updated_at=timezone.now())
+                    difference = line_total - line.line_total
+
+                held, message = ManageStock.hold_for_cart(cart, {product_sku_pk: new_quantity})
+                if held is None:
+                    raise _CartUnchanged(message)
+                Cart.objects.filter(pk=cart.pk).update(cart_total_amount=F('cart_total_amount') + difference,
+                                                       priced_until=cart.priced_until, updated_at=timezone.now())
+                cart.cart_total_amount += difference
+            return cart, "Cart updated"
+
+        except _CartUnchanged as error:
+            return None, str(error)
+
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while updating cart! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while updating cart! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while updating cart! Please try again later.",
+                "IntegrityError": "Same type exists in Database!",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while updating cart! Please try again later.")
+
+    def add_item(cart, product_sku_pk, quantity=1):
+        '''Add `quantity` units of a SKU to the cart. Returns `(cart, message)`'''
+        try:
+            if int(quantity) <= 0:
+                return None, "Quantity must be at least 1"
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+        return ManageCart.change_line(cart, product_sku_pk, add=quantity)
+
+    def set_quantity(cart, product_sku_pk, quantity):
+        '''Change the quantity of a SKU in the cart, 0 removes it. Returns `(cart, message)`'''
+        return ManageCart.change_line(cart, product_sku_pk, quantity=quantity)
+
+    def remove_item(cart, product_sku_pk):
+        '''Remove a SKU from the cart. Returns `(cart, message)`'''
+        return ManageCart.change_line(cart, product_sku_pk, quantity=0)
+
+    def merge_items(cart, quantities):
+
+        """
+        Add the quantities of many SKUs to the cart in one transaction, e.g. a guest cart when its customer logs in.
+
+        Args:
+            cart (Cart): The cart to add to.
+            quantities (dict): `{product sku pk: quantity}`, added to the quantity already in the cart.
+
+        Returns:
+            tuple:
+                - Cart or None: The cart with its new total, `None` if nothing was changed.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - The number of queries does not depend on the number of SKUs. SKUs that no longer exist are left out.
+            - The cart holds the stock of the merged lines, nothing is merged if the stock cannot cover them.
+        """
+        try:
+            quantities = {int(product_sku_pk): int(quantity) for product_sku_pk, quantity in quantities.items() if int(quantity) > 0}
+            with transaction.atomic():
+                cart = Cart.objects.select_for_update().filter(pk=cart.pk).first()
+                if cart is None:
+                    raise _CartUnchanged("Cart does not exist")
+                if cart.cart_checkout_status:
+                    raise _CartUnchanged("Cart has already been checked out")
+                if not quantities:
+                    return cart, "Cart updated"
+                lines = {line.product_sku_id: line for line in CartItems.objects.filter(cart_id=cart, product_sku_id__in=quantities)}
+                product_skus = {pk: (price, product_pk) for pk, price, product_pk in Product_SKU.objects.filter(
+                    pk__in=[pk for pk in quantities if pk not in lines]).values_list('pk', 'product_price', 'product_id')}
+                prices = ManageCart.unit_prices(product_skus)
+
+                created, updated, difference = [], [], Decimal('0.00')
+                for product_sku_pk, quantity in quantities.items():
+                    line = lines.get(product_sku_pk)
+                    if line is not None:
+                        line_total = line.unit_price * (line.quantity + quantity)
+                        difference += line_total - line.line_total
+                        line.quantity, line.line_total = line.quantity + quantity, line_total
+                        updated.append(line)
+                    elif product_sku_pk in prices:
+                        unit_price, valid_until = prices[product_sku_pk]
+                        created.append(CartItems(cart_id=cart, product_sku_id=product_sku_pk, quantity=quantity, unit_price=unit_price,
+                                                 line_total=unit_price * quantity, price_valid_until=valid_until))
+                        difference += unit_price * quantity
+                        if valid_until and (cart.priced_until is None or valid_until < cart.priced_until):
+                            cart.priced_until = valid_until
+                held, message = ManageStock.hold_for_cart(cart, {line.product_sku_id: line.quantity for line in created + updated})
+                if held is None:
+                    raise _CartUnchanged(message)
+                CartItems.objects.bulk_create(created)
+                if updated:
+                    CartItems.objects.bulk_update(updated, ['quantity', 'line_total'])
+                Cart.objects.filter(pk=cart.pk).update(cart_total_amount=F('cart_total_amount') + difference,
+                                                       priced_until=cart.priced_until, updated_at=timezone.now())
+                cart.cart_total_amount += difference
+            return cart, "Cart updated"
+
+        except _CartUnchanged as error:
+            return None, str(error)
+
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return None, "An unexpected error occurred while updating cart! Please try again later."
+
+    def refresh_prices(cart, now=None):
+
+        """
+        Price again the lines of a cart whose price may have changed since it was last priced.
+
+        Args:
+            cart (Cart): The cart, as read from the database.
+            now (datetime, optional): The time to price at, now by default.
+
+        Returns:
+            Cart: The cart with its total and price version up to date.
+
+        Notes:
+            - When no SKU price or discount changed and no discount window passed, this reads the clock only.
+        """
+        now = now or timezone.now()
+        current = Product_Price_Clock.current()
+        if cart.price_version >= current and (cart.priced_until is None or cart.priced_until > now):
+            return cart
+
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().get(pk=cart.pk)
+            lines = list(CartItems.objects.filter(cart_id=cart).filter(
+                Q(product_sku__price_version__gt=cart.price_version) | Q(price_valid_until__lte=now)
+            ).values('pk', 'product_sku_id', 'quantity', 'line_total', 'product_sku__product_price', 'product_sku__product_id'))
+            prices = ManageCart.unit_prices({line['product_sku_id']: (line['product_sku__product_price'], line['product_sku__product_id'])
+                                             for line in lines}, now)
+            repriced, difference = [], Decimal('0.00')
+            for line in lines:
+                unit_price, valid_until = prices[line['product_sku_id']]
+                line_total = unit_price * line['quantity']
+                difference += line_total - line['line_total']
+                repriced.append(CartItems(pk=line['pk'], unit_price=unit_price, line_total=line_total, price_valid_until=valid_until))
+            if repriced:
+                CartItems.objects.bulk_update(repriced, ['unit_price', 'line_total', 'price_valid_until'])
+            priced_until = CartItems.objects.filter(cart_id=cart, price_valid_until__gt=now).order_by('price_valid_until') \
+                .values_list('price_valid_until', flat=True).first()
+            Cart.objects.filter(pk=cart.pk).update(cart_total_amount=F('cart_total_amount') + difference, price_version=current,
+                                                   priced_until=priced_until)
+            cart.cart_total_amount += difference
+            cart.price_version = current
+            cart.priced_until = priced_until
+        return cart
+
+    def cart_lines(cart):
+        '''`(cart, lines)` with the prices refreshed if needed, the lines as dicts of the stored values'''
+        cart = ManageCart.refresh_prices(cart)
+        lines = list(CartItems.objects.filter(cart_id=cart).order_by('pk')
+                     .values('product_sku_id', 'quantity', 'unit_price', 'line_total'))
+        return cart, lines
@@ -0,0 +1,180 @@
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from customer.models import Coupon
+from products.models import Product_Discount
+from system.manage_error_log import ManageErrorLog
+from .models import Cart, CartItems, Order, OrderDetails, OrderShippingAddress, OrderPayment
+from .stock_management import ManageStock
+
+
+class _CheckoutFailed(Exception):
+    '''Raised inside the checkout transaction to roll it back with a message for the customer'''
+
+
+class ManageCheckout:
+
+    '''
+    Turns a customer's cart into an order in one transaction.
+
+    The number of queries does not grow with the number of cart lines: the lines are read with their SKUs in
+    one query, the active product discounts of all of them in another, the stock the cart holds is committed
+    (orders.stock_management) and the order lines are written with a single `bulk_create`. If any step
+    fails nothing is written and the stock is left as it was.
+
+    Example Usage:
+        order, message = ManageCheckout.checkout(request, cart_pk=cart.pk, payment_mode='bkash',
+                                                 shipping_address={'address_line1': 'House 1', 'city': 'Dhaka'},
+                                                 coupon_code='EID10')
+    '''
+
+    CENT = Decimal('0.01')
+    SHIPPING_FIELDS = ('address_line1', 'address_line2', 'country', 'city', 'postal_code')
+
+    def money(amount):
+        return Decimal(amount).quantize(ManageCheckout.CENT, rounding=ROUND_HALF_UP)
+
+    def price_lines(cart):
+        '''
+        `{product sku pk: {'quantity', 'unit_price', 'subtotal'}}` of the cart, with two queries.
+
+        Lines of the same SKU are added up. The unit price is the SKU price less the largest active
+        `Product_Discount` of its product, never below zero.
+        '''
+        lines = {}
+        product_pks = set()
+        for item in CartItems.objects.filter(cart_id=cart).values('product_sku_id', 'quantity', 'product_sku__product_price', 'product_sku__product_id'):
+            line = lines.setdefault(item['product_sku_id'], {'quantity': 0, 'price': item['product_sku__product_price'],
+                                                             'product_pk': item['product_sku__product_id']})
+            line['quantity'] += item['quantity']
+            product_pks.add(item['product_sku__product_id'])
+        if not lines:
+            return lines
+
+        now = timezone.now()
+        discounts = dict(Product_Discount.objects.filter(product_id__in=product_pks, start_date__lte=now, end_date__gte=now)
+                         .order_by().values('product_id').annotate(best=Max('discount_amount')).values_list('product_id', 'best'))
+        for line in lines.values():
+            line['unit_price'] = ManageCheckout.money(max(line['price'] - discounts.get(line['product_pk'], 0), 0))
+            line['subtotal'] = line['unit_price'] * line['quantity']
+        return lines
+
+    def coupon_discount(coupon, amount):
+        '''What `coupon` takes off `amount`, at most `maximum_discount_amount` (when set) and never more than `amount`'''
+        if coupon.discount_type == 'percentage':
+            discount = amount * coupon.discount_percentage / 100
+        else:
+            discount = coupon.discount_amount
+        if coupon.maximum_discount_amount:
+            discount = min(discount, coupon.maximum_discount_amount)
+        return ManageCheckout.money(min(discount, amount))
+
+    def fetch_coupon(customer, coupon_code):
+        '''
+        The customer's coupon with this code, locked until the order is written so two checkouts cannot use its
+        last use at once. Raises `_CheckoutFailed` if it is not valid.
+        '''
+        coupon = Coupon.objects.select_for_update().filter(coupon_code=coupon_code, customer_id=customer).first()
+        if coupon is None:
+            raise _CheckoutFailed("Coupon does not exist")
+        if not coupon.is_coupon_valid():
+            raise _CheckoutFailed("Coupon has expired")
+        used = Order.objects.filter(coupon_id=coupon).exclude(order_status__in=['cancelled', 'refunded']).count()
+        if used >= coupon.usage_limit:
+            raise _CheckoutFailed("Coupon has already been used")
+        return coupon
+
+    def checkout(request, cart_pk, payment_mode, shipping_address, coupon_code=None):
+
+        """
+        Place an order for the items of a cart.
+
+        Steps, all in one transaction:
+            1. Lock the customer's cart, so the same cart cannot be checked out twice at once.
+            2. Price every line against `Product_SKU.product_price` and the active `Product_Discount`s.
+            3. Apply the coupon, if any.
+            4. Commit the stock the cart holds for its lines. What it does not hold (a hold that expired, lines
+               written before holds existed) is reserved first as one batch, any other hold is given back.
+            5. Write the `Order`, its `OrderDetails` with one `bulk_create`, the `OrderShippingAddress`
+               and a pending `OrderPayment`, and mark the cart as checked out.
+
+        Args:
+            request (Request): The request object, `request.user` is the customer.
+            cart_pk (int): Primary key of the customer's cart.
+            payment_mode (str): One of `OrderPayment.PAYMENT_MODE_CHOICES`.
+            shipping_address (dict): `address_line1`, `address_line2`, `country`, `city` and `postal_code`.
+            coupon_code (str, optional): Code of a coupon of the customer.
+
+        Returns:
+            tuple:
+                - Order or None: The order placed, `None` if the checkout failed.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            order, message = ManageCheckout.checkout(request, cart_pk=3, payment_mode='cash_on_delivery',
+                                                     shipping_address={'address_line1': 'House 1', 'city': 'Dhaka'})
+
+        Exception Handling:
+            - **DatabaseError**, **OperationalError**, **ProgrammingError**, **IntegrityError** and **Exception** are
+              logged in `ErrorLogs` and answered with a generic message.
+
+        Notes:
+            - The payment starts as pending, the payment provider's confirmation updates it.
+        """
+        try:
+            if payment_mode not in dict(OrderPayment.PAYMENT_MODE_CHOICES):
+                return None, "Invalid payment mode"
+            shipping_address = {field: (shipping_address or {}).get(field) for field in ManageCheckout.SHIPPING_FIELDS}
+            if not shipping_address['address_line1']:
+                return None, "Shipping address is required"
+
+            with transaction.atomic():
+                cart = Cart.objects.select_for_update().filter(pk=cart_pk, customer_id=request.user).first()
+                if cart is None:
+                    raise _CheckoutFailed("Cart does not exist")
+                if cart.cart_checkout_status:
+                    raise _CheckoutFailed("Cart has already been checked out")
+
+                lines = ManageCheckout.price_lines(cart)
+                if not lines:
+                    raise _CheckoutFailed("Cart is empty")
+                subtotal = sum(line['subtotal'] for line in lines.values())
+
+                coupon = ManageCheckout.fetch_coupon(request.user, coupon_code) if coupon_code else None
+                discount = ManageCheckout.coupon_discount(coupon, subtotal) if coupon else Decimal('0.00')
+                total_amount = subtotal - discount
+
+                committed, message = ManageStock.commit_cart(cart, {pk: line['quantity'] for pk, line in lines.items()})
+                if not committed:
+                    raise _CheckoutFailed(message)
+
+                order = Order.objects.create(
+                    order_id=f"ORD-{timezone.now():%Y%m%d}-{uuid.uuid4().hex[:10].upper()}",
+                    customer_id=request.user, total_amount=total_amount, coupon_id=coupon, coupon_discount=discount,
+                )
+                OrderDetails.objects.bulk_create([
+                    OrderDetails(order_id=order, product_sku_id=product_sku_pk, quantity=line['quantity'],
+                                 unit_price=line['unit_price'], subtotal=line['subtotal'])
+                    for product_sku_pk, line in sorted(lines.items())
+                ])
+                OrderShippingAddress.objects.create(order_id=order, **shipping_address)
+                OrderPayment.objects.create(order_id=order, payment_mode=payment_mode, payment_amount=total_amount,
+                                            payment_reference=uuid.uuid4().hex)
+                Cart.objects.filter(pk=cart.pk).update(cart_checkout_status=True, cart_total_amount=total_amount, updated_at=timezone.now())
+            return order, "Order placed successfully"
+
+        except _CheckoutFailed as error:
+            return None, str(error)
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while placing order! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while placing order! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while placing order! Please try again later.",
+                "IntegrityError": "Same type exists in Database!",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while placing order! Please try again later.")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_guest_cart_store(app_configs, **kwargs):
+    '''Guest carts in a process local store are lost whenever another worker serves the next request'''
+    from .guest_cart import GuestCart
+    options = GuestCart.options()
+    if options['BACKEND'] == 'cache':
+        backend = settings.CACHES.get(options['CACHE_ALIAS'], {}).get('BACKEND', '')
+        local = backend.endswith('locmem.LocMemCache')
+    else:
+        local = True
+    if local:
+        return [checks.Warning(
+            "Guest carts are kept in a process local store and are lost between requests served by different workers.",
+            hint="Set CACHE_BACKEND=redis (or 'file' on a single host) and GUEST_CART['BACKEND']='cache'.",
+            id='orders.W001',
+        )]
+    return []
@@ -0,0 +1,246 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from products.models import Product_SKU
+from system.manage_error_log import ManageErrorLog
+from .cart_management import ManageCart
+
+
+class MemoryGuestCartBackend:
+
+    '''Guest carts in a dict of this process, for development and tests. Keeps the newest `max_carts` carts'''
+
+    def __init__(self, max_carts=10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._carts.get(key)
+            if entry is None:
+                return None
+            expires_at, lines = entry
+            if expires_at <= time.monotonic():
+                del self._carts[key]
+                return None
+            return dict(lines)
+
+    def set(self, key, lines, ttl_seconds):
+        with self._lock:
+            self._carts[key] = (time.monotonic() + ttl_seconds, dict(lines))
+            self._carts.move_to_end(key)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def delete(self, key):
+        '''True if the cart existed, only one of several concurrent deletes of a cart gets True'''
+        with self._lock:
+            entry = self._carts.pop(key, None)
+            return entry is not None and entry[0] > time.monotonic()
+
+
+class CacheGuestCartBackend:
+
+    '''Guest carts in a Django cache, a Redis compatible server when settings.CACHE_BACKEND is 'redis' '''
+
+    def __init__(self, alias='guest_carts'):
+        self.alias = alias
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, lines, ttl_seconds):
+        caches[self.alias].set(key, lines, timeout=ttl_seconds)
+
+    def delete(self, key):
+        '''True if the cart existed, the cache deletes atomically so only one of several concurrent deletes gets True'''
+        return caches[self.alias].delete(key)
+
+
+class GuestCart:
+
+    '''
+    Carts of customers who are not logged in, kept in a cache instead of `Cart` / `CartItems`.
+
+    Most anonymous carts are abandoned, so their add-to-cart requests write nothing to the database. A guest cart
+    is `{product sku pk: quantity}` stored under a random id. The client gets the id signed with SECRET_KEY (the
+    cart token) and sends it back in the `X-Cart-Token` header, a token that does not verify is treated as no cart.
+
+    `BACKEND` (settings.GUEST_CART) selects the store:
+
+        'cache'    the `CACHE_ALIAS` cache of its own, shared by all processes when CACHE_BACKEND is 'redis' or 'file'
+        'memory'   a dict of this process, for development and tests
+
+    A cart expires `TTL_SECONDS` after its last change and holds at most `MAX_LINES` SKUs. When the customer logs
+    in or checks out, `merge` claims the guest cart and adds it to their `Cart` with `ManageCart.merge_items`.
+    The 'cache' store must be shared by all processes, `manage.py check --deploy` warns when it is process local.
+
+    Example Usage:
+        token, message = GuestCart.add_item(request.headers.get(GuestCart.HEADER), product_sku_pk=12, quantity=2)
+        cart, message = GuestCart.merge(token, customer_cart)
+    '''
+
+    HEADER = 'X-Cart-Token'
+    BACKENDS = {'cache': CacheGuestCartBackend, 'memory': MemoryGuestCartBackend}
+
+    #one backend per configuration, the memory backend must outlive the request
+    _backends = {}
+    _backends_lock = threading.Lock()
+
+    def options():
+        options = {'BACKEND': 'cache', 'CACHE_ALIAS': 'guest_carts', 'TTL_SECONDS': 7 * 24 * 60 * 60, 'MAX_LINES': 50, 'MAX_CARTS': 10000}
+        options.update(getattr(settings, 'GUEST_CART', {}))
+        return options
+
+    def get_backend():
+        options = GuestCart.options()
+        if options['BACKEND'] not in GuestCart.BACKENDS:
+            raise ValueError(f"Unknown guest cart backend {options['BACKEND']}. Use one of {', '.join(GuestCart.BACKENDS)}")
+        key = (options['BACKEND'], options['CACHE_ALIAS'], options['MAX_CARTS'])
+        with GuestCart._backends_lock:
+            if key not in GuestCart._backends:
+                if options['BACKEND'] == 'cache':
+                    GuestCart._backends[key] = CacheGuestCartBackend(options['CACHE_ALIAS'])
+                else:
+                    GuestCart._backends[key] = MemoryGuestCartBackend(options['MAX_CARTS'])
+            return GuestCart._backends[key]
+
+    def _signer():
+        return signing.Signer(salt='orders.guest_cart')
+
+    def new_token():
+        return GuestCart._signer().sign(uuid.uuid4().hex)
+
+    def cart_key(token):
+        '''The store key of a cart token, `None` if the token is missing or was not signed by us'''
+        if not token:
+            return None
+        try:
+            return f"guest_cart:{GuestCart._signer().unsign(token)}"
+        except signing.BadSignature:
+            return None
+
+    def lines(token):
+        '''`{product sku pk: quantity}` of the guest cart, empty if there is none'''
+        key = GuestCart.cart_key(token)
+        return (GuestCart.get_backend().get(key) or {}) if key else {}
+
+    def change_line(token, product_sku_pk, quantity=None, add=0):
+
+        """
+        Set the quantity of a SKU in the guest cart (or add to it), creating the cart if the token has none.
+
+        Args:
+            token (str or None): The cart token sent by the client.
+            product_sku_pk (int): The SKU of the line.
+            quantity (int, optional): The new quantity, 0 removes the line.
+            add (int, optional): Units to add to the current quantity instead, when `quantity` is not given.
+
+        Returns:
+            tuple:
+                - str or None: The cart token to send back, a new one if the cart was created. `None` on failure.
+                - str: A message indicating the success or failure of the operation.
+
+        Exception Handling:
+            - Store and database errors are logged in `ErrorLogs` and answered with a generic message.
+        """
+        try:
+            options = GuestCart.options()
+            product_sku_pk = int(product_sku_pk)
+            key = GuestCart.cart_key(token)
+            if key is None:
+                token = GuestCart.new_token()
+                key = GuestCart.cart_key(token)
+            backend = GuestCart.get_backend()
+            lines = backend.get(key) or {}
+
+            new_quantity = int(quantity) if quantity is not None else lines.get(product_sku_pk, 0) + int(add)
+            if new_quantity < 0:
+                return None, "Quantity cannot be negative"
+            if new_quantity == 0:
+                if product_sku_pk not in lines:
+                    return None, "Product sku is not in the cart"
+                del lines[product_sku_pk]
+            else:
+                if product_sku_pk not in lines:
+                    if len(lines) >= options['MAX_LINES']:
+                        return None, f"A cart can hold at most {options['MAX_LINES']} products"
+                    if not Product_SKU.objects.filter(pk=product_sku_pk).exists():
+                        return None, "Product sku does not exist"
+                lines[product_sku_pk] = new_quantity
+            backend.set(key, lines, options['TTL_SECONDS'])
+            return token, "Cart updated"
+
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+
+        except Exception as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return None, "An unexpected error occurred while updating cart! Please try again later."
+
+    def add_item(token, product_sku_pk, quantity=1):
+        '''Add `quantity` units of a SKU to the guest cart. Returns `(token, message)`'''
+        try:
+            if int(quantity) <= 0:
+                return None, "Quantity must be at least 1"
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+        return GuestCart.change_line(token, product_sku_pk, add=quantity)
+
+    def set_quantity(token, product_sku_pk, quantity):
+        '''Change the quantity of a SKU in the guest cart, 0 removes it. Returns `(token, message)`'''
+        return GuestCart.change_line(token, product_sku_pk, quantity=quantity)
+
+    def remove_item(token, product_sku_pk):
+        '''Remove a SKU from the guest cart. Returns `(token, message)`'''
+        return GuestCart.change_line(token, product_sku_pk, quantity=0)
+
+    def priced_lines(token):
+        '''`(total, lines)` of the guest cart priced now, lines shaped like those of `ManageCart.cart_lines`'''
+        quantities = GuestCart.lines(token)
+        product_skus = {pk: (price, product_pk) for pk, price, product_pk in Product_SKU.objects.filter(pk__in=quantities)
+                        .values_list('pk', 'product_price', 'product_id')} if quantities else {}
+        prices = ManageCart.unit_prices(product_skus) if product_skus else {}
+        lines = [
+            {'product_sku_id': pk, 'quantity': quantity, 'unit_price': prices[pk][0], 'line_total': prices[pk][0] * quantity}
+            for pk, quantity in sorted(quantities.items()) if pk in prices
+        ]
+        return sum((line['line_total'] for line in lines), Decimal('0.00')), lines
+
+    def merge(token, cart):
+
+        """
+        Move the guest cart into a customer's cart, when the customer logs in or checks out.
+
+        Args:
+            token (str or None): The cart token sent by the client.
+            cart (Cart): The customer's open cart.
+
+        Returns:
+            tuple:
+                - Cart or None: The customer's cart with the guest lines added, `None` if the merge failed.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - Quantities of SKUs in both carts are added up.
+            - The guest cart is claimed by deleting it before the merge. Of several requests merging the same cart at
+              once only the one whose delete removed it merges, the others find nothing to merge. A failed merge
+              puts the guest cart back.
+            - Without a valid token, or with an expired cart, the customer's cart is returned unchanged.
+        """
+        key = GuestCart.cart_key(token)
+        backend = GuestCart.get_backend()
+        quantities = backend.get(key) if key else None
+        if not quantities or not backend.delete(key):
+            return cart, "No guest cart to merge"
+        merged, message = ManageCart.merge_items(cart, quantities)
+        if merged is None:
+            backend.set(key, quantities, GuestCart.options()['TTL_SECONDS'])
+            return None, message
+        return merged, "Guest cart merged"
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from orders.stock_management import ManageStock
+
+
+class Command(BaseCommand):
+    help = "Give the stock of expired cart reservations back to their product SKUs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Reservations released per transaction, settings.STOCK_RESERVATION['BATCH_SIZE'] by default")
+
+    def handle(self, *args, **options):
+        released = ManageStock.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock reservations"))
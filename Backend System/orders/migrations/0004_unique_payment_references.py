@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:14
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_references(apps, schema_editor):
+    #retried requests may have stored the same reference twice, all but the first row get their pk appended
+    OrderPayment = apps.get_model('orders', 'OrderPayment')
+    duplicates = OrderPayment.objects.values('payment_reference').annotate(rows=Count('pk')).filter(rows__gt=1)
+    for duplicate in duplicates:
+        payments = OrderPayment.objects.filter(payment_reference=duplicate['payment_reference']).order_by('pk')
+        for payment in payments[1:]:
+            payment.payment_reference = f"{payment.payment_reference[:80]}-duplicate-{payment.pk}"
+            payment.save(update_fields=['payment_reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_checkout_pricing'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_references, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='orderpayment',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='orderpayment',
+            name='payment_reference',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:17
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    #one line per SKU and cart, the quantities of the other lines are added to the first one
+    CartItems = apps.get_model('orders', 'CartItems')
+    duplicates = CartItems.objects.values('cart_id', 'product_sku').annotate(rows=Count('pk'), total=Sum('quantity')).filter(rows__gt=1)
+    for duplicate in duplicates:
+        lines = list(CartItems.objects.filter(cart_id=duplicate['cart_id'], product_sku=duplicate['product_sku']).order_by('pk'))
+        CartItems.objects.filter(pk=lines[0].pk).update(quantity=duplicate['total'])
+        CartItems.objects.filter(pk__in=[line.pk for line in lines[1:]]).delete()
+
+
+def price_existing_carts(apps, schema_editor):
+    #below every SKU's price_version, so the first read prices every line of carts created before
+    Cart = apps.get_model('orders', 'Cart')
+    Cart.objects.filter(cart_checkout_status=False).update(price_version=-1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_unique_payment_references'),
+        ('products', '0009_product_price_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='price_version',
+            field=models.BigIntegerField(default=0, verbose_name='Price Version'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='priced_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Priced Until'),
+        ),
+        migrations.AddField(
+            model_name='cartitems',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Line Total'),
+        ),
+        migrations.AddField(
+            model_name='cartitems',
+            name='price_valid_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Price Valid Until'),
+        ),
+        migrations.AddField(
+            model_name='cartitems',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Unit Price'),
+        ),
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.RunPython(price_existing_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitems',
+            constraint=models.UniqueConstraint(fields=('cart_id', 'product_sku'), name='cart_item_sku_unique'),
+        ),
+    ]
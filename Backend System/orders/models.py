@@ -1,5 +1,6 @@
 from django.db import models
-from customer.models import Accounts
+import uuid
+from customer.models import Accounts, Coupon
 from products.models import Product_SKU
 from business_admin.models import BusinessAdminUser
 
@@ -13,6 +14,8 @@ class Order(models.Model):
         customer_id (ForeignKey): A reference to the customer who placed the order.
         order_date (DateTimeField): The date and time when the order was created.
         total_amount (DecimalField): The total amount of the order.
+        coupon_id (ForeignKey): The coupon applied at checkout (optional).
+        coupon_discount (DecimalField): The amount the coupon took off the order.
         order_status (CharField): The current status of the order (e.g., pending, shipped).
         created_at (DateTimeField): The timestamp when the order record was created.
         updated_at (DateTimeField): The timestamp when the order record was last updated.
@@ -35,6 +38,8 @@ class Order(models.Model):
     customer_id = models.ForeignKey(Accounts, on_delete=models.CASCADE, null=False, blank=False)
     order_date = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)
+    coupon_id = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True, related_name="Orders")
+    coupon_discount = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False, default=0)
     order_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending', null=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,6 +62,7 @@ class OrderDetails(models.Model):
         product_sku (ForeignKey): A reference to the product SKU included in the order.
         quantity (PositiveIntegerField): The quantity of the product ordered.
         units (PositiveIntegerField): The number of units per item.
+        unit_price (DecimalField): The price of one unit at checkout, after the product discount.
         subtotal (DecimalField): The subtotal cost for this product in the order.
         created_at (DateTimeField): The timestamp when the record was created.
         updated_at (DateTimeField): The timestamp when the record was last updated.
@@ -69,6 +75,7 @@ class OrderDetails(models.Model):
     product_sku = models.ForeignKey(Product_SKU, on_delete=models.CASCADE, null=False, blank=False)
     quantity = models.PositiveIntegerField(null=False, blank=False)
     units = models.PositiveIntegerField(null=False, blank=False, default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False, default=0)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -122,7 +129,8 @@ class OrderPayment(models.Model):
         payment_status (CharField): The current status of the payment (e.g., pending, success).
         payment_date (DateTimeField): The timestamp when the payment was made.
         payment_amount (DecimalField): The amount paid for the order.
-        payment_reference (CharField): A unique reference for the payment transaction.
+        payment_reference (CharField): A unique reference for the payment, handed to the payment gateway.
+        transaction_id (CharField): The gateway's id of the transaction that settled the payment, unique.
         created_at (DateTimeField): The timestamp when the record was created.
         updated_at (DateTimeField): The timestamp when the record was last updated.
 
@@ -152,7 +160,8 @@ class OrderPayment(models.Model):
     payment_status = models.CharField(max_length=50, choices=PAYMENT_STATUS, default='pending', null=False, blank=False)
     payment_date = models.DateTimeField(auto_now_add=True)
     payment_amount = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)
-    payment_reference = models.CharField(max_length=100, null=False, blank=False)
+    payment_reference = models.CharField(max_length=100, unique=True, null=False, blank=False)
+    transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -171,8 +180,10 @@ class Cart(models.Model):
     Attributes:
         device_ip (GenericIPAddressField): The IP address of the customer's device for tracking guest users.
         customer_id (ForeignKey): A reference to the logged-in customer (if available).
-        cart_total_amount (DecimalField): The total cost of items in the cart.
+        cart_total_amount (DecimalField): The total cost of items in the cart, kept up to date by orders.cart_management.
         cart_checkout_status (BooleanField): Indicates if the cart has been checked out.
+        price_version (BigIntegerField): The `Product_Price_Clock` value the lines were last priced at.
+        priced_until (DateTimeField): When the next discount of a product in the cart starts or ends (optional).
         created_at (DateTimeField): The timestamp when the cart was created.
         updated_at (DateTimeField): The timestamp when the cart was last updated.
 
@@ -184,6 +195,8 @@ class Cart(models.Model):
     customer_id = models.ForeignKey(Accounts, on_delete=models.CASCADE, related_name="Cart")
     cart_total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Cart Total Amount")
     cart_checkout_status = models.BooleanField(default=False, verbose_name="Cart Checkout Status")
+    price_version = models.BigIntegerField(default=0, verbose_name="Price Version")
+    priced_until = models.DateTimeField(null=True, blank=True, verbose_name="Priced Until")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
@@ -203,14 +216,79 @@ class CartItems(models.Model):
         cart_id (ForeignKey): A reference to the related cart.
         product_sku (ForeignKey): A reference to the product SKU added to the cart.
         quantity (PositiveIntegerField): The quantity of the product in the cart.
+        unit_price (DecimalField): The price of one unit after the product discount, when the line was last priced.
+        line_total (DecimalField): `unit_price` times `quantity`.
+        price_valid_until (DateTimeField): When the next discount of the product starts or ends (optional).
         created_at (DateTimeField): The timestamp when the record was created.
         updated_at (DateTimeField): The timestamp when the record was last updated.
+
+    Meta:
+        constraints: A SKU has one line per cart.
     """
     cart_id = models.ForeignKey(Cart, on_delete=models.CASCADE)
     product_sku = models.ForeignKey(Product_SKU, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1, verbose_name="Quantity")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Unit Price")
+    line_total = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Line Total")
+    price_valid_until = models.DateTimeField(null=True, blank=True, verbose_name="Price Valid Until")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_id', 'product_sku'], name='cart_item_sku_unique'),
+        ]
+
     def __str__(self):
         return str(self.pk)
+
+
+class StockReservation(models.Model):
+    """
+    Stock of a product SKU held for a cart until checkout, or until the reservation expires.
+
+    Reserving takes the quantity off `Product_SKU.product_stock` straight away, so the stock shown to other
+    customers is what is left. An active reservation is either committed by the order it was placed for
+    (the stock stays sold) or released, which gives the quantity back. Expired active reservations are
+    released by `manage.py release_expired_reservations`.
+
+    Attributes:
+        reservation_id (UUIDField): A unique identifier of the reservation handed out to clients.
+        cart_id (ForeignKey): The cart the stock is held for (optional).
+        product_sku (ForeignKey): The product SKU whose stock is held.
+        quantity (PositiveIntegerField): The number of units held.
+        reservation_status (CharField): Whether the reservation is active, committed, released or expired.
+        expires_at (DateTimeField): When an active reservation is given back.
+        created_at (DateTimeField): The timestamp when the reservation was created.
+        updated_at (DateTimeField): The timestamp when the reservation was last updated.
+
+    Meta:
+        verbose_name (str): A human-readable name for the model (singular).
+        verbose_name_plural (str): A human-readable name for the model (plural).
+        indexes: The sweeper looks up active reservations by expiry.
+    """
+    RESERVATION_STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+
+    reservation_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    cart_id = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, blank=True, related_name="StockReservations")
+    product_sku = models.ForeignKey(Product_SKU, on_delete=models.CASCADE, related_name="StockReservations")
+    quantity = models.PositiveIntegerField(null=False, blank=False)
+    reservation_status = models.CharField(max_length=20, choices=RESERVATION_STATUS_CHOICES, default='active', null=False)
+    expires_at = models.DateTimeField(null=False, blank=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+        indexes = [
+            models.Index(fields=['reservation_status', 'expires_at'], name='stock_reservation_expiry'),
+        ]
+
+    def __str__(self):
+        return str(self.reservation_id)
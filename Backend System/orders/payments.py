@@ -0,0 +1,97 @@
+import hashlib
+import hmac
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError, transaction
+from django.utils import timezone
+from system.manage_error_log import ManageErrorLog
+from .models import OrderPayment
+
+
+class ManagePayments:
+
+    '''
+    Payment results reported by the payment gateways (bKash, Nagad, Rocket, cards).
+
+    Gateways retry their callbacks until they are acknowledged, so recording a result must be safe to repeat.
+    A pending payment is settled with one conditional UPDATE (`payment_status='pending'`), a second delivery of
+    the same result finds the payment settled by the same `transaction_id` and is acknowledged without a change.
+    `payment_reference` and `transaction_id` are unique in the database, so a transaction can settle one payment only.
+
+    Example Usage:
+        payment, message = ManagePayments.record_result(payment_reference, transaction_id="TRX9A8B7C", payment_status="success",
+                                                        amount="1450.00")
+    '''
+
+    RESULTS = ('success', 'failed')
+
+    def verify_signature(payment_mode, body, signature):
+        '''True if `signature` is the hex HMAC-SHA256 of the raw callback `body` with the gateway's secret'''
+        secret = getattr(settings, 'PAYMENT_CALLBACK_SECRETS', {}).get(payment_mode)
+        if not secret or not signature:
+            return False
+        expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature.lower())
+
+    def record_result(payment_reference, transaction_id, payment_status, amount):
+
+        """
+        Record the result of a payment reported by its gateway.
+
+        Args:
+            payment_reference (str): The reference of the `OrderPayment`, sent to the gateway at checkout.
+            transaction_id (str): The gateway's id of the transaction.
+            payment_status (str): 'success' or 'failed'.
+            amount (str or Decimal): The amount the gateway charged, it must equal `payment_amount`.
+
+        Returns:
+            tuple:
+                - OrderPayment or None: The payment with its new status, `None` if the result was refused.
+                - str: A message indicating the success or failure of the operation.
+
+        Exception Handling:
+            - **DatabaseError**, **OperationalError**, **ProgrammingError**, **IntegrityError** and **Exception** are
+              logged in `ErrorLogs` and answered with a generic message.
+
+        Notes:
+            - Delivering the same result again returns the payment with "Payment result already recorded".
+            - A payment that is already settled cannot change status.
+        """
+        try:
+            if payment_status not in ManagePayments.RESULTS:
+                return None, f"Payment status must be one of {', '.join(ManagePayments.RESULTS)}"
+            if not transaction_id:
+                return None, "Transaction id is required"
+            try:
+                amount = Decimal(str(amount))
+            except (InvalidOperation, ValueError):
+                return None, "Invalid amount"
+
+            payment = OrderPayment.objects.filter(payment_reference=payment_reference).first()
+            if payment is None:
+                return None, "Payment does not exist"
+            if payment_status == 'success' and amount != payment.payment_amount:
+                return None, "Amount does not match the payment"
+
+            with transaction.atomic():
+                settled = OrderPayment.objects.filter(pk=payment.pk, payment_status='pending').update(
+                    payment_status=payment_status, transaction_id=transaction_id, payment_date=timezone.now(), updated_at=timezone.now())
+            payment.refresh_from_db()
+            if settled:
+                return payment, "Payment result recorded"
+            if payment.transaction_id == transaction_id and payment.payment_status == payment_status:
+                return payment, "Payment result already recorded"
+            return None, f"Payment is already {payment.payment_status}"
+
+        except IntegrityError:
+            return None, "Transaction was already recorded for another payment"
+
+        except (DatabaseError, OperationalError, ProgrammingError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while recording payment! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while recording payment! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while recording payment! Please try again later.",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while recording payment! Please try again later.")
@@ -0,0 +1,351 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from products.models import Product_SKU
+from system.manage_error_log import ManageErrorLog
+from .models import StockReservation
+
+
+class _OutOfStock(Exception):
+    '''Raised inside the reservation transaction to roll it back'''
+
+    def __init__(self, product_sku_pk, available):
+        super().__init__(product_sku_pk, available)
+        self.product_sku_pk = product_sku_pk
+        self.available = available
+
+
+class ManageStock:
+
+    '''
+    Concurrency safe reservation of `Product_SKU.product_stock`.
+
+    Stock is never read, changed in Python and written back. Every change is an `F('product_stock') - quantity`
+    (or `+`) UPDATE, and the `product_sku_stock_not_negative` CHECK constraint makes the database refuse any
+    statement that would take the stock below zero, whatever the application does.
+
+    A reservation takes the quantity off the stock at once and holds it for `TTL_SECONDS`
+    (settings.STOCK_RESERVATION). Carts hold the quantity of their lines (`hold_for_cart`, called by
+    `ManageCart`), checkout commits it, lowering a quantity or removing an item releases it, and
+    `release_expired` (run by `manage.py release_expired_reservations`) gives back the ones nobody committed.
+
+    Reserving several SKUs locks their rows with `SELECT ... FOR UPDATE` in primary key order. Two carts
+    reserving the same SKUs in a different order then wait for each other instead of deadlocking, and the
+    reservation is all or nothing.
+
+    Example Usage:
+        reservations, message = ManageStock.reserve_stock({product_sku.pk: 2, other_sku.pk: 1}, cart=cart)
+        committed, message = ManageStock.commit_reservations(reservations)
+    '''
+
+    def options():
+        options = {'TTL_SECONDS': 15 * 60, 'BATCH_SIZE': 500}
+        options.update(getattr(settings, 'STOCK_RESERVATION', {}))
+        return options
+
+    def quantities(items):
+        '''`{product sku pk: quantity}` of a dict or `(pk, quantity)` pairs, repeated SKUs added up'''
+        pairs = items.items() if isinstance(items, dict) else items
+        quantities = {}
+        for product_sku_pk, quantity in pairs:
+            quantity = int(quantity)
+            if quantity <= 0:
+                raise ValueError("Quantity must be at least 1")
+            quantities[int(product_sku_pk)] = quantities.get(int(product_sku_pk), 0) + quantity
+        return quantities
+
+    def lock_skus(product_sku_pks):
+        '''`SELECT ... FOR UPDATE` the SKU rows in primary key order, every path that changes several of them locks first'''
+        return list(Product_SKU.objects.select_for_update().filter(pk__in=sorted(product_sku_pks)).order_by('pk')
+                    .values_list('pk', flat=True))
+
+    def change_stock(quantities, sign):
+        '''One UPDATE adding (`sign=1`) or taking (`sign=-1`) the quantities of `{pk: quantity}` to or from the stock'''
+        return Product_SKU.objects.filter(pk__in=list(quantities)).update(product_stock=F('product_stock') + sign * Case(
+            *[When(pk=product_sku_pk, then=Value(quantity)) for product_sku_pk, quantity in quantities.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+
+    def reserve_stock(items, cart=None, ttl_seconds=None):
+
+        """
+        Reserve stock of one or more product SKUs, all of them or none.
+
+        Args:
+            items (dict or list): `{product_sku_pk: quantity}` or `(product_sku_pk, quantity)` pairs.
+            cart (Cart, optional): The cart the stock is held for.
+            ttl_seconds (int, optional): How long the stock is held, settings.STOCK_RESERVATION['TTL_SECONDS'] by default.
+
+        Returns:
+            tuple:
+                - list or None: The `StockReservation` rows created, one per SKU, `None` if nothing was reserved.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            reservations, message = ManageStock.reserve_stock({12: 2, 7: 1}, cart=cart)
+            if reservations is None:
+                return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+        Exception Handling:
+            - **DatabaseError**, **OperationalError**, **ProgrammingError**, **IntegrityError** and **Exception** are
+              logged in `ErrorLogs` and answered with a generic message.
+
+        Notes:
+            - A single SKU needs no lock: the conditional `UPDATE ... WHERE product_stock >= quantity` is atomic.
+            - Several SKUs are locked in primary key order, then taken off with one UPDATE.
+        """
+        try:
+            try:
+                quantities = ManageStock.quantities(items)
+            except (TypeError, ValueError):
+                return None, "Quantity must be at least 1"
+            if not quantities:
+                return None, "No product sku to reserve"
+            ttl_seconds = ManageStock.options()['TTL_SECONDS'] if ttl_seconds is None else ttl_seconds
+            expires_at = timezone.now() + timedelta(seconds=ttl_seconds)
+
+            with transaction.atomic():
+                if len(quantities) == 1:
+                    [(product_sku_pk, quantity)] = quantities.items()
+                    taken = Product_SKU.objects.filter(pk=product_sku_pk, product_stock__gte=quantity) \
+                        .update(product_stock=F('product_stock') - quantity)
+                    if not taken:
+                        available = Product_SKU.objects.filter(pk=product_sku_pk).values_list('product_stock', flat=True).first()
+                        raise _OutOfStock(product_sku_pk, available)
+                else:
+                    #deterministic lock order, concurrent batches over the same SKUs queue up instead of deadlocking
+                    stock = dict(Product_SKU.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk')
+                                 .values_list('pk', 'product_stock'))
+                    for product_sku_pk in sorted(quantities):
+                        if stock.get(product_sku_pk, 0) < quantities[product_sku_pk]:
+                            raise _OutOfStock(product_sku_pk, stock.get(product_sku_pk))
+                    ManageStock.change_stock(quantities, -1)
+                reservations = StockReservation.objects.bulk_create([
+                    StockReservation(cart_id=cart, product_sku_id=product_sku_pk, quantity=quantity, expires_at=expires_at)
+                    for product_sku_pk, quantity in sorted(quantities.items())
+                ])
+            return reservations, "Stock reserved"
+
+        except _OutOfStock as error:
+            if error.available is None:
+                return None, f"Product sku {error.product_sku_pk} does not exist"
+            return None, f"Only {error.available} left in stock of product sku {error.product_sku_pk}"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while reserving stock! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while reserving stock! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while reserving stock! Please try again later.",
+                "IntegrityError": "Not enough stock left to reserve!",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while reserving stock! Please try again later.")
+
+    def end_reservations(reservations, reservation_status):
+        '''
+        Move the active ones among `reservations` (rows or pks) to `reservation_status`, giving their stock back
+        unless it is 'committed'. Returns the number of reservations moved.
+
+        The reservation rows are locked first, so a reservation released by the sweeper and by the customer at
+        the same time only gives its stock back once. The SKU rows are then locked in primary key order like
+        `reserve_stock` does, a release and a reservation over the same SKUs queue instead of deadlocking.
+        '''
+        pks = sorted({getattr(reservation, 'pk', reservation) for reservation in reservations})
+        if not pks:
+            return 0
+        with transaction.atomic():
+            locked = list(StockReservation.objects.select_for_update().filter(pk__in=pks, reservation_status='active')
+                          .order_by('pk').values_list('pk', 'product_sku_id', 'quantity'))
+            if not locked:
+                return 0
+            StockReservation.objects.filter(pk__in=[pk for pk, product_sku_pk, quantity in locked]) \
+                .update(reservation_status=reservation_status, updated_at=timezone.now())
+            if reservation_status != 'committed':
+                quantities = {}
+                for pk, product_sku_pk, quantity in locked:
+                    quantities[product_sku_pk] = quantities.get(product_sku_pk, 0) + quantity
+                ManageStock.lock_skus(quantities)
+                ManageStock.change_stock(quantities, 1)
+        return len(locked)
+
+    def release_reservations(reservations):
+
+        """
+        Give the stock of active reservations back, e.g. when an item is removed from the cart.
+
+        Args:
+            reservations (iterable): `StockReservation` rows or their primary keys.
+
+        Returns:
+            tuple:
+                - int or None: The number of reservations released, `None` on an error.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - Reservations that are no longer active (committed, released or expired) are left as they are.
+        """
+        try:
+            released = ManageStock.end_reservations(reservations, 'released')
+            return released, f"Released {released} stock reservations"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return None, "An unexpected error occurred while releasing stock! Please try again later."
+
+    def release_cart(cart):
+        '''Release every active reservation of `cart`. Returns `(released, message)`'''
+        return ManageStock.release_reservations(
+            StockReservation.objects.filter(cart_id=cart, reservation_status='active').values_list('pk', flat=True))
+
+    def hold_for_cart(cart, quantities):
+
+        """
+        Make the active reservations of a cart hold exactly `quantities` of those SKUs.
+
+        Called by `ManageCart` inside the cart row lock whenever a line changes: the units added to a line are
+        reserved for the cart, the units removed are given back. Checkout calls it again, so a line whose hold
+        expired, or that was never held, reserves what is missing before the order is placed.
+
+        Args:
+            cart (Cart): The cart the stock is held for.
+            quantities (dict): `{product sku pk: quantity}`, 0 gives the whole hold of the SKU back.
+
+        Returns:
+            tuple:
+                - bool or None: True if the cart now holds the quantities, `None` if the stock was not enough or on an error.
+                - str: A message indicating the success or failure of the operation.
+
+        Exception Handling:
+            - Errors are logged in `ErrorLogs` and answered with a generic message.
+
+        Notes:
+            - It is all or nothing: when a SKU is short, nothing is reserved or given back.
+            - The SKU rows are locked in primary key order before the first change, so two carts holding and
+              giving back the same SKUs cannot deadlock.
+            - A new reservation is held for `TTL_SECONDS`, what the cart already held keeps its expiry.
+        """
+        try:
+            quantities = {int(product_sku_pk): int(quantity) for product_sku_pk, quantity in quantities.items()}
+            with transaction.atomic():
+                active = list(StockReservation.objects.select_for_update()
+                              .filter(cart_id=cart, reservation_status='active', product_sku_id__in=list(quantities))
+                              .order_by('-pk').values_list('pk', 'product_sku_id', 'quantity'))
+                held = {}
+                for pk, product_sku_pk, quantity in active:
+                    held[product_sku_pk] = held.get(product_sku_pk, 0) + quantity
+                missing = {pk: quantity - held.get(pk, 0) for pk, quantity in quantities.items() if quantity > held.get(pk, 0)}
+                surplus = {pk: held[pk] - quantity for pk, quantity in quantities.items() if held.get(pk, 0) > quantity}
+                if not missing and not surplus:
+                    return True, "Stock held"
+
+                ManageStock.lock_skus(list(missing) + list(surplus))
+                if missing:
+                    reservations, message = ManageStock.reserve_stock(missing, cart=cart)
+                    if reservations is None:
+                        return None, message
+                if surplus:
+                    #newest reservations are given back first, the last one only in part
+                    released, shrunk, left = [], [], dict(surplus)
+                    for pk, product_sku_pk, quantity in active:
+                        if not left.get(product_sku_pk):
+                            continue
+                        if quantity <= left[product_sku_pk]:
+                            released.append(pk)
+                        else:
+                            shrunk.append(StockReservation(pk=pk, quantity=quantity - left[product_sku_pk], updated_at=timezone.now()))
+                        left[product_sku_pk] -= min(quantity, left[product_sku_pk])
+                    StockReservation.objects.filter(pk__in=released).update(reservation_status='released', updated_at=timezone.now())
+                    if shrunk:
+                        StockReservation.objects.bulk_update(shrunk, ['quantity', 'updated_at'])
+                    ManageStock.change_stock(surplus, 1)
+            return True, "Stock held"
+
+        except (TypeError, ValueError):
+            return None, "Quantity must be a whole number"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return None, "An unexpected error occurred while reserving stock! Please try again later."
+
+    def commit_cart(cart, quantities):
+        '''
+        Hold exactly `quantities` for the cart, commit those reservations and give back any other hold of the cart.
+        Call it inside the checkout transaction. Returns `(committed, message)`.
+        '''
+        held, message = ManageStock.hold_for_cart(cart, quantities)
+        if held is None:
+            return False, message
+        committed, message = ManageStock.commit_reservations(StockReservation.objects.filter(
+            cart_id=cart, reservation_status='active', product_sku_id__in=list(quantities)).values_list('pk', flat=True))
+        if not committed:
+            return False, message
+        released, message = ManageStock.release_cart(cart)
+        if released is None:
+            return False, message
+        return True, "Reserved stock committed"
+
+    def commit_reservations(reservations):
+
+        """
+        Turn active reservations into sold stock when the order is placed.
+
+        Call it inside the transaction that creates the order, so the order and the commit succeed or fail together.
+
+        Args:
+            reservations (iterable): `StockReservation` rows or their primary keys.
+
+        Returns:
+            tuple:
+                - bool: True if every reservation was still active and is now committed.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - If one of them was already released or expired nothing is committed, the order has to reserve again.
+            - An expired reservation the sweeper has not released yet still holds its stock and can be committed.
+        """
+        try:
+            pks = {getattr(reservation, 'pk', reservation) for reservation in reservations}
+            with transaction.atomic():
+                committed = ManageStock.end_reservations(pks, 'committed')
+                if committed != len(pks):
+                    transaction.set_rollback(True)
+                    return False, "Some of the reserved stock was released, please add the items to the cart again"
+            return True, "Reserved stock committed"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            return False, "An unexpected error occurred while committing reserved stock! Please try again later."
+
+    def release_expired(batch_size=None, now=None):
+
+        """
+        Sweeper: give back the stock of active reservations whose time ran out, in batches.
+
+        Args:
+            batch_size (int, optional): Reservations per transaction, settings.STOCK_RESERVATION['BATCH_SIZE'] by default.
+            now (datetime, optional): The time to compare `expires_at` with, now by default.
+
+        Returns:
+            int: The number of reservations released.
+
+        Example Usage:
+            released = ManageStock.release_expired()
+
+        Notes:
+            - On PostgreSQL rows another sweeper (or a checkout) holds are skipped and picked up by the next run.
+        """
+        batch_size = batch_size or ManageStock.options()['BATCH_SIZE']
+        now = now or timezone.now()
+        released = 0
+        while True:
+            with transaction.atomic():
+                batch = list(StockReservation.objects.select_for_update(skip_locked=True)
+                             .filter(reservation_status='active', expires_at__lte=now)
+                             .order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    break
+                released += ManageStock.end_reservations(batch, 'expired')
+            if len(batch) < batch_size:
+                break
+        return released
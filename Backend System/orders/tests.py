@@ -0,0 +1,557 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+from customer.models import Coupon
+from products.models import Product, Product_SKU, Product_Discount
+from products.product_management import ManageProducts
+from system.models import Accounts
+from system.testing import QueryRecorder
+from .cart_management import ManageCart
+from .checkout import ManageCheckout
+from .checks import check_guest_cart_store
+from .guest_cart import GuestCart, MemoryGuestCartBackend
+from .models import Cart, CartItems, Order, OrderDetails, OrderPayment, StockReservation
+from .payments import ManagePayments
+from .stock_management import ManageStock
+
+
+class TestManageStock(TestCase):
+
+    def setUp(self):
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.red = Product_SKU.objects.create(product_id=product, product_color="Red", product_price=100, product_stock=5)
+        self.blue = Product_SKU.objects.create(product_id=product, product_color="Blue", product_price=100, product_stock=2)
+
+    def stock(self, product_sku):
+        product_sku.refresh_from_db(fields=['product_stock'])
+        return product_sku.product_stock
+
+    def test_reserve_takes_stock_off(self):
+        """
+        Test that reserving a batch takes the stock of every SKU off and leaves the reservations active.
+        """
+        reservations, message = ManageStock.reserve_stock({self.red.pk: 2, self.blue.pk: 1})
+        self.assertEqual(len(reservations), 2, message)
+        self.assertEqual(self.stock(self.red), 3)
+        self.assertEqual(self.stock(self.blue), 1)
+        self.assertTrue(all(reservation.reservation_status == 'active' for reservation in reservations))
+
+    def test_batch_is_all_or_nothing(self):
+        """
+        Test that a batch with one short SKU reserves nothing and names the stock left.
+        """
+        reservations, message = ManageStock.reserve_stock([(self.red.pk, 2), (self.blue.pk, 3)])
+        self.assertIsNone(reservations)
+        self.assertIn("Only 2 left", message)
+        self.assertEqual(self.stock(self.red), 5)
+        self.assertEqual(StockReservation.objects.count(), 0)
+
+    def test_single_sku_cannot_oversell(self):
+        """
+        Test that a single SKU cannot be reserved beyond its stock.
+        """
+        self.assertIsNotNone(ManageStock.reserve_stock({self.blue.pk: 2})[0])
+        reservations, message = ManageStock.reserve_stock({self.blue.pk: 1})
+        self.assertIsNone(reservations)
+        self.assertEqual(self.stock(self.blue), 0)
+
+    def test_invalid_quantity_and_missing_sku(self):
+        """
+        Test that a zero quantity and an unknown SKU are refused with a message.
+        """
+        self.assertEqual(ManageStock.reserve_stock({self.red.pk: 0})[1], "Quantity must be at least 1")
+        self.assertIn("does not exist", ManageStock.reserve_stock({self.red.pk + 100: 1})[1])
+
+    def test_release_gives_stock_back_once(self):
+        """
+        Test that releasing the same reservations twice gives the stock back once.
+        """
+        reservations, message = ManageStock.reserve_stock({self.red.pk: 2})
+        self.assertEqual(ManageStock.release_reservations(reservations)[0], 1)
+        self.assertEqual(ManageStock.release_reservations(reservations)[0], 0)
+        self.assertEqual(self.stock(self.red), 5)
+
+    def test_commit_keeps_stock_sold(self):
+        """
+        Test that committed reservations keep their stock sold and can no longer be released.
+        """
+        reservations, message = ManageStock.reserve_stock({self.red.pk: 2, self.blue.pk: 1})
+        committed, message = ManageStock.commit_reservations(reservations)
+        self.assertTrue(committed, message)
+        self.assertEqual(ManageStock.release_reservations(reservations)[0], 0)
+        self.assertEqual(self.stock(self.red), 3)
+
+    def test_commit_fails_if_a_reservation_was_released(self):
+        """
+        Test that a commit that includes a released reservation commits nothing.
+        """
+        reservations, message = ManageStock.reserve_stock({self.red.pk: 1, self.blue.pk: 1})
+        ManageStock.release_reservations(reservations[:1])
+        committed, message = ManageStock.commit_reservations(reservations)
+        self.assertFalse(committed)
+        self.assertEqual(StockReservation.objects.filter(reservation_status='active').count(), 1)
+
+    def test_sweeper_releases_expired_reservations(self):
+        """
+        Test that the sweeper command gives back only the stock of expired reservations.
+        """
+        expired, message = ManageStock.reserve_stock({self.red.pk: 2}, ttl_seconds=0)
+        active, message = ManageStock.reserve_stock({self.red.pk: 1})
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn("Released 1 expired", out.getvalue())
+        self.assertEqual(self.stock(self.red), 4)
+        self.assertEqual(StockReservation.objects.get(pk=expired[0].pk).reservation_status, 'expired')
+        self.assertEqual(ManageStock.release_expired(now=timezone.now() + timedelta(hours=1)), 1)
+        self.assertEqual(self.stock(self.red), 5)
+
+    def test_release_locks_the_skus_in_pk_order_before_the_update(self):
+        """
+        Test that a release locks the SKU rows in primary key order before updating the stock.
+        """
+        reservations, message = ManageStock.reserve_stock({self.blue.pk: 1, self.red.pk: 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ManageStock.release_reservations(reservations)[0], 2)
+        statements = [query['sql'] for query in queries.captured_queries if 'products_product_sku' in query['sql']]
+        self.assertTrue(statements[0].startswith('SELECT') and 'ORDER BY' in statements[0], statements)
+        self.assertTrue(statements[1].startswith('UPDATE'), statements)
+        self.assertEqual((self.stock(self.red), self.stock(self.blue)), (5, 2))
+
+    def test_lowering_stock_below_reservations_is_refused(self):
+        """
+        Test that a SKU edit cannot lower the stock below what carts have reserved.
+        """
+        edited = Product_SKU.objects.get(pk=self.red.pk)
+        ManageStock.reserve_stock({self.red.pk: 4})
+        with patch.object(ManageProducts, 'fetch_product_sku', return_value=(edited, "")):
+            success, message = ManageProducts.update_product_sku(None, product_sku_pk=self.red.pk, product_id=self.red.product_id_id,
+                                                                 product_price=100, product_stock=2, product_flavours_pk_list=[])
+        self.assertFalse(success)
+        self.assertEqual(message, "Not enough stock! The stock cannot go below zero or below the units reserved by carts.")
+        self.assertEqual(self.stock(self.red), 1)
+
+    def test_database_refuses_negative_stock(self):
+        """
+        Test that the database refuses a stock update that would go below zero.
+        """
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product_SKU.objects.filter(pk=self.blue.pk).update(product_stock=F('product_stock') - 3)
+
+
+class TestManageCheckout(TestCase):
+
+    def setUp(self):
+        self.customer = Accounts.objects.create_user(email='buyer@example.com', username='buyer', password='password')
+        self.request = SimpleNamespace(user=self.customer, META={'REMOTE_ADDR': '127.0.0.1'})
+        self.product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.skus = [Product_SKU.objects.create(product_id=self.product, product_color=f"Color {i}", product_price=100, product_stock=10)
+                     for i in range(8)]
+        now = timezone.now()
+        Product_Discount.objects.create(product_id=self.product, discount_name="Small", discount_amount=5,
+                                        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        Product_Discount.objects.create(product_id=self.product, discount_name="Large", discount_amount=20,
+                                        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        Product_Discount.objects.create(product_id=self.product, discount_name="Over", discount_amount=50,
+                                        start_date=now - timedelta(days=5), end_date=now - timedelta(days=1))
+        self.address = {'address_line1': "House 1", 'city': "Dhaka"}
+
+    def cart(self, lines):
+        cart = Cart.objects.create(device_ip='127.0.0.1', customer_id=self.customer, cart_total_amount=0)
+        CartItems.objects.bulk_create([CartItems(cart_id=cart, product_sku=product_sku, quantity=2) for product_sku in self.skus[:lines]])
+        return cart
+
+    def coupon(self, **fields):
+        now = timezone.now()
+        defaults = dict(coupon_code="EID10", discount_type='percentage', discount_percentage=10, discount_amount=0,
+                        maximum_discount_amount=25, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+                        usage_limit=1, customer_id=self.customer)
+        defaults.update(fields)
+        return Coupon.objects.create(**defaults)
+
+    def test_checkout_prices_and_writes_order(self):
+        """
+        Test that checkout prices the lines with the largest discount and writes the order, payment, address and stock.
+        """
+        cart = self.cart(lines=2)
+        order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+        self.assertIsNotNone(order, message)
+        #the largest active discount, 100 - 20, for 2 lines of 2 units
+        self.assertEqual(order.total_amount, Decimal('320.00'))
+        self.assertEqual(list(OrderDetails.objects.filter(order_id=order).values_list('unit_price', 'quantity', 'subtotal')),
+                         [(Decimal('80.00'), 2, Decimal('160.00'))] * 2)
+        self.assertEqual(OrderPayment.objects.get(order_id=order).payment_amount, Decimal('320.00'))
+        self.assertEqual(order.ordershippingaddress_set.get().city, "Dhaka")
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[0].pk).product_stock, 8)
+        self.assertEqual(StockReservation.objects.filter(reservation_status='committed').count(), 2)
+        self.assertTrue(Cart.objects.get(pk=cart.pk).cart_checkout_status)
+        self.assertEqual(ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)[1], "Cart has already been checked out")
+
+    def test_query_count_does_not_grow_with_lines(self):
+        """
+        Test that checkout runs the same number of queries for 2 and 8 cart lines.
+        """
+        counts = []
+        for lines in (2, 8):
+            cart = self.cart(lines)
+            with QueryRecorder() as recorder:
+                order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+            self.assertIsNotNone(order, message)
+            counts.append(len(recorder))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_coupon_is_applied_and_capped(self):
+        """
+        Test that a coupon is capped at its maximum discount and cannot be used beyond its limit.
+        """
+        coupon = self.coupon()
+        order, message = ManageCheckout.checkout(self.request, self.cart(lines=4).pk, 'bkash', self.address, coupon_code="EID10")
+        #10% of 640 is 64, capped at 25
+        self.assertEqual(order.coupon_discount, Decimal('25.00'))
+        self.assertEqual(order.total_amount, Decimal('615.00'))
+        self.assertEqual(order.coupon_id, coupon)
+        order, message = ManageCheckout.checkout(self.request, self.cart(lines=1).pk, 'bkash', self.address, coupon_code="EID10")
+        self.assertIsNone(order)
+        self.assertEqual(message, "Coupon has already been used")
+
+    def test_failed_checkout_writes_nothing(self):
+        """
+        Test that a checkout short of stock writes no order and leaves the stock and cart as they were.
+        """
+        Product_SKU.objects.filter(pk=self.skus[1].pk).update(product_stock=1)
+        cart = self.cart(lines=2)
+        order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+        self.assertIsNone(order)
+        self.assertIn("Only 1 left", message)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[0].pk).product_stock, 10)
+        self.assertFalse(Cart.objects.get(pk=cart.pk).cart_checkout_status)
+
+    def test_cart_reservations_are_replaced(self):
+        """
+        Test that a hold larger than the cart line is cut down to the line at checkout.
+        """
+        cart = self.cart(lines=1)
+        ManageStock.reserve_stock({self.skus[0].pk: 5}, cart=cart)
+        order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+        self.assertIsNotNone(order, message)
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[0].pk).product_stock, 8)
+
+    def test_held_stock_is_committed_not_taken_again(self):
+        """
+        Test that checkout commits the stock the cart holds instead of taking it off again.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        ManageCart.add_item(cart, self.skus[0].pk, 2)
+        ManageCart.add_item(cart, self.skus[1].pk, 3)
+        order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+        self.assertIsNotNone(order, message)
+        self.assertEqual([Product_SKU.objects.get(pk=product_sku.pk).product_stock for product_sku in self.skus[:2]], [8, 7])
+        self.assertEqual(StockReservation.objects.filter(cart_id=cart, reservation_status='committed').count(), 2)
+        self.assertFalse(StockReservation.objects.filter(cart_id=cart, reservation_status='active').exists())
+
+    def test_expired_hold_is_reserved_again(self):
+        """
+        Test that checkout reserves again the stock of a hold the sweeper gave back.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        ManageCart.add_item(cart, self.skus[0].pk, 2)
+        ManageStock.release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[0].pk).product_stock, 10)
+        order, message = ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address)
+        self.assertIsNotNone(order, message)
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[0].pk).product_stock, 8)
+
+    def test_invalid_input(self):
+        """
+        Test that checkout refuses an unknown payment mode, a missing address, an unknown coupon and an empty cart.
+        """
+        cart = self.cart(lines=1)
+        self.assertEqual(ManageCheckout.checkout(self.request, cart.pk, 'cheque', self.address)[1], "Invalid payment mode")
+        self.assertEqual(ManageCheckout.checkout(self.request, cart.pk, 'bkash', {})[1], "Shipping address is required")
+        self.assertEqual(ManageCheckout.checkout(self.request, cart.pk, 'bkash', self.address, coupon_code="NOPE")[1], "Coupon does not exist")
+        self.assertEqual(ManageCheckout.checkout(self.request, self.cart(lines=0).pk, 'bkash', self.address)[1], "Cart is empty")
+
+
+class TestManageCart(TestCase):
+
+    def setUp(self):
+        customer = Accounts.objects.create_user(email='buyer@example.com', username='buyer', password='password')
+        self.request = SimpleNamespace(user=customer, META={'REMOTE_ADDR': '127.0.0.1'})
+        self.product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.red = Product_SKU.objects.create(product_id=self.product, product_color="Red", product_price=100, product_stock=10)
+        self.blue = Product_SKU.objects.create(product_id=self.product, product_color="Blue", product_price=40, product_stock=10)
+        self.cart = ManageCart.open_cart(self.request)[0]
+
+    def total(self):
+        return Cart.objects.get(pk=self.cart.pk).cart_total_amount
+
+    def test_total_follows_changes(self):
+        """
+        Test that the cart total follows every add, quantity change and removal.
+        """
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        ManageCart.add_item(self.cart, self.blue.pk)
+        self.assertEqual(self.total(), Decimal('240.00'))
+        ManageCart.add_item(self.cart, self.red.pk)
+        self.assertEqual(CartItems.objects.get(cart_id=self.cart, product_sku=self.red).quantity, 3)
+        ManageCart.set_quantity(self.cart, self.blue.pk, 4)
+        self.assertEqual(self.total(), Decimal('460.00'))
+        ManageCart.remove_item(self.cart, self.red.pk)
+        self.assertEqual(self.total(), Decimal('160.00'))
+        self.assertEqual(ManageCart.remove_item(self.cart, self.red.pk)[1], "Product sku is not in the cart")
+        self.assertEqual(ManageCart.add_item(self.cart, self.red.pk, 0)[1], "Quantity must be at least 1")
+        self.assertEqual(ManageCart.add_item(self.cart, self.red.pk + 100)[1], "Product sku does not exist")
+
+    def test_lines_hold_their_stock(self):
+        """
+        Test that the cart holds the stock of its lines and gives it back as they are lowered or removed.
+        """
+        stock = lambda: Product_SKU.objects.get(pk=self.red.pk).product_stock
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        self.assertEqual(stock(), 6)
+        ManageCart.set_quantity(self.cart, self.red.pk, 1)
+        self.assertEqual(stock(), 9)
+        self.assertEqual(StockReservation.objects.filter(cart_id=self.cart, reservation_status='active')
+                         .values_list('quantity', flat=True).get(), 1)
+        ManageCart.remove_item(self.cart, self.red.pk)
+        self.assertEqual(stock(), 10)
+        self.assertFalse(StockReservation.objects.filter(reservation_status='active').exists())
+
+    def test_add_beyond_stock_leaves_cart_unchanged(self):
+        """
+        Test that adding more than the stock left is refused and leaves the cart and stock unchanged.
+        """
+        ManageCart.add_item(self.cart, self.red.pk, 4)
+        cart, message = ManageCart.add_item(self.cart, self.red.pk, 7)
+        self.assertIsNone(cart)
+        self.assertIn("Only 6 left", message)
+        self.assertEqual(CartItems.objects.get(cart_id=self.cart, product_sku=self.red).quantity, 4)
+        self.assertEqual(self.total(), Decimal('400.00'))
+        self.assertEqual(Product_SKU.objects.get(pk=self.red.pk).product_stock, 6)
+
+    def test_read_does_not_touch_skus(self):
+        """
+        Test that reading the cart uses the stored prices without querying the SKUs.
+        """
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        ManageCart.add_item(self.cart, self.blue.pk)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with QueryRecorder() as recorder:
+            cart, lines = ManageCart.cart_lines(cart)
+        self.assertFalse([query for query in recorder.captured_queries if 'products_product_sku' in query['sql']])
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(cart.cart_total_amount, Decimal('240.00'))
+
+    def test_price_change_reprices_only_changed_lines(self):
+        """
+        Test that a SKU price change reprices its line and the total on the next read.
+        """
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        ManageCart.add_item(self.cart, self.blue.pk)
+        self.red.product_price = 120
+        self.red.save()
+        cart, lines = ManageCart.cart_lines(Cart.objects.get(pk=self.cart.pk))
+        self.assertEqual(cart.cart_total_amount, Decimal('280.00'))
+        self.assertEqual(self.total(), Decimal('280.00'))
+        self.assertEqual([line['unit_price'] for line in lines], [Decimal('120.00'), Decimal('40.00')])
+
+    def test_discount_reprices_and_expires(self):
+        """
+        Test that a product discount reprices the cart and stops applying once its window ends.
+        """
+        ManageCart.add_item(self.cart, self.red.pk, 2)
+        now = timezone.now()
+        Product_Discount.objects.create(product_id=self.product, discount_name="Eid", discount_amount=10,
+                                        start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        cart = ManageCart.refresh_prices(Cart.objects.get(pk=self.cart.pk))
+        self.assertEqual(cart.cart_total_amount, Decimal('180.00'))
+        self.assertIsNotNone(cart.priced_until)
+        #no version changes, the discount window passing is enough to price again
+        cart = ManageCart.refresh_prices(cart, now=now + timedelta(hours=2))
+        self.assertEqual(cart.cart_total_amount, Decimal('200.00'))
+        self.assertIsNone(cart.priced_until)
+
+    def test_checked_out_cart_cannot_change(self):
+        """
+        Test that a checked out cart cannot change and a new cart is opened instead.
+        """
+        Cart.objects.filter(pk=self.cart.pk).update(cart_checkout_status=True)
+        self.assertEqual(ManageCart.add_item(self.cart, self.red.pk)[1], "Cart has already been checked out")
+        self.assertNotEqual(ManageCart.open_cart(self.request)[0].pk, self.cart.pk)
+
+
+@override_settings(GUEST_CART={'BACKEND': 'memory', 'MAX_LINES': 2})
+class TestGuestCart(TestCase):
+
+    def setUp(self):
+        customer = Accounts.objects.create_user(email='buyer@example.com', username='buyer', password='password')
+        self.request = SimpleNamespace(user=customer, META={'REMOTE_ADDR': '127.0.0.1'})
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+        self.skus = [Product_SKU.objects.create(product_id=product, product_color=f"Color {i}", product_price=100, product_stock=10)
+                     for i in range(3)]
+
+    def test_guest_cart_is_not_written_to_database(self):
+        """
+        Test that a guest cart keeps its lines out of the database.
+        """
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        self.assertIsNotNone(token, message)
+        self.assertEqual(GuestCart.add_item(token, self.skus[0].pk)[0], token)
+        GuestCart.add_item(token, self.skus[1].pk)
+        self.assertEqual(GuestCart.lines(token), {self.skus[0].pk: 3, self.skus[1].pk: 1})
+        self.assertEqual(GuestCart.priced_lines(token)[0], Decimal('400.00'))
+        self.assertEqual(Cart.objects.count() + CartItems.objects.count(), 0)
+        GuestCart.set_quantity(token, self.skus[0].pk, 0)
+        self.assertEqual(GuestCart.lines(token), {self.skus[1].pk: 1})
+
+    def test_size_cap_and_unknown_sku(self):
+        """
+        Test that a guest cart refuses lines beyond its size cap and unknown SKUs.
+        """
+        token, message = GuestCart.add_item(None, self.skus[0].pk)
+        GuestCart.add_item(token, self.skus[1].pk)
+        self.assertEqual(GuestCart.add_item(token, self.skus[2].pk)[1], "A cart can hold at most 2 products")
+        self.assertEqual(GuestCart.add_item(None, self.skus[2].pk + 100)[1], "Product sku does not exist")
+
+    def test_forged_token_is_not_a_cart(self):
+        """
+        Test that a guest cart token with a forged signature reads as no cart.
+        """
+        token, message = GuestCart.add_item(None, self.skus[0].pk)
+        forged = token.split(':')[0] + ':forged'
+        self.assertIsNone(GuestCart.cart_key(forged))
+        self.assertEqual(GuestCart.lines(forged), {})
+        self.assertNotEqual(GuestCart.add_item(forged, self.skus[0].pk)[0], forged)
+
+    def test_merge_adds_up_and_deletes_guest_cart(self):
+        """
+        Test that merging adds the guest quantities to the cart, holds their stock and deletes the guest cart.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        ManageCart.add_item(cart, self.skus[0].pk, 1)
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        GuestCart.add_item(token, self.skus[1].pk)
+        cart, message = GuestCart.merge(token, cart)
+        self.assertEqual(message, "Guest cart merged")
+        self.assertEqual(dict(CartItems.objects.filter(cart_id=cart).values_list('product_sku_id', 'quantity')),
+                         {self.skus[0].pk: 3, self.skus[1].pk: 1})
+        self.assertEqual(Cart.objects.get(pk=cart.pk).cart_total_amount, Decimal('400.00'))
+        self.assertEqual([Product_SKU.objects.get(pk=product_sku.pk).product_stock for product_sku in self.skus[:2]], [7, 9])
+        self.assertEqual(GuestCart.lines(token), {})
+        self.assertEqual(GuestCart.merge(token, cart)[1], "No guest cart to merge")
+
+    def test_concurrent_merges_merge_once(self):
+        """
+        Test that two merges of the same guest cart add its lines once.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        stale = GuestCart.lines(token)
+        self.assertEqual(GuestCart.merge(token, cart)[1], "Guest cart merged")
+        #a second request that read the guest cart before the first one claimed it
+        with patch.object(MemoryGuestCartBackend, 'get', return_value=stale):
+            self.assertEqual(GuestCart.merge(token, cart)[1], "No guest cart to merge")
+        self.assertEqual(CartItems.objects.get(cart_id=cart).quantity, 2)
+
+    def test_failed_merge_keeps_guest_cart(self):
+        """
+        Test that a merge into a checked out cart keeps the guest cart.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        Cart.objects.filter(pk=cart.pk).update(cart_checkout_status=True)
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        self.assertEqual(GuestCart.merge(token, cart), (None, "Cart has already been checked out"))
+        self.assertEqual(GuestCart.lines(token), {self.skus[0].pk: 2})
+
+    def test_merge_beyond_stock_keeps_guest_cart(self):
+        """
+        Test that a merge the stock cannot cover merges nothing and keeps the guest cart.
+        """
+        cart = ManageCart.open_cart(self.request)[0]
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        GuestCart.add_item(token, self.skus[1].pk)
+        Product_SKU.objects.filter(pk=self.skus[0].pk).update(product_stock=1)
+        merged, message = GuestCart.merge(token, cart)
+        self.assertIsNone(merged)
+        self.assertIn("Only 1 left", message)
+        self.assertFalse(CartItems.objects.filter(cart_id=cart).exists())
+        self.assertEqual(Product_SKU.objects.get(pk=self.skus[1].pk).product_stock, 10)
+        self.assertEqual(GuestCart.lines(token), {self.skus[0].pk: 2, self.skus[1].pk: 1})
+
+    def test_deploy_check_warns_about_process_local_store(self):
+        """
+        Test that the deploy check warns about the process local guest cart store only.
+        """
+        self.assertEqual([warning.id for warning in check_guest_cart_store(None)], ['orders.W001'])
+        with override_settings(GUEST_CART={'BACKEND': 'cache', 'CACHE_ALIAS': 'shared'},
+                               CACHES={'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}):
+            self.assertEqual(check_guest_cart_store(None), [])
+
+    def test_memory_backend_expires_and_evicts(self):
+        """
+        Test that the memory backend expires carts and evicts the oldest beyond its size.
+        """
+        backend = MemoryGuestCartBackend(max_carts=2)
+        backend.set('a', {1: 1}, ttl_seconds=0)
+        self.assertIsNone(backend.get('a'))
+        for key in ('b', 'c', 'd'):
+            backend.set(key, {1: 1}, ttl_seconds=60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('d'), {1: 1})
+
+    @override_settings(GUEST_CART={'BACKEND': 'cache'})
+    def test_cache_backend(self):
+        """
+        Test that the cache backend stores and reads a guest cart.
+        """
+        token, message = GuestCart.add_item(None, self.skus[0].pk, 2)
+        self.assertEqual(GuestCart.lines(token), {self.skus[0].pk: 2})
+
+
+class TestManagePayments(TestCase):
+
+    def setUp(self):
+        customer = Accounts.objects.create_user(email='buyer@example.com', username='buyer', password='password')
+        order = Order.objects.create(order_id="ORD-1", customer_id=customer, total_amount=500)
+        self.payment = OrderPayment.objects.create(order_id=order, payment_mode='nagad', payment_amount=500, payment_reference="ref-1")
+        self.other = OrderPayment.objects.create(order_id=order, payment_mode='nagad', payment_amount=500, payment_reference="ref-2")
+
+    def test_result_is_recorded_once(self):
+        """
+        Test that a payment result is recorded once and a conflicting one is refused.
+        """
+        payment, message = ManagePayments.record_result("ref-1", "TRX1", 'success', "500.00")
+        self.assertEqual(payment.payment_status, 'success', message)
+        self.assertEqual(ManagePayments.record_result("ref-1", "TRX1", 'success', "500.00")[1], "Payment result already recorded")
+        self.assertEqual(ManagePayments.record_result("ref-1", "TRX2", 'failed', "500.00")[1], "Payment is already success")
+
+    def test_transaction_settles_one_payment(self):
+        """
+        Test that one gateway transaction cannot settle two payments.
+        """
+        ManagePayments.record_result("ref-1", "TRX1", 'success', "500.00")
+        payment, message = ManagePayments.record_result("ref-2", "TRX1", 'success', "500.00")
+        self.assertIsNone(payment)
+        self.assertEqual(OrderPayment.objects.get(pk=self.other.pk).payment_status, 'pending')
+
+    def test_amount_must_match(self):
+        """
+        Test that a payment result with a different amount is refused.
+        """
+        self.assertEqual(ManagePayments.record_result("ref-1", "TRX1", 'success', "5.00")[1], "Amount does not match the payment")
+
+    def test_payment_reference_is_unique(self):
+        """
+        Test that the database refuses two payments with the same reference.
+        """
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderPayment.objects.create(order_id=self.payment.order_id, payment_mode='nagad', payment_amount=1, payment_reference="ref-1")
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import urlencode
+from system.manage_error_log import ManageErrorLog
+
+
+class CatalogueCache:
+
+    '''
+    Versioned read-through cache for catalogue data (categories, sub-categories, brands, flavours, products).
+
+    Every entity has a version number stored in the cache. Cached values are keyed with the version they
+    were built for, so invalidating an entity is a single `bump` that makes all its old entries unreachable;
+    they simply expire. Works with any Django cache backend (local-memory, file based or Redis).
+    '''
+
+    PRODUCT_CATEGORY = 'product_category'
+    PRODUCT_SUB_CATEGORY = 'product_sub_category'
+    PRODUCT_BRAND = 'product_brand'
+    PRODUCT_FLAVOUR = 'product_flavour'
+    PRODUCT = 'product'
+
+    _stats_lock = threading.Lock()
+    _stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    _missing = object()
+
+    def get_cache():
+        return caches[getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')]
+
+    def _version_key(entity):
+        return f"catalogue:{entity}:version"
+
+    def _value_key(entity, key, version):
+        return f"catalogue:{entity}:v{version}:{key}"
+
+    def _record(entity, outcome):
+        with CatalogueCache._stats_lock:
+            CatalogueCache._stats[entity][outcome] += 1
+
+    def request_key(request, params=()):
+
+        """
+        Key of a fetch request within an entity: its path and the recognised query parameters, in a fixed order.
+
+        Parameters the view does not read (cache busters, tracking tags) and their order are left out, so they
+        neither add entries nor miss the cache. The host is never part of the key.
+
+        Args:
+            request (Request): The request being answered.
+            params (iterable): Names of the query parameters that change the response, e.g. `('pk', 'cursor')`.
+
+        Returns:
+            str: The key to pass to `get` and `set`.
+
+        Example Usage:
+            key = CatalogueCache.request_key(request, ('pk', 'brand_name', 'cursor', 'page_size'))
+        """
+        query = urlencode([(name, request.GET[name]) for name in sorted(params) if name in request.GET])
+        return f"{request.path}:{query}"
+
+    def get_version(entity):
+
+        """
+        Return the current version of a catalogue entity, initialising it if the cache has none.
+
+        New versions start from the current time in milliseconds instead of 1, so a version lost on
+        eviction or cache restart never comes back to a number whose entries may still be cached.
+
+        Args:
+            entity (str): Name of the catalogue entity, e.g. `CatalogueCache.PRODUCT_BRAND`.
+
+        Returns:
+            int: The current version of the entity.
+        """
+        cache = CatalogueCache.get_cache()
+        version_key = CatalogueCache._version_key(entity)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, int(time.time() * 1000), timeout=None)
+            version = cache.get(version_key)
+        return version
+
+    def bump(*entities):
+
+        """
+        Invalidate every cached value of the given catalogue entities.
+
+        Called by the create, update and delete methods of `ManageProducts` after a successful write.
+        Cache failures are logged and never propagate to the caller, because the database write has
+        already happened.
+
+        Args:
+            *entities (str): Names of the catalogue entities to invalidate.
+
+        Example Usage:
+            CatalogueCache.bump(CatalogueCache.PRODUCT_BRAND, CatalogueCache.PRODUCT)
+        """
+        cache = CatalogueCache.get_cache()
+        for entity in entities:
+            version_key = CatalogueCache._version_key(entity)
+            try:
+                try:
+                    cache.incr(version_key)
+                except ValueError:
+                    #version key was evicted, start a fresh time based version
+                    cache.set(version_key, int(time.time() * 1000), timeout=None)
+            except Exception as error:
+                ManageErrorLog.log_error(type(error).__name__, str(error))
+                print(f"{type(error).__name__} occurred: {error}")
+
+    def get(entity, key):
+
+        """
+        Look up a cached value for the current version of an entity.
+
+        Returns the version the lookup was made against. Pass it back to `set` so that a value built
+        while another request bumped the entity is stored under the old version and never served.
+
+        Args:
+            entity (str): Name of the catalogue entity.
+            key (str): Key of the value within the entity, e.g. `request_key` of a fetch request.
+
+        Returns:
+            tuple:
+                - object or None: The cached value, or `None` on a miss.
+                - int or None: The version used for the lookup, or `None` if the cache is unavailable.
+        """
+        try:
+            version = CatalogueCache.get_version(entity)
+            value = CatalogueCache.get_cache().get(CatalogueCache._value_key(entity, key, version), CatalogueCache._missing)
+        except Exception as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            print(f"{type(error).__name__} occurred: {error}")
+            CatalogueCache._record(entity, 'misses')
+            return None, None
+        if value is CatalogueCache._missing:
+            CatalogueCache._record(entity, 'misses')
+            return None, version
+        CatalogueCache._record(entity, 'hits')
+        return value, version
+
+    def set(entity, key, value, version, timeout=None):
+
+        """
+        Store a value for the version returned by `get`. Does nothing if the cache was unavailable.
+
+        Args:
+            entity (str): Name of the catalogue entity.
+            key (str): Key of the value within the entity.
+            value (object): Picklable value to store.
+            version (int or None): Version returned by the matching `get` call.
+            timeout (int, optional): Expiry in seconds. Defaults to `settings.CATALOGUE_CACHE_TIMEOUT`.
+        """
+        if version is None:
+            return
+        if timeout is None:
+            timeout = getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 3600)
+        try:
+            CatalogueCache.get_cache().set(CatalogueCache._value_key(entity, key, version), value, timeout=timeout)
+        except Exception as error:
+            ManageErrorLog.log_error(type(error).__name__, str(error))
+            print(f"{type(error).__name__} occurred: {error}")
+
+    def get_or_set(entity, key, loader, timeout=None):
+
+        """
+        Return the cached value of `key`, calling `loader` and caching its result on a miss.
+
+        Args:
+            entity (str): Name of the catalogue entity.
+            key (str): Key of the value within the entity.
+            loader (callable): Builds the value on a miss. A `None` result is returned but not cached.
+            timeout (int, optional): Expiry in seconds. Defaults to `settings.CATALOGUE_CACHE_TIMEOUT`.
+
+        Returns:
+            object: The cached or freshly loaded value.
+
+        Example Usage:
+            brands = CatalogueCache.get_or_set(CatalogueCache.PRODUCT_BRAND, 'all',
+                                               lambda: list(Product_Brands.objects.values('id', 'brand_name')))
+        """
+        value, version = CatalogueCache.get(entity, key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                CatalogueCache.set(entity, key, value, version, timeout)
+        return value
+
+    def stats():
+        '''Return the hit and miss counters of this process per entity'''
+        with CatalogueCache._stats_lock:
+            return {entity: dict(counts) for entity, counts in CatalogueCache._stats.items()}
+
+    def reset_stats():
+        with CatalogueCache._stats_lock:
+            CatalogueCache._stats.clear()
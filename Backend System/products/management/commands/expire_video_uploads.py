@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.video_upload import ManageVideoUploads
+
+
+class Command(BaseCommand):
+    help = "Fail chunked video uploads that received nothing for settings.VIDEO_UPLOAD['ABANDON_SECONDS'] and delete their chunks"
+
+    def handle(self, *args, **options):
+        expired = ManageVideoUploads.expire_abandoned()
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} abandoned video uploads"))
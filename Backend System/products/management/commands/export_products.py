@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.product_export import ProductExport
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalogue (one row per SKU) to a CSV, JSONL or columnar JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, '-' (default) writes to stdout")
+        parser.add_argument('--format', choices=ProductExport.FORMATS, default='csv', help="Output format, csv by default")
+        parser.add_argument('--chunk-size', type=int, default=ProductExport.CHUNK_SIZE,
+                            help="Rows fetched per server-side cursor round trip")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        data = ProductExport.generate(options['format'], chunk_size=options['chunk_size'])
+        if options['path'] == '-':
+            for piece in data:
+                self.stdout.write(piece, ending='')
+            return
+        try:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as file:
+                for piece in data:
+                    file.write(piece)
+        except OSError as error:
+            raise CommandError(str(error))
+        self.stderr.write(self.style.SUCCESS(f"Catalogue exported to {options['path']}"))
@@ -0,0 +1,66 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+    django.contrib.postgres.indexes.GinIndex(fields=['product_name'], name='product_name_trgm_gin', opclasses=['gin_trgm_ops']),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    #GIN indexes and the gin_trgm_ops operator class only exist on PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('products', 'Product')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Product, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('products', 'Product')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Product, index)
+
+
+def populate_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models import OuterRef, Subquery
+    Product = apps.get_model('products', 'Product')
+    Product_Brands = apps.get_model('products', 'Product_Brands')
+    brand_name = Subquery(Product_Brands.objects.filter(pk=OuterRef('product_brand_id')).values('brand_name')[:1])
+    #same expression as products.product_search.ProductSearch.search_vector_expression
+    Product.objects.update(search_vector=(
+        SearchVector('product_name', weight='A', config='english') +
+        SearchVector(brand_name, weight='A', config='english') +
+        SearchVector('product_summary', weight='B', config='english') +
+        SearchVector('product_ingredients', weight='C', config='english') +
+        SearchVector('product_description', weight='D', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='product', index=index) for index in SEARCH_INDEXES],
+            database_operations=[migrations.RunPython(create_search_indexes, drop_search_indexes)],
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
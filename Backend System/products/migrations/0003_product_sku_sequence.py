@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_sku_sequences(apps, schema_editor):
+    '''Start every counter after the highest number already used by the SKU codes of its product, color and size'''
+    Product_SKU = apps.get_model('products', 'Product_SKU')
+    Product_SKU_Sequence = apps.get_model('products', 'Product_SKU_Sequence')
+    last_numbers = {}
+    for product_pk, color, size, code in Product_SKU.objects.values_list(
+            'product_id_id', 'product_color', 'product_size', 'product_sku').iterator(chunk_size=2000):
+        key = (product_pk, color or '', size or '')
+        try:
+            #codes look like NAME_COLOR_SIZE_N_HASH
+            number = int(code.rsplit('_', 2)[1])
+        except (IndexError, ValueError):
+            number = 0
+        #the old generator counted the existing SKUs, so the count is a lower bound as well
+        count, highest = last_numbers.get(key, (0, 0))
+        last_numbers[key] = (count + 1, max(highest, number))
+    Product_SKU_Sequence.objects.bulk_create([
+        Product_SKU_Sequence(product_id_id=product_pk, product_color=color, product_size=size, last_number=max(count, highest))
+        for (product_pk, color, size), (count, highest) in last_numbers.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product_SKU_Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_color', models.CharField(blank=True, default='', max_length=100)),
+                ('product_size', models.CharField(blank=True, default='', max_length=100)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Product SKU Sequence',
+                'verbose_name_plural': 'Product SKU Sequences',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='product_sku_sequence',
+            constraint=models.UniqueConstraint(fields=('product_id', 'product_color', 'product_size'), name='product_sku_sequence_unique'),
+        ),
+        migrations.RunPython(populate_sku_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:39
+
+from collections import defaultdict
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def duplicate_groups(model, field_name):
+    '''Primary keys of rows sharing a name case-insensitively, oldest first. Groups of one are skipped'''
+    groups = defaultdict(list)
+    for pk, name in model.objects.annotate(name_lower=Lower(field_name)).order_by('pk').values_list('pk', 'name_lower'):
+        groups[name].append(pk)
+    return [pks for pks in groups.values() if len(pks) > 1]
+
+
+def move_m2m_rows(through, field_name, other_field_name, keep_pk, duplicate_pks):
+    '''Point the through rows of the duplicates at the kept row, dropping the ones it already has'''
+    linked = set(through.objects.filter(**{f'{field_name}_id': keep_pk}).values_list(f'{other_field_name}_id', flat=True))
+    stale = []
+    for pk, other_pk in through.objects.filter(**{f'{field_name}_id__in': duplicate_pks}).values_list('pk', f'{other_field_name}_id'):
+        if other_pk in linked:
+            stale.append(pk)
+        else:
+            through.objects.filter(pk=pk).update(**{f'{field_name}_id': keep_pk})
+            linked.add(other_pk)
+    through.objects.filter(pk__in=stale).delete()
+
+
+def deduplicate_names(apps, schema_editor):
+    '''
+    Categories, sub-categories, brands and flavours that only differ in case are merged into the oldest row,
+    moving every product, sub-category and SKU link to it. Duplicate product names are renamed with their pk
+    because products carry SKUs, images and orders that must not be merged.
+    '''
+    Product = apps.get_model('products', 'Product')
+    Product_SKU = apps.get_model('products', 'Product_SKU')
+    Product_Category = apps.get_model('products', 'Product_Category')
+    Product_Sub_Category = apps.get_model('products', 'Product_Sub_Category')
+    Product_Brands = apps.get_model('products', 'Product_Brands')
+    Product_Flavours = apps.get_model('products', 'Product_Flavours')
+
+    for keep_pk, *duplicate_pks in duplicate_groups(Product_Category, 'category_name'):
+        move_m2m_rows(Product.product_category.through, 'product_category', 'product', keep_pk, duplicate_pks)
+        move_m2m_rows(Product_Sub_Category.category_id.through, 'product_category', 'product_sub_category', keep_pk, duplicate_pks)
+        Product_Category.objects.filter(pk__in=duplicate_pks).delete()
+
+    for keep_pk, *duplicate_pks in duplicate_groups(Product_Sub_Category, 'sub_category_name'):
+        move_m2m_rows(Product.product_sub_category.through, 'product_sub_category', 'product', keep_pk, duplicate_pks)
+        move_m2m_rows(Product_Sub_Category.category_id.through, 'product_sub_category', 'product_category', keep_pk, duplicate_pks)
+        Product_Sub_Category.objects.filter(pk__in=duplicate_pks).delete()
+
+    for keep_pk, *duplicate_pks in duplicate_groups(Product_Brands, 'brand_name'):
+        Product.objects.filter(product_brand_id__in=duplicate_pks).update(product_brand_id=keep_pk)
+        Product_Brands.objects.filter(pk__in=duplicate_pks).delete()
+
+    for keep_pk, *duplicate_pks in duplicate_groups(Product_Flavours, 'product_flavour_name'):
+        move_m2m_rows(Product_SKU.product_flavours.through, 'product_flavours', 'product_sku', keep_pk, duplicate_pks)
+        Product_Flavours.objects.filter(pk__in=duplicate_pks).delete()
+
+    for keep_pk, *duplicate_pks in duplicate_groups(Product, 'product_name'):
+        for product in Product.objects.filter(pk__in=duplicate_pks):
+            product.product_name = f"{product.product_name} ({product.pk})"
+            product.save(update_fields=['product_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_sku_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('product_name'), name='product_name_lower_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='product_brands',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('brand_name'), name='product_brand_name_lower_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='product_category',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('category_name'), name='product_category_name_lower_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='product_flavours',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('product_flavour_name'), name='product_flavour_name_lower_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='product_sub_category',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('sub_category_name'), name='product_sub_category_name_lower_unique'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:52
+
+import products.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_lower_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product_brands',
+            name='brand_logo_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product_images',
+            name='product_image_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product_brands',
+            name='brand_logo',
+            field=models.ImageField(blank=True, null=True, upload_to='brand_logos/'),
+        ),
+        migrations.AlterField(
+            model_name='product_images',
+            name='product_image',
+            field=models.ImageField(blank=True, null=True, upload_to=products.models.get_product_image_path),
+        ),
+    ]
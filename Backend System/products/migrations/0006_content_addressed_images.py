@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:55
+
+import products.models
+import system.content_storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product_brands',
+            name='brand_logo',
+            field=models.ImageField(blank=True, null=True, storage=system.content_storage.ContentAddressedStorage(), upload_to='brand_logos/'),
+        ),
+        migrations.AlterField(
+            model_name='product_images',
+            name='product_image',
+            field=models.ImageField(blank=True, null=True, storage=system.content_storage.ContentAddressedStorage(), upload_to=products.models.get_product_image_path),
+        ),
+    ]
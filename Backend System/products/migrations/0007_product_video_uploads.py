@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:58
+
+import django.db.models.deletion
+import system.content_storage
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product_videos',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product_videos',
+            name='poster',
+            field=models.ImageField(blank=True, null=True, storage=system.content_storage.ContentAddressedStorage(), upload_to='product_video_posters/'),
+        ),
+        migrations.CreateModel(
+            name='Product_Video_Upload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('file_name', models.CharField(max_length=255)),
+                ('color', models.CharField(max_length=100)),
+                ('size', models.CharField(max_length=100)),
+                ('total_size', models.BigIntegerField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('upload_status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+                ('product_video', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product_videos')),
+            ],
+            options={
+                'verbose_name': 'Product Video Upload',
+                'verbose_name_plural': 'Product Video Uploads',
+            },
+        ),
+    ]
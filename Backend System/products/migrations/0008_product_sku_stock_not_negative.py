@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+def clear_negative_stock(apps, schema_editor):
+    #read-modify-write updates could leave oversold SKUs below zero, the constraint needs them at zero first
+    Product_SKU = apps.get_model('products', 'Product_SKU')
+    Product_SKU.objects.filter(product_stock__lt=0).update(product_stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_video_uploads'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_negative_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product_sku',
+            constraint=models.CheckConstraint(check=models.Q(('product_stock__gte', 0)), name='product_sku_stock_not_negative'),
+        ),
+    ]
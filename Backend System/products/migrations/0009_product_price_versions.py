@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_sku_stock_not_negative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product_Price_Clock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Product Price Clock',
+                'verbose_name_plural': 'Product Price Clock',
+            },
+        ),
+        migrations.AddField(
+            model_name='product_sku',
+            name='price_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
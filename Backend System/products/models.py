@@ -1,11 +1,15 @@
-from django.db import models
-from django_resized import ResizedImageField
+from django.db import models, connection, transaction
 from django.utils import timezone
 from inventory.models import *
 from django.core.validators import MaxValueValidator
 from customer.models import Accounts
-from django_resized import ResizedImageField
 import hashlib
+from decimal import Decimal, InvalidOperation
+import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Lower
+from system.content_storage import content_addressed_storage
 
 # Create your models here.
 
@@ -22,6 +26,9 @@ class Product_Category(models.Model):
     class Meta:
         verbose_name="Product Category"
         verbose_name_plural="Product Categories"
+        constraints=[
+            models.UniqueConstraint(Lower('category_name'),name='product_category_name_lower_unique'),
+        ]
 
     def __str__(self) -> str:
         # returns the category pk when called via filter or get
@@ -43,6 +50,9 @@ class Product_Sub_Category(models.Model):
     class Meta:
         verbose_name="Product Sub-Category"
         verbose_name_plural="Product Sub-Categories"
+        constraints=[
+            models.UniqueConstraint(Lower('sub_category_name'),name='product_sub_category_name_lower_unique'),
+        ]
 
     def __str__(self) -> str:
         # returns the sub-category pk when called via filter or get
@@ -60,7 +70,8 @@ class Product_Brands(models.Model):
     brand_country=models.CharField(null=True,blank=True,max_length=100,verbose_name="Brand Origin Country")
     brand_description=models.TextField(null=True,blank=True,verbose_name="Brand Description")
     brand_established_year=models.IntegerField(null=False,blank=False)
-    brand_logo=ResizedImageField(size=[244,244],null=True,blank=True,upload_to='brand_logos/')
+    brand_logo=models.ImageField(null=True,blank=True,upload_to='brand_logos/',storage=content_addressed_storage)
+    brand_logo_variants=models.JSONField(blank=True,null=True)#resized copies made by system.image_pipeline
     is_own_brand=models.BooleanField(null=False,blank=False,default=False)
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
@@ -69,6 +80,9 @@ class Product_Brands(models.Model):
     class Meta:
         verbose_name="Brand"
         verbose_name_plural="Brands"
+        constraints=[
+            models.UniqueConstraint(Lower('brand_name'),name='product_brand_name_lower_unique'),
+        ]
 
     def __str__(self) -> str:
         return str(self.brand_name)
@@ -84,6 +98,9 @@ class Product_Flavours(models.Model):
     class Meta:
         verbose_name="Product Flavour"
         verbose_name_plural="Product Flavours"
+        constraints=[
+            models.UniqueConstraint(Lower('product_flavour_name'),name='product_flavour_name_lower_unique'),
+        ]
         
     def __str__(self):
         return str(self.pk)
@@ -102,6 +119,7 @@ class Product(models.Model):
     product_summary=models.TextField(null=False,blank=False)
     product_ingredients=models.TextField(null=True,blank=True)
     product_usage_direction=models.TextField(null=True,blank=True)
+    search_vector=SearchVectorField(null=True,blank=True,editable=False)#maintained by products.product_search.ProductSearch
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
     updated_by = models.JSONField(blank=True, null=True)
@@ -109,6 +127,14 @@ class Product(models.Model):
     class Meta:
         verbose_name="Product"
         verbose_name_plural="Products"
+        constraints=[
+            models.UniqueConstraint(Lower('product_name'),name='product_name_lower_unique'),
+        ]
+        #GIN indexes are only created on PostgreSQL, see migration 0002_product_search_vector
+        indexes=[
+            GinIndex(fields=['search_vector'],name='product_search_vector_gin'),
+            GinIndex(fields=['product_name'],name='product_name_trgm_gin',opclasses=['gin_trgm_ops']),
+        ]
         
     def __str__(self) -> str:
         return self.product_name
@@ -125,6 +151,8 @@ class Product_SKU(models.Model):
     product_size = models.CharField(null=True, blank=True, max_length=100)
     product_price=models.DecimalField(null=False,blank=False,default=0,max_digits=50,decimal_places=2)
     product_stock = models.IntegerField(null=False, blank=False, default=0)
+    #Product_Price_Clock value of the last change of the price or of a discount of the product, see orders.cart_management
+    price_version = models.BigIntegerField(null=False, blank=False, default=0)
     product_flavours=models.ManyToManyField(Product_Flavours,related_name='product_flavour')
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
@@ -133,53 +161,217 @@ class Product_SKU(models.Model):
     class Meta:
         verbose_name="Product SKU"
         verbose_name_plural="Products SKU"
+        constraints = [
+            #stock is only ever changed with F() expressions, the database refuses to oversell
+            models.CheckConstraint(check=models.Q(product_stock__gte=0),name='product_sku_stock_not_negative'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #remember the loaded values so save() can tell if the SKU code must change without querying again
+        if 'product_color' in instance.__dict__ and 'product_size' in instance.__dict__:
+            instance._loaded_sku_fields = instance._sku_fields()
+        if 'product_price' in instance.__dict__:
+            instance._loaded_price = instance.product_price
+        return instance
+
+    def _sku_fields(self):
+        return (self.product_color, self.product_size)
 
     def generate_and_save_sku(self):
-        # Filter existing SKUs with the same product, color, and size
-        existing_skus = Product_SKU.objects.filter(
-            product_id=self.product_id,
-            product_color=self.product_color,
-            product_size=self.product_size
-        ).count()
-        
-        sequential_number = existing_skus + 1
-
-        product_name = self.product_id.product_name.replace(' ', '_')
-        base_sku = f"{product_name.upper()}_{self.product_color.upper() if self.product_color else 'no_color'.upper()}_{self.product_size.upper() if self.product_size else 'no_size'.upper()}_{sequential_number}"
+        #the sequence number is taken from the per product, color and size counter in one atomic statement
+        key = Product_SKU_Sequence.key(self.product_id_id,self.product_color,self.product_size)
+        sequential_number = Product_SKU_Sequence.allocate({key: 1})[key]
+        self.product_sku = Product_SKU.build_sku_code(self.product_id.product_name,self.product_color,self.product_size,sequential_number)
+
+    @staticmethod
+    def build_sku_code(product_name,product_color,product_size,sequential_number):
+        '''Format a SKU code: NAME_COLOR_SIZE_N followed by a short hash of that base'''
+        product_name = product_name.replace(' ', '_')
+        base_sku = f"{product_name.upper()}_{product_color.upper() if product_color else 'no_color'.upper()}_{product_size.upper() if product_size else 'no_size'.upper()}_{sequential_number}"
         unique_hash = hashlib.md5(base_sku.encode()).hexdigest()[:6]
-        self.product_sku = f"{base_sku}_{unique_hash.upper()}"
+        return f"{base_sku}_{unique_hash.upper()}"
+
+    @staticmethod
+    def assign_sku_codes(product_skus,product_names=None):
+        '''
+        Set `product_sku` on unsaved SKUs before `bulk_create`, which skips `save()`.
+
+        Sequence numbers for every product, color and size in the batch are allocated with one statement.
+        `product_names` maps product pk to name; when omitted the name is read from `product_id`.
+        '''
+        requests = {}
+        for product_sku in product_skus:
+            key = Product_SKU_Sequence.key(product_sku.product_id_id,product_sku.product_color,product_sku.product_size)
+            requests[key] = requests.get(key,0) + 1
+        last_numbers = Product_SKU_Sequence.allocate(requests)
+        #allocate returns the last number of each block, the block is handed out in order
+        next_numbers = {key: last_numbers[key] - count + 1 for key, count in requests.items()}
+        for product_sku in product_skus:
+            key = Product_SKU_Sequence.key(product_sku.product_id_id,product_sku.product_color,product_sku.product_size)
+            product_name = product_names[product_sku.product_id_id] if product_names else product_sku.product_id.product_name
+            product_sku.product_sku = Product_SKU.build_sku_code(product_name,product_sku.product_color,product_sku.product_size,next_numbers[key])
+            next_numbers[key] += 1
+        return product_skus
 
     def save(self, *args, **kwargs):
         #if newly created only then
         if not self.pk or self._is_sku_related_field_updated():
             self.generate_and_save_sku()
-        
-        super(Product_SKU, self).save(*args, **kwargs)
+
+        if self.pk and self._is_price_updated():
+            #the clock tick commits with the new price, a cart that sees the new version also sees the price
+            with transaction.atomic():
+                self.price_version = Product_Price_Clock.tick()
+                super(Product_SKU, self).save(*args, **kwargs)
+        else:
+            super(Product_SKU, self).save(*args, **kwargs)
+        self._loaded_sku_fields = self._sku_fields()
+        self._loaded_price = self.product_price
     
+    def _is_price_updated(self):
+        #views pass the price as a string, "150" and Decimal("150.00") are the same price
+        loaded = getattr(self, '_loaded_price', None)
+        try:
+            return loaded is None or Decimal(str(self.product_price)) != loaded
+        except InvalidOperation:
+            return True
+
     def _is_sku_related_field_updated(self):
         """Check if fields affecting SKU generation have been updated."""
         if not self.pk:
             return False
 
-        # Get the current state from the database
-        current = Product_SKU.objects.get(pk=self.pk)
-        return (
-            current.product_color != self.product_color or
-            current.product_size != self.product_size
-        )
+        # Compare with the values loaded from the database, only instances built by hand or loaded with deferred fields query again
+        loaded = getattr(self, '_loaded_sku_fields', None)
+        if loaded is None:
+            loaded = Product_SKU.objects.filter(pk=self.pk).values_list('product_color','product_size').first()
+        return loaded != self._sku_fields()
     
 
     def __str__(self) -> str:
         return f"pk:{self.pk} - {self.product_id.product_name}, sku - {self.product_sku}"
 
 
+class Product_SKU_Sequence(models.Model):
+
+    '''Last SKU sequence number handed out for every product, color and size. Empty strings stand for no color or size'''
+
+    product_id = models.ForeignKey(Product, null=False, blank=False, on_delete=models.CASCADE)
+    product_color = models.CharField(null=False, blank=True, default='', max_length=100)
+    product_size = models.CharField(null=False, blank=True, default='', max_length=100)
+    last_number = models.PositiveIntegerField(null=False, blank=False, default=0)
+
+    class Meta:
+        verbose_name="Product SKU Sequence"
+        verbose_name_plural="Product SKU Sequences"
+        constraints = [
+            models.UniqueConstraint(fields=['product_id','product_color','product_size'],name='product_sku_sequence_unique'),
+        ]
+
+    @staticmethod
+    def key(product_pk,product_color,product_size):
+        return (product_pk, product_color or '', product_size or '')
+
+    @staticmethod
+    def allocate(requests):
+        '''
+        Reserve sequence numbers and return the last number of each reserved block.
+
+        `requests` maps `key(product_pk, color, size)` to how many numbers are needed. On PostgreSQL and SQLite
+        every counter is created or incremented with a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+        so concurrent creates never receive the same number. Other databases increment each counter with an
+        F() expression under a row lock.
+        '''
+        if not requests:
+            return {}
+        if connection.vendor == 'postgresql' or (connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)):
+            table = connection.ops.quote_name(Product_SKU_Sequence._meta.db_table)
+            placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(requests))
+            params = [value for key, count in requests.items() for value in (*key, count)]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (product_id_id, product_color, product_size, last_number) VALUES {placeholders} "
+                    f"ON CONFLICT (product_id_id, product_color, product_size) "
+                    f"DO UPDATE SET last_number = {table}.last_number + EXCLUDED.last_number "
+                    f"RETURNING product_id_id, product_color, product_size, last_number",
+                    params,
+                )
+                return {(product_pk, color, size): last_number for product_pk, color, size, last_number in cursor.fetchall()}
+
+        last_numbers = {}
+        with transaction.atomic():
+            for (product_pk, color, size), count in requests.items():
+                sequence, created = Product_SKU_Sequence.objects.select_for_update().get_or_create(
+                    product_id_id=product_pk, product_color=color, product_size=size)
+                Product_SKU_Sequence.objects.filter(pk=sequence.pk).update(last_number=models.F('last_number') + count)
+                last_numbers[(product_pk, color, size)] = sequence.last_number + count
+        return last_numbers
+
+
+class Product_Price_Clock(models.Model):
+
+    '''
+    Single row counter that ticks whenever a SKU price or a product discount changes.
+
+    The changed SKUs get the new value as their `price_version`. A cart remembers the value it was priced at,
+    so reading it only has to compare one number to know if any price may have changed since
+    (orders.cart_management), and then only re-prices the SKUs stamped after it.
+    '''
+
+    version = models.BigIntegerField(null=False, blank=False, default=0)
+
+    class Meta:
+        verbose_name="Product Price Clock"
+        verbose_name_plural="Product Price Clock"
+
+    @staticmethod
+    def current():
+        return Product_Price_Clock.objects.filter(pk=1).values_list('version',flat=True).first() or 0
+
+    @staticmethod
+    def tick():
+        '''
+        Advance the clock and return the new value. Call it in the transaction that changes the prices.
+
+        On PostgreSQL and SQLite the row is created or incremented with one INSERT ... ON CONFLICT DO UPDATE ...
+        RETURNING, the row lock orders concurrent price changes. Other databases increment it under a row lock.
+        '''
+        if connection.vendor == 'postgresql' or (connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)):
+            table = connection.ops.quote_name(Product_Price_Clock._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (id, version) VALUES (1, 1) "
+                    f"ON CONFLICT (id) DO UPDATE SET version = {table}.version + 1 RETURNING version"
+                )
+                return cursor.fetchone()[0]
+        with transaction.atomic():
+            clock, created = Product_Price_Clock.objects.select_for_update().get_or_create(pk=1)
+            Product_Price_Clock.objects.filter(pk=1).update(version=models.F('version') + 1)
+            return clock.version + 1
+
+    @staticmethod
+    def stamp(product_pks):
+        '''Tick the clock and stamp every SKU of the products with it, e.g. after a change of their discounts'''
+        product_pks = [pk for pk in set(product_pks) if pk]
+        if not product_pks:
+            return None
+        with transaction.atomic():
+            version = Product_Price_Clock.tick()
+            Product_SKU.objects.filter(product_id__in=product_pks).update(price_version=version)
+        return version
+
+
 def get_product_image_path(instance, filename):
-    return f'product_images/{instance.product_id.product_name}/{filename}'
+    #the storage names the file after its content hash, identical pictures of different products share one file
+    return f'product_images/{filename}'
 class Product_Images(models.Model):
-    '''This table stores the pictures of the Product. Pictures are stored locally in the product_images/{product_pk}/ folder'''
+    '''This table stores the pictures of the Product. Pictures are stored locally in the product_images/ folder under their content hash'''
 
     product_id=models.ForeignKey(Product,null=False,blank=False,on_delete=models.CASCADE)
-    product_image=ResizedImageField(size=[632,632],upload_to=get_product_image_path,blank=True, null=True)
+    product_image=models.ImageField(upload_to=get_product_image_path,storage=content_addressed_storage,blank=True, null=True)#original upload, resized by system.image_pipeline
+    product_image_variants=models.JSONField(blank=True,null=True)#urls of the thumbnail, card and detail sizes in every format
     color = models.CharField(null=True, blank=True, max_length=100)
     size = models.CharField(null=True, blank=True, max_length=100)
     created_at=models.DateTimeField(auto_now_add=True)
@@ -200,6 +392,8 @@ class Product_Videos(models.Model):
 
     product_id=models.ForeignKey(Product,null=False,blank=False,on_delete=models.CASCADE)
     product_videos=models.FileField(upload_to = get_product_video_path,blank=True, null=True)
+    poster=models.ImageField(upload_to='product_video_posters/',storage=content_addressed_storage,blank=True,null=True)#frame extracted by system.video_pipeline
+    duration=models.FloatField(blank=True,null=True)#seconds, extracted by system.video_pipeline
     color = models.CharField(null=False, blank=False, max_length=100)
     size = models.CharField(null=False, blank=False, max_length=100)
     created_at=models.DateTimeField(auto_now_add=True)
@@ -212,6 +406,39 @@ class Product_Videos(models.Model):
     
     def __str__(self):
         return str(self.product_id.product_name)
+
+class Product_Video_Upload(models.Model):
+    '''
+    A resumable, chunked upload of a product video (products.video_upload).
+
+    Chunks are written to storage under product_video_uploads/{upload_id}/ as they arrive, `received_bytes` is the
+    offset the next chunk must start at. Finalising joins the chunks into a `Product_Videos` row.
+    '''
+    UPLOAD_STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+
+    upload_id=models.UUIDField(default=uuid.uuid4,unique=True,editable=False)
+    product_id=models.ForeignKey(Product,null=False,blank=False,on_delete=models.CASCADE)
+    file_name=models.CharField(null=False,blank=False,max_length=255)
+    color = models.CharField(null=False, blank=False, max_length=100)
+    size = models.CharField(null=False, blank=False, max_length=100)
+    total_size=models.BigIntegerField(null=False,blank=False)
+    checksum=models.CharField(null=False,blank=False,max_length=64)#sha256 of the whole file, hex
+    received_bytes=models.BigIntegerField(default=0)
+    upload_status=models.CharField(max_length=20,choices=UPLOAD_STATUS_CHOICES,default='uploading')
+    product_video=models.OneToOneField(Product_Videos,null=True,blank=True,on_delete=models.SET_NULL)
+    created_at=models.DateTimeField(auto_now_add=True)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name="Product Video Upload"
+        verbose_name_plural="Product Video Uploads"
+
+    def __str__(self):
+        return str(self.upload_id)
     
 class Product_Discount(models.Model):
     ''''This table stores all the discounts of a product'''
@@ -229,6 +456,26 @@ class Product_Discount(models.Model):
         verbose_name="Product Discount"
         verbose_name_plural="Product Discounts"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #a discount moved to another product changes the prices of both
+        instance._loaded_product_pk = instance.__dict__.get('product_id_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Product_Price_Clock.stamp([self.product_id_id, getattr(self, '_loaded_product_pk', None)])
+        self._loaded_product_pk = self.product_id_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            product_pk = self.product_id_id
+            deleted = super().delete(*args, **kwargs)
+            Product_Price_Clock.stamp([product_pk])
+        return deleted
+
     def __str__(self):
         return f"{self.product_id.product_name} - {self.discount_amount}. Discount duration - {self.start_date} - {self.end_date}"
     
@@ -0,0 +1,171 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .models import Product, Product_SKU, Product_Discount
+
+
+class _Echo:
+    '''File-like object whose `write` returns the value, so `csv.writer` can produce lines for a generator'''
+
+    def write(self, value):
+        return value
+
+
+class ProductExport:
+
+    '''
+    Streams the whole catalogue as CSV, JSONL or a columnar JSON format with constant memory.
+
+    The export is one row per SKU (products without SKUs get one row with empty SKU columns) joining product,
+    brand and the product's best active discount in SQL. Rows are read with a server-side cursor through
+    `QuerySet.iterator(chunk_size=...)`; for every chunk the categories, sub-categories and flavours are read
+    with one query each, so memory and the number of queries per chunk do not depend on catalogue size.
+
+    The column names match the ones read by `ProductImporter`, so a CSV or JSONL export can be imported
+    into another database.
+
+    Example Usage:
+        for data in ProductExport.generate('csv'):
+            output.write(data)
+    '''
+
+    FORMATS = ('csv', 'jsonl', 'columnar')
+    CONTENT_TYPES = {
+        'csv': 'text/csv',
+        'jsonl': 'application/x-ndjson',
+        'columnar': 'application/x-ndjson',
+    }
+    CHUNK_SIZE = 2000
+    LIST_SEPARATOR = '|'
+
+    #column name and type, the type is only reported in the columnar schema
+    COLUMNS = [
+        ('product_id', 'int'), ('product_name', 'str'), ('product_description', 'str'), ('product_summary', 'str'),
+        ('product_ingredients', 'str'), ('product_usage_direction', 'str'), ('brand', 'str'),
+        ('categories', 'list'), ('sub_categories', 'list'), ('sku_id', 'int'), ('sku', 'str'), ('color', 'str'),
+        ('size', 'str'), ('price', 'decimal'), ('stock', 'int'), ('flavours', 'list'),
+        ('discount_name', 'str'), ('discount_amount', 'decimal'),
+    ]
+
+    def queryset():
+        '''Lazy QuerySet of export rows (one per SKU), ordered so a server-side cursor can stream it'''
+        now = timezone.now()
+        active_discounts = Product_Discount.objects.filter(
+            product_id=OuterRef('pk'), start_date__lte=now, end_date__gte=now,
+        ).order_by('-discount_amount', 'pk')
+        return Product.objects.annotate(
+            discount_name=Subquery(active_discounts.values('discount_name')[:1]),
+            discount_amount=Subquery(active_discounts.values('discount_amount')[:1]),
+        ).order_by('pk', 'product_sku__pk').values(
+            'pk', 'product_name', 'product_description', 'product_summary', 'product_ingredients',
+            'product_usage_direction', 'product_brand__brand_name', 'product_sku__pk', 'product_sku__product_sku',
+            'product_sku__product_color', 'product_sku__product_size', 'product_sku__product_price',
+            'product_sku__product_stock', 'discount_name', 'discount_amount',
+        )
+
+    def _names_by(through_queryset, key_field, name_field):
+        names = defaultdict(list)
+        for key, name in through_queryset.order_by(name_field).values_list(key_field, name_field):
+            names[key].append(name)
+        return names
+
+    def rows(chunk_size=None):
+        """
+        Yield export rows as dicts keyed by the names in `COLUMNS`.
+
+        Args:
+            chunk_size (int, optional): Rows fetched per round trip of the server-side cursor. Defaults to `CHUNK_SIZE`.
+        """
+        chunk_size = chunk_size or ProductExport.CHUNK_SIZE
+        rows = ProductExport.queryset().iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            product_pks = {row['pk'] for row in chunk}
+            sku_pks = {row['product_sku__pk'] for row in chunk if row['product_sku__pk'] is not None}
+            categories = ProductExport._names_by(Product.product_category.through.objects.filter(product_id__in=product_pks),
+                                                 'product_id', 'product_category__category_name')
+            sub_categories = ProductExport._names_by(Product.product_sub_category.through.objects.filter(product_id__in=product_pks),
+                                                     'product_id', 'product_sub_category__sub_category_name')
+            flavours = ProductExport._names_by(Product_SKU.product_flavours.through.objects.filter(product_sku_id__in=sku_pks),
+                                               'product_sku_id', 'product_flavours__product_flavour_name') if sku_pks else {}
+            for row in chunk:
+                yield {
+                    'product_id': row['pk'],
+                    'product_name': row['product_name'],
+                    'product_description': row['product_description'],
+                    'product_summary': row['product_summary'],
+                    'product_ingredients': row['product_ingredients'],
+                    'product_usage_direction': row['product_usage_direction'],
+                    'brand': row['product_brand__brand_name'],
+                    'categories': categories.get(row['pk'], []),
+                    'sub_categories': sub_categories.get(row['pk'], []),
+                    'sku_id': row['product_sku__pk'],
+                    'sku': row['product_sku__product_sku'],
+                    'color': row['product_sku__product_color'],
+                    'size': row['product_sku__product_size'],
+                    'price': row['product_sku__product_price'],
+                    'stock': row['product_sku__product_stock'],
+                    'flavours': flavours.get(row['product_sku__pk'], []),
+                    'discount_name': row['discount_name'],
+                    'discount_amount': row['discount_amount'],
+                }
+
+    def _json_value(value):
+        return str(value) if value is not None and not isinstance(value, (int, str, list)) else value
+
+    def generate(file_format, chunk_size=None):
+
+        """
+        Yield the export as text pieces, ready for `StreamingHttpResponse` or a file.
+
+        Args:
+            file_format (str): `csv`, `jsonl` or `columnar`.
+                - csv: a header line then one line per row. List columns are joined with `|`.
+                - jsonl: one JSON object per row.
+                - columnar: a schema line `{"schema": [{"name", "type"}]}`, then one line per chunk of rows
+                  (a row group) holding a list of values for every column, like the row groups of a Parquet file.
+            chunk_size (int, optional): Rows per cursor round trip and per columnar row group.
+
+        Raises:
+            ValueError: If `file_format` is not supported.
+
+        Example Usage:
+            response = StreamingHttpResponse(ProductExport.generate('jsonl'), content_type='application/x-ndjson')
+        """
+        if file_format not in ProductExport.FORMATS:
+            raise ValueError(f"Unsupported export format {file_format}. Use one of {', '.join(ProductExport.FORMATS)}")
+        names = [name for name, _ in ProductExport.COLUMNS]
+        rows = ProductExport.rows(chunk_size)
+        return getattr(ProductExport, f'_generate_{file_format}')(names, rows, chunk_size or ProductExport.CHUNK_SIZE)
+
+    def _generate_csv(names, rows, chunk_size):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([
+                ProductExport.LIST_SEPARATOR.join(row[name]) if isinstance(row[name], list) else row[name]
+                for name in names
+            ])
+
+    def _generate_jsonl(names, rows, chunk_size):
+        for row in rows:
+            yield json.dumps({name: ProductExport._json_value(row[name]) for name in names}) + '\n'
+
+    def _generate_columnar(names, rows, chunk_size):
+        yield json.dumps({'schema': [{'name': name, 'type': column_type} for name, column_type in ProductExport.COLUMNS]}) + '\n'
+        row_group = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield json.dumps({
+                'row_group': row_group,
+                'num_rows': len(chunk),
+                'columns': {name: [ProductExport._json_value(row[name]) for row in chunk] for name in names},
+            }) + '\n'
+            row_group += 1
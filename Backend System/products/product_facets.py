@@ -0,0 +1,199 @@
+import hashlib
+import json
+from decimal import Decimal
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError
+from django.db.models import Count, Q
+from .models import Product, Product_SKU
+from .catalogue_cache import CatalogueCache
+from .product_management import ManageProducts
+from .product_search import ProductSearch
+from system.manage_error_log import ManageErrorLog
+
+
+class ProductFacets:
+
+    '''
+    Facet counts (category, sub-category, brand, flavour, colour, size, price band) for storefront filters.
+
+    Every facet is computed with one grouped SQL query, so a full facet response costs a fixed number of
+    queries regardless of catalogue size. Facets are disjunctive: the counts of a facet apply every selected
+    filter except the facet's own, so the user can still see how many products each other value would add.
+    Results are cached in `CatalogueCache` and invalidated by any catalogue write.
+    '''
+
+    #upper bounds of the price bands, the last band is open ended
+    PRICE_BANDS = [Decimal('500'), Decimal('1000'), Decimal('2000'), Decimal('5000')]
+
+    def _sku_condition(filters, exclude=None):
+        '''Q object on Product_SKU for the SKU level filters (flavour, colour, size, price)'''
+        condition = Q()
+        if filters.get('flavour') and exclude != 'flavour':
+            condition &= Q(product_flavours__in=filters['flavour'])
+        if filters.get('color') and exclude != 'color':
+            condition &= Q(product_color__in=filters['color'])
+        if filters.get('size') and exclude != 'size':
+            condition &= Q(product_size__in=filters['size'])
+        if exclude != 'price':
+            if filters.get('min_price') is not None:
+                condition &= Q(product_price__gte=filters['min_price'])
+            if filters.get('max_price') is not None:
+                condition &= Q(product_price__lte=filters['max_price'])
+        return condition
+
+    def filtered_products(filters, exclude=None, validate_pks=False):
+
+        """
+        Build the lazy product QuerySet matching `filters`, optionally ignoring one facet.
+
+        Args:
+            filters (dict): Selected filters. Keys: `category`, `sub_category`, `brand`, `flavour` (lists of pks),
+                `color`, `size` (lists of strings), `min_price`, `max_price` (Decimal) and `query` (search text).
+            exclude (str, optional): Facet whose own filter is ignored, used for disjunctive counts.
+            validate_pks (bool, optional): Check that the filtered categories, sub-categories and brands exist.
+
+        Returns:
+            QuerySet: Unevaluated `Product` QuerySet.
+        """
+        products = ManageProducts.build_product_filter_queryset(
+            product_category_pk_list=filters.get('category') if exclude != 'category' else None,
+            product_sub_category_pk_list=filters.get('sub_category') if exclude != 'sub_category' else None,
+            product_brand_pk_list=filters.get('brand') if exclude != 'brand' else None,
+            validate_pks=validate_pks,
+        )
+        sku_condition = ProductFacets._sku_condition(filters, exclude)
+        if sku_condition:
+            products = products.filter(pk__in=Product_SKU.objects.filter(sku_condition).values('product_id'))
+        if filters.get('query'):
+            products = products.filter(ProductSearch.search_condition(filters['query']))
+        return products
+
+    def _price_bands():
+        bands = []
+        lower = Decimal('0')
+        for upper in ProductFacets.PRICE_BANDS:
+            bands.append((lower, upper))
+            lower = upper
+        bands.append((lower, None))
+        return bands
+
+    def _compute_facets(filters):
+        facets = {}
+        #the pks are validated once here, the per facet querysets skip the check
+        products = ProductFacets.filtered_products(filters, validate_pks=True)
+        facets['total'] = products.count()
+
+        category_rows = Product.product_category.through.objects.filter(
+            product_id__in=ProductFacets.filtered_products(filters, 'category').values('pk')
+        ).values('product_category_id', 'product_category__category_name').annotate(
+            count=Count('product_id', distinct=True)).order_by('product_category__category_name')
+        facets['categories'] = [{'id': r['product_category_id'], 'name': r['product_category__category_name'], 'count': r['count']}
+                                for r in category_rows]
+
+        sub_category_rows = Product.product_sub_category.through.objects.filter(
+            product_id__in=ProductFacets.filtered_products(filters, 'sub_category').values('pk')
+        ).values('product_sub_category_id', 'product_sub_category__sub_category_name').annotate(
+            count=Count('product_id', distinct=True)).order_by('product_sub_category__sub_category_name')
+        facets['sub_categories'] = [{'id': r['product_sub_category_id'], 'name': r['product_sub_category__sub_category_name'], 'count': r['count']}
+                                    for r in sub_category_rows]
+
+        brand_rows = ProductFacets.filtered_products(filters, 'brand').filter(product_brand__isnull=False).values(
+            'product_brand_id', 'product_brand__brand_name').annotate(count=Count('pk')).order_by('product_brand__brand_name')
+        facets['brands'] = [{'id': r['product_brand_id'], 'name': r['product_brand__brand_name'], 'count': r['count']}
+                            for r in brand_rows]
+
+        flavour_rows = Product_SKU.product_flavours.through.objects.filter(
+            product_sku__product_id__in=ProductFacets.filtered_products(filters, 'flavour').values('pk'),
+        )
+        flavour_sku_condition = ProductFacets._sku_condition(filters, 'flavour')
+        if flavour_sku_condition:
+            flavour_rows = flavour_rows.filter(product_sku__in=Product_SKU.objects.filter(flavour_sku_condition).values('pk'))
+        flavour_rows = flavour_rows.values('product_flavours_id', 'product_flavours__product_flavour_name').annotate(
+            count=Count('product_sku__product_id', distinct=True)).order_by('product_flavours__product_flavour_name')
+        facets['flavours'] = [{'id': r['product_flavours_id'], 'name': r['product_flavours__product_flavour_name'], 'count': r['count']}
+                              for r in flavour_rows]
+
+        for facet, field, key in (('color', 'product_color', 'colors'), ('size', 'product_size', 'sizes')):
+            rows = Product_SKU.objects.filter(
+                ProductFacets._sku_condition(filters, facet),
+                product_id__in=ProductFacets.filtered_products(filters, facet).values('pk'),
+            ).exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values(field).annotate(
+                count=Count('product_id', distinct=True)).order_by(field)
+            facets[key] = [{'value': r[field], 'count': r['count']} for r in rows]
+
+        #every price band is a filtered COUNT in one aggregate query
+        bands = ProductFacets._price_bands()
+        band_counts = Product_SKU.objects.filter(
+            ProductFacets._sku_condition(filters, 'price'),
+            product_id__in=ProductFacets.filtered_products(filters, 'price').values('pk'),
+        ).aggregate(**{
+            f'band_{i}': Count('product_id', distinct=True,
+                               filter=Q(product_price__gte=lower) & (Q(product_price__lt=upper) if upper is not None else Q()))
+            for i, (lower, upper) in enumerate(bands)
+        })
+        facets['price_bands'] = [{'min': str(lower), 'max': str(upper) if upper is not None else None, 'count': band_counts[f'band_{i}']}
+                                 for i, (lower, upper) in enumerate(bands)]
+        return facets
+
+    def _cache_key(filters):
+        '''Facets include names of categories, sub-categories, brands and flavours, so their versions are part of the key'''
+        versions = [CatalogueCache.get_version(entity) for entity in (CatalogueCache.PRODUCT_CATEGORY, CatalogueCache.PRODUCT_SUB_CATEGORY,
+                                                                     CatalogueCache.PRODUCT_BRAND, CatalogueCache.PRODUCT_FLAVOUR)]
+        normalised = {key: sorted(value) if isinstance(value, (list, set, tuple)) else value for key, value in filters.items() if value}
+        digest = hashlib.sha1(json.dumps(normalised, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return f"facets:{digest}:{':'.join(str(v) for v in versions)}"
+
+    def fetch_facets(filters=None):
+
+        """
+        Compute the facet counts for the given filter set.
+
+        Args:
+            filters (dict, optional): Selected filters, see `filtered_products`. Defaults to no filter.
+
+        Returns:
+            tuple:
+                - dict or bool: `total` plus lists for `categories`, `sub_categories`, `brands`, `flavours`, `colors`,
+                  `sizes` and `price_bands`, each entry carrying a `count`. `False` if an error occurs.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            facets, message = ProductFacets.fetch_facets({'category': [1], 'min_price': Decimal('100')})
+            for brand in facets['brands']:
+                print(brand['name'], brand['count'])
+
+        Exception Handling:
+            - **DoesNotExist**: Raised when a filtered category, sub-category or brand does not exist.
+                Message: "An unexpected error occurred while fetching product facets! Please try again later."
+            - **DatabaseError**: Catches general database-related issues.
+                Message: "An unexpected error in Database occurred while fetching product facets! Please try again later."
+            - **OperationalError**: Handles server-related issues such as connection problems.
+                Message: "An unexpected error in server occurred while fetching product facets! Please try again later."
+            - **ProgrammingError**: Catches programming errors such as invalid queries.
+                Message: "An unexpected error in server occurred while fetching product facets! Please try again later."
+            - **Exception**: A catch-all for any other unexpected errors.
+                Message: "An unexpected error occurred while fetching product facets! Please try again later."
+
+        Notes:
+            - Uncached, the function runs one query per facet plus one for the total, and one existence check
+              per filtered category, sub-category and brand list.
+            - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
+        """
+        try:
+            filters = filters or {}
+            facets = CatalogueCache.get_or_set(CatalogueCache.PRODUCT, ProductFacets._cache_key(filters),
+                                               lambda: ProductFacets._compute_facets(filters))
+            return facets, "Product facets fetched successfully!"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            # Log the error
+            error_type = type(error).__name__  # Get the name of the error as a string
+            error_message = str(error)
+            ManageErrorLog.log_error(error_type, error_message)
+            print(f"{error_type} occurred: {error_message}")
+
+            # Return appropriate messages based on the error type
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while fetching product facets! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while fetching product facets! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while fetching product facets! Please try again later.",
+            }
+            return False, error_messages.get(error_type, "An unexpected error occurred while fetching product facets! Please try again later.")
@@ -0,0 +1,222 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from django.db import transaction, DatabaseError, OperationalError, IntegrityError, ProgrammingError
+from django.db.models.functions import Lower
+from .models import Product, Product_SKU, Product_Category, Product_Sub_Category, Product_Brands, Product_Flavours
+from .catalogue_cache import CatalogueCache
+from .product_search import ProductSearch
+from system.manage_error_log import ManageErrorLog
+
+
+class ProductImporter:
+
+    '''
+    Streams a CSV or JSONL catalogue file into the database with batched inserts.
+
+    Every row describes one SKU. Rows sharing a `product_name` belong to the same product, which is created
+    with the first of them. Columns:
+
+        product_name, product_description, product_summary, product_ingredients, product_usage_direction,
+        brand, categories, sub_categories, color, size, price, stock, flavours
+
+    `brand`, `categories`, `sub_categories` and `flavours` are names (several separated by `|`) resolved
+    against lookup maps loaded once per import. Rows are processed in chunks; each chunk is inserted with
+    `bulk_create` for products, SKUs and the M2M through tables inside one transaction. Invalid rows are
+    skipped and reported with their row number, the rest of the file is still imported.
+
+    Example Usage:
+        with open('catalogue.csv', newline='') as file:
+            result = ProductImporter().import_file(file, 'csv')
+        print(result['products_created'], result['errors'])
+    '''
+
+    FORMATS = ('csv', 'jsonl')
+    LIST_SEPARATOR = '|'
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.categories = self._lookup_map(Product_Category, 'category_name')
+        self.sub_categories = self._lookup_map(Product_Sub_Category, 'sub_category_name')
+        self.brands = self._lookup_map(Product_Brands, 'brand_name')
+        self.flavours = self._lookup_map(Product_Flavours, 'product_flavour_name')
+        #products created by this import, by lower case name, so later chunks can add SKUs to them
+        self.imported_products = {}
+        self.result = {'rows': 0, 'products_created': 0, 'skus_created': 0, 'errors': []}
+
+    def _lookup_map(self, model, name_field):
+        return {name.lower(): pk for pk, name in model.objects.values_list('pk', name_field)}
+
+    def read_rows(self, file, file_format):
+        '''Yield `(row_number, row)` from a text stream without loading the whole file'''
+        if file_format == 'csv':
+            for row_number, row in enumerate(csv.DictReader(file), start=1):
+                yield row_number, row
+        elif file_format == 'jsonl':
+            for row_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield row_number, row if isinstance(row, dict) else {'_invalid': 'Row is not a JSON object'}
+        else:
+            raise ValueError(f"Unsupported import format {file_format}. Use one of {', '.join(ProductImporter.FORMATS)}")
+
+    def import_file(self, file, file_format):
+
+        """
+        Import every row of `file` and return a summary.
+
+        Args:
+            file: Text stream (or binary stream, decoded as UTF-8) of the catalogue.
+            file_format (str): `csv` or `jsonl`.
+
+        Returns:
+            dict: `rows` read, `products_created`, `skus_created` and `errors`, a list of `{'row': n, 'error': message}`.
+        """
+        if isinstance(file, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(file, 'mode', ''):
+            file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        chunk = []
+        for row_number, row in self.read_rows(file, file_format):
+            self.result['rows'] += 1
+            chunk.append((row_number, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        if self.result['products_created'] or self.result['skus_created']:
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
+        return self.result
+
+    def _error(self, row_number, message):
+        self.result['errors'].append({'row': row_number, 'error': message})
+
+    def _names(self, value):
+        if isinstance(value, list):
+            return [str(v).strip() for v in value if str(v).strip()]
+        return [v.strip() for v in str(value or '').split(ProductImporter.LIST_SEPARATOR) if v.strip()]
+
+    def _resolve(self, lookup, names, label):
+        missing = [name for name in names if name.lower() not in lookup]
+        if missing:
+            raise ValueError(f"Unknown {label}: {', '.join(missing)}")
+        return [lookup[name.lower()] for name in names]
+
+    def _clean_row(self, row):
+        '''Validate a row and resolve its names to primary keys. Raises ValueError with a readable message'''
+        if '_invalid' in row:
+            raise ValueError(row['_invalid'])
+        product_name = str(row.get('product_name') or '').strip()
+        if not product_name:
+            raise ValueError("product_name is required")
+        try:
+            price = Decimal(str(row.get('price') or '0'))
+            stock = int(row.get('stock') or 0)
+        except (InvalidOperation, ValueError):
+            raise ValueError("price must be a number and stock an integer")
+        if price < 0 or stock < 0:
+            raise ValueError("price and stock must not be negative")
+        brand_names = self._names(row.get('brand'))
+        return {
+            'product_name': product_name,
+            'product_description': str(row.get('product_description') or '').strip(),
+            'product_summary': str(row.get('product_summary') or '').strip(),
+            'product_ingredients': str(row.get('product_ingredients') or '').strip() or None,
+            'product_usage_direction': str(row.get('product_usage_direction') or '').strip() or None,
+            'brand': self._resolve(self.brands, brand_names[:1], 'brand')[0] if brand_names else None,
+            'categories': self._resolve(self.categories, self._names(row.get('categories')), 'categories'),
+            'sub_categories': self._resolve(self.sub_categories, self._names(row.get('sub_categories')), 'sub categories'),
+            'flavours': self._resolve(self.flavours, self._names(row.get('flavours')), 'flavours'),
+            'color': str(row.get('color') or '').strip() or None,
+            'size': str(row.get('size') or '').strip() or None,
+            'price': price,
+            'stock': stock,
+        }
+
+    def _import_chunk(self, chunk):
+        rows = []
+        for row_number, row in chunk:
+            try:
+                rows.append((row_number, self._clean_row(row)))
+            except ValueError as error:
+                self._error(row_number, str(error))
+
+        #one query for the names of this chunk that already exist outside this import
+        names = {row['product_name'].lower() for _, row in rows} - set(self.imported_products)
+        existing = set(Product.objects.annotate(name_lower=Lower('product_name')).filter(name_lower__in=names)
+                       .values_list('name_lower', flat=True)) if names else set()
+
+        new_products = {}
+        valid_rows = []
+        for row_number, row in rows:
+            name = row['product_name'].lower()
+            if name in existing:
+                self._error(row_number, "Same product already exists!")
+                continue
+            if name not in self.imported_products and name not in new_products:
+                if not row['product_description'] or not row['product_summary']:
+                    self._error(row_number, "product_description and product_summary are required for a new product")
+                    continue
+                new_products[name] = row
+            valid_rows.append((row_number, row))
+        if not valid_rows:
+            return
+
+        try:
+            with transaction.atomic():
+                products_created, skus_created = self._insert(new_products, valid_rows)
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            print(f"{error_type} occurred: {error}")
+            for name in new_products:
+                self.imported_products.pop(name, None)
+            for row_number, row in valid_rows:
+                self._error(row_number, f"Chunk could not be saved: {error_type}")
+            return
+        self.result['products_created'] += products_created
+        self.result['skus_created'] += skus_created
+
+    def _insert(self, new_products, valid_rows):
+        products = Product.objects.bulk_create([
+            Product(product_name=row['product_name'], product_description=row['product_description'],
+                    product_summary=row['product_summary'], product_ingredients=row['product_ingredients'],
+                    product_usage_direction=row['product_usage_direction'], product_brand_id=row['brand'])
+            for row in new_products.values()
+        ])
+        for name, product in zip(new_products, products):
+            self.imported_products[name] = (product.pk, product.product_name)
+
+        category_through = Product.product_category.through
+        sub_category_through = Product.product_sub_category.through
+        category_through.objects.bulk_create([
+            category_through(product_id=product.pk, product_category_id=pk)
+            for product, row in zip(products, new_products.values()) for pk in set(row['categories'])
+        ])
+        sub_category_through.objects.bulk_create([
+            sub_category_through(product_id=product.pk, product_sub_category_id=pk)
+            for product, row in zip(products, new_products.values()) for pk in set(row['sub_categories'])
+        ])
+
+        skus = []
+        product_names = {}
+        for row_number, row in valid_rows:
+            product_pk, product_name = self.imported_products[row['product_name'].lower()]
+            product_names[product_pk] = product_name
+            skus.append(Product_SKU(product_id_id=product_pk, product_color=row['color'], product_size=row['size'],
+                                    product_price=row['price'], product_stock=row['stock']))
+        #bulk_create skips Product_SKU.save(), the codes of the whole chunk are allocated in one statement
+        Product_SKU.assign_sku_codes(skus, product_names)
+        skus = Product_SKU.objects.bulk_create(skus)
+        flavour_through = Product_SKU.product_flavours.through
+        flavour_through.objects.bulk_create([
+            flavour_through(product_sku_id=sku.pk, product_flavours_id=pk)
+            for sku, (row_number, row) in zip(skus, valid_rows) for pk in set(row['flavours'])
+        ])
+
+        ProductSearch.update_search_vector(product_pk_list=[product.pk for product in products])
+        return len(products), len(skus)
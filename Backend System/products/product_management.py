@@ -1,15 +1,50 @@
 from .models import *
 from system.models import *
-from django.db import DatabaseError,OperationalError,IntegrityError,ProgrammingError
+from django.db import DatabaseError,OperationalError,IntegrityError,ProgrammingError,transaction
 from system.manage_error_log import ManageErrorLog
+from system.image_pipeline import ImagePipeline
 from e_commerce_app import settings
 import os
 from system.system_log import SystemLogs
 from django.utils import timezone
+from django.db.models import Count,F,Prefetch,Q,Value
+from django.db.models.functions import Lower
+from .catalogue_cache import CatalogueCache
+from .product_search import ProductSearch
 
 class ManageProducts:
+
+    #many to many fields rendered by `Product_Serializer`, prefetched so a product list costs one query per relation, not per product
+    PRODUCT_LIST_PREFETCH = ('product_category','product_sub_category')
     
+    def name_exists(model,field_name,name,exclude_pk=None):
+        """
+        Check case-insensitively whether a row with this name exists, with a single `EXISTS` query.
+
+        The lookup compares `LOWER(field)` so it is served by the `Lower(field)` unique index of the model. Category,
+        sub-category, brand, flavour and product names each have one, so the database also refuses a name that
+        differs from an existing one only in case.
+
+        Args:
+            model (Model): Model class to probe, e.g. `Product_Brands`.
+            field_name (str): Name field of the model, e.g. `brand_name`.
+            name (str): Name to look for.
+            exclude_pk (int, optional): Primary key of the row being updated, which is ignored.
+
+        Returns:
+            bool: `True` if another row already uses the name.
+
+        Example Usage:
+            if ManageProducts.name_exists(Product_Brands,'brand_name',"Loreal"):
+                return False, "Same brand exists in Database!"
+        """
+        queryset = model.objects.alias(name_lower=Lower(field_name)).filter(name_lower=Lower(Value(name)))
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        return queryset.exists()
+
     # Manage Product Category
+
     def fetch_product_categories(product_category_pk=None):
 
         """
@@ -72,36 +107,31 @@ class ManageProducts:
         # Handle database-related errors
         except DatabaseError as db_err:
             print(f"Database error occurred: {db_err}")
-            new_error=ErrorLogs.objects.create(error_type="DatabaseError", error_message=str(db_err))
-            new_error.save()
+            ManageErrorLog.log_error("DatabaseError", str(db_err))
             return None, "An unexpected error in Database occurred! Please try again later."
 
         # Handle Operational errors, e.g., connection issues
         except OperationalError as op_err:
             print(f"Operational error occurred: {op_err}")
-            new_error=ErrorLogs.objects.create(error_type="OperationalError", error_message=str(op_err))
-            new_error.save()
+            ManageErrorLog.log_error("OperationalError", str(op_err))
             return None, "An unexpected error in server occurred! Please try again later."
 
         # Handle programming errors, e.g., invalid queries
         except ProgrammingError as prog_err:
             print(f"Programming error occurred: {prog_err}")
-            new_error=ErrorLogs.objects.create(error_type="ProgrammingError", error_message=str(prog_err))
-            new_error.save()
+            ManageErrorLog.log_error("ProgrammingError", str(prog_err))
             return None, "An unexpected error in server occurred! Please try again later."
 
         # Handle integrity errors, e.g., data inconsistency
         except IntegrityError as integrity_err:
             print(f"Integrity error occurred: {integrity_err}")
-            new_error=ErrorLogs.objects.create(error_type="IntegrityError", error_message=str(integrity_err))
-            new_error.save()
+            ManageErrorLog.log_error("IntegrityError", str(integrity_err))
             return None, "Same type exists in Database!"
 
         # Handle general exceptions (fallback for unexpected errors)
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
-            new_error=ErrorLogs.objects.create(error_type="UnexpectedError", error_message=str(e))
-            new_error.save()
+            ManageErrorLog.log_error("UnexpectedError", str(e))
             return None, "An unexpected error occurred! Please try again later."
 
     def create_product_category(request,product_category_name,description):
@@ -147,18 +177,16 @@ class ManageProducts:
         """
 
         try:
-            # Fetch existing product categories
-            product_categories, message = ManageProducts.fetch_product_categories()
-            if product_categories:
-                # Check for duplicate types (case-insensitive)
-                if any(p.category_name.lower() == product_category_name.lower() for p in product_categories):
-                    return False, "Same type exists in Database!"
+            # Check for duplicate types (case-insensitive)
+            if ManageProducts.name_exists(Product_Category,'category_name',product_category_name):
+                return False, "Same type exists in Database!"
 
-            # Create a new product type if no duplicates are found
-            product_category = Product_Category.objects.create(category_name=product_category_name, description=description)
-            product_category.save()
+            # Create a new product type if no duplicates are found. A concurrent duplicate is rejected by the unique index
+            with transaction.atomic():
+                product_category = Product_Category.objects.create(category_name=product_category_name, description=description)
             #updated,message = SystemLogs.updated_by(request,product_category)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product Category {product_category_name}",message="Created")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_CATEGORY)
             return True, f"New Product category. {product_category_name} successfully added!"
 
 
@@ -166,7 +194,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -222,24 +250,23 @@ class ManageProducts:
             - If the category does not exist, an error message will be returned.
         """
         try:
-            # Fetch existing product types
-            product_categories, message = ManageProducts.fetch_product_categories()
-            if product_categories:
-                # Check for duplicate types (case-insensitive)
-                if any(p.category_name.lower() == new_category_name.lower() for p in product_categories):
-                    return False, "Same type exists in Database!" 
-            
             # Get the product type object
             product_category = Product_Category.objects.get(pk=product_category_pk)
 
+            # Check for duplicate types (case-insensitive)
+            if ManageProducts.name_exists(Product_Category,'category_name',new_category_name,exclude_pk=product_category.pk):
+                return False, "Same type exists in Database!"
+
             # Update the product type if changed
             if product_category.category_name != new_category_name:
                 product_category.category_name = new_category_name  # Ensure this is a string
             if product_category.description != description:
                 product_category.description = description
-            product_category.save()
+            with transaction.atomic():
+                product_category.save()
             #updated, message = SystemLogs.updated_by(request,product_category)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Category, {new_category_name}",message="Updated")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_CATEGORY)
             return True, "Product Category updated successfully!"
         
         except Product_Category.DoesNotExist:
@@ -249,7 +276,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
             
             # Return appropriate messages based on the error type
@@ -306,6 +333,7 @@ class ManageProducts:
             get_product_category = Product_Category.objects.get(pk=product_category_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product Category {get_product_category.category_name}",message="Deleted")
             get_product_category.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT_CATEGORY,CatalogueCache.PRODUCT_SUB_CATEGORY,CatalogueCache.PRODUCT)
             return True, "Product Category deleted successfully!"
         except Product_Category.DoesNotExist:
             return False, "Product Category does not exist!"
@@ -313,7 +341,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__
             error_message = str(error)
-            ManageErrorLog.create_error_log(error_type, error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
             # Return appropriate messages based on the error type
             error_messages = {
@@ -363,42 +391,38 @@ class ManageProducts:
         """
         try:
             product_category = Product_Category.objects.get(pk=product_category_pk)
-            product_sub_categories = Product_Sub_Category.objects.filter(category_id=product_category)
+            #categories of every sub-category are serialised, load them in one query instead of one per row
+            product_sub_categories = Product_Sub_Category.objects.filter(category_id=product_category).prefetch_related('category_id')
             return product_sub_categories, "Fetched all product sub-categories for a category successfully!" if len(product_sub_categories)>0 else "No product sub-categories found"
 
         # Handle database-related errors
         except DatabaseError as db_err:
             print(f"Database error occurred: {db_err}")
-            new_error = ErrorLogs.objects.create(error_type="DatabaseError", error_message=str(db_err))
-            new_error.save()
+            ManageErrorLog.log_error("DatabaseError", str(db_err))
             return None, "An unexpected error in Database occurred! Please try again later."
 
         # Handle Operational errors, e.g., connection issues
         except OperationalError as op_err:
             print(f"Operational error occurred: {op_err}")
-            new_error = ErrorLogs.objects.create(error_type="OperationalError", error_message=str(op_err))
-            new_error.save()
+            ManageErrorLog.log_error("OperationalError", str(op_err))
             return None, "An unexpected error in Database occurred! Please try again later."
 
         # Handle programming errors, e.g., invalid queries
         except ProgrammingError as prog_err:
             print(f"Programming error occurred: {prog_err}")
-            new_error = ErrorLogs.objects.create(error_type="ProgrammingError", error_message=str(prog_err))
-            new_error.save()
+            ManageErrorLog.log_error("ProgrammingError", str(prog_err))
             return None, "An unexpected error in Database occurred! Please try again later."
 
         # Handle integrity errors, e.g., data inconsistency
         except IntegrityError as integrity_err:
             print(f"Integrity error occurred: {integrity_err}")
-            new_error = ErrorLogs.objects.create(error_type="IntegrityError", error_message=str(integrity_err))
-            new_error.save()
+            ManageErrorLog.log_error("IntegrityError", str(integrity_err))
             return None, "An unexpected error in Database occurred! Please try again later."
 
         # Handle general exceptions (fallback for unexpected errors)
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
-            new_error = ErrorLogs.objects.create(error_type="UnexpectedError", error_message=str(e))
-            new_error.save()
+            ManageErrorLog.log_error("UnexpectedError", str(e))
             return None, "An unexpected error occurred! Please try again later."
         
     def create_product_sub_category(request,product_category_pk,sub_category_name,description):
@@ -444,25 +468,31 @@ class ManageProducts:
         """
         
         try:
-            # Fetch product all sub category
-            product_sub_categories, message = ManageProducts.fetch_all_product_sub_categories_for_a_category(product_category_pk)
-            if product_sub_categories:
-                # Check for duplicate types (case-insensitive)
-                if any(p.sub_category_name.lower() == sub_category_name.lower() for p in product_sub_categories):
-                    return False, "Same type exists in Database!"
-            
             product_category = Product_Category.objects.get(pk=product_category_pk)
-            sub_category = Product_Sub_Category.objects.create(sub_category_name=sub_category_name,description=description)
-            sub_category.category_id.add(product_category)
+            # Sub category names are unique (case-insensitive). A sub category can belong to many categories,
+            # so an existing one is linked to this category instead of being created again
+            sub_category = Product_Sub_Category.objects.alias(name_lower=Lower('sub_category_name')).filter(
+                name_lower=Lower(Value(sub_category_name))).first()
+            if sub_category:
+                if sub_category.category_id.filter(pk=product_category.pk).exists():
+                    return False, "Same type exists in Database!"
+                sub_category.category_id.add(product_category)
+                CatalogueCache.bump(CatalogueCache.PRODUCT_SUB_CATEGORY)
+                return True, f"Product sub-category, {sub_category.sub_category_name} successfully added to {product_category.category_name}!"
+
+            with transaction.atomic():
+                sub_category = Product_Sub_Category.objects.create(sub_category_name=sub_category_name,description=description)
+                sub_category.category_id.add(product_category)
             #updated, message = SystemLogs.updated_by(request,sub_category)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product Sub Category {sub_category_name}",message="Created")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_SUB_CATEGORY)
             return True, f"New Product sub-category, {sub_category_name} successfully added!"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -478,7 +508,7 @@ class ManageProducts:
             # Log the error
             error_type = "UnexpectedError"
             error_message = str(e)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
             return False, "An unexpected error occurred while creating Product Sub Category! Please try again later."
     
@@ -535,21 +565,25 @@ class ManageProducts:
                     product_sub_categories.category_id.add(Product_Category.objects.get(pk=category))
             #updating the sub category name if changed
             if product_sub_categories.sub_category_name.lower() != sub_category_name.lower():
+                if ManageProducts.name_exists(Product_Sub_Category,'sub_category_name',sub_category_name,exclude_pk=product_sub_categories.pk):
+                    return False, "Same type exists in Database!"
                 product_sub_categories.sub_category_name = sub_category_name
             #updating the sub category description if changed
             if product_sub_categories.description.lower() != description.lower():
                 product_sub_categories.description = description
             #saving the changes made
-            product_sub_categories.save()
+            with transaction.atomic():
+                product_sub_categories.save()
             #updated, message = SystemLogs.updated_by(request,product_sub_categories)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Sub Category {product_sub_categories.sub_category_name}",message="Updated")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_SUB_CATEGORY)
             return True, "Product Sub Category updated successfully!"
             
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -565,7 +599,7 @@ class ManageProducts:
             # Log the error
             error_type = "UnexpectedError"
             error_message = str(e)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
             return False, "An unexpected error occurred while updating Product Sub Category! Please try again later."
         
@@ -610,6 +644,7 @@ class ManageProducts:
             get_product_sub_category = Product_Sub_Category.objects.get(pk=product_sub_category_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product Sub Category {get_product_sub_category.sub_category_name}",message="Deleted")
             get_product_sub_category.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT_SUB_CATEGORY,CatalogueCache.PRODUCT)
             return True, "Product Sub Category deleted successfully!"
         except Product_Sub_Category.DoesNotExist:
             return False, "Product Sub Category does not exist!"
@@ -617,7 +652,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__
             error_message = str(error)
-            ManageErrorLog.create_error_log(error_type, error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
             # Return appropriate messages based on the error type
             error_messages = {
@@ -676,18 +711,15 @@ class ManageProducts:
         """
         
         try:
-            # Fetch existing product brands
-            product_brands = Product_Brands.objects.all()
-            if product_brands:
-                # Check for duplicate brands (case-insensitive)
-                if any(p.brand_name.lower() == brand_name.lower() for p in product_brands):
-                    return False, "Same brand exists in Database!"
+            # Check for duplicate brands (case-insensitive)
+            if ManageProducts.name_exists(Product_Brands,'brand_name',brand_name):
+                return False, "Same brand exists in Database!"
             
-            # Create a new product brand if no duplicates are found
-            product_brand = Product_Brands.objects.create(brand_name=brand_name,
-                                        brand_established_year=brand_established_year, 
-                                        is_own_brand=is_own_brand)
-            product_brand.save()
+            # Create a new product brand if no duplicates are found. A concurrent duplicate is rejected by the unique index
+            with transaction.atomic():
+                product_brand = Product_Brands.objects.create(brand_name=brand_name,
+                                            brand_established_year=brand_established_year, 
+                                            is_own_brand=is_own_brand)
             if (brand_country):
                 product_brand.brand_country=brand_country
             if (brand_description):
@@ -695,15 +727,18 @@ class ManageProducts:
             if (brand_logo):
                 product_brand.brand_logo=brand_logo
             product_brand.save()
+            if (brand_logo):
+                ImagePipeline.get().process_later(product_brand,'brand_logo')
             #updated, message = SystemLogs.updated_by(request,product_brand)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product Brand {brand_name}",message="Created")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_BRAND)
             return True, f"New Product brand, {brand_name} successfully added!"
                                               
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -764,12 +799,12 @@ class ManageProducts:
                 return Product_Brands.objects.get(pk=pk), "Product brand fetched successfully!"
             else:
                 product_brand = Product_Brands.objects.all()
-                return product_brand, "All Product brands fetched successfully!" if len(product_brand)>0 else "No Product brands found"
+                return product_brand, "All Product brands fetched successfully!" if product_brand.exists() else "No Product brands found"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -827,12 +862,10 @@ class ManageProducts:
         try:
             #get product brand
             product_brand = Product_Brands.objects.get(pk=product_brand_pk)
-            all_product_brand,message = ManageProducts.fetch_product_brand()
             #update the product brand name
             if (product_brand.brand_name.lower() != brand_name.lower()):
-                for p in all_product_brand:
-                    if p != product_brand and p.brand_name.lower() == brand_name.lower():
-                        return False, "Same brand already exists!"
+                if ManageProducts.name_exists(Product_Brands,'brand_name',brand_name,exclude_pk=product_brand.pk):
+                    return False, "Same brand already exists!"
                 product_brand.brand_name = brand_name
             #update the product brand country
             if (brand_country):
@@ -851,21 +884,25 @@ class ManageProducts:
             #update the product brand logo
             if (brand_logo):
                 if product_brand.brand_logo:
-                    # Delete the previous logo file from local directory
-                    path = settings.MEDIA_ROOT+str(product_brand.brand_logo)
-                    if os.path.exists(path):
-                        os.remove(path)
-                    product_brand.brand_logo.delete()
-            product_brand.save()
+                    # Delete the previous logo file and its resized copies unless another brand uses the same image
+                    ImagePipeline.get().release(product_brand,'brand_logo')
+                product_brand.brand_logo = brand_logo
+            with transaction.atomic():
+                product_brand.save()
+            if (brand_logo):
+                ImagePipeline.get().process_later(product_brand,'brand_logo')
             #updated,message = SystemLogs.updated_by(request,product_brand)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Brand {product_brand.brand_name}",message="Updated")
+            #brand name is part of the search vector of its products
+            ProductSearch.update_search_vector(product_brand_pk=product_brand.pk)
+            CatalogueCache.bump(CatalogueCache.PRODUCT_BRAND,CatalogueCache.PRODUCT)
             return True, f"Product brand, {brand_name} updated successfully!"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -912,25 +949,24 @@ class ManageProducts:
 
         Notes:
             - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
-            - If the product brand has an associated logo, the logo file is deleted from the local directory before deleting the brand.
+            - If the product brand has an associated logo, the logo file is deleted from the local directory before deleting the brand, unless another brand uses the same image.
         """
         try:
             #get product brand
             product_brand = Product_Brands.objects.get(pk=product_brand_pk)
             #delete the product brand logo first if exists
             if product_brand.brand_logo:
-                path = settings.MEDIA_ROOT+str(product_brand.brand_logo)
-                if os.path.exists(path):
-                    os.remove(path)
+                ImagePipeline.get().release(product_brand,'brand_logo')
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product Brand {product_brand.brand_name}",message="Deleted")
             product_brand.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT_BRAND,CatalogueCache.PRODUCT)
             return True, "Product brand deleted successfully!"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -995,12 +1031,12 @@ class ManageProducts:
                 return Product_Flavours.objects.get(pk=pk), "Product flavour fetched successfully!"
             else:
                 product_flavour = Product_Flavours.objects.all()
-                return product_flavour, "All Product flavours fetched successfully!" if len(product_flavour)>0 else "No Product flavour found"
+                return product_flavour, "All Product flavours fetched successfully!" if product_flavour.exists() else "No Product flavour found"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1053,20 +1089,20 @@ class ManageProducts:
         """
 
         try:
-            product_flavours,message = ManageProducts.fetch_product_flavour()
-            if product_flavours:
-                if any(p.product_flavour_name.lower() == product_flavour_name.lower() for p in product_flavours):
-                    return False, "Same flavour exists in Database!"
+            if ManageProducts.name_exists(Product_Flavours,'product_flavour_name',product_flavour_name):
+                return False, "Same flavour exists in Database!"
             
-            product_flavour = Product_Flavours.objects.create(product_flavour_name=product_flavour_name)
+            with transaction.atomic():
+                product_flavour = Product_Flavours.objects.create(product_flavour_name=product_flavour_name)
             #updated,message = SystemLogs.updated_by(request,product_flavour)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product Flavour {product_flavour_name}",message="Created")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_FLAVOUR)
             return True, f"New Product flavour, {product_flavour_name} successfully added!"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1118,22 +1154,22 @@ class ManageProducts:
         try:
             #fetch product flavour with pk
             product_flavour,message = ManageProducts.fetch_product_flavour(pk=product_flavour_pk)
-            all_product_flavour , message = ManageProducts.fetch_product_flavour()
             #detecting changes
             if (product_flavour.product_flavour_name.lower() != product_flavour_name.lower()):
-                for p in all_product_flavour:
-                    if p != product_flavour and p.product_flavour_name.lower() == product_flavour_name.lower():
-                        return False, "Same product flavour already exists!"
+                if ManageProducts.name_exists(Product_Flavours,'product_flavour_name',product_flavour_name,exclude_pk=product_flavour.pk):
+                    return False, "Same product flavour already exists!"
                 product_flavour.product_flavour_name = product_flavour_name
-            product_flavour.save()
+            with transaction.atomic():
+                product_flavour.save()
             #updated,message = SystemLogs.updated_by(request,product_flavour)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Flavour {product_flavour.product_flavour_name}",message="Updated")
+            CatalogueCache.bump(CatalogueCache.PRODUCT_FLAVOUR)
             return True, "Product flavour updated successfully!"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1185,12 +1221,13 @@ class ManageProducts:
             product_flavour,message = ManageProducts.fetch_product_flavour(pk=product_flavour_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product Flavour {product_flavour.product_flavour_name}",message="Deleted")
             product_flavour.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT_FLAVOUR)
             return True, "Product flavour deleted successfully!"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1225,6 +1262,8 @@ class ManageProducts:
             tuple:
                 - QuerySet or Product: A QuerySet of products matching the criteria or a single Product object.
                 - Using 'pk' and 'product_name' uses 'get' operation to retrieve. So returns error if not found.
+                - Category and sub-category lists are resolved in the database and return a lazy QuerySet,
+                  so slicing and ordering are applied in SQL. Unknown primary keys raise an error.
                 - str: A message indicating the success or failure of the operation.
 
         Example Usage:
@@ -1266,29 +1305,23 @@ class ManageProducts:
                 return Product.objects.get(product_name=product_name), "Products fetched successfully!"
             elif product_brand_pk:
                 product_brand,message = ManageProducts.fetch_product_brand(pk=product_brand_pk)
-                products = Product.objects.filter(product_brand=product_brand)
-                return products, "Products fetched successfully!" if products else "No products found using this brand"
+                products = Product.objects.filter(product_brand=product_brand).prefetch_related(*ManageProducts.PRODUCT_LIST_PREFETCH)
+                return products, "Products fetched successfully!" if products.exists() else "No products found using this brand"
             elif product_category_pk_list:
-                product_categories = [Product_Category.objects.get(pk=p) for p in product_category_pk_list]
-                products=set()
-                for categories in product_categories:
-                    products.update(categories.products.all())
-                return products, "Products fetched successfully!" if products else "No products found using this categories"
+                products = ManageProducts.build_product_filter_queryset(product_category_pk_list=product_category_pk_list).prefetch_related(*ManageProducts.PRODUCT_LIST_PREFETCH)
+                return products, "Products fetched successfully!" if products.exists() else "No products found using this categories"
             elif product_sub_category_pk_list:
-                product_sub_categories = [Product_Sub_Category.objects.get(pk=p) for p in product_sub_category_pk_list]
-                products = set()
-                for sub_categories in product_sub_categories:
-                    products.update(sub_categories.products.all())
-                return products,"Products fetched successfully!"if products else "No products found using this sub categories"
+                products = ManageProducts.build_product_filter_queryset(product_sub_category_pk_list=product_sub_category_pk_list).prefetch_related(*ManageProducts.PRODUCT_LIST_PREFETCH)
+                return products,"Products fetched successfully!"if products.exists() else "No products found using this sub categories"
             else:
-                products = Product.objects.all()
-                return products, "All Products fetched successfully!" if len(products)>0 else "No products founds"
+                products = Product.objects.prefetch_related(*ManageProducts.PRODUCT_LIST_PREFETCH)
+                return products, "All Products fetched successfully!" if products.exists() else "No products founds"
             
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1299,7 +1332,230 @@ class ManageProducts:
                 "IntegrityError": "Same type exists in Database!",
             }
             return False, error_messages.get(error_type, "An unexpected error occurred while fetching product! Please try again later.") 
+
+    def _validate_pk_list(model,pk_list):
+        """Raise `model.DoesNotExist` if any primary key in `pk_list` has no matching row, using a single count query."""
+        pk_set = {int(pk) for pk in pk_list}
+        if model.objects.filter(pk__in=pk_set).count() != len(pk_set):
+            raise model.DoesNotExist(f"{model._meta.verbose_name} matching query does not exist.")
+        return pk_set
+
+    def _m2m_product_condition(through_model,field_name,pk_set,match_all=False):
+        """
+        Build a `Q` object selecting products linked to `pk_set` through an M2M through table.
+
+        With `match_all` the product must be linked to every pk in the set (grouped with HAVING),
+        otherwise linking to any one of them is enough. The condition is a sub-select on the
+        through table, so the outer product query never joins and never needs `distinct()`.
+        """
+        rows = through_model.objects.filter(**{f"{field_name}__in": pk_set})
+        if match_all:
+            rows = rows.values('product_id').annotate(matched=Count(field_name,distinct=True)).filter(matched=len(pk_set))
+        return Q(pk__in=rows.values('product_id'))
+
+    def build_product_filter_queryset(product_category_pk_list=None,product_sub_category_pk_list=None,product_brand_pk_list=None,
+                                      match_all_categories=False,match_all_sub_categories=False,combine_with_or=False,validate_pks=True):
+        """
+        Build a lazy product QuerySet for the given category, sub-category and brand filters.
+
+        Every filter is translated into a single SQL condition so the whole lookup is one query
+        (plus one existence check per pk list). Errors are not handled here; use `filter_products`
+        or `fetch_product` for the logged, message-returning variants.
+
+        Args:
+            product_category_pk_list (list, optional): Primary keys of product categories.
+            product_sub_category_pk_list (list, optional): Primary keys of product sub-categories.
+            product_brand_pk_list (list, optional): Primary keys of product brands.
+            match_all_categories (bool, optional): Product must belong to every given category. Defaults to False (any).
+            match_all_sub_categories (bool, optional): Product must belong to every given sub-category. Defaults to False (any).
+            combine_with_or (bool, optional): Combine the category, sub-category and brand conditions with OR instead of AND.
+            validate_pks (bool, optional): Check that every given pk exists. Defaults to True; pass False when the
+                same pks were already validated.
+
+        Returns:
+            QuerySet: Unevaluated `Product` QuerySet.
+
+        Raises:
+            Product_Category.DoesNotExist, Product_Sub_Category.DoesNotExist, Product_Brands.DoesNotExist:
+                If any of the given primary keys does not exist.
+        """
+        def pk_set(model,pk_list):
+            return ManageProducts._validate_pk_list(model,pk_list) if validate_pks else {int(pk) for pk in pk_list}
+
+        conditions = []
+        if product_category_pk_list:
+            category_pks = pk_set(Product_Category,product_category_pk_list)
+            conditions.append(ManageProducts._m2m_product_condition(Product.product_category.through,'product_category_id',
+                                                                    category_pks,match_all_categories))
+        if product_sub_category_pk_list:
+            sub_category_pks = pk_set(Product_Sub_Category,product_sub_category_pk_list)
+            conditions.append(ManageProducts._m2m_product_condition(Product.product_sub_category.through,'product_sub_category_id',
+                                                                    sub_category_pks,match_all_sub_categories))
+        if product_brand_pk_list:
+            brand_pks = pk_set(Product_Brands,product_brand_pk_list)
+            conditions.append(Q(product_brand_id__in=brand_pks))
+
+        query = Q()
+        for condition in conditions:
+            query = query | condition if combine_with_or else query & condition
+        return Product.objects.filter(query)
+
+    def filter_products(product_category_pk_list=None,product_sub_category_pk_list=None,product_brand_pk_list=None,
+                        match_all_categories=False,match_all_sub_categories=False,combine_with_or=False):
+        """
+        Filter products by categories, sub-categories and brands in a single database query.
+
+        Unlike `fetch_product`, which accepts one filter at a time, this function combines all the
+        provided filters. Within categories and sub-categories a product may match any or all of the
+        given pks; across the three filter groups conditions are combined with AND by default or OR
+        when `combine_with_or` is set. The result is a lazy QuerySet, so callers can order, slice and
+        paginate it in the database.
+
+        Args:
+            product_category_pk_list (list, optional): Primary keys of product categories. Defaults to None.
+            product_sub_category_pk_list (list, optional): Primary keys of product sub-categories. Defaults to None.
+            product_brand_pk_list (list, optional): Primary keys of product brands. Defaults to None.
+            match_all_categories (bool, optional): Require every category instead of any. Defaults to False.
+            match_all_sub_categories (bool, optional): Require every sub-category instead of any. Defaults to False.
+            combine_with_or (bool, optional): OR the filter groups together instead of AND. Defaults to False.
+
+        Returns:
+            tuple:
+                - QuerySet or bool: A lazy QuerySet of matching products, or `False` if an error occurs.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            products, message = filter_products(product_category_pk_list=[1, 2], product_brand_pk_list=[3])
+            first_page = products.order_by('created_at', 'pk')[:20]
+
+            products, message = filter_products(product_category_pk_list=[1, 2], match_all_categories=True)
+
+        Exception Handling:
+            - **DoesNotExist**: Raised when any given category, sub-category or brand pk does not exist.
+                Message: "An unexpected error occurred while fetching product! Please try again later."
+            - **DatabaseError**: Catches general database-related issues.
+                Message: "An unexpected error in Database occurred while fetching product! Please try again later."
+            - **OperationalError**: Handles server-related issues such as connection problems.
+                Message: "An unexpected error in server occurred while fetching product! Please try again later."
+            - **ProgrammingError**: Catches programming errors such as invalid queries.
+                Message: "An unexpected error in server occurred while fetching product! Please try again later."
+            - **Exception**: A catch-all for any other unexpected errors.
+                Message: "An unexpected error occurred while fetching product! Please try again later."
+
+        Notes:
+            - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
+        """
+        try:
+            products = ManageProducts.build_product_filter_queryset(product_category_pk_list=product_category_pk_list,
+                                                                     product_sub_category_pk_list=product_sub_category_pk_list,
+                                                                     product_brand_pk_list=product_brand_pk_list,
+                                                                     match_all_categories=match_all_categories,
+                                                                     match_all_sub_categories=match_all_sub_categories,
+                                                                     combine_with_or=combine_with_or).prefetch_related(*ManageProducts.PRODUCT_LIST_PREFETCH)
+            return products, "Products fetched successfully!" if products.exists() else "No products found using these filters"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            # Log the error
+            error_type = type(error).__name__  # Get the name of the error as a string
+            error_message = str(error)
+            ManageErrorLog.log_error(error_type, error_message)
+            print(f"{error_type} occurred: {error_message}")
+
+            # Return appropriate messages based on the error type
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while fetching product! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while fetching product! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while fetching product! Please try again later.",
+            }
+            return False, error_messages.get(error_type, "An unexpected error occurred while fetching product! Please try again later.")
         
+    def product_detail_queryset(queryset=None):
+        """
+        Apply the eager loading plan used by `Product_Detail_Serializer` to a product QuerySet.
+
+        Brand is joined with `select_related`; categories, sub-categories with their categories, SKUs with
+        their flavours, images and currently active discounts are each loaded with one `prefetch_related`
+        query. Serialising the result therefore costs a fixed number of queries (8) no matter how many
+        products are in the QuerySet. Active discounts are stored on each product as `active_discounts`.
+
+        Args:
+            queryset (QuerySet, optional): Product QuerySet to load. Defaults to all products.
+
+        Returns:
+            QuerySet: The product QuerySet with the loading plan applied.
+        """
+        now = timezone.now()
+        if queryset is None:
+            queryset = Product.objects.all()
+        return queryset.select_related('product_brand').prefetch_related(
+            'product_category',
+            'product_sub_category__category_id',
+            Prefetch('product_sku_set',queryset=Product_SKU.objects.prefetch_related('product_flavours').order_by('pk')),
+            Prefetch('product_images_set',queryset=Product_Images.objects.order_by('pk')),
+            Prefetch('product_discount_set',queryset=Product_Discount.objects.filter(start_date__lte=now,end_date__gte=now).order_by('pk'),
+                     to_attr='active_discounts'),
+        )
+
+    def fetch_product_detail(product_pk=None,product_pk_list=None):
+        """
+        Fetch products together with their brand, categories, sub-categories, SKUs, images and active discounts.
+
+        The returned objects are meant to be serialised with `Product_Detail_Serializer`, which gives the
+        clients a complete product page in one response instead of separate product, SKU, image and
+        discount calls.
+
+        Args:
+            product_pk (int, optional): Primary key of a single product. Defaults to None.
+            product_pk_list (list, optional): Primary keys of the products to fetch. Defaults to None.
+
+        Returns:
+            tuple:
+                - Product or QuerySet or bool: A single product if `product_pk` is given, otherwise a lazy QuerySet
+                  of products. `False` if an error occurs.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            product, message = fetch_product_detail(product_pk=1)
+            products, message = fetch_product_detail(product_pk_list=[1, 2, 3])
+            data = Product_Detail_Serializer(products, many=True).data
+
+        Exception Handling:
+            - **DoesNotExist**: Raised when the product with `product_pk` does not exist.
+                Message: "An unexpected error occurred while fetching product details! Please try again later."
+            - **DatabaseError**: Catches general database-related issues.
+                Message: "An unexpected error in Database occurred while fetching product details! Please try again later."
+            - **OperationalError**: Handles server-related issues such as connection problems.
+                Message: "An unexpected error in server occurred while fetching product details! Please try again later."
+            - **ProgrammingError**: Catches programming errors such as invalid queries.
+                Message: "An unexpected error in server occurred while fetching product details! Please try again later."
+            - **Exception**: A catch-all for any other unexpected errors.
+                Message: "An unexpected error occurred while fetching product details! Please try again later."
+
+        Notes:
+            - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
+        """
+        try:
+            if product_pk:
+                return ManageProducts.product_detail_queryset().get(pk=product_pk), "Product details fetched successfully!"
+            elif product_pk_list:
+                products = ManageProducts.product_detail_queryset(Product.objects.filter(pk__in=product_pk_list))
+            else:
+                products = ManageProducts.product_detail_queryset()
+            return products, "Product details fetched successfully!" if products.exists() else "No products found"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            # Log the error
+            error_type = type(error).__name__  # Get the name of the error as a string
+            error_message = str(error)
+            ManageErrorLog.log_error(error_type, error_message)
+            print(f"{error_type} occurred: {error_message}")
+
+            # Return appropriate messages based on the error type
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while fetching product details! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while fetching product details! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while fetching product details! Please try again later.",
+            }
+            return False, error_messages.get(error_type, "An unexpected error occurred while fetching product details! Please try again later.")
+
     def create_product(request,product_name,product_category_pk_list,product_sub_category_pk_list,product_description,
                        product_summary,product_brand_pk=None,product_ingredients=None,
                        product_usage_direction=None):
@@ -1358,39 +1614,35 @@ class ManageProducts:
             - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
         """
         try:
-            try:
-                #checking to see if product alreadt exists or not. If does returning
-                product,message = ManageProducts.fetch_product(product_name=product_name)
-                if product.product_name.lower() == product_name.lower():
-                    return False, "Same product already exists!"
-            except:
-                print("creating product as no matching found")
+            #checking to see if product already exists or not (case-insensitive). If does returning
+            if ManageProducts.name_exists(Product,'product_name',product_name):
+                return False, "Same product already exists!"
+            #getting all category and sub categories and flavours
+            product_category = [Product_Category.objects.get(pk=p) for p in product_category_pk_list]
+            product_sub_category = [Product_Sub_Category.objects.get(pk=p) for p in product_sub_category_pk_list]
+            #checking optional paramters
+            brand = None
+            if product_brand_pk:
+                brand,message = ManageProducts.fetch_product_brand(pk=product_brand_pk)
+            #a concurrent duplicate is rejected by the unique index and nothing is left half created
+            with transaction.atomic():
                 product = Product.objects.create(product_name=product_name,product_description=product_description,
-                                    product_summary=product_summary)
-                product.save()
-                #getting all category and sub categories and flavours
-                product_category = [Product_Category.objects.get(pk=p) for p in product_category_pk_list]
-                product_sub_category = [Product_Sub_Category.objects.get(pk=p) for p in product_sub_category_pk_list]
+                                    product_summary=product_summary,product_brand=brand or None,
+                                    product_ingredients=product_ingredients or None,
+                                    product_usage_direction=product_usage_direction or None)
                 product.product_category.add(*product_category)
                 product.product_sub_category.add(*product_sub_category)
-                #checking optional paramters
-                if product_brand_pk:
-                    brand,message = ManageProducts.fetch_product_brand(pk=product_brand_pk)
-                    product.product_brand = brand
-                if product_ingredients:
-                    product.product_ingredients = product_ingredients
-                if product_usage_direction:
-                    product.product_usage_direction = product_usage_direction
-                product.save()
-                #updated, message = SystemLogs.updated_by(request,product)
-                #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product {product_name}",message="Created")
-                return product, f"Product, {product_name} created!"
+            #updated, message = SystemLogs.updated_by(request,product)
+            #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product {product_name}",message="Created")
+            ProductSearch.update_search_vector(product_pk_list=[product.pk])
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
+            return product, f"Product, {product_name} created!"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1468,12 +1720,10 @@ class ManageProducts:
             product,message = ManageProducts.fetch_product(product_pk=product_pk)
             existing_product_category = sorted(product.product_category.all())
             existing_product_sub_category = sorted(product.product_sub_category.all())
-            all_products, message = ManageProducts.fetch_product()
             #updating only if changed
             if product.product_name.lower() != product_name.lower():
-                for p in all_products:
-                    if p!=product and p.product_name.lower() == product_name.lower():
-                        return False,"Same product name already exists!"
+                if ManageProducts.name_exists(Product,'product_name',product_name,exclude_pk=product.pk):
+                    return False,"Same product name already exists!"
                 product.product_name = product_name
             if existing_product_category != new_product_category:
                 product.product_category.set(new_product_category)
@@ -1493,9 +1743,12 @@ class ManageProducts:
             if product_usage_direction:
                 if not product.product_usage_direction or product.product_usage_direction.lower() != product_usage_direction.lower():
                     product.product_usage_direction = product_usage_direction
-            product.save()
+            with transaction.atomic():
+                product.save()
             #updated,message = SystemLogs.updated_by(request,product)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product {product.product_name}",message="Updated")
+            ProductSearch.update_search_vector(product_pk_list=[product.pk])
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, "Product updated successfully!"
             
         
@@ -1503,7 +1756,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1556,12 +1809,13 @@ class ManageProducts:
             product,message = ManageProducts.fetch_product(product_pk=product_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product {product.product_name}",message="Deleted")
             product.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, "Product deleted successfully"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1629,11 +1883,11 @@ class ManageProducts:
             elif product_id:
                 product,message = ManageProducts.fetch_product(product_pk=product_id)
                 product_skus = Product_SKU.objects.filter(product_id=product)
-                return product_skus, "Fetched successfully" if len(product_skus)>0 else "No product sku found"
+                return product_skus, "Fetched successfully" if product_skus.exists() else "No product sku found"
             elif product_name:
                 product,message = ManageProducts.fetch_product(product_name=product_name)
                 product_skus = Product_SKU.objects.filter(product_id=product)
-                return product_skus, "Fetched successfully" if len(product_skus)>0 else "No product sku found"
+                return product_skus, "Fetched successfully" if product_skus.exists() else "No product sku found"
             elif product_sku:
                 try:
                     return Product_SKU.objects.get(product_sku=product_sku.upper()), "Fetched successfully"
@@ -1645,7 +1899,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1725,13 +1979,14 @@ class ManageProducts:
             product_sku.save()
             #updated, message = SystemLogs.updated_by(request,product_sku)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product sku with sku - {product_sku.product_sku}",message="Created")
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, "Product sku created successfully"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1790,11 +2045,16 @@ class ManageProducts:
                 Message: "An unexpected error in server occurred while updating product sku! Please try again later."
             - **IntegrityError**: Handles data integrity issues.
                 Message: "Same type exists in Database!"
+                When the stock would go below zero (the `product_sku_stock_not_negative` CHECK constraint):
+                Message: "Not enough stock! The stock cannot go below zero or below the units reserved by carts."
             - **Exception**: A catch-all for any other unexpected errors.
                 Message: "An unexpected error occurred while updating product sku! Please try again later."
 
         Notes:
             - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
+            - `product_stock` is applied as the change from the stock that was read, so units reserved by carts
+              (orders.stock_management) while the SKU was edited are not handed out twice.
+            - The update is atomic, a refused stock change leaves the flavours as they were.
         """
         try:
             #new product_id
@@ -1802,35 +2062,40 @@ class ManageProducts:
             #getting the product sku
             product_sku,message = ManageProducts.fetch_product_sku(pk=product_sku_pk)
             #sku gets updated automatically, no logic needed
-            existing_product_flavours = sorted(product_sku.product_flavours.all())
-            new_product_flavours = sorted([Product_Flavours.objects.get(pk=p) for p in product_flavours_pk_list])
-            if product_sku.product_id != product:
-                product_sku.product_id = product
-            if product_sku.product_price != product_price:
-                product_sku.product_price = product_price
-            if product_sku.product_stock != product_stock:
-                product_sku.product_stock = product_stock
-            if existing_product_flavours != new_product_flavours:
-                product_sku.product_flavours.set(new_product_flavours)
-            if product_color:
-                if not product_sku.product_color or product_sku.product_color.lower() != product_color.lower():
-                    product_sku.product_color = product_color
-            if product_size:
-                if not product_sku.product_size or product_sku.product_size.lower() != product_size.lower():
-                    if type(product_size) == int:
-                        product_sku.product_size = str(product_size)
-                    else:
-                        product_sku.product_size = product_size
-            product_sku.save()
+            with transaction.atomic():
+                existing_product_flavours = sorted(product_sku.product_flavours.all())
+                new_product_flavours = sorted([Product_Flavours.objects.get(pk=p) for p in product_flavours_pk_list])
+                if product_sku.product_id != product:
+                    product_sku.product_id = product
+                if product_sku.product_price != product_price:
+                    product_sku.product_price = product_price
+                #applied as a difference to the stock read above, reservations taken in the meantime are kept
+                product_sku.product_stock = F('product_stock') + (int(product_stock) - product_sku.product_stock)
+                if existing_product_flavours != new_product_flavours:
+                    product_sku.product_flavours.set(new_product_flavours)
+                if product_color:
+                    if not product_sku.product_color or product_sku.product_color.lower() != product_color.lower():
+                        product_sku.product_color = product_color
+                if product_size:
+                    if not product_sku.product_size or product_sku.product_size.lower() != product_size.lower():
+                        if type(product_size) == int:
+                            product_sku.product_size = str(product_size)
+                        else:
+                            product_sku.product_size = product_size
+                product_sku.save()
             #updated,message = SystemLogs.updated_by(request,product_sku)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product sku with sku - {product_sku.product_sku}",message="Updated")
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, f"Product sku updated with new sku id"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            if error_type == "IntegrityError" and 'product_sku_stock_not_negative' in error_message:
+                #carts reserved units after the stock was read, or the new stock is negative
+                return False, "Not enough stock! The stock cannot go below zero or below the units reserved by carts."
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1883,13 +2148,14 @@ class ManageProducts:
             product_sku, message = ManageProducts.fetch_product_sku(pk=product_sku_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product sku with sku - {product_sku.product_sku}",message="Deleted")
             product_sku.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, "Product sku successfully deleted!"
 
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -1951,18 +2217,18 @@ class ManageProducts:
             if product_pk:
                 product,message = ManageProducts.fetch_product(product_pk=product_pk)
                 product_images = Product_Images.objects.filter(product_id=product)
-                return product_images, "Product images fetched successfully" if len(product_images)>0 else "No images found for this product"
+                return product_images, "Product images fetched successfully" if product_images.exists() else "No images found for this product"
             elif product_image_pk:
                 product_image = Product_Images.objects.get(pk=product_image_pk)
                 return product_image, "Product images fetched successfully"
             else:
                 product_images = Product_Images.objects.all()
-                return product_images, "All product images fetched successfully" if len(product_images)>0 else "No images found"
+                return product_images, "All product images fetched successfully" if product_images.exists() else "No images found"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2026,18 +2292,13 @@ class ManageProducts:
             try:
                 product,message = ManageProducts.fetch_product(product_pk=product_id)
                 for i in product_image_list:
-                    product_image_created = Product_Images.objects.create(product_id=product,product_image = i)
-                    product_image_created.save()
-                    if color:
-                        product_image_created.color = color
-                    if size:
-                        if type(size) == int:
-                            product_image_created.size = str(size)
-                        else:
-                            product_image_created.size = size
-                    product_image_created.save()
+                    #one INSERT per upload, the original is stored as is and resized after the request
+                    product_image_created = Product_Images.objects.create(product_id=product,product_image = i,
+                                                                          color=color or None,size=str(size) if size else None)
+                    ImagePipeline.get().process_later(product_image_created,'product_image')
                     #updated, message = SystemLogs.updated_by(request,product_image_created)
                     #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product image for the product, {product_image_created.product_id.product_name}",message="Created Product Image")
+                CatalogueCache.bump(CatalogueCache.PRODUCT)
                 return True, "Product image created successfully"
             except:
                 return False, "No product image found"
@@ -2046,7 +2307,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2109,10 +2370,8 @@ class ManageProducts:
             product_image ,message = ManageProducts.fetch_product_image(product_image_pk=product_image_pk)
             if new_image:
                 if product_image.product_image:
-                    path = settings.MEDIA_ROOT+str(product_image.product_image)
-                    if os.path.exists(path):
-                        os.remove(path)
-                    product_image.product_image.delete()
+                    #identical pictures of other products share the file, it is only deleted with its last reference
+                    ImagePipeline.get().release(product_image,'product_image')
                 product_image.product_image = new_image
             if color:
                 if not product_image.color or product_image.color.lower() != color.lower():
@@ -2123,15 +2382,18 @@ class ManageProducts:
                     product_image.size = size
             
             product_image.save()
+            if new_image:
+                ImagePipeline.get().process_later(product_image,'product_image')
             #updated, message = SystemLogs.updated_by(request,product_image)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product image for the product, {product_image.product_id.product_name}",message="Updated Product Image")
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True,"Product image updated successfully"
         
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2188,18 +2450,17 @@ class ManageProducts:
             #getting the product image
             product_image,message = ManageProducts.fetch_product_image(product_image_pk=product_image_pk)
             if product_image.product_image:
-                path = settings.MEDIA_ROOT+str(product_image.product_image)
-                if os.path.exists(path):
-                    os.remove(path)
-                product_image.product_image.delete()
+                #identical pictures of other products share the file, it is only deleted with its last reference
+                ImagePipeline.get().release(product_image,'product_image')
             #activity_updated, message = SystemLogs.admin_activites(request,f"Deleted Product image for the product, {product_image.product_id.product_name}",message="Deleted Product Image")
             product_image.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True,"Product image deleted successfully"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2217,7 +2478,7 @@ class ManageProducts:
             if product_id:
                 product,message = ManageProducts.fetch_product(product_pk=product_id)
                 product_discount = Product_Discount.objects.filter(product_id=product)
-                return product_discount, "Product Discounts fetched successfully" if len(product_discount)>0 else "No product discount found"
+                return product_discount, "Product Discounts fetched successfully" if product_discount.exists() else "No product discount found"
             elif product_discount_pk:
                 product_discount = Product_Discount.objects.get(pk=product_discount_pk)
                 return product_discount,"Product Discount fetched successfully"
@@ -2236,7 +2497,7 @@ class ManageProducts:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2262,12 +2523,13 @@ class ManageProducts:
             product_discount.save()
             #updated, message = SystemLogs.updated_by(request,product_discount)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Created Product Discount for the product, {product_discount.product_id.product_name}",message="Created Product Discount")
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True,"Product discount created successfully"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2298,13 +2560,14 @@ class ManageProducts:
             product_discount.save()
             #updated, message = SystemLogs.updated_by(request,product_discount)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Discount for the product, {product_discount.product_id.product_name}",message="Updated Product Discount")
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True, "Product Discount updated"
         
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -2322,12 +2585,13 @@ class ManageProducts:
             product_discount,message = ManageProducts.fetch_product_discount(product_discount_pk=product_discount_pk)
             #activity_updated, message = SystemLogs.admin_activites(request,f"Updated Product Discount for the product, {product_discount.product_id.product_name}",message="Updated Product Discount")
             product_discount.delete()
+            CatalogueCache.bump(CatalogueCache.PRODUCT)
             return True,"Product discount deleted successfully"
         except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -0,0 +1,155 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection, DatabaseError, OperationalError, IntegrityError, ProgrammingError
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from .models import Product, Product_Brands
+from system.manage_error_log import ManageErrorLog
+
+
+class ProductSearch:
+
+    '''
+    Full text product search.
+
+    On PostgreSQL every product keeps a weighted `search_vector` (name, brand, summary, ingredients, description)
+    backed by a GIN index, and product names carry a trigram GIN index for typo tolerant matching. Results are
+    ranked by full text rank and then by trigram similarity. Other databases fall back to case-insensitive
+    containment so development and tests keep working.
+    '''
+
+    SEARCH_CONFIG = 'english'
+    MAX_RESULTS = 50
+
+    def is_supported():
+        '''Full text search, trigram matching and the search vector column only exist on PostgreSQL'''
+        return connection.vendor == 'postgresql'
+
+    def search_vector_expression():
+        """
+        Return the weighted `SearchVector` expression stored in `Product.search_vector`.
+
+        The brand name is read with a sub-query so the expression can be used in `QuerySet.update()`,
+        which does not allow joins.
+        """
+        brand_name = Subquery(Product_Brands.objects.filter(pk=OuterRef('product_brand_id')).values('brand_name')[:1])
+        config = ProductSearch.SEARCH_CONFIG
+        return (
+            SearchVector('product_name', weight='A', config=config) +
+            SearchVector(brand_name, weight='A', config=config) +
+            SearchVector('product_summary', weight='B', config=config) +
+            SearchVector('product_ingredients', weight='C', config=config) +
+            SearchVector('product_description', weight='D', config=config)
+        )
+
+    def update_search_vector(product_pk_list=None, product_brand_pk=None):
+
+        """
+        Recompute the stored search vector of products in a single UPDATE statement.
+
+        Must be called after a product is created or updated, and after a brand is renamed, so the
+        indexed vector stays in sync. Does nothing on databases other than PostgreSQL.
+
+        Args:
+            product_pk_list (list, optional): Primary keys of the products to refresh.
+            product_brand_pk (int, optional): Refresh every product of this brand.
+                If neither argument is given, every product is refreshed.
+
+        Returns:
+            int: Number of products refreshed.
+
+        Example Usage:
+            ProductSearch.update_search_vector(product_pk_list=[product.pk])
+            ProductSearch.update_search_vector(product_brand_pk=brand.pk)
+        """
+        if not ProductSearch.is_supported():
+            return 0
+        products = Product.objects.all()
+        if product_pk_list is not None:
+            products = products.filter(pk__in=product_pk_list)
+        if product_brand_pk is not None:
+            products = products.filter(product_brand_id=product_brand_pk)
+        return products.update(search_vector=ProductSearch.search_vector_expression())
+
+    def search_condition(query):
+        """
+        Return the `Q` object selecting products that match `query`.
+
+        Shared by `search_products` and other product listings (such as facets) that must be
+        restricted to the same matches.
+        """
+        if ProductSearch.is_supported():
+            search_query = SearchQuery(query, search_type='websearch', config=ProductSearch.SEARCH_CONFIG)
+            return Q(search_vector=search_query) | Q(product_name__trigram_similar=query)
+        return (Q(product_name__icontains=query) | Q(product_brand__brand_name__icontains=query) |
+                Q(product_summary__icontains=query) | Q(product_ingredients__icontains=query))
+
+    def search_products(query, limit=20, offset=0):
+
+        """
+        Search products by name, brand, summary, ingredients and description, best matches first.
+
+        On PostgreSQL a product matches if its search vector matches the query (web search syntax: quoted
+        phrases, `or`, `-word`) or if its name is trigram-similar to the query, which tolerates typos such
+        as "moisturiser" for "moisturizer". Both conditions are served by GIN indexes and only the matching
+        rows are ranked.
+
+        Args:
+            query (str): Text typed by the user.
+            limit (int, optional): Maximum number of results, capped at `MAX_RESULTS`. Defaults to 20.
+            offset (int, optional): Number of results to skip. Defaults to 0.
+
+        Returns:
+            tuple:
+                - list or bool: Matching `Product` objects annotated with `rank` and `similarity`, or `False` if an error occurs.
+                - str: A message indicating the success or failure of the operation.
+
+        Example Usage:
+            products, message = ProductSearch.search_products("loreal moisturiser", limit=10)
+            for product in products:
+                print(product.product_name, product.rank)
+
+        Exception Handling:
+            - **DatabaseError**: Catches general database-related issues.
+                Message: "An unexpected error in Database occurred while searching products! Please try again later."
+            - **OperationalError**: Handles server-related issues such as connection problems.
+                Message: "An unexpected error in server occurred while searching products! Please try again later."
+            - **ProgrammingError**: Catches programming errors such as invalid queries.
+                Message: "An unexpected error in server occurred while searching products! Please try again later."
+            - **Exception**: A catch-all for any other unexpected errors.
+                Message: "An unexpected error occurred while searching products! Please try again later."
+
+        Notes:
+            - The function ensures that all errors are logged in `ErrorLogs` for debugging and analysis.
+        """
+        try:
+            query = (query or '').strip()
+            if not query:
+                return False, "Search query must not be empty"
+            limit = max(1, min(int(limit), ProductSearch.MAX_RESULTS))
+            offset = max(0, int(offset))
+
+            products = Product.objects.select_related('product_brand').filter(ProductSearch.search_condition(query))
+            if ProductSearch.is_supported():
+                search_query = SearchQuery(query, search_type='websearch', config=ProductSearch.SEARCH_CONFIG)
+                products = products.annotate(
+                    rank=SearchRank(F('search_vector'), search_query),
+                    similarity=TrigramSimilarity('product_name', query),
+                ).order_by('-rank', '-similarity', 'pk')
+            else:
+                products = products.annotate(rank=Value(0.0), similarity=Value(0.0)).order_by('product_name', 'pk')
+
+            results = list(products[offset:offset + limit])
+            return results, "Products searched successfully!" if results else "No products found for this search"
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            # Log the error
+            error_type = type(error).__name__  # Get the name of the error as a string
+            error_message = str(error)
+            ManageErrorLog.log_error(error_type, error_message)
+            print(f"{error_type} occurred: {error_message}")
+
+            # Return appropriate messages based on the error type
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while searching products! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while searching products! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while searching products! Please try again later.",
+            }
+            return False, error_messages.get(error_type, "An unexpected error occurred while searching products! Please try again later.")
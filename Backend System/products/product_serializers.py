@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import *
+from system.image_pipeline import ImagePipeline
 
 class Product_Category_Serializer(serializers.ModelSerializer):
     class Meta:
@@ -13,6 +14,11 @@ class Product_Sub_Category_Serializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class Product_Brands_Serializer(serializers.ModelSerializer):
+    #<picture> sources of the logo variants, best format first: [{"type": "image/webp", "srcset": "<url> 64w, <url> 244w"}, ...]
+    brand_logo_srcset = serializers.SerializerMethodField()
+
+    def get_brand_logo_srcset(self, obj):
+        return ImagePipeline.srcset(obj.brand_logo_variants)
 
     class Meta:
         model = Product_Brands
@@ -25,16 +31,47 @@ class Product_Flavour_Serializer(serializers.ModelSerializer):
 class Product_Serializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields= '__all__'
+        exclude = ['search_vector']
 class Product_SKU_Serializer(serializers.ModelSerializer):
     class Meta:
         model = Product_SKU
         fields= '__all__'
 class Product_Images_Serializer(serializers.ModelSerializer):
+    #<picture> sources of the image variants, best format first: [{"type": "image/webp", "srcset": "<url> 150w, ..."}, ...]
+    product_image_srcset = serializers.SerializerMethodField()
+
+    def get_product_image_srcset(self, obj):
+        return ImagePipeline.srcset(obj.product_image_variants)
+
     class Meta:
         model=Product_Images
         fields= '__all__'
+class Product_Videos_Serializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product_Videos
+        fields = '__all__'
+class Product_Video_Upload_Serializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product_Video_Upload
+        fields = ['upload_id','product_id','file_name','total_size','received_bytes','upload_status','product_video']
 class Product_Discount_Serializer(serializers.ModelSerializer):
     class Meta:
         model = Product_Discount
         fields = '__all__'
+
+class Product_Detail_SKU_Serializer(serializers.ModelSerializer):
+    product_flavours = Product_Flavour_Serializer(many=True,read_only=True)
+    class Meta:
+        model = Product_SKU
+        exclude = ['product_id']
+class Product_Detail_Serializer(serializers.ModelSerializer):
+    '''Read model for a full product page. Use with ManageProducts.product_detail_queryset to avoid N+1 queries'''
+    product_brand = Product_Brands_Serializer(read_only=True)
+    product_category = Product_Category_Serializer(many=True,read_only=True)
+    product_sub_category = Product_Sub_Category_Serializer(many=True,read_only=True)
+    product_skus = Product_Detail_SKU_Serializer(source='product_sku_set',many=True,read_only=True)
+    product_images = Product_Images_Serializer(source='product_images_set',many=True,read_only=True)
+    active_discounts = Product_Discount_Serializer(many=True,read_only=True)
+    class Meta:
+        model = Product
+        exclude = ['search_vector']
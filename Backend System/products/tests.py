@@ -2,14 +2,31 @@ from django.test import TestCase,RequestFactory
 from django.utils import timezone
 from products.models import *
 from products.product_management import ManageProducts
+from products import product_serializers
+from products.catalogue_cache import CatalogueCache
+from products.product_facets import ProductFacets
+from products.product_import import ProductImporter
+from products.product_export import ProductExport
+from django.core.cache import cache
 from django.db import *
+from django.db.models import QuerySet
 from system.models import *
 from django.core.files.uploadedfile import SimpleUploadedFile
 from business_admin.models import *
 from PIL import Image
-from io import BytesIO
+from io import BytesIO, StringIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import datetime
+import json
+from decimal import Decimal
+import os
+import tempfile
+from unittest.mock import patch
+from django.test import override_settings
+from system.image_pipeline import ImagePipeline
+from system.content_storage import ContentAddressedStorage
+from system.storage_gc import StorageGarbageCollector
+from system.views import media
 # Create your tests here.
 
 class TestManageProducts(TestCase):
@@ -469,6 +486,96 @@ class TestManageProducts(TestCase):
         self.assertFalse(success,"Product should not be fetched successfully.")
         self.assertEqual(message,"An unexpected error occurred while fetching product! Please try again later.", "Error message is incorrect")
 
+    def test_fetch_product_using_category_list_returns_lazy_queryset(self):
+        """
+        Test that category list lookups are resolved in the database with a fixed number of queries
+        """
+        with self.assertNumQueries(1):
+            products = ManageProducts.build_product_filter_queryset(product_category_pk_list=[self.category_skincare.pk,self.category_haircare.pk])
+        self.assertIsInstance(products, QuerySet, "Result should be a lazy queryset.")
+        with self.assertNumQueries(1):
+            product_pks = set(products.order_by('pk').values_list('pk',flat=True)[:10])
+        self.assertEqual(product_pks,{self.product1.pk,self.product2.pk,self.product3.pk},"Products of any given category should be returned once.")
+
+    def test_filter_products(self):
+        """
+        Test filtering products with AND/OR semantics across categories, sub-categories and brands
+        """
+        #any of the sub categories
+        products, message = ManageProducts.filter_products(product_sub_category_pk_list=[self.sub_category1.pk,self.sub_category2.pk])
+        self.assertEqual(set(products),{self.product1,self.product2},"Products with any of the sub categories should be returned.")
+        self.assertEqual(message,"Products fetched successfully!", "Success message is incorrect")
+
+        #all of the sub categories
+        products, message = ManageProducts.filter_products(product_sub_category_pk_list=[self.sub_category1.pk,self.sub_category2.pk],
+                                                           match_all_sub_categories=True)
+        self.assertEqual(list(products),[self.product1],"Only products with every sub category should be returned.")
+
+        #category and brand combined with AND
+        products, message = ManageProducts.filter_products(product_category_pk_list=[self.category_skincare.pk,self.category_haircare.pk],
+                                                           product_brand_pk_list=[self.brand1.pk])
+        self.assertEqual(set(products),{self.product1,self.product3},"Products should match both category and brand.")
+
+        #category and brand combined with OR
+        products, message = ManageProducts.filter_products(product_category_pk_list=[self.category_fragrance.pk],
+                                                           product_brand_pk_list=[self.brand1.pk],combine_with_or=True)
+        self.assertEqual(set(products),{self.product1,self.product3,self.product4,self.product5},"Products should match either category or brand.")
+
+        #no product matches
+        products, message = ManageProducts.filter_products(product_category_pk_list=[self.category_fragrance.pk],
+                                                           product_brand_pk_list=[self.brand1.pk])
+        self.assertFalse(products.exists(),"No products should be returned.")
+        self.assertEqual(message,"No products found using these filters", "Message is incorrect")
+
+        #unknown brand
+        success, message = ManageProducts.filter_products(product_brand_pk_list=[self.brand1.pk,9000])
+        self.assertFalse(success,"Products should not be fetched with an unknown brand.")
+        self.assertEqual(message,"An unexpected error occurred while fetching product! Please try again later.", "Error message is incorrect")
+
+    def test_fetch_product_detail(self):
+        """
+        Test fetching product details with SKUs, flavours, images and only the active discounts
+        """
+        product, message = ManageProducts.fetch_product_detail(product_pk=self.product1.pk)
+        self.assertEqual(message,"Product details fetched successfully!", "Success message is incorrect")
+        data = product_serializers.Product_Detail_Serializer(product).data
+        self.assertEqual(data['product_brand']['brand_name'],self.brand1.brand_name)
+        self.assertEqual(len(data['product_skus']),2,"Both SKUs should be included.")
+        self.assertEqual(data['product_skus'][0]['product_flavours'][0]['product_flavour_name'],"Vanilla")
+        self.assertEqual([d['discount_name'] for d in data['active_discounts']],["Active Discount"],"Only active discounts should be included.")
+
+        success, message = ManageProducts.fetch_product_detail(product_pk=100000)
+        self.assertFalse(success,"Product details should not be fetched.")
+        self.assertEqual(message,"An unexpected error occurred while fetching product details! Please try again later.", "Error message is incorrect")
+
+    def test_fetch_product_detail_query_count_is_constant(self):
+        """
+        Test that serialising product details costs the same number of queries for 1 and 1,000 products
+        """
+        def serialise(pk_list):
+            products, message = ManageProducts.fetch_product_detail(product_pk_list=pk_list)
+            return product_serializers.Product_Detail_Serializer(products,many=True).data
+
+        #one existence check plus the eight queries of the loading plan
+        with self.assertNumQueries(9):
+            self.assertEqual(len(serialise([self.product1.pk])),1)
+
+        now = timezone.now()
+        products = Product.objects.bulk_create([Product(product_name=f"Bulk Product {i}", product_brand=self.brand2, product_description="Bulk",
+                                                        product_summary="Bulk") for i in range(995)])
+        Product.product_category.through.objects.bulk_create([Product.product_category.through(product=p,product_category=self.category_makeup) for p in products])
+        Product.product_sub_category.through.objects.bulk_create([Product.product_sub_category.through(product=p,product_sub_category=self.sub_category5) for p in products])
+        skus = Product_SKU.objects.bulk_create([Product_SKU(product_id=p,product_sku=f"BULK_{p.pk}",product_price=10) for p in products])
+        Product_SKU.product_flavours.through.objects.bulk_create([Product_SKU.product_flavours.through(product_sku=sku,product_flavours=self.product_flavour1) for sku in skus])
+        Product_Images.objects.bulk_create([Product_Images(product_id=p) for p in products])
+        Product_Discount.objects.bulk_create([Product_Discount(product_id=p,discount_name=f"Bulk discount {p.pk}",discount_amount=1,
+                                                               start_date=now - datetime.timedelta(days=1),end_date=now + datetime.timedelta(days=1)) for p in products])
+
+        pk_list = list(Product.objects.values_list('pk',flat=True))
+        self.assertEqual(len(pk_list),1000)
+        with self.assertNumQueries(9):
+            self.assertEqual(len(serialise(pk_list)),1000)
+
     def test_create_product(self):
         """
         Test creating product, duplicate as well
@@ -693,4 +800,514 @@ class TestManageProducts(TestCase):
 
     
    
-        
\ No newline at end of file
+        
+
+
+class TestCatalogueCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        CatalogueCache.reset_stats()
+        self.factory = RequestFactory()
+
+    def test_get_or_set_counts_hits_and_misses(self):
+        """
+        Test that the first read misses, later reads hit and the loader runs only once
+        """
+        calls = []
+        def loader():
+            calls.append(1)
+            return ["Vanilla"]
+        for _ in range(3):
+            value = CatalogueCache.get_or_set(CatalogueCache.PRODUCT_FLAVOUR,'all',loader)
+            self.assertEqual(value,["Vanilla"])
+        self.assertEqual(len(calls),1,"Loader should only run on the first read.")
+        self.assertEqual(CatalogueCache.stats()[CatalogueCache.PRODUCT_FLAVOUR],{'hits':2,'misses':1})
+
+    def test_bump_invalidates_only_the_entity(self):
+        """
+        Test that bumping an entity hides its cached values and leaves other entities untouched
+        """
+        CatalogueCache.get_or_set(CatalogueCache.PRODUCT_BRAND,'all',lambda: "old brands")
+        CatalogueCache.get_or_set(CatalogueCache.PRODUCT_FLAVOUR,'all',lambda: "flavours")
+        CatalogueCache.bump(CatalogueCache.PRODUCT_BRAND)
+        self.assertEqual(CatalogueCache.get_or_set(CatalogueCache.PRODUCT_BRAND,'all',lambda: "new brands"),"new brands")
+        self.assertEqual(CatalogueCache.get_or_set(CatalogueCache.PRODUCT_FLAVOUR,'all',lambda: "changed"),"flavours")
+
+    def test_value_built_before_bump_is_not_served(self):
+        """
+        Test that a value loaded while the entity was bumped is stored under the old version
+        """
+        value, version = CatalogueCache.get(CatalogueCache.PRODUCT_CATEGORY,'all')
+        self.assertIsNone(value)
+        CatalogueCache.bump(CatalogueCache.PRODUCT_CATEGORY)
+        CatalogueCache.set(CatalogueCache.PRODUCT_CATEGORY,'all',"stale",version)
+        value, new_version = CatalogueCache.get(CatalogueCache.PRODUCT_CATEGORY,'all')
+        self.assertIsNone(value,"Stale value should not be served.")
+        self.assertNotEqual(version,new_version)
+
+    def test_manage_products_writes_bump_versions(self):
+        """
+        Test that creating, updating and deleting a product category bumps its version
+        """
+        request = self.factory.post('/product/categories/create/')
+        versions = [CatalogueCache.get_version(CatalogueCache.PRODUCT_CATEGORY)]
+        success, message = ManageProducts.create_product_category(request,"Skincare","Products for skincare")
+        self.assertTrue(success,"Product category should be created successfully.")
+        versions.append(CatalogueCache.get_version(CatalogueCache.PRODUCT_CATEGORY))
+        category = Product_Category.objects.get(category_name="Skincare")
+        success, message = ManageProducts.update_product_category(request,category.pk,"Skin care","Products for skincare")
+        self.assertTrue(success,"Product category should be updated successfully.")
+        versions.append(CatalogueCache.get_version(CatalogueCache.PRODUCT_CATEGORY))
+        success, message = ManageProducts.delete_product_category(request,category.pk)
+        self.assertTrue(success,"Product category should be deleted successfully.")
+        versions.append(CatalogueCache.get_version(CatalogueCache.PRODUCT_CATEGORY))
+        self.assertEqual(len(set(versions)),4,"Every write should bump the category version.")
+
+
+class TestProductFacets(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.skincare = Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+        self.makeup = Product_Category.objects.create(category_name="Makeup", description="Products for makeup")
+        self.loreal = Product_Brands.objects.create(brand_name="Loreal", brand_established_year=1909)
+        self.dove = Product_Brands.objects.create(brand_name="Dove", brand_established_year=2000)
+        self.vanilla = Product_Flavours.objects.create(product_flavour_name="Vanilla")
+
+        self.moisturizer = Product.objects.create(product_name="Loreal Moisturizer", product_brand=self.loreal, product_description="Moisturizer", product_summary="Moisturizer")
+        self.moisturizer.product_category.set([self.skincare])
+        self.lipstick = Product.objects.create(product_name="Loreal Lipstick", product_brand=self.loreal, product_description="Lipstick", product_summary="Lipstick")
+        self.lipstick.product_category.set([self.makeup])
+        self.cleanser = Product.objects.create(product_name="Dove Cleanser", product_brand=self.dove, product_description="Cleanser", product_summary="Cleanser")
+        self.cleanser.product_category.set([self.skincare])
+
+        sku = Product_SKU.objects.create(product_id=self.moisturizer, product_color="white", product_size="50ml", product_price=300)
+        sku.product_flavours.set([self.vanilla])
+        Product_SKU.objects.create(product_id=self.lipstick, product_color="red", product_price=1200)
+        Product_SKU.objects.create(product_id=self.lipstick, product_color="pink", product_price=1500)
+        Product_SKU.objects.create(product_id=self.cleanser, product_color="white", product_size="100ml", product_price=450)
+
+    def test_fetch_facets_without_filters(self):
+        """
+        Test facet counts over the whole catalogue
+        """
+        facets, message = ProductFacets.fetch_facets()
+        self.assertEqual(message, "Product facets fetched successfully!", "Success message is incorrect")
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {"Skincare": 2, "Makeup": 1})
+        self.assertEqual({b['name']: b['count'] for b in facets['brands']}, {"Loreal": 2, "Dove": 1})
+        self.assertEqual({c['value']: c['count'] for c in facets['colors']}, {"white": 2, "red": 1, "pink": 1})
+        self.assertEqual({s['value']: s['count'] for s in facets['sizes']}, {"50ml": 1, "100ml": 1})
+        self.assertEqual({f['name']: f['count'] for f in facets['flavours']}, {"Vanilla": 1})
+        self.assertEqual([band['count'] for band in facets['price_bands']], [2, 0, 1, 0, 0], "Lipstick should be counted once in its band.")
+
+    def test_fetch_facets_are_disjunctive(self):
+        """
+        Test that each facet ignores its own selection but applies the others
+        """
+        facets, message = ProductFacets.fetch_facets({'category': [self.skincare.pk], 'color': ['white']})
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {"Skincare": 2}, "Categories should apply the colour filter only.")
+        self.assertEqual({c['value']: c['count'] for c in facets['colors']}, {"white": 2}, "Colours should apply the category filter only.")
+        self.assertEqual({b['name']: b['count'] for b in facets['brands']}, {"Loreal": 1, "Dove": 1})
+
+    def test_fetch_facets_query_count_and_cache(self):
+        """
+        Test that facets cost a bounded number of queries and are served from cache until a catalogue write
+        """
+        #two pk checks, the total and one grouped query per facet
+        with self.assertNumQueries(10):
+            ProductFacets.fetch_facets({'category': [self.skincare.pk], 'brand': [self.loreal.pk]})
+        with self.assertNumQueries(0):
+            ProductFacets.fetch_facets({'brand': [self.loreal.pk], 'category': [self.skincare.pk]})
+        CatalogueCache.bump(CatalogueCache.PRODUCT)
+        facets, message = ProductFacets.fetch_facets({'category': [self.skincare.pk], 'brand': [self.loreal.pk]})
+        self.assertEqual(facets['total'], 1)
+
+    def test_fetch_facets_unknown_category(self):
+        """
+        Test facets for a category that does not exist
+        """
+        success, message = ProductFacets.fetch_facets({'category': [90000]})
+        self.assertFalse(success, "Facets should not be fetched for a missing category.")
+        self.assertEqual(message, "An unexpected error occurred while fetching product facets! Please try again later.")
+
+
+class TestProductImporter(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.skincare = Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+        self.face = Product_Sub_Category.objects.create(sub_category_name="Face", description="Products for face")
+        self.face.category_id.set([self.skincare])
+        self.loreal = Product_Brands.objects.create(brand_name="Loreal", brand_established_year=1909)
+        self.vanilla = Product_Flavours.objects.create(product_flavour_name="Vanilla")
+        Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+
+    def test_import_csv(self):
+        """
+        Test that rows sharing a product name become SKUs of one product and bad rows are reported
+        """
+        csv_file = StringIO(
+            "product_name,product_description,product_summary,brand,categories,sub_categories,color,size,price,stock,flavours\n"
+            "Loreal Moisturizer,Moisturizer,Moisturizer,loreal,Skincare,Face,white,50ml,300,10,Vanilla\n"
+            "Loreal Moisturizer,,,loreal,Skincare,Face,white,50ml,320,5,\n"
+            "Loreal Serum,Serum,Serum,Loreal,Skincare|Makeup,,red,,100,1,\n"
+            "Dove Cleanser,Cleanser,Cleanser,,Skincare,,white,,450,3,\n"
+            "Loreal Toner,Toner,Toner,Loreal,Skincare,,white,,abc,3,\n"
+        )
+        result = ProductImporter(chunk_size=2).import_file(csv_file, 'csv')
+        self.assertEqual(result['rows'], 5)
+        self.assertEqual(result['products_created'], 1)
+        self.assertEqual(result['skus_created'], 2)
+        self.assertEqual([error['row'] for error in result['errors']], [3, 4, 5])
+        self.assertEqual(result['errors'][0]['error'], "Unknown categories: Makeup")
+        self.assertEqual(result['errors'][1]['error'], "Same product already exists!")
+
+        product = Product.objects.get(product_name="Loreal Moisturizer")
+        self.assertEqual(product.product_brand, self.loreal)
+        self.assertEqual(list(product.product_category.all()), [self.skincare])
+        self.assertEqual(list(product.product_sub_category.all()), [self.face])
+        skus = list(Product_SKU.objects.filter(product_id=product).order_by('pk'))
+        self.assertEqual(len(skus), 2)
+        self.assertTrue(skus[0].product_sku.startswith("LOREAL_MOISTURIZER_WHITE_50ML_1_"))
+        self.assertTrue(skus[1].product_sku.startswith("LOREAL_MOISTURIZER_WHITE_50ML_2_"))
+        self.assertEqual(list(skus[0].product_flavours.all()), [self.vanilla])
+
+    def test_import_jsonl(self):
+        """
+        Test importing JSON lines with list values and a malformed line
+        """
+        jsonl_file = StringIO(
+            '{"product_name": "Loreal Serum", "product_description": "Serum", "product_summary": "Serum", "categories": ["Skincare"], "flavours": ["vanilla"], "price": 100}\n'
+            'not json\n'
+            '\n'
+            '{"product_name": "Loreal Serum", "color": "gold", "price": "150.50", "stock": 2}\n'
+        )
+        result = ProductImporter().import_file(jsonl_file, 'jsonl')
+        self.assertEqual(result['products_created'], 1)
+        self.assertEqual(result['skus_created'], 2)
+        self.assertEqual(result['errors'], [{'row': 2, 'error': "Row is not a JSON object"}])
+        self.assertEqual(Product_SKU.objects.get(product_color="gold").product_price, Decimal('150.50'))
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        """
+        Test that a chunk is inserted with a fixed number of queries
+        """
+        rows = "".join(f"Product {i},Description,Summary,Loreal,Skincare,Face,white,,100,1,Vanilla\n" for i in range(50))
+        csv_file = StringIO("product_name,product_description,product_summary,brand,categories,sub_categories,color,size,price,stock,flavours\n" + rows)
+        importer = ProductImporter()
+        #existing name check, savepoint, products, two through tables, SKU codes, SKUs, flavours, release.
+        #50 rows fit in one INSERT per table even with SQLite's bound parameter limit
+        with self.assertNumQueries(9):
+            result = importer.import_file(csv_file, 'csv')
+        self.assertEqual(result['products_created'], 50)
+        self.assertEqual(Product_SKU.objects.count(), 50)
+
+
+class TestProductExport(TestCase):
+
+    def setUp(self):
+        self.skincare = Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+        self.loreal = Product_Brands.objects.create(brand_name="Loreal", brand_established_year=1909)
+        self.vanilla = Product_Flavours.objects.create(product_flavour_name="Vanilla")
+        self.moisturizer = Product.objects.create(product_name="Loreal Moisturizer", product_brand=self.loreal, product_description="Moisturizer", product_summary="Moisturizer")
+        self.moisturizer.product_category.set([self.skincare])
+        sku = Product_SKU.objects.create(product_id=self.moisturizer, product_color="white", product_size="50ml", product_price=300, product_stock=4)
+        sku.product_flavours.set([self.vanilla])
+        Product_SKU.objects.create(product_id=self.moisturizer, product_color="red", product_price=320)
+        Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        now = timezone.now()
+        Product_Discount.objects.create(product_id=self.moisturizer, discount_name="Eid", discount_amount=20,
+                                        start_date=now - datetime.timedelta(days=1), end_date=now + datetime.timedelta(days=1))
+        Product_Discount.objects.create(product_id=self.moisturizer, discount_name="Expired", discount_amount=50,
+                                        start_date=now - datetime.timedelta(days=5), end_date=now - datetime.timedelta(days=1))
+
+    def test_export_csv_can_be_imported(self):
+        """
+        Test the CSV export rows and that its columns are accepted by the importer
+        """
+        lines = "".join(ProductExport.generate('csv')).splitlines()
+        self.assertEqual(len(lines), 4, "Header, two SKUs and one product without SKU")
+        header = lines[0].split(',')
+        first = dict(zip(header, lines[1].split(',')))
+        self.assertEqual(first['product_name'], "Loreal Moisturizer")
+        self.assertEqual(first['brand'], "Loreal")
+        self.assertEqual(first['categories'], "Skincare")
+        self.assertEqual(first['flavours'], "Vanilla")
+        self.assertEqual(first['discount_name'], "Eid", "Expired discounts must not be exported")
+        self.assertEqual(dict(zip(header, lines[3].split(',')))['sku'], "")
+
+        Product.objects.all().delete()
+        result = ProductImporter().import_file(StringIO("\n".join(lines)), 'csv')
+        self.assertEqual(result['products_created'], 2)
+        self.assertEqual(result['errors'], [])
+
+    def test_export_jsonl_and_columnar(self):
+        """
+        Test that JSONL has one object per row and columnar groups rows per chunk
+        """
+        rows = [json.loads(line) for line in ProductExport.generate('jsonl')]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['categories'], ["Skincare"])
+        self.assertEqual(rows[0]['price'], "300.00")
+
+        lines = [json.loads(line) for line in ProductExport.generate('columnar', chunk_size=2)]
+        self.assertEqual([column['name'] for column in lines[0]['schema']], [name for name, _ in ProductExport.COLUMNS])
+        self.assertEqual([group['num_rows'] for group in lines[1:]], [2, 1])
+        self.assertEqual(lines[1]['columns']['color'], ["white", "red"])
+
+    def test_export_query_count_per_chunk(self):
+        """
+        Test that every chunk costs the row fetch plus one query per name lookup
+        """
+        with self.assertNumQueries(4):
+            list(ProductExport.generate('jsonl', chunk_size=10))
+        #the row cursor is one query, the second chunk has no SKU so it skips the flavour lookup
+        with self.assertNumQueries(6):
+            list(ProductExport.generate('jsonl', chunk_size=2))
+
+
+class TestProductSKUCodes(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(product_name="Loreal Lipstick", product_description="Lipstick", product_summary="Lipstick")
+
+    def test_save_allocates_next_number_without_reading_skus(self):
+        """
+        Test that creating a SKU costs the counter statement and the insert, and numbers are never reused
+        """
+        with self.assertNumQueries(2):
+            first = Product_SKU.objects.create(product_id=self.product, product_color="red", product_price=100)
+        self.assertTrue(first.product_sku.startswith("LOREAL_LIPSTICK_RED_NO_SIZE_1_"))
+        first.delete()
+        second = Product_SKU.objects.create(product_id=self.product, product_color="red", product_price=100)
+        self.assertTrue(second.product_sku.startswith("LOREAL_LIPSTICK_RED_NO_SIZE_2_"), "A deleted SKU's number must not be handed out again.")
+
+    def test_update_tracks_changed_fields_in_memory(self):
+        """
+        Test that saving a loaded SKU does not query it again and only a color or size change regenerates the code
+        """
+        Product_SKU.objects.create(product_id=self.product, product_color="red", product_price=100)
+        sku = Product_SKU.objects.select_related('product_id').get(product_color="red")
+        code = sku.product_sku
+        sku.product_stock = 5
+        with self.assertNumQueries(1):
+            sku.save()
+        self.assertEqual(sku.product_sku, code)
+        #a price change also ticks the price clock, in one transaction with the update
+        sku.product_price = 120
+        with self.assertNumQueries(4):
+            sku.save()
+        self.assertEqual(sku.price_version, Product_Price_Clock.current())
+        self.assertEqual(sku.product_sku, code)
+        sku.product_color = "pink"
+        with self.assertNumQueries(2):
+            sku.save()
+        self.assertTrue(sku.product_sku.startswith("LOREAL_LIPSTICK_PINK_NO_SIZE_1_"))
+
+    def test_assign_sku_codes_for_a_batch(self):
+        """
+        Test that a batch covering several colors is numbered with one statement after the existing SKUs
+        """
+        Product_SKU.objects.create(product_id=self.product, product_color="red", product_price=100)
+        skus = [Product_SKU(product_id=self.product, product_color=color, product_price=100) for color in ("red", "red", "pink")]
+        with self.assertNumQueries(1):
+            Product_SKU.assign_sku_codes(skus)
+        Product_SKU.objects.bulk_create(skus)
+        self.assertEqual([sku.product_sku.rsplit('_', 2)[1] for sku in skus], ["2", "3", "1"])
+        self.assertEqual(Product_SKU_Sequence.objects.get(product_id=self.product, product_color="red", product_size="").last_number, 3)
+
+
+class TestCaseInsensitiveNames(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.request = self.factory.post('/product/')
+        self.skincare = Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+        self.makeup = Product_Category.objects.create(category_name="Makeup", description="Products for makeup")
+        self.loreal = Product_Brands.objects.create(brand_name="Loreal", brand_established_year=1909)
+
+    def test_duplicate_check_is_a_single_query(self):
+        """
+        Test that duplicate names are found with one probe whatever the table size
+        """
+        Product_Brands.objects.bulk_create([Product_Brands(brand_name=f"Brand {i}", brand_established_year=2000) for i in range(50)])
+        with self.assertNumQueries(1):
+            success, message = ManageProducts.create_product_brand(self.request, "LOREAL", 1909, False)
+        self.assertFalse(success, "Brand names should be unique regardless of case")
+        self.assertEqual(message, "Same brand exists in Database!")
+
+    def test_unique_index_rejects_case_variants(self):
+        """
+        Test that the database itself rejects a name that only differs in case
+        """
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Product_Category.objects.create(category_name="SKINCARE", description="Duplicate")
+
+    def test_update_keeps_own_name(self):
+        """
+        Test that a row may be saved again with its own name in another case but not with another row's name
+        """
+        success, message = ManageProducts.update_product_category(self.request, self.skincare.pk, "SkinCare", "Products for skincare")
+        self.assertTrue(success, "A category should keep its own name.")
+        success, message = ManageProducts.update_product_category(self.request, self.skincare.pk, "makeup", "Products for skincare")
+        self.assertFalse(success, "A category should not take another category's name.")
+        self.assertEqual(message, "Same type exists in Database!")
+
+    def test_existing_sub_category_is_linked_to_another_category(self):
+        """
+        Test that creating a sub category that exists under another category links it instead of duplicating it
+        """
+        success, message = ManageProducts.create_product_sub_category(self.request, self.skincare.pk, "Face", "Products for face")
+        self.assertTrue(success)
+        success, message = ManageProducts.create_product_sub_category(self.request, self.makeup.pk, "FACE", "Products for face")
+        self.assertTrue(success, "The existing sub category should be added to the category.")
+        self.assertEqual(Product_Sub_Category.objects.count(), 1)
+        self.assertEqual(set(Product_Sub_Category.objects.get().category_id.values_list('pk', flat=True)), {self.skincare.pk, self.makeup.pk})
+        success, message = ManageProducts.create_product_sub_category(self.request, self.makeup.pk, "face", "Products for face")
+        self.assertFalse(success)
+        self.assertEqual(message, "Same type exists in Database!")
+
+
+
+
+class TestImagePipeline(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.request = RequestFactory().get('/')
+        self.product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    @staticmethod
+    def upload(name, size=(1000, 500)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color='pink').save(buffer, format='JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_create_product_image_records_variants(self):
+        """
+        Test that the original is stored unchanged and every variant is recorded in each format
+        """
+        success, message = ManageProducts.create_product_image(self.request, self.product.pk, [self.upload('front.jpg')], color="pink")
+        self.assertTrue(success, message)
+        product_image = Product_Images.objects.get()
+        self.assertEqual(product_image.color, "pink")
+        self.assertEqual(product_image.product_image.width, 1000, "The original should not be resized.")
+        variants = product_image.product_image_variants
+        self.assertEqual(set(variants), {'thumbnail', 'card', 'detail'})
+        self.assertEqual((variants['detail']['width'], variants['detail']['height']), (632, 316))
+        self.assertEqual(variants['thumbnail']['width'], 150)
+        self.assertIn('jpeg', variants['card'])
+        self.assertIn('webp', variants['card'])
+        stem = os.path.splitext(product_image.product_image.name)[0]
+        self.assertTrue(ContentAddressedStorage.is_immutable(product_image.product_image.name), product_image.product_image.name)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root.name, f'{stem}_thumbnail.webp')))
+
+    def test_replaced_image_drops_old_variants(self):
+        """
+        Test that updating an image queues the old files for the garbage collector and renders the new image
+        """
+        ManageProducts.create_product_image(self.request, self.product.pk, [self.upload('front.jpg')])
+        product_image = Product_Images.objects.get()
+        success, message = ManageProducts.update_product_image(self.request, product_image.pk, self.upload('back.jpg', size=(300, 600)))
+        self.assertTrue(success, message)
+        old_name = product_image.product_image.name
+        product_image.refresh_from_db()
+        self.assertNotEqual(product_image.product_image.name, old_name)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root.name, old_name)), "Files are deleted outside the request.")
+        StorageGarbageCollector(grace_seconds=0).process_queue()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root.name, old_name)))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root.name, f'{os.path.splitext(old_name)[0]}_card.jpg')))
+        self.assertEqual(product_image.product_image_variants['card']['height'], 400)
+
+    def test_customer_profile_picture_gets_variants(self):
+        """
+        Test that saving a new customer profile picture queues its variants without a manage function doing it
+        """
+        customer = Accounts.objects.create_user(email='avatar@test.com', username='avatar', password='password')
+        customer.profile_picture = self.upload('me.jpg', size=(800, 800))
+        customer.save()
+        customer.refresh_from_db()
+        self.assertEqual(customer.profile_picture_variants['card']['width'], 244)
+        #saving other fields does not render the variants again
+        with patch.object(ImagePipeline, 'process') as process:
+            customer.first_name = "Nadia"
+            customer.save()
+        process.assert_not_called()
+
+    def test_asynchronous_pipeline_waits_for_commit(self):
+        """
+        Test that the worker pool only renders variants after the transaction commits
+        """
+        pipeline = ImagePipeline(max_workers=1, asynchronous=True)
+        product_image = Product_Images.objects.create(product_id=self.product, product_image=self.upload('side.png'))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            pipeline.process_later(product_image, 'product_image')
+        self.assertEqual(len(callbacks), 1)
+        product_image.refresh_from_db()
+        self.assertIsNone(product_image.product_image_variants, "Nothing should run before the commit.")
+        #run the job in this thread, a worker thread cannot see the uncommitted test transaction
+        with patch.object(pipeline, '_submit', side_effect=lambda job: pipeline.process(*job)):
+            callbacks[0]()
+        product_image.refresh_from_db()
+        self.assertEqual(set(product_image.product_image_variants), {'thumbnail', 'card', 'detail'})
+
+    def test_identical_uploads_share_one_file(self):
+        """
+        Test that the same picture uploaded for two products is stored once and kept while either uses it
+        """
+        other_product = Product.objects.create(product_name="Dove Toner", product_description="Toner", product_summary="Toner")
+        ManageProducts.create_product_image(self.request, self.product.pk, [self.upload('front.jpg')])
+        ManageProducts.create_product_image(self.request, other_product.pk, [self.upload('copy of front.jpg')])
+        first, second = Product_Images.objects.order_by('pk')
+        self.assertEqual(first.product_image.name, second.product_image.name)
+        self.assertEqual(first.product_image_variants, second.product_image_variants)
+        stored = os.path.join(self.media_root.name, first.product_image.name)
+
+        success, message = ManageProducts.delete_product_image(self.request, first.pk)
+        self.assertTrue(success, message)
+        StorageGarbageCollector(grace_seconds=0).process_queue()
+        self.assertTrue(os.path.exists(stored), "The file is still used by the other product.")
+        success, message = ManageProducts.delete_product_image(self.request, second.pk)
+        self.assertTrue(success, message)
+        StorageGarbageCollector(grace_seconds=0).process_queue()
+        self.assertFalse(os.path.exists(stored))
+
+    def test_serializer_lists_srcset_sources(self):
+        """
+        Test that the image serializer returns <picture> sources ordered by width
+        """
+        ManageProducts.create_product_image(self.request, self.product.pk, [self.upload('front.jpg')])
+        data = product_serializers.Product_Images_Serializer(Product_Images.objects.get()).data
+        sources = {source['type']: source['srcset'] for source in data['product_image_srcset']}
+        self.assertEqual(list(sources)[0], 'image/webp')
+        self.assertIn('image/jpeg', sources)
+        widths = [candidate.rsplit(' ', 1)[1] for candidate in sources['image/jpeg'].split(', ')]
+        self.assertEqual(widths, ['150w', '400w', '632w'])
+
+    def test_media_view_caches_hashed_files_for_a_year(self):
+        """
+        Test that content-hashed files are served as immutable and answer revalidation with 304
+        """
+        ManageProducts.create_product_image(self.request, self.product.pk, [self.upload('front.jpg')])
+        name = Product_Images.objects.get().product_image.name
+        response = media(RequestFactory().get(f'/media_files/{name}'), name)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+        not_modified = media(RequestFactory().get(f'/media_files/{name}', HTTP_IF_NONE_MATCH=response['ETag']), name)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with open(os.path.join(self.media_root.name, 'legacy.jpg'), 'wb') as legacy:
+            legacy.write(self.upload('legacy.jpg').read())
+        response = media(RequestFactory().get('/media_files/legacy.jpg'), 'legacy.jpg')
+        self.assertIn('no-cache', response['Cache-Control'])
@@ -0,0 +1,345 @@
+import hashlib
+import os
+import re
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, OperationalError, IntegrityError, ProgrammingError, transaction
+from django.utils import timezone
+from .models import Product, Product_Videos, Product_Video_Upload
+from system.manage_error_log import ManageErrorLog
+from system.video_pipeline import VideoPipeline
+
+
+class _ChunkReader:
+    '''Reads exactly `length` bytes of a request body, hashing them on the way'''
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+        self.read_bytes = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        if not data:
+            self.remaining = 0
+        self.read_bytes += len(data)
+        self.digest.update(data)
+        return data
+
+
+class _JoinedChunks:
+    '''Reads the stored chunks of an upload one after the other as a single file, hashing them on the way'''
+
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = list(names)
+        self.current = None
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = b''
+        while size is None or size < 0 or len(data) < size:
+            if self.current is None:
+                if not self.names:
+                    break
+                self.current = self.storage.open(self.names.pop(0), 'rb')
+            part = self.current.read(-1 if size is None or size < 0 else size - len(data))
+            if not part:
+                self.current.close()
+                self.current = None
+                continue
+            data += part
+        self.digest.update(data)
+        return data
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+class ManageVideoUploads:
+
+    '''
+    Resumable, chunked upload of product videos.
+
+    A client creates an upload with the size and SHA-256 of the file, sends it in chunks with the offset each one
+    starts at and finalises it. Every chunk is streamed from the request straight to the storage of
+    `Product_Videos.product_videos` (local disk or the S3 backend), as `product_video_uploads/<upload_id>/<offset>.part`,
+    so neither the request nor the server ever holds the whole video. An interrupted upload resumes from
+    `received_bytes`. Finalising joins the chunks into the video file, checks the checksum, creates the
+    `Product_Videos` row and hands it to `VideoPipeline` for the poster frame and duration.
+
+    Every attempt at a chunk is written under its own name first and only moved to the offset name once the
+    upload accepted it, so a retry or a concurrent request can never replace an accepted chunk. Uploads that
+    received nothing for `ABANDON_SECONDS` are failed and their chunks deleted by `manage.py expire_video_uploads`.
+
+    Example Usage:
+        upload, message = ManageVideoUploads.create_upload(request, product_pk=1, file_name="demo.mp4", total_size=size,
+                                                           checksum=sha256, color="Red", size="M")
+        upload, message = ManageVideoUploads.write_chunk(upload, offset=0, stream=request.stream, length=chunk_length)
+        product_video, message = ManageVideoUploads.finalise_upload(request, upload)
+    '''
+
+    CHUNK_FOLDER = 'product_video_uploads'
+    CHECKSUM_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+    def options():
+        options = {'CHUNK_SIZE': 8 * 1024 * 1024, 'MAX_CHUNK_SIZE': 64 * 1024 * 1024, 'MAX_SIZE': 5 * 1024 ** 3,
+                   'EXTENSIONS': ('mp4', 'm4v', 'mov', 'webm'), 'ABANDON_SECONDS': 24 * 60 * 60}
+        options.update(getattr(settings, 'VIDEO_UPLOAD', {}))
+        return options
+
+    def storage():
+        return Product_Videos._meta.get_field('product_videos').storage
+
+    def chunk_name(upload, offset):
+        #zero padded so the chunks sort by offset
+        return f'{ManageVideoUploads.CHUNK_FOLDER}/{upload.upload_id}/{offset:015d}.part'
+
+    def attempt_name(upload, offset):
+        #one per request, a chunk only gets its offset name once the upload accepted it
+        return f'{ManageVideoUploads.CHUNK_FOLDER}/{upload.upload_id}/{offset:015d}.{uuid.uuid4().hex}.attempt'
+
+    def promote(storage, attempt_name, name):
+        '''Move an accepted attempt to the chunk name of its offset'''
+        try:
+            os.replace(storage.path(attempt_name), storage.path(name))
+            return
+        except NotImplementedError:
+            #remote storage such as S3 has no rename, the chunk is copied
+            pass
+        if storage.exists(name):
+            storage.delete(name)
+        with storage.open(attempt_name, 'rb') as file:
+            storage.save(name, file)
+        storage.delete(attempt_name)
+
+    def create_upload(request, product_pk, file_name, total_size, checksum, color, size):
+
+        """
+        Start a chunked video upload for a product.
+
+        Args:
+            request (Request): The request object containing the user information.
+            product_pk (int): Primary key of the product the video belongs to.
+            file_name (str): Name of the video file, its extension must be one of settings.VIDEO_UPLOAD['EXTENSIONS'].
+            total_size (int): Size of the whole file in bytes.
+            checksum (str): SHA-256 of the whole file, hex encoded. Checked when the upload is finalised.
+            color (str): The color of the product shown in the video.
+            size (str): The size of the product shown in the video.
+
+        Returns:
+            tuple:
+                - Product_Video_Upload or None: The new upload, `None` if it could not be created.
+                - str: A message indicating the success or failure of the operation.
+
+        Exception Handling:
+            - **DatabaseError**, **OperationalError**, **ProgrammingError**, **IntegrityError** and **Exception** are
+              logged in `ErrorLogs` and answered with a generic message.
+        """
+        try:
+            options = ManageVideoUploads.options()
+            extension = os.path.splitext(file_name or '')[1].lstrip('.').lower()
+            if extension not in options['EXTENSIONS']:
+                return None, f"Unsupported video format. Use one of {', '.join(options['EXTENSIONS'])}"
+            try:
+                total_size = int(total_size)
+            except (TypeError, ValueError):
+                return None, "Total size must be a number of bytes"
+            if total_size <= 0 or total_size > options['MAX_SIZE']:
+                return None, f"Total size must be between 1 and {options['MAX_SIZE']} bytes"
+            checksum = str(checksum or '').lower()
+            if not ManageVideoUploads.CHECKSUM_PATTERN.match(checksum):
+                return None, "Checksum must be the SHA-256 of the file, hex encoded"
+            product = Product.objects.filter(pk=product_pk).first()
+            if product is None:
+                return None, "Product does not exist"
+            upload = Product_Video_Upload.objects.create(product_id=product, file_name=os.path.basename(file_name),
+                                                         total_size=total_size, checksum=checksum, color=color, size=str(size))
+            return upload, "Video upload created"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while creating video upload! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while creating video upload! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while creating video upload! Please try again later.",
+                "IntegrityError": "Same type exists in Database!",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while creating video upload! Please try again later.")
+
+    def fetch_upload(upload_id):
+        '''Returns `(upload, message)`, the upload is `None` if it does not exist'''
+        upload = Product_Video_Upload.objects.filter(upload_id=upload_id).first()
+        if upload is None:
+            return None, "Video upload does not exist"
+        return upload, "Fetched video upload"
+
+    def write_chunk(upload, offset, stream, length, chunk_checksum=None):
+
+        """
+        Stream one chunk of the request body to storage and advance the upload.
+
+        The chunk must start at `upload.received_bytes`. A chunk that is cut short or does not match
+        `chunk_checksum` is discarded and can be sent again from the same offset.
+
+        Args:
+            upload (Product_Video_Upload): The upload the chunk belongs to.
+            offset (int): Offset of the first byte of the chunk in the file.
+            stream: File-like request body, read in pieces, never as a whole.
+            length (int): Number of bytes of the chunk (the request `Content-Length`).
+            chunk_checksum (str, optional): SHA-256 of the chunk, hex encoded.
+
+        Returns:
+            tuple:
+                - Product_Video_Upload or None: The upload with the new `received_bytes`, `None` if the chunk was rejected.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - Two clients sending the same offset at once: one of them advances the upload, the other is rejected
+              and its bytes are deleted. An accepted chunk is never overwritten.
+        """
+        try:
+            options = ManageVideoUploads.options()
+            if upload.upload_status != 'uploading':
+                return None, f"Video upload is {upload.upload_status}"
+            if offset != upload.received_bytes:
+                return None, f"Chunk must start at offset {upload.received_bytes}"
+            if length <= 0 or stream is None:
+                return None, "Chunk is empty"
+            if length > options['MAX_CHUNK_SIZE']:
+                return None, f"Chunks can be at most {options['MAX_CHUNK_SIZE']} bytes"
+            if offset + length > upload.total_size:
+                return None, "Chunk goes past the end of the file"
+
+            storage = ManageVideoUploads.storage()
+            reader = _ChunkReader(stream, length)
+            attempt_name = storage.save(ManageVideoUploads.attempt_name(upload, offset), File(reader, name='chunk.attempt'))
+            if reader.read_bytes != length:
+                storage.delete(attempt_name)
+                return None, f"Chunk was cut short after {reader.read_bytes} of {length} bytes"
+            if chunk_checksum and reader.digest.hexdigest() != chunk_checksum.lower():
+                storage.delete(attempt_name)
+                return None, "Chunk checksum does not match"
+
+            advanced = Product_Video_Upload.objects.filter(pk=upload.pk, received_bytes=offset, upload_status='uploading') \
+                .update(received_bytes=offset + length, updated_at=timezone.now())
+            if not advanced:
+                storage.delete(attempt_name)
+                return None, "Another chunk was written at this offset first"
+            ManageVideoUploads.promote(storage, attempt_name, ManageVideoUploads.chunk_name(upload, offset))
+            upload.received_bytes = offset + length
+            return upload, "Chunk received"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            return None, "An unexpected error occurred while receiving video chunk! Please try again later."
+
+    def finalise_upload(request, upload):
+
+        """
+        Join the chunks of a fully received upload into a `Product_Videos` row.
+
+        The chunks are read one after the other into the video storage, hashing them on the way, so the file is
+        never held in memory. If the SHA-256 differs from the one given when the upload was created, the file
+        and chunks are deleted and the upload is marked failed. Finalising a complete upload again returns its video.
+
+        Args:
+            request (Request): The request object containing the user information.
+            upload (Product_Video_Upload): The upload to finalise.
+
+        Returns:
+            tuple:
+                - Product_Videos or None: The video, `None` if the upload could not be finalised.
+                - str: A message indicating the success or failure of the operation.
+
+        Notes:
+            - The poster frame and duration are extracted after the transaction commits by `VideoPipeline`.
+        """
+        try:
+            if upload.upload_status == 'complete' and upload.product_video_id:
+                return upload.product_video, "Video upload was already finalised"
+            if upload.upload_status != 'uploading':
+                return None, f"Video upload is {upload.upload_status}"
+            if upload.received_bytes != upload.total_size:
+                return None, f"{upload.total_size - upload.received_bytes} bytes of the video have not been received"
+
+            storage = ManageVideoUploads.storage()
+            #the accepted chunks, from offset 0 each one starting where the previous one ends
+            names, offset = [], 0
+            while offset < upload.total_size:
+                name = ManageVideoUploads.chunk_name(upload, offset)
+                if not storage.exists(name):
+                    ManageVideoUploads.fail_upload(upload)
+                    return None, "A chunk of the video is missing, please upload it again"
+                names.append(name)
+                offset += storage.size(name)
+            joined = _JoinedChunks(storage, names)
+            product_video = Product_Videos(product_id=upload.product_id, color=upload.color, size=upload.size)
+            try:
+                product_video.product_videos.save(upload.file_name, File(joined, name=upload.file_name), save=False)
+            finally:
+                joined.close()
+
+            if joined.digest.hexdigest() != upload.checksum:
+                storage.delete(product_video.product_videos.name)
+                ManageVideoUploads.fail_upload(upload)
+                return None, "Video checksum does not match, please upload it again"
+
+            with transaction.atomic():
+                product_video.save()
+                upload.product_video = product_video
+                upload.upload_status = 'complete'
+                upload.save(update_fields=['product_video', 'upload_status', 'updated_at'])
+            ManageVideoUploads.delete_chunks(upload)
+            VideoPipeline.get().process_later(product_video)
+            return product_video, "Product video uploaded successfully"
+
+        except (DatabaseError, OperationalError, ProgrammingError, IntegrityError, Exception) as error:
+            error_type = type(error).__name__
+            ManageErrorLog.log_error(error_type, str(error))
+            error_messages = {
+                "DatabaseError": "An unexpected error in Database occurred while finalising video upload! Please try again later.",
+                "OperationalError": "An unexpected error in server occurred while finalising video upload! Please try again later.",
+                "ProgrammingError": "An unexpected error in server occurred while finalising video upload! Please try again later.",
+                "IntegrityError": "Same type exists in Database!",
+            }
+            return None, error_messages.get(error_type, "An unexpected error occurred while finalising video upload! Please try again later.")
+
+    def delete_chunks(upload):
+        storage = ManageVideoUploads.storage()
+        folder = f'{ManageVideoUploads.CHUNK_FOLDER}/{upload.upload_id}'
+        try:
+            file_names = storage.listdir(folder)[1]
+        except FileNotFoundError:
+            return
+        for file_name in file_names:
+            storage.delete(f'{folder}/{file_name}')
+
+    def fail_upload(upload):
+        Product_Video_Upload.objects.filter(pk=upload.pk).update(upload_status='failed', updated_at=timezone.now())
+        upload.upload_status = 'failed'
+        ManageVideoUploads.delete_chunks(upload)
+
+    def expire_abandoned(now=None):
+        '''Fail the uploads that received no chunk for `ABANDON_SECONDS` and delete their chunks. Returns the number expired'''
+        now = now or timezone.now()
+        cutoff = now - timedelta(seconds=ManageVideoUploads.options()['ABANDON_SECONDS'])
+        expired = 0
+        for upload in Product_Video_Upload.objects.filter(upload_status='uploading', updated_at__lt=cutoff).iterator():
+            #a chunk accepted since the query moved updated_at, the upload is kept
+            if Product_Video_Upload.objects.filter(pk=upload.pk, upload_status='uploading', updated_at__lt=cutoff) \
+                    .update(upload_status='failed', updated_at=now):
+                ManageVideoUploads.delete_chunks(upload)
+                expired += 1
+        return expired
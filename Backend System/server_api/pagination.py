@@ -0,0 +1,174 @@
+import base64
+import datetime
+import json
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on `(created_at, pk)` shared by all the server_api fetch views.
+
+    Instead of an OFFSET the page boundary is expressed as a `WHERE (created_at, pk) < (last_created_at, last_pk)`
+    condition, so every page costs the same no matter how deep the client scrolls, and rows inserted
+    while paging never shift or duplicate results. The newest rows are returned first.
+
+    Query Parameters:
+        - cursor: Opaque cursor taken from the `next` or `previous` URL of a previous page.
+        - page_size: Number of rows per page. Defaults to `settings.KEYSET_PAGE_SIZE` (50) and is capped at `max_page_size`.
+
+    Example Usage:
+        paginator = KeysetPagination()
+        product_brands = paginator.paginate_queryset(Product_Brands.objects.all(), request, view=self)
+        return Response({"product_brands": serializer(product_brands, many=True).data,
+                         "pagination": paginator.get_pagination_data()})
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    #None reads settings.KEYSET_PAGE_SIZE on every request, a subclass can fix its own default
+    page_size = None
+    max_page_size = 200
+    ordering_field = 'created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.request = None
+        self.page = None
+        self.has_next = False
+        self.has_previous = False
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return min(self.page_size or getattr(settings, 'KEYSET_PAGE_SIZE', 50), self.max_page_size)
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return a single page of `queryset` as a list.
+
+        Values that are not QuerySets (a single object or `False` returned by a failed fetch) are
+        returned unchanged, so views can pass every fetch result through the paginator.
+        """
+        if not isinstance(queryset, QuerySet):
+            return queryset
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        #walking backwards flips the ordering, the page is reversed back after fetching
+        direction = '' if reverse else '-'
+        queryset = queryset.order_by(f'{direction}{self.ordering_field}', f'{direction}pk')
+        if cursor is not None:
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__{lookup}': cursor['position']}) |
+                Q(**{self.ordering_field: cursor['position'], f'pk__{lookup}': cursor['pk']})
+            )
+
+        #fetching one extra row tells whether another page exists without a COUNT query
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return {
+                'position': datetime.datetime.fromisoformat(data['position']),
+                'pk': int(data['pk']),
+                'reverse': bool(data['reverse']),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        data = {
+            'position': getattr(instance, self.ordering_field).isoformat(),
+            'pk': instance.pk,
+            'reverse': reverse,
+        }
+        return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+    def get_next_cursor(self):
+        if not self.page or not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_cursor(self):
+        """The cursor of the previous page, an empty string when it is the first page (a link without cursor)."""
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return ''
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @classmethod
+    def cursor_link(cls, request, cursor):
+        if cursor is None:
+            return None
+        if not cursor:
+            return remove_query_param(request.build_absolute_uri(), cls.cursor_query_param)
+        return replace_query_param(request.build_absolute_uri(), cls.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.cursor_link(self.request, self.get_next_cursor())
+
+    def get_previous_link(self):
+        return self.cursor_link(self.request, self.get_previous_cursor())
+
+    def get_cursor_data(self):
+        """
+        Return the cursors of the current page, or None if nothing was paginated.
+
+        Unlike the links they do not depend on the host or the query string of the request, cache these and
+        turn them into links for every request with `get_links`.
+        """
+        if self.page is None:
+            return None
+        return {
+            'next': self.get_next_cursor(),
+            'previous': self.get_previous_cursor(),
+            'page_size': len(self.page),
+        }
+
+    @classmethod
+    def get_links(cls, request, cursor_data):
+        """Return the pagination data of `get_cursor_data` with the cursors turned into links of `request`."""
+        if cursor_data is None:
+            return None
+        return {
+            'next': cls.cursor_link(request, cursor_data['next']),
+            'previous': cls.cursor_link(request, cursor_data['previous']),
+            'page_size': cursor_data['page_size'],
+        }
+
+    def get_pagination_data(self):
+        """Return the `next`/`previous` links of the current page, or None if nothing was paginated."""
+        return self.get_links(self.request, self.get_cursor_data())
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
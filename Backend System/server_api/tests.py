@@ -6,13 +6,27 @@ from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from products.models import *
 from products import product_serializers
+from products.video_upload import ManageVideoUploads
+from products.catalogue_cache import CatalogueCache
 from business_admin.models import *
+from system.models import Accounts
+from system.testing import QueryBudgetMixin
 from django.db.models import Q
 from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import time
 import datetime
+from unittest.mock import patch
+import json
+import hashlib
+import os
+import subprocess
+import tempfile
+from django.test import override_settings
+from django.urls import reverse
+from django.core import checks
+from django.core.cache import cache
 
 # Create your tests here.
 class ServerAPITestCases(APITestCase):
@@ -715,13 +729,364 @@ class ServerAPITestCases(APITestCase):
         self.assertEqual(response.data['message'],"Start date of dicount must be less than or equal to end data")
 
 
+class KeysetPaginationTests(APITestCase):
 
+    def setUp(self):
+        cache.clear()
+        self.user = Accounts.objects.create_user(email='pagination@test.com', username='paginationuser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.brands = [Product_Brands.objects.create(brand_name=f"Brand {i}", brand_established_year=2000+i) for i in range(7)]
+        # same timestamp for a few rows to exercise the pk tie breaker
+        Product_Brands.objects.filter(pk__in=[b.pk for b in self.brands[2:5]]).update(created_at=self.brands[2].created_at)
+
+    def test_walking_pages_with_cursors(self):
+        """
+        Test that next cursors walk every row once, newest first, and previous cursors walk back
+        """
+        url = '/server_api/product/product-brand/fetch-product-brands/?page_size=3'
+        expected = list(Product_Brands.objects.order_by('-created_at','-pk').values_list('pk',flat=True))
+        fetched = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['product_brands']),3,"Page must not exceed page size.")
+            fetched.extend(brand['id'] for brand in response.data['product_brands'])
+            pages.append(response.data)
+            url = response.data['pagination']['next']
+        self.assertEqual(fetched,expected,"Every brand should be returned once in stable order.")
+        self.assertIsNone(pages[0]['pagination']['previous'],"First page should not have a previous link.")
+
+        response = self.client.get(pages[-1]['pagination']['previous'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['product_brands'],pages[-2]['product_brands'],"Previous cursor should return the preceding page.")
 
+    def test_page_size_is_capped(self):
+        """
+        Test that the default and maximum page sizes bound the response
+        """
+        response = self.client.get('/server_api/product/product-brand/fetch-product-brands/?page_size=100000')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['product_brands']),7)
+        self.assertIsNone(response.data['pagination']['next'],"No further page expected.")
 
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor is rejected
+        """
+        response = self.client.get('/server_api/product/product-brand/fetch-product-brands/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'],"Invalid cursor")
 
+    def test_cached_pages_build_their_links_per_request(self):
+        """
+        Test that unknown query parameters share the cache entry and that cached pages link to the requesting URL
+        """
+        url = '/server_api/product/product-brand/fetch-product-brands/?page_size=3'
+        first = self.client.get(url)
+        hits = CatalogueCache.stats()[CatalogueCache.PRODUCT_BRAND]['hits']
+        second = self.client.get(url + '&utm_source=newsletter', secure=True)
+        self.assertEqual(CatalogueCache.stats()[CatalogueCache.PRODUCT_BRAND]['hits'], hits + 1, "An unknown parameter should not miss the cache.")
+        self.assertEqual(second.data['product_brands'], first.data['product_brands'])
+        self.assertTrue(first.data['pagination']['next'].startswith('http://testserver/'))
+        self.assertTrue(second.data['pagination']['next'].startswith('https://testserver/'), "Links must not come from the cached request.")
+        self.assertIn('utm_source=newsletter', second.data['pagination']['next'])
+        self.assertEqual(self.client.get(second.data['pagination']['next']).data['product_brands'],
+                         self.client.get(first.data['pagination']['next']).data['product_brands'])
 
+    @override_settings(KEYSET_PAGE_SIZE=4)
+    def test_default_page_size_comes_from_settings(self):
+        """
+        Test that pages without a page_size parameter hold KEYSET_PAGE_SIZE rows, without DRF's PAGE_SIZE warning
+        """
+        response = self.client.get('/server_api/product/product-brand/fetch-product-brands/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['product_brands']),4)
+        self.assertIsNotNone(response.data['pagination']['next'],"The remaining brands should be on a next page.")
+        self.assertNotIn('rest_framework.W001',[message.id for message in checks.run_checks()])
 
 
+class ConditionalRequestTests(APITestCase):
 
-    
+    def setUp(self):
+        self.user = Accounts.objects.create_user(email='conditional@test.com', username='conditionaluser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.product = Product.objects.create(product_name="Dove Cleanser", product_description="A cleanser by Dove", product_summary="Gentle cleanser")
+
+    def test_fetch_product_not_modified(self):
+        """
+        Test that fetch product answers 304 for a current ETag and 200 once a product changes
+        """
+        response = self.client.get('/server_api/product/fetch-product/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(2):#token lookup and the validator aggregate, nothing is fetched or serialised
+            response = self.client.get('/server_api/product/fetch-product/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.product.product_summary = "Very gentle cleanser"
+        self.product.save()
+        response = self.client.get('/server_api/product/fetch-product/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImportProductsTests(APITestCase):
+
+    def setUp(self):
+        self.user = Accounts.objects.create_user(email='import@test.com', username='importuser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+
+    def test_import_products_csv(self):
+        """Test uploading a CSV file with one valid and one invalid row"""
+        content = (b"product_name,product_description,product_summary,categories,color,price,stock\n"
+                   b"Dove Cleanser,Cleanser,Cleanser,Skincare,white,450,3\n"
+                   b"Dove Soap,Soap,Soap,Bodycare,white,50,3\n")
+        upload = InMemoryUploadedFile(BytesIO(content), 'file', 'catalogue.csv', 'text/csv', len(content), None)
+        response = self.client.post('/server_api/product/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['result']['products_created'], 1)
+        self.assertEqual(response.data['result']['errors'], [{'row': 2, 'error': "Unknown categories: Bodycare"}])
+        self.assertTrue(Product_SKU.objects.filter(product_id__product_name="Dove Cleanser").exists())
+
+    def test_import_products_unsupported_format(self):
+        """Test that a file that is neither CSV nor JSONL is rejected"""
+        upload = InMemoryUploadedFile(BytesIO(b"{}"), 'file', 'catalogue.xlsx', 'application/octet-stream', 2, None)
+        response = self.client.post('/server_api/product/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportProductsTests(APITestCase):
+
+    def setUp(self):
+        self.user = Accounts.objects.create_user(email='export@test.com', username='exportuser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        Product_SKU.objects.create(product_id=product, product_color="white", product_price=450)
+
+    def test_export_products_streams_csv(self):
+        """Test that the export is a streamed attachment"""
+        response = self.client.get('/server_api/product/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = b"".join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Dove Cleanser", lines[1])
+
+    def test_export_products_unsupported_format(self):
+        """Test that an unknown export format is rejected"""
+        response = self.client.get('/server_api/product/export/?export_format=xlsx')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+
+    """
+    Query budgets of the fetch endpoints, checked against `query_budgets.json`.
+    Enough rows are created that a per-row query would show up as an N+1 pattern.
+    """
+
+    def setUp(self):
+        self.user = Accounts.objects.create_user(email='budget@test.com', username='budgetuser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        now = timezone.now()
+        self.categories = [Product_Category.objects.create(category_name=f"Category {i}") for i in range(4)]
+        self.sub_categories = []
+        for i in range(4):
+            sub_category = Product_Sub_Category.objects.create(sub_category_name=f"Sub Category {i}")
+            sub_category.category_id.set(self.categories[:2])
+            self.sub_categories.append(sub_category)
+        self.brands = [Product_Brands.objects.create(brand_name=f"Brand {i}", brand_established_year=2000+i) for i in range(4)]
+        self.flavours = [Product_Flavours.objects.create(product_flavour_name=f"Flavour {i}") for i in range(4)]
+        self.products = []
+        for i in range(5):
+            product = Product.objects.create(product_name=f"Product {i}", product_brand=self.brands[i % 4],
+                                             product_description="Description", product_summary="Summary")
+            product.product_category.set(self.categories[:2])
+            product.product_sub_category.set(self.sub_categories[:2])
+            for color in ("red", "blue"):
+                sku = Product_SKU.objects.create(product_id=product, product_color=color, product_price=100+i, product_stock=10)
+                sku.product_flavours.set(self.flavours[:2])
+            Product_Images.objects.create(product_id=product)
+            Product_Discount.objects.create(product_id=product, discount_name=f"Discount {i}", discount_amount=5,
+                                            start_date=now - datetime.timedelta(days=1), end_date=now + datetime.timedelta(days=1))
+            self.products.append(product)
+
+    def fetch(self, budget_name, url, data=None):
+        with self.assertQueryBudget(budget_name):
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.generic('GET', url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_fetch_product_categories(self):
+        self.fetch('server_api:fetch_all_product_categories', '/server_api/product/categories/fetch-all/')
+
+    def test_fetch_product_sub_categories(self):
+        self.fetch('server_api:fetch_all_product_sub_categories_for_a_category',
+                   f'/server_api/product/sub-categories/fetch-all-product-sub-categories-for-a-category/{self.categories[0].pk}/')
+
+    def test_fetch_product_brands(self):
+        self.fetch('server_api:fetch_product_brands', '/server_api/product/product-brand/fetch-product-brands/')
+
+    def test_fetch_product_flavours(self):
+        self.fetch('server_api:fetch_product_flavour', '/server_api/product/product-flavour/fetch-product-flavour/')
+
+    def test_fetch_products(self):
+        self.fetch('server_api:fetch_product', '/server_api/product/fetch-product/')
 
+    def test_fetch_products_by_category(self):
+        #the product filters are read from the request body
+        self.fetch('server_api:fetch_product?product_category_pk_list', '/server_api/product/fetch-product/',
+                   {'product_category_pk_list': [category.pk for category in self.categories]})
+
+    def test_fetch_product_detail(self):
+        self.fetch('server_api:fetch_product_detail', '/server_api/product/fetch-product-detail/')
+
+    def test_fetch_product_sku(self):
+        self.fetch('server_api:product_sku_fetch', f'/server_api/product/product-sku/fetch-product-sku/?product_id={self.products[0].pk}')
+
+    def test_fetch_product_images(self):
+        self.fetch('server_api:fetch_product_images', '/server_api/product/product-images/fetch-product-image/')
+
+    def test_fetch_product_discounts(self):
+        self.fetch('server_api:fetch_product_discounts', '/server_api/product/product-discounts/fetch-product-discount/')
+
+    def test_budget_exceeded_fails(self):
+        """Test that running more queries than the budget fails the test"""
+        with patch('system.testing.QueryBudgets.updating', return_value=False), \
+                patch('system.testing.QueryBudgets.get', return_value=0):
+            with self.assertRaises(AssertionError):
+                with self.assertQueryBudget('server_api:fetch_product_brands'):
+                    Product_Brands.objects.count()
+
+    def test_repeated_query_fails(self):
+        """Test that the same query shape run once per row fails as N+1"""
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget('server_api:n_plus_one'):
+                for brand in self.brands:
+                    Product.objects.filter(product_brand=brand).count()
+        self.assertIn("N+1", str(context.exception))
+
+class ProductVideoUploadTests(APITestCase):
+
+    """
+    Resumable chunked upload of product videos: create, send chunks by offset, finalise.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = Accounts.objects.create_user(email='video@test.com', username='videouser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        self.video = os.urandom(250 * 1024)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def create_upload(self, checksum=None):
+        response = self.client.post(reverse('server_api:create_product_video_upload', args=[self.product.pk]), {
+            'file_name': 'demo.mp4', 'total_size': len(self.video), 'color': 'red', 'size': 'M',
+            'checksum': checksum or hashlib.sha256(self.video).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['upload']['upload_id']
+
+    def send_chunk(self, upload_id, offset, data, **headers):
+        return self.client.put(reverse('server_api:upload_product_video_chunk', args=[upload_id]), data,
+                               content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers)
+
+    def test_chunked_upload_is_joined_into_a_video(self):
+        upload_id = self.create_upload()
+        first, second = self.video[:100 * 1024], self.video[100 * 1024:]
+        response = self.send_chunk(upload_id, 0, first, HTTP_UPLOAD_CHECKSUM=hashlib.sha256(first).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['received_bytes'], len(first))
+
+        #a client that lost the response resumes from the offset the upload reports
+        response = self.client.get(reverse('server_api:fetch_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.data['upload']['received_bytes'], len(first))
+        self.assertEqual(self.send_chunk(upload_id, 0, first).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.send_chunk(upload_id, len(first), second).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        product_video = Product_Videos.objects.get(product_id=self.product)
+        with product_video.product_videos.open('rb') as file:
+            self.assertEqual(file.read(), self.video)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root.name, 'product_video_uploads', upload_id, '000000000000000.part')),
+                         "Chunks should be deleted once joined.")
+        #finalising again returns the same video
+        response = self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.data['product_video']['id'], product_video.pk)
+
+    def test_rejected_chunks_and_checksums(self):
+        upload_id = self.create_upload(checksum='0' * 64)
+        response = self.send_chunk(upload_id, 0, self.video[:1024], HTTP_UPLOAD_CHECKSUM='f' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['received_bytes'], 0, "A chunk with a wrong checksum is discarded.")
+
+        response = self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, "The upload is not complete yet.")
+
+        self.assertEqual(self.send_chunk(upload_id, 0, self.video).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product_Video_Upload.objects.get(upload_id=upload_id).upload_status, 'failed')
+        self.assertFalse(Product_Videos.objects.exists())
+
+    def test_stale_retry_cannot_replace_an_accepted_chunk(self):
+        upload_id = self.create_upload()
+        first, second = self.video[:100 * 1024], self.video[100 * 1024:]
+        #both requests read the upload while it was still at offset 0
+        stale = Product_Video_Upload.objects.get(upload_id=upload_id)
+        self.assertEqual(self.send_chunk(upload_id, 0, first).status_code, status.HTTP_200_OK)
+        upload, message = ManageVideoUploads.write_chunk(stale, 0, BytesIO(b'x' * 10), 1024)
+        self.assertEqual(message, "Chunk was cut short after 10 of 1024 bytes")
+        upload, message = ManageVideoUploads.write_chunk(stale, 0, BytesIO(b'y' * 1024), 1024)
+        self.assertEqual(message, "Another chunk was written at this offset first")
+        self.assertEqual(os.listdir(os.path.join(self.media_root.name, 'product_video_uploads', upload_id)), ['000000000000000.part'],
+                         "Rejected attempts are deleted, the accepted chunk is kept.")
+
+        self.assertEqual(self.send_chunk(upload_id, len(first), second).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+    def test_abandoned_uploads_are_expired(self):
+        upload_id = self.create_upload()
+        self.send_chunk(upload_id, 0, self.video[:1024])
+        self.assertEqual(ManageVideoUploads.expire_abandoned(), 0)
+        self.assertEqual(ManageVideoUploads.expire_abandoned(now=timezone.now() + datetime.timedelta(days=2)), 1)
+        self.assertEqual(Product_Video_Upload.objects.get(upload_id=upload_id).upload_status, 'failed')
+        self.assertEqual(os.listdir(os.path.join(self.media_root.name, 'product_video_uploads', upload_id)), [])
+
+    def test_poster_and_duration_are_extracted(self):
+        upload_id = self.create_upload()
+        self.send_chunk(upload_id, 0, self.video)
+        poster = BytesIO()
+        Image.new('RGB', (64, 36), color='pink').save(poster, format='JPEG')
+        #ffprobe prints the duration, ffmpeg the JPEG frame
+        outputs = [subprocess.CompletedProcess([], 0, stdout=b'12.5\n'), subprocess.CompletedProcess([], 0, stdout=poster.getvalue())]
+        with patch('system.video_pipeline.shutil.which', return_value='/usr/bin/ffmpeg'), \
+             patch('system.video_pipeline.subprocess.run', side_effect=outputs) as run:
+            self.client.post(reverse('server_api:finalise_product_video_upload', args=[upload_id]))
+        self.assertIn('-ss', run.call_args_list[1].args[0])
+        self.assertIn('1.000', run.call_args_list[1].args[0])
+        product_video = Product_Videos.objects.get(product_id=self.product)
+        self.assertEqual(product_video.duration, 12.5)
+        self.assertEqual(product_video.poster.width, 64)
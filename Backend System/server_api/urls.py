@@ -41,7 +41,10 @@ urlpatterns = [
 
     #product
     path('product/fetch-product/',views.FetchProduct.as_view(),name='fetch_product'),#pass parameters /?pk= OR product_name= OR product_brand_pk= OR product_category_pk_list OR product_sub_category_pk_list Or no paramter to fetch all
+    path('product/fetch-product-detail/',views.FetchProductDetail.as_view(),name='fetch_product_detail'),#pass parameters /?product_pk= OR product_pk_list=1,2,3 OR no parameter to fetch all. Returns SKUs, images and active discounts with each product
     path('product/create/',views.CreateProduct.as_view(),name='create_product'),
+    path('product/import/',views.ImportProducts.as_view(),name='import_products'),#multipart 'file' (.csv or .jsonl), optional 'format'. Responds 207 with per-row errors if some rows were skipped
+    path('product/export/',views.ExportProducts.as_view(),name='export_products'),#pass parameter /?export_format= csv (default) OR jsonl OR columnar. Streams one row per SKU
     path('product/update/<int:product_pk>/',views.UpdateProduct.as_view(),name='update_product'),
     path('product/delete/<int:product_pk>/',views.DeleteProduct.as_view(),name='delete_product'),
 
@@ -57,6 +60,12 @@ urlpatterns = [
     path('product/product-image/update/<int:product_image_pk>/',views.UpdateProductImage.as_view(),name='update_product_image'),
     path('product/product-image/delete/<int:product_image_pk>/',views.DeleteProductImage.as_view(),name='delete_product_image'),
 
+    #product video, resumable chunked upload: create, PUT raw chunks with an Upload-Offset header (and optional Upload-Checksum, sha256 hex), then finalise
+    path('product/product-videos/uploads/create/<int:product_id>/',views.CreateProductVideoUpload.as_view(),name='create_product_video_upload'),#pass file_name, total_size, checksum (sha256 hex of the file), color, size
+    path('product/product-videos/uploads/<uuid:upload_id>/',views.FetchProductVideoUpload.as_view(),name='fetch_product_video_upload'),#received_bytes is the offset to resume from
+    path('product/product-videos/uploads/<uuid:upload_id>/chunk/',views.UploadProductVideoChunk.as_view(),name='upload_product_video_chunk'),
+    path('product/product-videos/uploads/<uuid:upload_id>/finalise/',views.FinaliseProductVideoUpload.as_view(),name='finalise_product_video_upload'),
+
     #product discount
     path('product/product-discounts/fetch-product-discount/',views.FetchProductDiscount.as_view(),name='fetch_product_discounts'),#pass parameters either /?product_id= OR discount_name= OR is_active= OR product_discount_pk OR none to fetch all
     path('product/product-discounts/create-product-discount/<int:product_id>/',views.CreateProductDiscount.as_view(),name='create_product_dicount'),
@@ -13,6 +13,15 @@ from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
 from system.system_log import SystemLogs
 from django.contrib.auth.models import User
+from rest_framework.exceptions import NotFound
+from server_api.pagination import KeysetPagination
+from products.catalogue_cache import CatalogueCache
+from products.models import Product_Category,Product
+from system.conditional_requests import ConditionalRequests
+from products.product_import import ProductImporter
+from products.product_export import ProductExport
+from products.video_upload import ManageVideoUploads
+from django.http import StreamingHttpResponse
 
 # Create your views here.
 
@@ -307,6 +316,14 @@ class FetchProductCategoryView(APIView):
 
     def get(self,request,format=None,*args, **kwargs):
         try:
+            cache_key = CatalogueCache.request_key(request,('pk',))
+            etag,last_modified = ConditionalRequests.get_validators(Product_Category.objects.all(),cache_key)
+            not_modified = ConditionalRequests.not_modified_response(request,etag,last_modified)
+            if not_modified is not None:
+                return not_modified
+            cached_data,cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_CATEGORY,f"{cache_key}:{etag}")
+            if cached_data is not None:
+                return ConditionalRequests.set_validators(Response(cached_data,status=status.HTTP_200_OK),etag,last_modified)
             pk = request.query_params.get('pk')
             if pk:
                 product_categories,message = ManageProducts.fetch_product_categories(product_category_pk=pk)
@@ -315,10 +332,9 @@ class FetchProductCategoryView(APIView):
                 product_categories,message = ManageProducts.fetch_product_categories(product_category_pk=pk)
                 product_category_data = product_serializers.Product_Category_Serializer(product_categories,many=True)
             if product_categories:
-                return Response(
-                    {"message": message,"product_category": product_category_data.data},
-                    status=status.HTTP_200_OK
-                )
+                response_data = {"message": message,"product_category": product_category_data.data}
+                CatalogueCache.set(CatalogueCache.PRODUCT_CATEGORY,f"{cache_key}:{etag}",response_data,cache_version)
+                return ConditionalRequests.set_validators(Response(response_data,status=status.HTTP_200_OK),etag,last_modified)
             else:
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -335,15 +351,17 @@ class FetchProductCategoryWithPkView(APIView):
 
     def get(self,request,pk,format=None):
         try:
-
+            cache_key = CatalogueCache.request_key(request)
+            cached_data,cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_CATEGORY,cache_key)
+            if cached_data is not None:
+                return Response(cached_data,status=status.HTTP_200_OK)
             product_category_pk = pk
             product_category,message = ManageProducts.fetch_product_categories(product_category_pk=product_category_pk)
             product_category_data = product_serializers.Product_Category_Serializer(product_category,many=False)
             if product_category:
-                return Response(
-                    {"message": message,"product_category": product_category_data.data},
-                    status=status.HTTP_200_OK
-                )
+                response_data = {"message": message,"product_category": product_category_data.data}
+                CatalogueCache.set(CatalogueCache.PRODUCT_CATEGORY,cache_key,response_data,cache_version)
+                return Response(response_data,status=status.HTTP_200_OK)
             else:
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -469,15 +487,17 @@ class FetchProductSubCategoryView(APIView):
 
     def get(self,request,pk,format=None):
         try:
-
+            cache_key = CatalogueCache.request_key(request)
+            cached_data,cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_SUB_CATEGORY,cache_key)
+            if cached_data is not None:
+                return Response(cached_data,status=status.HTTP_200_OK)
             product_category_pk = pk
             product_sub_categories,message = ManageProducts.fetch_all_product_sub_categories_for_a_category(product_category_pk=product_category_pk)
             product_sub_categories_data = product_serializers.Product_Sub_Category_Serializer(product_sub_categories,many=True)
             if product_sub_categories_data:
-                return Response(
-                    {"message": message,"product_sub_category": product_sub_categories_data.data},
-                    status=status.HTTP_200_OK
-                )
+                response_data = {"message": message,"product_sub_category": product_sub_categories_data.data}
+                CatalogueCache.set(CatalogueCache.PRODUCT_SUB_CATEGORY,cache_key,response_data,cache_version)
+                return Response(response_data,status=status.HTTP_200_OK)
             else:
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -602,6 +622,12 @@ class FetchProductBrands(APIView):
     def get(self,request,format=None,*args, **kwargs):
 
         try:
+            #the cache holds the page cursors, the links are built for each request
+            cache_key = CatalogueCache.request_key(request,('pk','brand_name','cursor','page_size'))
+            cached_data,cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_BRAND,cache_key)
+            if cached_data is not None:
+                return Response({**cached_data,"pagination": KeysetPagination.get_links(request,cached_data["pagination"])},status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
             pk = request.query_params.get('pk')
             brand_name = request.query_params.get('brand_name')
             if pk:
@@ -612,15 +638,19 @@ class FetchProductBrands(APIView):
                 product_brands_data = product_serializers.Product_Brands_Serializer(product_brands,many=False)
             else:
                 product_brands,message = ManageProducts.fetch_product_brand()
+                product_brands = paginator.paginate_queryset(product_brands,request,view=self)
                 product_brands_data = product_serializers.Product_Brands_Serializer(product_brands,many=True)
             if product_brands:
-                return Response(
-                    {"message": message,"product_brands": product_brands_data.data},
-                    status=status.HTTP_200_OK
-                )
+                response_data = {"message": message,"product_brands": product_brands_data.data,"pagination": paginator.get_cursor_data()}
+                CatalogueCache.set(CatalogueCache.PRODUCT_BRAND,cache_key,response_data,cache_version)
+                return Response({**response_data,"pagination": paginator.get_pagination_data()},status=status.HTTP_200_OK)
             else:
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
 
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
@@ -756,6 +786,12 @@ class FetchProductFlavour(APIView):
 
     def get(self,request,format=None,*args, **kwargs):
         try:
+            #the cache holds the page cursors, the links are built for each request
+            cache_key = CatalogueCache.request_key(request,('pk','product_flavour_name','cursor','page_size'))
+            cached_data,cache_version = CatalogueCache.get(CatalogueCache.PRODUCT_FLAVOUR,cache_key)
+            if cached_data is not None:
+                return Response({**cached_data,"pagination": KeysetPagination.get_links(request,cached_data["pagination"])},status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
             pk = request.query_params.get('pk')
             product_flavour_name = request.query_params.get('product_flavour_name')
 
@@ -767,15 +803,19 @@ class FetchProductFlavour(APIView):
                 product_flavours_data = product_serializers.Product_Flavour_Serializer(product_flavours,many=False)
             else:
                 product_flavours,message = ManageProducts.fetch_product_flavour()
+                product_flavours = paginator.paginate_queryset(product_flavours,request,view=self)
                 product_flavours_data = product_serializers.Product_Flavour_Serializer(product_flavours,many=True)
             
             if product_flavours:
-                return Response(
-                    {"message": message,"product_flavours_data":product_flavours_data.data},
-                    status=status.HTTP_200_OK
-                )
+                response_data = {"message": message,"product_flavours_data":product_flavours_data.data,"pagination": paginator.get_cursor_data()}
+                CatalogueCache.set(CatalogueCache.PRODUCT_FLAVOUR,cache_key,response_data,cache_version)
+                return Response({**response_data,"pagination": paginator.get_pagination_data()},status=status.HTTP_200_OK)
             else:
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
@@ -875,12 +915,21 @@ class FetchProduct(APIView):
     permission_classes = [IsAuthenticated]
     def get(self,request,format=None,*args, **kwargs):
         try:
-
+            #the filters are read from the body, so it is part of the ETag along with the query string
+            etag,last_modified = ConditionalRequests.get_validators(Product.objects.all(),request.get_full_path(),request.data)
+            not_modified = ConditionalRequests.not_modified_response(request,etag,last_modified)
+            if not_modified is not None:
+                return not_modified
+            paginator = KeysetPagination()
             product_pk = self.request.data.get('product_pk',None)
             product_name = self.request.data.get('product_name',None)
             product_brand_pk = self.request.data.get('product_brand_pk',None)
             product_category_pk_list = self.request.data.get('product_category_pk_list',None)
             product_sub_category_pk_list = self.request.data.get('product_sub_category_pk_list',None)
+            match_all_categories = self.request.data.get('match_all_categories',False)
+            match_all_sub_categories = self.request.data.get('match_all_sub_categories',False)
+            combine_with_or = self.request.data.get('combine_with_or',False)
+            filter_count = sum(1 for f in [product_brand_pk,product_category_pk_list,product_sub_category_pk_list] if f)
 
             if product_pk:
                 product,message = ManageProducts.fetch_product(product_pk=product_pk)
@@ -888,28 +937,46 @@ class FetchProduct(APIView):
             elif product_name:
                 product,message = ManageProducts.fetch_product(product_name=product_name)
                 product_data = product_serializers.Product_Serializer(product,many=False)
+            elif filter_count > 1 or match_all_categories or match_all_sub_categories:
+                product,message = ManageProducts.filter_products(product_category_pk_list=product_category_pk_list,
+                                                                 product_sub_category_pk_list=product_sub_category_pk_list,
+                                                                 product_brand_pk_list=[product_brand_pk] if product_brand_pk else None,
+                                                                 match_all_categories=match_all_categories,
+                                                                 match_all_sub_categories=match_all_sub_categories,
+                                                                 combine_with_or=combine_with_or)
+                product = paginator.paginate_queryset(product,request,view=self)
+                product_data = product_serializers.Product_Serializer(product,many=True)
             elif product_brand_pk:
                 product,message = ManageProducts.fetch_product(product_brand_pk=product_brand_pk)
-                product_data = product_serializers.Product_Serializer(product,many=False)
+                product = paginator.paginate_queryset(product,request,view=self)
+                product_data = product_serializers.Product_Serializer(product,many=True)
             elif product_category_pk_list:
                 product,message = ManageProducts.fetch_product(product_category_pk_list=product_category_pk_list)
+                product = paginator.paginate_queryset(product,request,view=self)
                 product_data = product_serializers.Product_Serializer(product,many=True)
             elif product_sub_category_pk_list:
                 product,message = ManageProducts.fetch_product(product_sub_category_pk_list=product_sub_category_pk_list)
+                product = paginator.paginate_queryset(product,request,view=self)
                 product_data = product_serializers.Product_Serializer(product,many=True)
             else:
                 product,message = ManageProducts.fetch_product()
+                product = paginator.paginate_queryset(product,request,view=self)
                 product_data = product_serializers.Product_Serializer(product,many=True)
             
             if product:
-                return Response({
+                return ConditionalRequests.set_validators(Response({
                     'message':message,
-                    'product_data':product_data.data
-                },status=status.HTTP_200_OK)
+                    'product_data':product_data.data,
+                    'pagination':paginator.get_pagination_data()
+                },status=status.HTTP_200_OK),etag,last_modified)
             else:
                 return Response({
                     'error':message
                 },status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
@@ -917,6 +984,72 @@ class FetchProduct(APIView):
                 "message": "An error occurred while fetching product."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+class FetchProductDetail(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self,request,format=None,*args, **kwargs):
+        try:
+            paginator = KeysetPagination()
+            product_pk = self.request.query_params.get('product_pk',None)
+            product_pk_list = self.request.query_params.get('product_pk_list',None)
+
+            if product_pk:
+                product,message = ManageProducts.fetch_product_detail(product_pk=product_pk)
+                product_data = product_serializers.Product_Detail_Serializer(product,many=False)
+            else:
+                if product_pk_list:
+                    product,message = ManageProducts.fetch_product_detail(product_pk_list=product_pk_list.split(','))
+                else:
+                    product,message = ManageProducts.fetch_product_detail()
+                product = paginator.paginate_queryset(product,request,view=self)
+                product_data = product_serializers.Product_Detail_Serializer(product,many=True)
+
+            if product:
+                return Response({
+                    'message':message,
+                    'product_data':product_data.data,
+                    'pagination':paginator.get_pagination_data()
+                },status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    'error':message
+                },status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while fetching product details."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ExportProducts(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self,request,format=None,*args, **kwargs):
+        try:
+            #'format' is reserved by DRF for renderer negotiation, so the export format has its own parameter
+            export_format = self.request.query_params.get('export_format','csv')
+            if export_format not in ProductExport.FORMATS:
+                return Response({
+                    'error':f"Unsupported export format. Use one of {', '.join(ProductExport.FORMATS)}"
+                },status=status.HTTP_400_BAD_REQUEST)
+
+            extension = 'csv' if export_format == 'csv' else 'jsonl'
+            response = StreamingHttpResponse(ProductExport.generate(export_format),content_type=ProductExport.CONTENT_TYPES[export_format])
+            response['Content-Disposition'] = f'attachment; filename="products-{export_format}.{extension}"'
+            return response
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while exporting products."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class CreateProduct(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
@@ -972,6 +1105,37 @@ class CreateProduct(APIView):
                 "error": str(e),
                 "message": "An error occurred while creating product."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ImportProducts(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self,request,format=None):
+        try:
+            #multipart upload, one row per SKU. format is taken from the file extension unless given
+            import_file = self.request.FILES.get('file',None)
+            if not import_file:
+                return Response({
+                    'error':"The following fields are required: File"
+                },status=status.HTTP_400_BAD_REQUEST)
+            file_format = self.request.data.get('format',None) or import_file.name.rsplit('.',1)[-1].lower()
+            if file_format not in ProductImporter.FORMATS:
+                return Response({
+                    'error':f"Unsupported import format. Use one of {', '.join(ProductImporter.FORMATS)}"
+                },status=status.HTTP_400_BAD_REQUEST)
+
+            result = ProductImporter().import_file(import_file.file,file_format)
+            return Response({
+                'message':f"{result['products_created']} products and {result['skus_created']} SKUs imported",
+                'result':result
+            },status=status.HTTP_201_CREATED if not result['errors'] else status.HTTP_207_MULTI_STATUS)
+
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while importing products."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 class UpdateProduct(APIView):
     authentication_classes = [TokenAuthentication]
@@ -1059,7 +1223,7 @@ class FetchProductSKU(APIView):
 
     def get(self,request,format=None,*args, **kwargs):
         try:
-
+            paginator = KeysetPagination()
             pk = self.request.query_params.get('pk',None)
             product_id = self.request.query_params.get('product_id',None)
             product_name = self.request.query_params.get('product_name',None)
@@ -1070,10 +1234,12 @@ class FetchProductSKU(APIView):
                 product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=False)
             elif product_id:
                 product_sku_fetch,message = ManageProducts.fetch_product_sku(product_id=product_id)
-                product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=False)
+                product_sku_fetch = paginator.paginate_queryset(product_sku_fetch,request,view=self)
+                product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=True)
             elif product_name:
                 product_sku_fetch,message = ManageProducts.fetch_product_sku(product_name=product_name)
-                product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=False)
+                product_sku_fetch = paginator.paginate_queryset(product_sku_fetch,request,view=self)
+                product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=True)
             elif product_sku:
                 product_sku_fetch,message = ManageProducts.fetch_product_sku(product_sku=product_sku)
                 product_sku_fetch_data = product_serializers.Product_SKU_Serializer(product_sku_fetch,many=False)
@@ -1085,12 +1251,17 @@ class FetchProductSKU(APIView):
             if product_sku_fetch:
                 return Response({
                     'message':message,
-                    'product_sku_fetch':product_sku_fetch_data.data
+                    'product_sku_fetch':product_sku_fetch_data.data,
+                    'pagination':paginator.get_pagination_data()
                 },status=status.HTTP_200_OK)
             else:
                 return Response({
                     'error':message
                 },status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
@@ -1224,27 +1395,35 @@ class FetchProductImages(APIView):
 
     def get(self,request,format=None,*args, **kwargs):
         try:
+            paginator = KeysetPagination()
             product_pk = self.request.query_params.get('product_pk',None)
             product_image_pk = self.request.query_params.get('product_image_pk',None)
             if product_pk:
                 product_images,message = ManageProducts.fetch_product_image(product_pk=product_pk)
+                product_images = paginator.paginate_queryset(product_images,request,view=self)
                 product_images_data = product_serializers.Product_Images_Serializer(product_images,many=True)
             elif product_image_pk:
                 product_images,message = ManageProducts.fetch_product_image(product_image_pk=product_image_pk)
                 product_images_data = product_serializers.Product_Images_Serializer(product_images,many=False)
             else:
                 product_images,message = ManageProducts.fetch_product_image()
+                product_images = paginator.paginate_queryset(product_images,request,view=self)
                 product_images_data = product_serializers.Product_Images_Serializer(product_images,many=True)
             
             if product_images:
                 return Response({
                     'message':message,
-                    'product_image_data':product_images_data.data
+                    'product_image_data':product_images_data.data,
+                    'pagination':paginator.get_pagination_data()
                 },status=status.HTTP_200_OK)
             else:
                 return Response({
                     'error':message
                 },status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
@@ -1339,6 +1518,151 @@ class DeleteProductImage(APIView):
                 "message": "An error occurred while deleting image."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  
         
+
+#product video, uploaded in chunks
+class CreateProductVideoUpload(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self,request,product_id,format=None):
+        try:
+            file_name = self.request.data.get('file_name',None)
+            total_size = self.request.data.get('total_size',None)
+            checksum = self.request.data.get('checksum',None)
+            color = self.request.data.get('color',None)
+            size = self.request.data.get('size',None)
+
+            field_errors = []
+            if not file_name:
+                field_errors.append("File Name")
+            if not total_size:
+                field_errors.append("Total Size")
+            if not checksum:
+                field_errors.append("Checksum")
+            if not color:
+                field_errors.append("Color")
+            if not size:
+                field_errors.append("Size")
+            if field_errors:
+                return Response({
+                    'error':f"The following fields are required: {', '.join(field_errors)}"
+                },status=status.HTTP_400_BAD_REQUEST)
+
+            upload,message = ManageVideoUploads.create_upload(request,product_id,file_name,total_size,checksum,color,size)
+            if upload:
+                return Response({
+                    'message':message,
+                    'upload':product_serializers.Product_Video_Upload_Serializer(upload).data,
+                    'chunk_size':ManageVideoUploads.options()['CHUNK_SIZE'],
+                },status=status.HTTP_201_CREATED)
+            else:
+                return Response({
+                    'error':message
+                },status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while creating video upload."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class FetchProductVideoUpload(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self,request,upload_id,format=None):
+        try:
+            upload,message = ManageVideoUploads.fetch_upload(upload_id)
+            if upload:
+                return Response({
+                    'message':message,
+                    'upload':product_serializers.Product_Video_Upload_Serializer(upload).data,
+                },status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    'error':message
+                },status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while fetching video upload."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class UploadProductVideoChunk(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def put(self,request,upload_id,format=None):
+        try:
+            #the body is the raw chunk, it is streamed to storage so request.data must not be touched
+            upload,message = ManageVideoUploads.fetch_upload(upload_id)
+            if not upload:
+                return Response({
+                    'error':message
+                },status=status.HTTP_404_NOT_FOUND)
+            try:
+                offset = int(self.request.headers.get('Upload-Offset'))
+                length = int(self.request.META.get('CONTENT_LENGTH') or 0)
+            except (TypeError, ValueError):
+                return Response({
+                    'error':"Upload-Offset and Content-Length headers are required"
+                },status=status.HTTP_400_BAD_REQUEST)
+            if offset != upload.received_bytes:
+                #the client resumes from the offset in the response
+                return Response({
+                    'error':f"Chunk must start at offset {upload.received_bytes}",
+                    'received_bytes':upload.received_bytes
+                },status=status.HTTP_409_CONFLICT)
+
+            updated_upload,message = ManageVideoUploads.write_chunk(upload,offset,self.request.stream,length,
+                                                                    self.request.headers.get('Upload-Checksum',None))
+            if updated_upload:
+                return Response({
+                    'message':message,
+                    'received_bytes':updated_upload.received_bytes
+                },status=status.HTTP_200_OK)
+            else:
+                upload.refresh_from_db()
+                return Response({
+                    'error':message,
+                    'received_bytes':upload.received_bytes
+                },status=status.HTTP_409_CONFLICT if upload.received_bytes != offset else status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while receiving video chunk."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class FinaliseProductVideoUpload(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self,request,upload_id,format=None):
+        try:
+            upload,message = ManageVideoUploads.fetch_upload(upload_id)
+            if not upload:
+                return Response({
+                    'error':message
+                },status=status.HTTP_404_NOT_FOUND)
+            product_video,message = ManageVideoUploads.finalise_upload(request,upload)
+            if product_video:
+                return Response({
+                    'message':message,
+                    'product_video':product_serializers.Product_Videos_Serializer(product_video).data
+                },status=status.HTTP_201_CREATED)
+            else:
+                return Response({
+                    'error':message
+                },status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "error": str(e),
+                "message": "An error occurred while finalising video upload."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class FetchProductDiscount(APIView):
 
     authentication_classes = [TokenAuthentication]
@@ -1346,7 +1670,7 @@ class FetchProductDiscount(APIView):
 
     def get(self,request,format=None,*args, **kwargs):
         try:
-            
+            paginator = KeysetPagination()
             product_id = self.request.query_params.get('product_id',None)
             discount_name = self.request.query_params.get('discount_name',None)
             is_active = self.request.query_params.get('is_active',None)
@@ -1354,30 +1678,38 @@ class FetchProductDiscount(APIView):
 
             if product_id:
                 product_discount,message = ManageProducts.fetch_product_discount(product_id=product_id)
+                product_discount = paginator.paginate_queryset(product_discount,request,view=self)
                 product_discount_data = product_serializers.Product_Discount_Serializer(product_discount,many=True)
             elif discount_name:
                 product_discount,message = ManageProducts.fetch_product_discount(discount_name=discount_name)
                 product_discount_data = product_serializers.Product_Discount_Serializer(product_discount,many=False)
             elif is_active:
                 product_discount,message = ManageProducts.fetch_product_discount(is_active=True)
+                product_discount = paginator.paginate_queryset(product_discount,request,view=self)
                 product_discount_data = product_serializers.Product_Discount_Serializer(product_discount,many=True)
             elif product_discount_pk:
                 product_discount,message = ManageProducts.fetch_product_discount(product_discount_pk=product_discount_pk)
                 product_discount_data = product_serializers.Product_Discount_Serializer(product_discount,many=False)
             else:
                 product_discount,message = ManageProducts.fetch_product_discount()
+                product_discount = paginator.paginate_queryset(product_discount,request,view=self)
                 product_discount_data = product_serializers.Product_Discount_Serializer(product_discount,many=True)
             
             if product_discount:
                 return Response({
                     'message':message,
-                    'product_discount':product_discount_data.data
+                    'product_discount':product_discount_data.data,
+                    'pagination':paginator.get_pagination_data()
                 },status=status.HTTP_200_OK)
             else:
                 return Response({
                     'error':message
                 },status=status.HTTP_400_BAD_REQUEST)
 
+        except NotFound as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 "success": False,
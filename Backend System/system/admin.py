@@ -24,5 +24,5 @@ admin.site.register(Accounts,AccountAdmin)
 @admin.register(ErrorLogs)
 class ErrorLog(admin.ModelAdmin):
     list_display=[
-        'id','timestamp','error_type'
+        'id','timestamp','error_type','occurrences','last_seen'
     ]
\ No newline at end of file
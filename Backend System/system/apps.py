@@ -5,5 +5,5 @@ class SystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'system'
 
-    # def ready(self):
-    #     import system.signals
\ No newline at end of file
+    def ready(self):
+        import system.signals
\ No newline at end of file
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalRequests:
+
+    '''
+    HTTP conditional request support (ETag / Last-Modified) for list endpoints.
+
+    Validators are computed from one aggregate query over the table (`Max(updated_at)` and the row count),
+    so a view can answer `304 Not Modified` before fetching or serialising anything.
+    '''
+
+    def get_validators(queryset, *key_parts):
+
+        """
+        Compute a strong ETag and the Last-Modified time of a QuerySet with a single aggregate query.
+
+        The ETag hashes the model, the row count, the latest `updated_at` and `key_parts`. Pass everything
+        that changes the response body for the same data (request path, query string, request body) as
+        `key_parts`. The row count makes deletions change the ETag even though they leave no `updated_at`.
+
+        Args:
+            queryset (QuerySet): Rows the response is built from. Must have an `updated_at` field.
+            *key_parts: Extra values that identify the response representation.
+
+        Returns:
+            tuple:
+                - str: Quoted strong ETag.
+                - datetime or None: Latest `updated_at`, or `None` if the QuerySet is empty.
+
+        Example Usage:
+            etag, last_modified = ConditionalRequests.get_validators(Product_Category.objects.all(), request.get_full_path())
+        """
+        aggregate = queryset.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        last_modified = aggregate['last_modified']
+        parts = [
+            queryset.model._meta.label,
+            str(aggregate['count']),
+            last_modified.isoformat() if last_modified else '',
+        ] + [json.dumps(part, sort_keys=True, default=str) for part in key_parts]
+        etag = '"%s"' % hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+        return etag, last_modified
+
+    def not_modified_response(request, etag, last_modified):
+        '''Return a 304 (or 412) response if the request preconditions match the validators, None otherwise'''
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is not None:
+            ConditionalRequests.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(response, etag, last_modified):
+        '''Attach the ETag and Last-Modified headers to a response and return it'''
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import re
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible(path='system.content_storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    '''
+    File storage that names every file after the SHA-256 of its content.
+
+    The folder given by the field's `upload_to` is kept, the file name is replaced by
+    `<folder>/<first 2 hash characters>/<hash>.<ext>`. A name therefore never points at different bytes,
+    which makes the URLs safe to cache forever (see `system.views.media`), and uploading the same image
+    twice stores it once: the second save finds the file and returns its name without writing.
+
+    Because several rows may share a file, never delete one directly: `system.storage_gc` deletes it once no
+    row references it.
+
+    Example Usage:
+        product_image = models.ImageField(upload_to='product_images/', storage=content_addressed_storage)
+    '''
+
+    CHUNK_SIZE = 64 * 1024
+    #a hashed original or one of the variants rendered from it (`<hash>_<variant>.<ext>`)
+    IMMUTABLE_NAME = re.compile(r'^[0-9a-f]{64}(_[a-z0-9]+)?\.[a-z0-9]+$')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            #a fresh modification time keeps the garbage collector (system.storage_gc) away while the new row commits
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+    def save_as(self, name, content):
+        '''Store `content` under `name` as given, for files named after another file's hash (image variants)'''
+        if not self.exists(name):
+            super()._save(name, content)
+        return name
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks(chunk_size=ContentAddressedStorage.CHUNK_SIZE):
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        content_hash = digest.hexdigest()
+        folder, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(folder, content_hash[:2], f'{content_hash}{extension}').replace('\\', '/')
+
+    @staticmethod
+    def is_immutable(name):
+        return bool(ContentAddressedStorage.IMMUTABLE_NAME.match(os.path.basename(name)))
+
+
+content_addressed_storage = ContentAddressedStorage()
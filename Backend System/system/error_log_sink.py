@@ -0,0 +1,175 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from django.db import connection, DatabaseError, close_old_connections
+from django.db.models import F
+from .models import ErrorLogs
+
+
+class ErrorLogSink:
+
+    '''
+    Buffered writer for `ErrorLogs`, used through `ManageErrorLog.log_error`.
+
+    Errors are put on an in-process queue and a daemon thread writes them in batches with one `bulk_create`,
+    so a failing request does not add a synchronous INSERT to a database that may already be struggling.
+    Identical errors (same type and message) seen again within `dedupe_window` seconds increment the
+    `occurrences` counter of the row already written instead of adding a row. If the database cannot be
+    reached the batch is appended to a local JSONL file so nothing is lost.
+
+    With `asynchronous=False` (ERROR_LOG_ASYNC=false, and the test settings) every error is written before `emit` returns.
+    '''
+
+    def __init__(self, batch_size=100, flush_interval=1.0, dedupe_window=60, fallback_path=None,
+                 max_queue_size=10000, asynchronous=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedupe_window = dedupe_window
+        self.fallback_path = fallback_path
+        self.asynchronous = asynchronous
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        self.thread = None
+        #(error_type, error_message) -> (ErrorLogs pk, monotonic time the window started)
+        self.recent = {}
+
+    def emit(self, error_type, error_message):
+        '''Record an error. Never raises, logging must not break the failing request any further'''
+        entry = {
+            'error_type': str(error_type)[:255] if error_type is not None else None,
+            'error_message': str(error_message) if error_message is not None else None,
+            'timestamp': datetime.now(),
+            'occurrences': 1,
+        }
+        if not self.asynchronous:
+            self.write([entry])
+            return True
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            #the writer cannot keep up, keep the error on disk rather than blocking the request
+            self.write_fallback([entry])
+            return False
+        self._start()
+        return True
+
+    def _start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='error-log-sink', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self.write(batch)
+                close_old_connections()
+
+    def _next_batch(self):
+        '''Wait for the first error, then collect what arrives within `flush_interval` up to `batch_size`'''
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        '''Write everything still queued from the calling thread. Registered to run at interpreter exit'''
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def _collapse(self, entries):
+        '''Merge identical errors of a batch into one entry carrying their count'''
+        collapsed = {}
+        for entry in entries:
+            key = (entry['error_type'], entry['error_message'])
+            if key in collapsed:
+                collapsed[key]['occurrences'] += entry['occurrences']
+                collapsed[key]['last_seen'] = entry['timestamp']
+            else:
+                collapsed[key] = dict(entry, last_seen=entry['timestamp'])
+        return collapsed
+
+    def write(self, entries):
+        '''Write a batch: one UPDATE per error already logged within the window, one bulk INSERT for the rest'''
+        collapsed = self._collapse(entries)
+        now = time.monotonic()
+        try:
+            new_entries = []
+            for key, entry in collapsed.items():
+                pk, window_started = self.recent.get(key, (None, 0))
+                if pk is not None and now - window_started < self.dedupe_window:
+                    if ErrorLogs.objects.filter(pk=pk).update(occurrences=F('occurrences') + entry['occurrences'],
+                                                              last_seen=entry['last_seen']):
+                        continue
+                new_entries.append((key, entry))
+            created = ErrorLogs.objects.bulk_create([
+                ErrorLogs(error_type=entry['error_type'], error_message=entry['error_message'],
+                          occurrences=entry['occurrences'], last_seen=entry['last_seen'])
+                for key, entry in new_entries
+            ])
+            for (key, entry), error_log in zip(new_entries, created):
+                if error_log.pk is not None:
+                    self.recent[key] = (error_log.pk, now)
+            self._forget_expired(now)
+            return True
+        except Exception as error:
+            print(f"{type(error).__name__} occurred while writing error logs: {error}")
+            if isinstance(error, DatabaseError) and not connection.in_atomic_block:
+                #drop the broken connection so the next batch reconnects
+                connection.close()
+            self.write_fallback(collapsed.values())
+            return False
+
+    def _forget_expired(self, now):
+        if len(self.recent) > 1000:
+            self.recent = {key: value for key, value in self.recent.items() if now - value[1] < self.dedupe_window}
+
+    def write_fallback(self, entries):
+        '''Append errors to the JSONL fallback file, one object per line'''
+        if not self.fallback_path:
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.fallback_path) or '.', exist_ok=True)
+            with self.lock, open(self.fallback_path, 'a', encoding='utf-8') as file:
+                for entry in entries:
+                    file.write(json.dumps(entry, default=str) + '\n')
+            return True
+        except OSError as error:
+            print(f"Could not write error log fallback file: {error}")
+            return False
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        options = getattr(settings, 'ERROR_LOG_SINK', {})
+        sink = cls(
+            batch_size=options.get('BATCH_SIZE', 100),
+            flush_interval=options.get('FLUSH_INTERVAL', 1.0),
+            dedupe_window=options.get('DEDUPE_WINDOW', 60),
+            fallback_path=str(options['FALLBACK_PATH']) if options.get('FALLBACK_PATH') else None,
+            max_queue_size=options.get('MAX_QUEUE_SIZE', 10000),
+            asynchronous=options.get('ASYNC', True),
+        )
+        if sink.asynchronous:
+            atexit.register(sink.flush)
+        return sink
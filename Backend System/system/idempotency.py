@@ -0,0 +1,131 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+
+class Idempotency:
+
+    '''
+    Idempotency keys for requests that must not run twice, such as placing an order or a payment callback.
+
+    The client sends a unique `Idempotency-Key` header with the request and the same one when it retries. The
+    first request stores the key as `processing` (a unique constraint on key, endpoint and customer lets only one
+    request in), runs the view and stores its response. Retries with the key get the stored response back, with
+    `Idempotent-Replayed: true`, without running the view again:
+
+        same key, same body, finished        the stored response
+        same key, same body, still running   409, retry later
+        same key, another body               422, the key belongs to another request
+
+    Server errors (5xx) and 409 / 429 responses are not stored, the key is freed so the retry runs the view.
+    Keys are kept for `TTL_SECONDS` (settings.IDEMPOTENCY), `manage.py purge_idempotency_keys` deletes older ones.
+
+    Example Usage:
+        class CheckoutView(APIView):
+            @Idempotency.idempotent('checkout')
+            def post(self, request):
+                ...
+    '''
+
+    HEADER = 'Idempotency-Key'
+    REPLAYED_HEADER = 'Idempotent-Replayed'
+    #retries of these may succeed, so they are not answered from the store
+    NOT_STORED = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def options():
+        options = {'TTL_SECONDS': 24 * 60 * 60}
+        options.update(getattr(settings, 'IDEMPOTENCY', {}))
+        return options
+
+    def request_hash(request):
+        '''SHA-256 of the request body, of the parsed data if the body was already read as a stream'''
+        try:
+            body = request.body
+        except RawPostDataException:
+            body = repr(sorted(request.data.items())).encode('utf-8')
+        return hashlib.sha256(body).hexdigest()
+
+    def idempotent(endpoint):
+        '''Decorator for APIView handlers: use the request's `Idempotency-Key` header, if it has one'''
+        def decorator(handler):
+            @wraps(handler)
+            def wrapper(view, request, *args, **kwargs):
+                customer = request.user if request.user and request.user.is_authenticated else None
+                return Idempotency.respond(request, endpoint, request.headers.get(Idempotency.HEADER), customer,
+                                           lambda: handler(view, request, *args, **kwargs))
+            return wrapper
+        return decorator
+
+    def respond(request, endpoint, key, customer, handler):
+
+        """
+        Run `handler` once per key, answering retries with the stored response.
+
+        Args:
+            request (Request): The request, its body is hashed to recognise a key reused for another request.
+            endpoint (str): Name of the operation, keys are only unique per endpoint and customer.
+            key (str or None): The idempotency key. Without one `handler` simply runs.
+            customer (Accounts or None): The authenticated customer, `None` for callers like payment gateways.
+            handler (callable): Runs the request and returns its `Response`.
+
+        Returns:
+            Response: The response of `handler`, the stored one, or a 409 / 422 error.
+        """
+        if not key:
+            return handler()
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({"success": False, "message": f"{Idempotency.HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = Idempotency.request_hash(request)
+        now = timezone.now()
+        records = IdempotencyKey.objects.filter(key=key, endpoint=endpoint, customer=customer)
+        records.filter(expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(key=key, endpoint=endpoint, customer=customer, request_hash=request_hash,
+                                                       expires_at=now + timedelta(seconds=Idempotency.options()['TTL_SECONDS']))
+        except IntegrityError:
+            return Idempotency.replay(records.first(), request_hash)
+
+        try:
+            response = handler()
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.status_code in Idempotency.NOT_STORED:
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(status='complete', response_status=response.status_code,
+                                                               response_body=response.data)
+        return response
+
+    def replay(record, request_hash):
+        '''The answer to a retry of the request stored as `record`'''
+        if record is not None and record.request_hash != request_hash:
+            return Response({"success": False, "message": "This idempotency key was used for a different request"},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record is None or record.status == 'processing':
+            #the first request is still running (or just failed and freed the key)
+            response = Response({"success": False, "message": "A request with this idempotency key is already being processed"},
+                                status=status.HTTP_409_CONFLICT)
+            response['Retry-After'] = '1'
+            return response
+        response = Response(record.response_body, status=record.response_status)
+        response[Idempotency.REPLAYED_HEADER] = 'true'
+        return response
+
+    def purge_expired(batch_size=1000):
+        '''Delete expired keys in batches. Returns the number deleted'''
+        deleted = 0
+        while True:
+            pks = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,178 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction, close_old_connections
+from PIL import Image, ImageOps
+
+
+class ImagePipeline:
+
+    '''
+    Generates resized variants of uploaded images in a worker pool, after the request has returned.
+
+    Uploads are stored as they are (no resizing inside the request). Once the transaction that saved the
+    row commits, every size listed in `VARIANTS` for the field is rendered in the original format, WebP
+    and AVIF (when the installed Pillow can encode it), stored next to the original as
+    `<name>_<variant>.<ext>`, and the URLs are recorded on the row's `<field>_variants` JSON field:
+
+        {"thumbnail": {"width": 150, "height": 100, "jpeg": "/media_files/...", "webp": "..."}, ...}
+
+    Originals are named after their content hash (`system.content_storage`), so a variant that already
+    exists was rendered from the same bytes and is reused instead of encoded again. Files shared by several
+    rows are deleted by `system.storage_gc` once the last row stops referencing them.
+
+    With `asynchronous=False` (IMAGE_PIPELINE_ASYNC=false, and the test settings) variants are generated
+    before `process_later` returns.
+
+    Example Usage:
+        product_image = Product_Images.objects.create(product_id=product, product_image=upload)
+        ImagePipeline.get().process_later(product_image, 'product_image')
+    '''
+
+    #'app_label.Model.field': ((variant name, longest side in pixels), ...)
+    VARIANTS = {
+        'products.Product_Images.product_image': (('thumbnail', 150), ('card', 400), ('detail', 632)),
+        'products.Product_Brands.brand_logo': (('thumbnail', 64), ('card', 244)),
+        'business_admin.BusinessAdminUser.admin_avatar': (('thumbnail', 64), ('card', 244)),
+        'system.Accounts.profile_picture': (('thumbnail', 64), ('card', 244)),
+    }
+    #formats every variant is written in, on top of the original one
+    EXTRA_FORMATS = ('WEBP', 'AVIF')
+    EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'AVIF': 'avif'}
+    #order of the srcset sources, smallest encoding first so browsers pick the first one they support
+    SOURCE_ORDER = ('avif', 'webp', 'jpeg', 'png')
+    MIME_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+    #created on first use from settings.IMAGE_PIPELINE
+    _pipeline = None
+
+    def __init__(self, max_workers=2, quality=85, asynchronous=True):
+        self.max_workers = max_workers
+        self.quality = quality
+        self.asynchronous = asynchronous
+        self.executor = None
+        self.lock = threading.Lock()
+        Image.init()
+        self.formats = [image_format for image_format in ImagePipeline.EXTRA_FORMATS if image_format in Image.SAVE]
+
+    @classmethod
+    def get(cls):
+        if cls._pipeline is None:
+            cls._pipeline = cls.from_settings()
+        return cls._pipeline
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        options = getattr(settings, 'IMAGE_PIPELINE', {})
+        return cls(
+            max_workers=options.get('MAX_WORKERS', 2),
+            quality=options.get('QUALITY', 85),
+            asynchronous=options.get('ASYNC', True),
+        )
+
+    def sizes(self, model, field_name):
+        return ImagePipeline.VARIANTS[f'{model._meta.label}.{field_name}']
+
+    def process_later(self, instance, field_name):
+        '''Generate the variants of `instance.<field_name>` once the current transaction commits'''
+        file = getattr(instance, field_name)
+        if not file:
+            return False
+        job = (instance._meta.label, instance.pk, field_name, file.name)
+        if not self.asynchronous:
+            self.process(*job)
+            return True
+        transaction.on_commit(lambda: self._submit(job))
+        return True
+
+    def _submit(self, job):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-pipeline')
+        self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            self.process(*job)
+        except Exception as error:
+            from .manage_error_log import ManageErrorLog
+            ManageErrorLog.log_error(type(error).__name__, f"Image variants of {job[0]} {job[1]} failed: {error}")
+        finally:
+            close_old_connections()
+
+    def process(self, model_label, pk, field_name, name):
+        '''Render and store the variants of one image and record their URLs. Returns the variants'''
+        model = apps.get_model(model_label)
+        storage = model._meta.get_field(field_name).storage
+        with storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            original_format = image.format if image.format in ('JPEG', 'PNG') else 'PNG'
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+        variants = {}
+        for variant, size in self.sizes(model, field_name):
+            width, height = self.fitted_size(image.width, image.height, size)
+            variants[variant] = {'width': width, 'height': height}
+            resized = None
+            for image_format in [original_format] + self.formats:
+                variant_name = self.variant_name(name, variant, image_format)
+                #named after the original's hash, an existing file already holds this rendering
+                if not storage.exists(variant_name):
+                    if resized is None:
+                        resized = image.resize((width, height), Image.LANCZOS) if (width, height) != image.size else image.copy()
+                    storage.save_as(variant_name, ContentFile(self.encode(resized, image_format)))
+                variants[variant][image_format.lower()] = storage.url(variant_name)
+
+        #the image may have been replaced while the variants were rendered, only record them for this file
+        model.objects.filter(pk=pk, **{field_name: name}).update(**{f'{field_name}_variants': variants})
+        return variants
+
+    @staticmethod
+    def fitted_size(width, height, size):
+        '''Size of an image scaled down (never up) so its longest side is at most `size`'''
+        if width <= size and height <= size:
+            return width, height
+        scale = size / max(width, height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def encode(self, image, image_format):
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=self.quality, optimize=image_format in ('JPEG', 'PNG'))
+        return buffer.getvalue()
+
+    def variant_name(self, name, variant, image_format):
+        return f'{os.path.splitext(name)[0]}_{variant}.{ImagePipeline.EXTENSIONS[image_format]}'
+
+    def release(self, instance, field_name):
+        '''
+        Forget the variants of the image on `instance.<field_name>` before it is replaced or the row is deleted.
+
+        The files are not deleted here: saving or deleting the row queues the old name (system.signals) and
+        `StorageGarbageCollector` deletes the original and its variants once no row references them.
+        '''
+        setattr(instance, f'{field_name}_variants', None)
+
+    @staticmethod
+    def srcset(variants):
+        '''
+        `<picture>` sources of a `<field>_variants` value, best format first:
+
+            [{"type": "image/webp", "srcset": "/media_files/..._thumbnail.webp 150w, ..."}, ...]
+        '''
+        if not variants:
+            return []
+        ordered = sorted(variants.values(), key=lambda variant: variant['width'])
+        sources = []
+        for image_format in ImagePipeline.SOURCE_ORDER:
+            candidates = [f"{variant[image_format]} {variant['width']}w" for variant in ordered if image_format in variant]
+            if candidates:
+                sources.append({'type': ImagePipeline.MIME_TYPES[image_format], 'srcset': ', '.join(candidates)})
+        return sources
@@ -1,6 +1,11 @@
 from datetime import datetime
 from .models import *
+from .error_log_sink import ErrorLogSink
 class ManageErrorLog:
+
+    #created on first use from settings.ERROR_LOG_SINK
+    _sink = None
+
     def create_error_log(error_type,error_message):
         '''This function creates an error log in the database'''
         try:
@@ -13,4 +18,21 @@ class ManageErrorLog:
             return None
         except Exception as e:
             print(e)
-        
\ No newline at end of file
+
+    def get_sink():
+        if ManageErrorLog._sink is None:
+            ManageErrorLog._sink = ErrorLogSink.from_settings()
+        return ManageErrorLog._sink
+
+    def log_error(error_type,error_message):
+        '''
+        Record an error through the buffered sink, without waiting for the database.
+
+        Identical errors within the dedupe window are counted on one `ErrorLogs` row. Use this in
+        exception handlers; `create_error_log` stays available when the row must exist on return.
+        '''
+        try:
+            return ManageErrorLog.get_sink().emit(error_type,error_message)
+        except Exception as e:
+            print(e)
+            return False
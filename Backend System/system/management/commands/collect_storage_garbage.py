@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from system.storage_gc import StorageGarbageCollector
+
+
+class Command(BaseCommand):
+    help = "Delete stored files no row references any more: the queued ones, or every orphan with --full"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Walk the upload folders and compare them with the database instead of only processing the queue")
+        parser.add_argument('--field', action='append', choices=list(StorageGarbageCollector.FOLDERS), default=[],
+                            help="Only sweep this file field (app_label.Model.field) with --full, repeatable")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the files that would be deleted")
+
+    def handle(self, *args, **options):
+        collector = StorageGarbageCollector.from_settings()
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        deleted = collector.process_queue(dry_run=options['dry_run'])
+        self.stdout.write(f"{verb} {deleted} queued files")
+        if options['full']:
+            for field_label, count in collector.collect(options['field'] or None, dry_run=options['dry_run']).items():
+                self.stdout.write(f"{verb} {count} orphaned files of {field_label}")
+        self.stdout.write(self.style.SUCCESS("Storage garbage collection finished"))
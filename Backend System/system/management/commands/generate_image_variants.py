@@ -0,0 +1,54 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from system.content_storage import ContentAddressedStorage
+from system.image_pipeline import ImagePipeline
+from system.storage_gc import StorageGarbageCollector
+
+
+class Command(BaseCommand):
+    help = "Generate the resized variants of stored product images, brand logos and avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--field', action='append', choices=list(ImagePipeline.VARIANTS), default=[],
+                            help="Only this image field (app_label.Model.field), repeatable")
+        parser.add_argument('--all', action='store_true', help="Regenerate images that already have variants too")
+        parser.add_argument('--rehash', action='store_true',
+                            help="First move images stored before content-addressed storage to their content hash name")
+
+    def handle(self, *args, **options):
+        pipeline = ImagePipeline.from_settings()
+        generated = failed = 0
+        for field_path in options['field'] or ImagePipeline.VARIANTS:
+            model_label, field_name = field_path.rsplit('.', 1)
+            model = apps.get_model(model_label)
+            if options['rehash']:
+                self.rehash(model, field_name)
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            if not options['all']:
+                rows = rows.filter(**{f'{field_name}_variants__isnull': True})
+            for pk, name in rows.values_list('pk', field_name).iterator():
+                try:
+                    pipeline.process(model._meta.label, pk, field_name, name)
+                    generated += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{field_path} {pk}: {error}")
+        if failed and not generated:
+            raise CommandError(f"No variants generated, {failed} images failed")
+        self.stdout.write(self.style.SUCCESS(f"Generated variants of {generated} images, {failed} failed"))
+
+    def rehash(self, model, field_name):
+        '''Store every legacy image under its content hash and queue the old file for the garbage collector'''
+        storage = model._meta.get_field(field_name).storage
+        rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for instance in rows.iterator():
+            file = getattr(instance, field_name)
+            if ContentAddressedStorage.is_immutable(file.name) or not storage.exists(file.name):
+                continue
+            old_name = file.name
+            with storage.open(old_name, 'rb') as content:
+                new_name = storage.save(old_name, content)
+            model.objects.filter(pk=instance.pk).update(**{field_name: new_name, f'{field_name}_variants': None})
+            #update() sends no signals, the old file is queued here
+            StorageGarbageCollector.queue(f'{model._meta.label}.{field_name}', [old_name])
+            self.stdout.write(f"{model._meta.label} {instance.pk}: {old_name} -> {new_name}")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from system.idempotency import Idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than settings.IDEMPOTENCY['TTL_SECONDS']"
+
+    def handle(self, *args, **options):
+        deleted = Idempotency.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
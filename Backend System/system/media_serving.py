@@ -0,0 +1,207 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from .content_storage import ContentAddressedStorage
+
+
+class _FileRange:
+
+    '''
+    File object limited to `length` bytes from `start`.
+
+    Keeps `fileno()` so a WSGI server's `wsgi.file_wrapper` (gunicorn, uWSGI) sends the range with
+    `os.sendfile` from the current offset for `Content-Length` bytes; other servers read it in blocks.
+    '''
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size is None or size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class MediaServer:
+
+    '''
+    Serves files under `MEDIA_ROOT` after authorising the request, without Python streaming the bytes where possible.
+
+    `BACKEND` (settings.MEDIA_SERVING) selects how the file leaves the process once the view has authorised it:
+
+        'x-accel'     empty response with `X-Accel-Redirect: <X_ACCEL_PREFIX><path>`, nginx sends the file
+        'x-sendfile'  empty response with `X-Sendfile: <absolute path>`, Apache mod_xsendfile or lighttpd sends it
+        'python'      `FileResponse`, sent with `os.sendfile` by WSGI servers with a `wsgi.file_wrapper`
+
+    The web server answers `Range` requests itself with the first two. The Python backend supports single byte
+    ranges (`206`, `416`) so videos can be seeked. `RULES` are `(path prefix, access)` pairs, the first matching
+    prefix wins: `public`, `authenticated` (a session or an API token) or `denied`; other paths are public.
+
+    Content-hashed files (`system.content_storage`) are cached for a year as immutable, anything else is
+    revalidated against its ETag / Last-Modified. Files that need authentication are only cached privately.
+
+    Example nginx location for 'x-accel':
+        location /protected-media/ { internal; alias /srv/e-commerce/Media/; }
+    '''
+
+    BACKENDS = ('python', 'x-accel', 'x-sendfile')
+    IMMUTABLE_CACHE_SECONDS = 365 * 24 * 60 * 60
+    RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+    #created on first use from settings.MEDIA_SERVING
+    _server = None
+
+    def __init__(self, root, backend='python', x_accel_prefix='/protected-media/', rules=()):
+        if backend not in MediaServer.BACKENDS:
+            raise ValueError(f"Unknown media serving backend {backend}. Use one of {', '.join(MediaServer.BACKENDS)}")
+        self.root = root
+        self.backend = backend
+        self.x_accel_prefix = '/' + x_accel_prefix.strip('/') + '/'
+        self.rules = tuple(rules)
+
+    @classmethod
+    def get(cls):
+        if cls._server is None:
+            cls._server = cls.from_settings()
+        return cls._server
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        options = getattr(settings, 'MEDIA_SERVING', {})
+        return cls(
+            root=settings.MEDIA_ROOT,
+            backend=options.get('BACKEND', 'python'),
+            x_accel_prefix=options.get('X_ACCEL_PREFIX', '/protected-media/'),
+            rules=options.get('RULES', ()),
+        )
+
+    def access(self, path):
+        for prefix, access in self.rules:
+            if path.startswith(prefix):
+                return access
+        return 'public'
+
+    def is_authenticated(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return True
+        try:
+            return TokenAuthentication().authenticate(Request(request)) is not None
+        except AuthenticationFailed:
+            return False
+
+    def serve(self, request, path):
+        '''Return the response for `path` (relative to MEDIA_ROOT): the file, 304, 206, 401, 403, 404 or 416'''
+        try:
+            full_path = safe_join(self.root, path)
+        except SuspiciousFileOperation:
+            raise Http404("Media file not found")
+        #the rules are matched on the normalised path, './x' and 'a/../x' are the same file as 'x'
+        path = os.path.relpath(full_path, os.path.abspath(self.root)).replace(os.sep, '/')
+
+        access = self.access(path)
+        if access == 'denied':
+            return HttpResponse(status=403)
+        if access == 'authenticated' and not self.is_authenticated(request):
+            return HttpResponse(status=401)
+
+        if not os.path.isfile(full_path):
+            raise Http404("Media file not found")
+
+        stat = os.stat(full_path)
+        immutable = ContentAddressedStorage.is_immutable(path)
+        etag = '"%s"' % os.path.splitext(os.path.basename(path))[0] if immutable else '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if not_modified is not None:
+            return self.cache_headers(not_modified, etag, stat, immutable, access)
+
+        if self.backend == 'x-accel':
+            response = HttpResponse(content_type=self.content_type(path))
+            response['X-Accel-Redirect'] = self.x_accel_prefix + quote(path)
+        elif self.backend == 'x-sendfile':
+            response = HttpResponse(content_type=self.content_type(path))
+            response['X-Sendfile'] = full_path
+        else:
+            response = self.file_response(request, full_path, stat.st_size, etag)
+        return self.cache_headers(response, etag, stat, immutable, access)
+
+    def file_response(self, request, full_path, size, etag):
+        byte_range = self.requested_range(request, size, etag)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        file = open(full_path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file)
+        else:
+            start, end = byte_range
+            response = FileResponse(_FileRange(file, start, end - start + 1), status=206)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    def requested_range(self, request, size, etag):
+        '''`(start, end)` of a single satisfiable byte range, `'unsatisfiable'`, or None to send the whole file'''
+        header = request.headers.get('Range')
+        if not header or request.method != 'GET':
+            return None
+        #If-Range: the range only applies to the version the client already has part of
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag:
+            return None
+        match = MediaServer.RANGE_PATTERN.match(header.replace(' ', ''))
+        if not match or match.groups() == ('', ''):
+            #several ranges or another unit, answered with the whole file
+            return None
+        first, last = match.groups()
+        if first == '':
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, end
+
+    def content_type(self, path):
+        return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def cache_headers(self, response, etag, stat, immutable, access):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        shared = {'public': True} if access == 'public' else {'private': True}
+        if immutable:
+            patch_cache_control(response, max_age=MediaServer.IMMUTABLE_CACHE_SECONDS, immutable=True, **shared)
+        else:
+            patch_cache_control(response, no_cache=True, **shared)
+        return response
+
+
+@receiver(setting_changed)
+def _reset_media_server(setting, **kwargs):
+    if setting in ('MEDIA_ROOT', 'MEDIA_SERVING'):
+        MediaServer._server = None
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='errorlogs',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='errorlogs',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
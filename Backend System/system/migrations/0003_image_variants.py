@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:52
+
+import system.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0002_error_log_occurrences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounts',
+            name='profile_picture_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='accounts',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, upload_to=system.models.get_customer_avatar_path),
+        ),
+    ]
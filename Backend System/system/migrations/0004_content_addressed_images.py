@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:55
+
+import system.content_storage
+import system.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accounts',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=system.content_storage.ContentAddressedStorage(), upload_to=system.models.get_customer_avatar_path),
+        ),
+    ]
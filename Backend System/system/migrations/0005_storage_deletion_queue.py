@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0004_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=255)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Storage Deletion',
+                'verbose_name_plural': 'Storage Deletions',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='storagedeletion',
+            constraint=models.UniqueConstraint(fields=('field', 'name'), name='storage_deletion_field_name_unique'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import AbstractBaseUser,BaseUserManager
-from django_resized import ResizedImageField
+from .content_storage import content_addressed_storage
 
 # Create your models here.
 
@@ -35,7 +36,7 @@ class AccountsManager(BaseUserManager):
 
 
 def get_customer_avatar_path(self, filename):
-    return f'customer_profile_picture/{self.pk}/{filename}'
+    return f'customer_profile_picture/{filename}'
 class Accounts(AbstractBaseUser):
     '''This model is for storing customer data'''
 
@@ -54,7 +55,8 @@ class Accounts(AbstractBaseUser):
     middle_name=models.CharField(max_length=50,verbose_name="Middle name")
     last_name=models.CharField(max_length=50,verbose_name="Last name")
     phone_no=models.CharField(max_length=15,verbose_name="Phone Number") 
-    profile_picture = ResizedImageField(size=[244,244],upload_to=get_customer_avatar_path,blank=True, null=True)
+    profile_picture = models.ImageField(upload_to=get_customer_avatar_path,storage=content_addressed_storage,blank=True, null=True)
+    profile_picture_variants = models.JSONField(blank=True,null=True)#resized copies made by system.image_pipeline
     skinType=models.CharField(max_length=20,choices=SKIN_TYPE_CHOICES,blank=True,verbose_name="Skin Type")
     block=models.BooleanField(default=False,verbose_name="Block Account")
 
@@ -87,6 +89,8 @@ class ErrorLogs(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True,null=True)  # Automatically logs the time of the error
     error_type = models.CharField(max_length=255,null=True,blank=True)  # The type of error, e.g., "DatabaseError"
     error_message = models.TextField(null=True,blank=True)  # The detailed error message
+    occurrences = models.PositiveIntegerField(default=1)  # How many identical errors this row stands for, see system.error_log_sink
+    last_seen = models.DateTimeField(null=True,blank=True)  # When the last of those identical errors happened
 
     class Meta:
         verbose_name = "Error Log"
@@ -94,4 +98,51 @@ class ErrorLogs(models.Model):
         ordering = ['-timestamp']  # Orders the errors by latest timestamp first
 
     def __str__(self):
-        return f"{self.timestamp} - {self.error_type}"
\ No newline at end of file
+        return f"{self.timestamp} - {self.error_type}"
+
+class StorageDeletion(models.Model):
+    '''Stored files that may no longer be referenced, queued by system.signals and deleted in batches by system.storage_gc'''
+    field = models.CharField(max_length=100)  # The file field the name was stored on, 'app_label.Model.field'
+    name = models.CharField(max_length=255)  # The storage name of the file
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Storage Deletion"
+        verbose_name_plural = "Storage Deletions"
+        constraints = [
+            models.UniqueConstraint(fields=['field', 'name'], name='storage_deletion_field_name_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.field} - {self.name}"
+
+class IdempotencyKey(models.Model):
+    '''Responses of non-idempotent requests stored under the client's Idempotency-Key and replayed on retries, see system.idempotency'''
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('complete', 'Complete'),
+    ]
+
+    key = models.CharField(max_length=255)  # The Idempotency-Key header, or an id the payment gateway sends
+    endpoint = models.CharField(max_length=100)  # Name of the operation the key was used for, e.g. "checkout"
+    customer = models.ForeignKey(Accounts,on_delete=models.CASCADE,null=True,blank=True,related_name="IdempotencyKeys")  # None for unauthenticated callers
+    request_hash = models.CharField(max_length=64)  # SHA-256 of the request body, a key reused for another body is refused
+    status = models.CharField(max_length=20,choices=STATUS_CHOICES,default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True,blank=True)
+    response_body = models.JSONField(null=True,blank=True,encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            #NULLs are distinct in a unique constraint, so keys without a customer get one of their own
+            models.UniqueConstraint(fields=['key', 'endpoint', 'customer'], condition=models.Q(customer__isnull=False),
+                                    name='idempotency_key_customer_unique'),
+            models.UniqueConstraint(fields=['key', 'endpoint'], condition=models.Q(customer__isnull=True),
+                                    name='idempotency_key_anonymous_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} - {self.key}"
@@ -0,0 +1,216 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('e_commerce_app.performance')
+
+#metrics of the request being handled. Context variables follow the request into the threads asgiref
+#uses for sync code under ASGI, so queries run by a sync view are still counted
+_current_request = contextvars.ContextVar('performance_request_metrics', default=None)
+
+
+class RequestMetrics:
+
+    '''Measurements of one request, filled in by `PerformanceMiddleware` and `query_timer`'''
+
+    #statements kept per request to show the offending SQL of slow requests
+    MAX_CAPTURED_QUERIES = 50
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.queries = []
+
+    def add_query(self, sql, duration):
+        self.query_count += 1
+        self.sql_time += duration
+        if len(self.queries) < RequestMetrics.MAX_CAPTURED_QUERIES:
+            self.queries.append((duration, sql))
+
+
+def query_timer(execute, sql, params, many, context):
+    '''Database `execute_wrapper` timing every statement of the current request'''
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(connection, **kwargs):
+    '''Add `query_timer` to a connection once. Connected to `connection_created` so every thread's connection is covered'''
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='system.performance.install_query_timer')
+
+
+class PerformanceRegistry:
+
+    '''
+    Process wide aggregates of request metrics, rendered in the Prometheus text format.
+
+    Series are labelled by view name, method and status code. Latency is a histogram, the other
+    measurements are counters (sums), so rates and averages can be derived in Prometheus.
+    '''
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, view, method, status, latency, query_count, sql_time, render_time, response_size):
+        key = (view, method, str(status))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'count': 0, 'latency_sum': 0.0, 'buckets': [0] * len(PerformanceRegistry.LATENCY_BUCKETS),
+                    'queries': 0, 'sql_seconds': 0.0, 'render_seconds': 0.0, 'response_bytes': 0,
+                }
+            series['count'] += 1
+            series['latency_sum'] += latency
+            for i, bound in enumerate(PerformanceRegistry.LATENCY_BUCKETS):
+                if latency <= bound:
+                    series['buckets'][i] += 1
+            series['queries'] += query_count
+            series['sql_seconds'] += sql_time
+            series['render_seconds'] += render_time
+            series['response_bytes'] += response_size
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def _labels(self, key, **extra):
+        view, method, status = key
+        labels = {'view': view, 'method': method, 'status': status, **extra}
+        return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels.items())
+
+    def render(self):
+        '''Return every series in the Prometheus text exposition format (version 0.0.4)'''
+        with self.lock:
+            series = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.series.items()}
+        lines = [
+            '# HELP http_request_duration_seconds Request latency measured by PerformanceMiddleware.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for key, value in sorted(series.items()):
+            for bound, count in zip(PerformanceRegistry.LATENCY_BUCKETS, value['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{{{self._labels(key, le=bound)}}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{self._labels(key, le="+Inf")}}} {value["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{self._labels(key)}}} {value["latency_sum"]}')
+            lines.append(f'http_request_duration_seconds_count{{{self._labels(key)}}} {value["count"]}')
+        counters = (
+            ('http_request_sql_queries_total', 'SQL statements run while handling requests.', 'queries'),
+            ('http_request_sql_seconds_total', 'Time spent in SQL while handling requests.', 'sql_seconds'),
+            ('http_request_render_seconds_total', 'Time spent rendering (serialising) responses.', 'render_seconds'),
+            ('http_response_size_bytes_total', 'Bytes of response bodies, streaming responses excluded.', 'response_bytes'),
+        )
+        for name, description, field in counters:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(series.items()):
+                lines.append(f'{name}{{{self._labels(key)}}} {value[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = PerformanceRegistry()
+
+
+class PerformanceMiddleware:
+
+    '''
+    Records the view name, latency, SQL query count and time, render time and response size of every request.
+
+    Each request is added to `registry` (served by `system.views.metrics`) and written as one JSON line to the
+    `e_commerce_app.performance` logger. Requests slower than `PERFORMANCE_SLOW_REQUEST_MS` are logged as
+    warnings together with their slowest SQL statements. Works as a sync (WSGI) and async (ASGI) middleware.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_seconds = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500) / 1000
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_request.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        '''DRF responses are rendered after the view returns, the render is timed as serialisation'''
+        metrics = _current_request.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def render_finished(rendered):
+                metrics.render_time += time.perf_counter() - started
+                return rendered
+
+            response.add_post_render_callback(render_finished)
+        return response
+
+    def record(self, request, response, metrics):
+        latency = time.perf_counter() - metrics.started
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = (resolver_match.view_name or resolver_match._func_path) if resolver_match else 'unresolved'
+        response_size = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, latency, metrics.query_count,
+                         metrics.sql_time, metrics.render_time, response_size)
+
+        line = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round(latency * 1000, 2),
+            'sql_queries': metrics.query_count,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+            'response_bytes': response_size,
+        }
+        if latency >= self.slow_request_seconds:
+            line['slow_sql'] = [
+                {'ms': round(duration * 1000, 2), 'sql': sql}
+                for duration, sql in sorted(metrics.queries, key=lambda query: query[0], reverse=True)[:10]
+            ]
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
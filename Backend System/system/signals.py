@@ -2,6 +2,11 @@ from django.contrib.auth.signals import user_logged_in
 from django.dispatch import receiver
 from django.utils.timezone import now
 from business_admin.models import *
+from django.apps import apps
+from django.db.models.signals import post_init, post_save, post_delete
+from django.db.models.fields.files import FieldFile
+from .storage_gc import StorageGarbageCollector
+from .image_pipeline import ImagePipeline
 
 # @receiver(user_logged_in)
 # def update_last_login_at(sender, request, user, **kwargs):
@@ -13,4 +18,49 @@ from business_admin.models import *
 #         business_admin_user.save()
 #     except BusinessAdminUser.DoesNotExist:
 #         # Handle the case where no BusinessAdminUser is associated with the logged-in user
-#         pass
\ No newline at end of file
+#         pass
+
+# Stored files of deleted rows and replaced files are queued for system.storage_gc.
+# post_init remembers the names a row was loaded with, so replacing a file costs no extra query.
+
+def stored_name(value):
+    '''Storage name of a file field value, '' for an upload that is not stored yet'''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, FieldFile) and value._committed:
+        return value.name or ''
+    return ''
+
+def remember_stored_files(sender, instance, **kwargs):
+    #names as strings, a FieldFile is renamed in place when it is saved to
+    instance._stored_files = {field_name: stored_name(instance.__dict__.get(field_name)) for field_name in _FILE_FIELDS[sender]}
+
+def queue_replaced_files(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_files', {})
+    for field_name in _FILE_FIELDS[sender]:
+        field_label = f'{sender._meta.label}.{field_name}'
+        old_name = stored.get(field_name)
+        new_name = getattr(instance, field_name).name or ''
+        if old_name and old_name != new_name:
+            StorageGarbageCollector.queue(field_label, [old_name])
+        if new_name and old_name != new_name and field_label in _VARIANTS_ON_SAVE:
+            ImagePipeline.get().process_later(instance, field_name)
+    remember_stored_files(sender, instance)
+
+def queue_deleted_files(sender, instance, **kwargs):
+    for field_name in _FILE_FIELDS[sender]:
+        StorageGarbageCollector.queue(f'{sender._meta.label}.{field_name}', [getattr(instance, field_name).name])
+
+#images whose variants are queued by any save of a new file, the others are queued by their manage functions.
+#customer profile pictures are set by the admin site and the customer views, which do not queue them themselves
+_VARIANTS_ON_SAVE = {'system.Accounts.profile_picture'}
+
+#model: names of its file fields collected by StorageGarbageCollector
+_FILE_FIELDS = {}
+for field_label in StorageGarbageCollector.FOLDERS:
+    model_label, field_name = field_label.rsplit('.', 1)
+    _FILE_FIELDS.setdefault(apps.get_model(model_label), []).append(field_name)
+for model in _FILE_FIELDS:
+    post_init.connect(remember_stored_files, sender=model, dispatch_uid=f'remember_stored_files_{model._meta.label}')
+    post_save.connect(queue_replaced_files, sender=model, dispatch_uid=f'queue_replaced_files_{model._meta.label}')
+    post_delete.connect(queue_deleted_files, sender=model, dispatch_uid=f'queue_deleted_files_{model._meta.label}')
@@ -0,0 +1,164 @@
+import time
+from django.apps import apps
+from .image_pipeline import ImagePipeline
+
+
+class StorageGarbageCollector:
+
+    '''
+    Deletes stored files that no row references any more, in batches and outside the request.
+
+    Two ways to find them:
+
+        process_queue()  incremental. The model signals (system.signals) queue the old name whenever a row
+                         with a file is deleted (also by a cascade) or its file is replaced, as `StorageDeletion`
+                         rows. Each batch of names is checked against the database with one query per field.
+        collect()        full sweep. Walks the folder of every field in `FOLDERS`, builds the set of names
+                         referenced by the database and deletes the difference.
+
+    The resized variants of an image (system.image_pipeline) go with their original. Files modified in the last
+    `grace_seconds` are never deleted: they may belong to a row that is not committed yet, and content-addressed
+    storage touches a file when an identical upload reuses it. Queued names that are still too recent stay in the
+    queue for the next run.
+
+    Example Usage:
+        deleted = StorageGarbageCollector.from_settings().process_queue()
+    '''
+
+    #'app_label.Model.field': folder the field's upload_to stores files in
+    FOLDERS = {
+        'products.Product_Images.product_image': 'product_images/',
+        'products.Product_Brands.brand_logo': 'brand_logos/',
+        'business_admin.BusinessAdminUser.admin_avatar': 'admin_profile_picture/',
+        'system.Accounts.profile_picture': 'customer_profile_picture/',
+        'products.Product_Videos.product_videos': 'product_videos/',
+        'products.Product_Videos.poster': 'product_video_posters/',
+    }
+
+    def __init__(self, batch_size=500, grace_seconds=3600):
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        options = getattr(settings, 'STORAGE_GC', {})
+        return cls(
+            batch_size=options.get('BATCH_SIZE', 500),
+            grace_seconds=options.get('GRACE_SECONDS', 3600),
+        )
+
+    @staticmethod
+    def field(field_label):
+        '''`(model, field name, storage)` of an 'app_label.Model.field' label'''
+        model_label, field_name = field_label.rsplit('.', 1)
+        model = apps.get_model(model_label)
+        return model, field_name, model._meta.get_field(field_name).storage
+
+    @staticmethod
+    def queue(field_label, names):
+        '''Queue stored names of a field for the next `process_queue`'''
+        from .models import StorageDeletion
+        names = {name for name in names if name}
+        if names:
+            StorageDeletion.objects.bulk_create([StorageDeletion(field=field_label, name=name) for name in names], ignore_conflicts=True)
+
+    @staticmethod
+    def with_variants(field_label, names):
+        '''`names` and the names of their image variants, if the field has any'''
+        names = set(names)
+        if field_label not in ImagePipeline.VARIANTS:
+            return names
+        pipeline = ImagePipeline.get()
+        files = set(names)
+        for name in names:
+            for variant, size in ImagePipeline.VARIANTS[field_label]:
+                for image_format in ImagePipeline.EXTENSIONS:
+                    files.add(pipeline.variant_name(name, variant, image_format))
+        return files
+
+    def referenced(self, field_label, names=None):
+        '''Set of names rows reference (with their variants), only among `names` if given'''
+        model, field_name, storage = self.field(field_label)
+        rows = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if names is not None:
+            rows = rows.filter(**{f'{field_name}__in': list(names)})
+        return self.with_variants(field_label, rows.values_list(field_name, flat=True).iterator())
+
+    def stored(self, storage, folder):
+        '''Every file name under `folder`, walking sub folders'''
+        folders, files = storage.listdir(folder) if storage.exists(folder) else ([], [])
+        for file_name in files:
+            yield f'{folder}{file_name}'
+        for sub_folder in folders:
+            yield from self.stored(storage, f'{folder}{sub_folder}/')
+
+    def is_recent(self, storage, name):
+        if not self.grace_seconds:
+            return False
+        return time.time() - storage.get_modified_time(name).timestamp() < self.grace_seconds
+
+    def delete(self, storage, names, dry_run=False):
+        '''Delete the existing, old enough files among `names`. Returns `(deleted, too recent)` names'''
+        deleted, recent = [], []
+        for name in names:
+            if not storage.exists(name):
+                continue
+            if self.is_recent(storage, name):
+                recent.append(name)
+                continue
+            if not dry_run:
+                storage.delete(name)
+            deleted.append(name)
+        return deleted, recent
+
+    def process_queue(self, dry_run=False):
+        '''Delete the queued files no row references any more. Returns the number of files deleted'''
+        from .models import StorageDeletion
+        deleted_count = 0
+        last_pk = 0
+        while True:
+            batch = list(StorageDeletion.objects.filter(pk__gt=last_pk).order_by('pk')[:self.batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            by_field = {}
+            for queued in batch:
+                by_field.setdefault(queued.field, []).append(queued)
+
+            done = []
+            for field_label, queued in by_field.items():
+                if field_label not in StorageGarbageCollector.FOLDERS:
+                    done.extend(queued)
+                    continue
+                model, field_name, storage = self.field(field_label)
+                #one query for the whole batch of this field
+                still_used = self.referenced(field_label, [item.name for item in queued])
+                for item in queued:
+                    if item.name in still_used:
+                        done.append(item)
+                        continue
+                    if storage.exists(item.name) and self.is_recent(storage, item.name):
+                        #possibly reused by an upload that is not committed yet, looked at again next run
+                        continue
+                    deleted, recent = self.delete(storage, self.with_variants(field_label, [item.name]), dry_run)
+                    deleted_count += len(deleted)
+                    if not recent:
+                        done.append(item)
+            if not dry_run:
+                StorageDeletion.objects.filter(pk__in=[item.pk for item in done]).delete()
+        return deleted_count
+
+    def collect(self, field_labels=None, dry_run=False):
+        '''Delete every file under the fields' folders no row references. Returns `{field label: files deleted}`'''
+        result = {}
+        for field_label in field_labels or StorageGarbageCollector.FOLDERS:
+            model, field_name, storage = self.field(field_label)
+            referenced = self.referenced(field_label)
+            orphans = [name for name in self.stored(storage, StorageGarbageCollector.FOLDERS[field_label]) if name not in referenced]
+            deleted_count = 0
+            for start in range(0, len(orphans), self.batch_size):
+                deleted, recent = self.delete(storage, orphans[start:start + self.batch_size], dry_run)
+                deleted_count += len(deleted)
+            result[field_label] = deleted_count
+        return result
@@ -1,6 +1,7 @@
 from products.models import *
 from django.db import DatabaseError,OperationalError,IntegrityError,ProgrammingError
 from system.models import *
+from system.manage_error_log import ManageErrorLog
 from business_admin.models import *
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -51,7 +52,7 @@ class SystemLogs:
             # Log the error
             error_type = type(error).__name__  # Get the name of the error as a string
             error_message = str(error)
-            ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+            ManageErrorLog.log_error(error_type, error_message)
             print(f"{error_type} occurred: {error_message}")
 
             # Return appropriate messages based on the error type
@@ -136,7 +137,7 @@ class SystemLogs:
         #     # Log the error
         #     error_type = type(error).__name__  # Get the name of the error as a string
         #     error_message = str(error)
-        #     ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+        #     ManageErrorLog.log_error(error_type, error_message)
         #     print(f"{error_type} occurred: {error_message}")
 
         #     # Return appropriate messages based on the error type
@@ -215,7 +216,7 @@ class SystemLogs:
         #     # Log the error
         #     error_type = type(error).__name__  # Get the name of the error as a string
         #     error_message = str(error)
-        #     ErrorLogs.objects.create(error_type=error_type, error_message=error_message)
+        #     ManageErrorLog.log_error(error_type, error_message)
         #     print(f"{error_type} occurred: {error_message}")
 
         #     # Return appropriate messages based on the error type
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryRecorder(CaptureQueriesContext):
+
+    '''
+    Records the SQL run inside a `with` block and groups it by shape.
+
+    The shape of a statement is its SQL with literals, numbers, IN lists and savepoint names replaced,
+    so `SELECT ... WHERE id = 1` and `SELECT ... WHERE id = 2` share a shape. A shape seen many times
+    in one block is the signature of an N+1 query pattern.
+
+    Example Usage:
+        with QueryRecorder() as recorder:
+            self.client.get('/server_api/product/fetch-product/')
+        print(len(recorder), recorder.repeated_shapes(threshold=3))
+    '''
+
+    _patterns = [
+        (re.compile(r"'(?:[^']|'')*'"), '?'),
+        (re.compile(r'"s\d+_x\d+"'), '"savepoint"'),
+        (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+        (re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE), 'IN (...)'),
+        (re.compile(r'\s+'), ' '),
+    ]
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__(connections[using])
+
+    @staticmethod
+    def shape(sql):
+        for pattern, replacement in QueryRecorder._patterns:
+            sql = pattern.sub(replacement, sql)
+        return sql.strip()
+
+    def shapes(self):
+        return Counter(QueryRecorder.shape(query['sql']) for query in self.captured_queries)
+
+    def repeated_shapes(self, threshold):
+        '''Shapes run at least `threshold` times, most repeated first'''
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= threshold]
+
+
+class QueryBudgets:
+
+    '''
+    Checked in per endpoint query budgets, stored as `{"name": max_queries}` in `QUERY_BUDGETS_FILE`.
+
+    Run the tests with `UPDATE_QUERY_BUDGETS=1` to write the measured counts into the file after an
+    intended change, then commit the file with the change so the growth is reviewed.
+    '''
+
+    _lock = threading.Lock()
+    _budgets = None
+
+    def path():
+        return getattr(settings, 'QUERY_BUDGETS_FILE', os.path.join(settings.BASE_DIR, 'query_budgets.json'))
+
+    def updating():
+        return os.environ.get('UPDATE_QUERY_BUDGETS') == '1'
+
+    def load():
+        with QueryBudgets._lock:
+            if QueryBudgets._budgets is None:
+                try:
+                    with open(QueryBudgets.path(), encoding='utf-8') as file:
+                        QueryBudgets._budgets = json.load(file)
+                except FileNotFoundError:
+                    QueryBudgets._budgets = {}
+            return QueryBudgets._budgets
+
+    def get(name):
+        return QueryBudgets.load().get(name)
+
+    def record(name, count):
+        budgets = QueryBudgets.load()
+        with QueryBudgets._lock:
+            budgets[name] = count
+            with open(QueryBudgets.path(), 'w', encoding='utf-8') as file:
+                json.dump(dict(sorted(budgets.items())), file, indent=4)
+                file.write('\n')
+
+
+class QueryBudgetMixin:
+
+    '''
+    TestCase mixin that fails when an API call runs more queries than its checked in budget, or
+    runs the same query shape again and again (N+1).
+
+    Example Usage:
+        class ProductQueryBudgetTests(QueryBudgetMixin, APITestCase):
+            def test_fetch_products(self):
+                with self.assertQueryBudget('server_api:fetch_product'):
+                    self.client.get('/server_api/product/fetch-product/')
+    '''
+
+    #a shape repeated this many times in one call is reported as N+1
+    n_plus_one_threshold = 3
+
+    @contextmanager
+    def assertQueryBudget(self, name, n_plus_one_threshold=None, using=DEFAULT_DB_ALIAS):
+        threshold = n_plus_one_threshold or self.n_plus_one_threshold
+        with QueryRecorder(using=using) as recorder:
+            yield recorder
+
+        repeated = recorder.repeated_shapes(threshold)
+        if repeated:
+            details = '\n'.join(f'  {count}x {shape}' for shape, count in repeated)
+            self.fail(f"{name} repeats the same query {threshold} or more times (N+1 pattern):\n{details}")
+
+        count = len(recorder)
+        if QueryBudgets.updating():
+            QueryBudgets.record(name, count)
+            return
+        budget = QueryBudgets.get(name)
+        if budget is None:
+            self.fail(f"{name} has no query budget in {QueryBudgets.path()}. Run the tests with UPDATE_QUERY_BUDGETS=1 to record it.")
+        if count > budget:
+            queries = '\n'.join(f"  {query['sql']}" for query in recorder.captured_queries)
+            self.fail(f"{name} ran {count} queries, its budget is {budget}. Fix the regression or raise the budget "
+                      f"with UPDATE_QUERY_BUDGETS=1.\n{queries}")
@@ -3,6 +3,33 @@ from unittest.mock import patch
 from datetime import datetime
 from .models import ErrorLogs
 from .manage_error_log import ManageErrorLog
+from .error_log_sink import ErrorLogSink
+from django.db import DatabaseError
+import json
+import os
+import tempfile
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from .models import Accounts
+from .performance import registry
+from products.models import Product_Category
+from .testing import QueryRecorder, QueryBudgets
+from .models import StorageDeletion
+from .storage_gc import StorageGarbageCollector
+from .models import IdempotencyKey
+from .idempotency import Idempotency
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from .image_pipeline import ImagePipeline
+from products.models import Product, Product_Images
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory
+from django.contrib.auth.models import AnonymousUser
+from .media_serving import MediaServer
 
 class TestCreateErrorLog(TestCase):
     def test_create_error_log_success(self):
@@ -40,4 +67,331 @@ class TestCreateErrorLog(TestCase):
         self.assertIsNone(result, "The function should return None if an exception occurs during save.")
 
         # Verify no log was created
-        self.assertEqual(ErrorLogs.objects.count(), 0, "No error logs should be created if an exception occurs.")
\ No newline at end of file
+        self.assertEqual(ErrorLogs.objects.count(), 0, "No error logs should be created if an exception occurs.")
+
+
+class TestErrorLogSink(TestCase):
+
+    def test_identical_errors_are_counted_on_one_row(self):
+        """
+        Test that repeating an error within the dedupe window increments its counter
+        """
+        sink = ErrorLogSink(asynchronous=False)
+        sink.emit("DatabaseError", "connection refused")
+        sink.emit("DatabaseError", "connection refused")
+        sink.emit("IntegrityError", "duplicate key")
+        self.assertEqual(ErrorLogs.objects.count(), 2)
+        self.assertEqual(ErrorLogs.objects.get(error_type="DatabaseError").occurrences, 2)
+
+    def test_queued_errors_are_written_in_one_batch(self):
+        """
+        Test that queued errors are collapsed and inserted with a single query
+        """
+        sink = ErrorLogSink(asynchronous=True)
+        with patch.object(sink, '_start'):
+            for i in range(5):
+                sink.emit("ValueError", f"bad value {i % 2}")
+        with self.assertNumQueries(1):
+            sink.flush()
+        self.assertEqual(sorted(ErrorLogs.objects.values_list('occurrences', flat=True)), [2, 3])
+
+    def test_database_failure_falls_back_to_file(self):
+        """
+        Test that errors are kept in the JSONL file when the database cannot be written
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'error_logs.jsonl')
+            sink = ErrorLogSink(asynchronous=False, fallback_path=path)
+            with patch('system.models.ErrorLogs.objects.bulk_create', side_effect=DatabaseError("database is down")):
+                sink.emit("OperationalError", "server closed the connection")
+            with open(path, encoding='utf-8') as file:
+                lines = [json.loads(line) for line in file]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['error_type'], "OperationalError")
+        self.assertEqual(ErrorLogs.objects.count(), 0)
+
+
+class TestPerformanceMiddleware(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = Accounts.objects.create_user(email='metrics@test.com', username='metricsuser', password='password')
+        self.token = Token.objects.create(user=self.user)
+        Product_Category.objects.create(category_name="Skincare", description="Products for skincare")
+
+    def _series(self, view):
+        return {key: value for key, value in registry.series.items() if key[0] == view}
+
+    def test_request_metrics_are_recorded(self):
+        """
+        Test that a request is counted with its SQL queries and response size and exposed to Prometheus
+        """
+        response = self.client.get('/server_api/product/categories/fetch-all/', HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(response.status_code, 200)
+        series = self._series('server_api:fetch_all_product_categories')
+        self.assertEqual(len(series), 1)
+        (view, method, status), value = series.popitem()
+        self.assertEqual((method, status), ('GET', '200'))
+        self.assertGreater(value['queries'], 0, "SQL statements of the view should be counted.")
+        self.assertEqual(value['response_bytes'], len(response.content))
+
+        metrics = self.client.get('/system/metrics/')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn('http_request_duration_seconds_count{view="server_api:fetch_all_product_categories",method="GET",status="200"} 1',
+                      metrics.content.decode('utf-8'))
+
+    def test_metrics_endpoint_is_internal_only(self):
+        """
+        Test that the metrics endpoint refuses addresses outside INTERNAL_IPS
+        """
+        response = self.client.get('/system/metrics/', REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0)
+    def test_slow_request_logs_its_sql(self):
+        """
+        Test that requests over the threshold are logged as warnings with their SQL
+        """
+        with self.assertLogs('e_commerce_app.performance', level='WARNING') as logs:
+            self.client.get('/server_api/product/categories/fetch-all/', HTTP_AUTHORIZATION='Token ' + self.token.key)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['view'], 'server_api:fetch_all_product_categories')
+        self.assertTrue(line['slow_sql'], "The slowest statements should be captured.")
+
+    async def test_async_request_is_recorded(self):
+        """
+        Test that the middleware also records requests served through ASGI
+        """
+        response = await self.async_client.get('/system/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._series('system:metrics')), 1)
+
+
+
+class TestQueryRecorder(TestCase):
+
+    def test_shape_ignores_literals(self):
+        """
+        Test that statements differing only in their parameters share a shape
+        """
+        self.assertEqual(
+            QueryRecorder.shape('SELECT * FROM "a" WHERE "a"."id" = 1 AND "a"."name" = \'x\''),
+            QueryRecorder.shape('SELECT * FROM "a" WHERE "a"."id" = 25 AND "a"."name" = \'it\'\'s\''),
+        )
+        self.assertEqual(
+            QueryRecorder.shape('SELECT * FROM "a" WHERE "a"."id" IN (1, 2, 3)'),
+            QueryRecorder.shape('SELECT * FROM "a" WHERE "a"."id" IN (4)'),
+        )
+        self.assertEqual(QueryRecorder.shape('SAVEPOINT "s140_x2"'), QueryRecorder.shape('SAVEPOINT "s140_x3"'))
+
+    def test_repeated_shapes(self):
+        """
+        Test that a query run once per row is reported and a single query is not
+        """
+        categories = [Product_Category.objects.create(category_name=f"Category {i}") for i in range(3)]
+        with QueryRecorder() as recorder:
+            list(Product_Category.objects.all())
+            for category in categories:
+                Product_Category.objects.get(pk=category.pk)
+        repeated = recorder.repeated_shapes(threshold=3)
+        self.assertEqual(len(recorder), 4)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 3)
+
+    def test_budgets_file(self):
+        """
+        Test that recorded budgets are written sorted and read back
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'query_budgets.json')
+            with override_settings(QUERY_BUDGETS_FILE=path), patch.object(QueryBudgets, '_budgets', None):
+                QueryBudgets.record('b', 3)
+                QueryBudgets.record('a', 2)
+                self.assertEqual(QueryBudgets.get('a'), 2)
+                with open(path, encoding='utf-8') as file:
+                    self.assertEqual(list(json.load(file)), ['a', 'b'])
+
+class TestMediaServer(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.content = bytes(range(256)) * 40
+        for folder in ('product_videos', 'customer_profile_picture', 'product_video_uploads'):
+            os.makedirs(os.path.join(self.media_root.name, folder))
+            with open(os.path.join(self.media_root.name, folder, 'file.mp4'), 'wb') as file:
+                file.write(self.content)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_byte_ranges(self):
+        """
+        Test that single byte ranges are answered with 206 and only the requested bytes
+        """
+        url = '/media_files/product_videos/file.mp4'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        #the file changed since the client got its first part
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_web_server_hand_off(self):
+        """
+        Test that the x-accel and x-sendfile backends send no body and let the web server send the file
+        """
+        with override_settings(MEDIA_SERVING={'BACKEND': 'x-accel', 'X_ACCEL_PREFIX': '/protected-media/'}):
+            response = self.client.get('/media_files/product_videos/file.mp4')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/product_videos/file.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_SERVING={'BACKEND': 'x-sendfile'}):
+            response = self.client.get('/media_files/product_videos/file.mp4')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root.name, 'product_videos', 'file.mp4'))
+
+    def test_protected_paths_are_authorised(self):
+        """
+        Test that the RULES of MEDIA_SERVING are applied before anything is sent
+        """
+        self.assertEqual(self.client.get('/media_files/product_video_uploads/file.mp4').status_code, 403)
+        url = '/media_files/customer_profile_picture/file.mp4'
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Token wrong').status_code, 401)
+        user = Accounts.objects.create_user(email='media@test.com', username='mediauser', password='password')
+        token = Token.objects.create(user=user)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get('/media_files/../settings.py').status_code, 404)
+
+    def test_rules_apply_to_the_normalised_path(self):
+        """
+        Test that './' and '..' segments cannot move a protected path out from under its rule
+        """
+        server = MediaServer.from_settings()
+        request = RequestFactory().get('/media_files/')
+        request.user = AnonymousUser()
+        for path in ('./customer_profile_picture/file.mp4', 'product_videos/../customer_profile_picture/file.mp4',
+                     'customer_profile_picture//file.mp4'):
+            self.assertEqual(server.serve(request, path).status_code, 401, path)
+        for path in ('./product_video_uploads/file.mp4', 'product_videos/../product_video_uploads/file.mp4'):
+            self.assertEqual(server.serve(request, path).status_code, 403, path)
+        self.assertEqual(server.serve(request, './product_videos/file.mp4').status_code, 200)
+
+class TestStorageGarbageCollector(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.collector = StorageGarbageCollector(batch_size=2, grace_seconds=0)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def stored(self, name):
+        return os.path.exists(os.path.join(self.media_root.name, name))
+
+    def image(self, product, content):
+        return Product_Images.objects.create(product_id=product, product_image=SimpleUploadedFile('image.png', content))
+
+    def test_cascaded_delete_is_queued_and_collected(self):
+        """
+        Test that deleting a product queues the files of its images and the collector deletes them with their variants
+        """
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        names = [self.image(product, f'image {i}'.encode()).product_image.name for i in range(3)]
+        variant = ImagePipeline.get().variant_name(names[0], 'card', 'WEBP')
+        default_storage.save(variant, ContentFile(b'variant'))
+
+        product.delete()
+        self.assertEqual(StorageDeletion.objects.count(), 3)
+        self.assertTrue(all(self.stored(name) for name in names), "Nothing is deleted inside the request.")
+        self.assertEqual(self.collector.process_queue(), 4)
+        self.assertFalse(any(self.stored(name) for name in names + [variant]))
+        self.assertFalse(StorageDeletion.objects.exists())
+
+    def test_queued_files_still_referenced_or_recent_are_kept(self):
+        """
+        Test that a queued file another row still uses is kept, and a recently modified one waits in the queue
+        """
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        shared, other = self.image(product, b'same'), self.image(product, b'same')
+        shared.delete()
+        self.collector.process_queue()
+        self.assertTrue(self.stored(other.product_image.name))
+        self.assertFalse(StorageDeletion.objects.exists())
+
+        other.delete()
+        StorageGarbageCollector(grace_seconds=3600).process_queue()
+        self.assertTrue(self.stored(other.product_image.name))
+        self.assertEqual(StorageDeletion.objects.count(), 1)
+
+    def test_full_sweep_deletes_orphans(self):
+        """
+        Test that the full sweep deletes files no row references and keeps referenced ones
+        """
+        product = Product.objects.create(product_name="Dove Cleanser", product_description="Cleanser", product_summary="Cleanser")
+        kept = self.image(product, b'kept').product_image.name
+        orphans = [default_storage.save(f'product_images/orphans/{i}.png', ContentFile(b'orphan')) for i in range(3)]
+        result = self.collector.collect(['products.Product_Images.product_image'])
+        self.assertEqual(result, {'products.Product_Images.product_image': 3})
+        self.assertTrue(self.stored(kept))
+        self.assertFalse(any(self.stored(name) for name in orphans))
+
+
+class TestIdempotency(TestCase):
+
+    def request(self, body):
+        return APIRequestFactory().post('/orders/', body, format='json')
+
+    def test_key_in_progress_is_refused(self):
+        """
+        Test that a retry arriving while the first request still runs gets a 409 and the handler runs once
+        """
+        calls = []
+
+        def handler():
+            calls.append(1)
+            retry = Idempotency.respond(self.request({'a': 1}), 'test', 'key-1', None, handler)
+            self.assertEqual(retry.status_code, 409)
+            return Response({'done': True}, status=201)
+
+        response = Idempotency.respond(self.request({'a': 1}), 'test', 'key-1', None, handler)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(Idempotency.respond(self.request({'a': 1}), 'test', 'key-1', None, handler).data, {'done': True})
+
+    def test_server_errors_are_not_stored(self):
+        """
+        Test that a failed request frees its key for the retry
+        """
+        Idempotency.respond(self.request({}), 'test', 'key-1', None, lambda: Response(status=500))
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_expired(self):
+        """
+        Test that only expired keys are purged
+        """
+        now = timezone.now()
+        IdempotencyKey.objects.create(key='old', endpoint='test', request_hash='x', expires_at=now - timedelta(seconds=1))
+        IdempotencyKey.objects.create(key='new', endpoint='test', request_hash='x', expires_at=now + timedelta(hours=1))
+        self.assertEqual(Idempotency.purge_expired(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name='system'
+
+urlpatterns = [
+    path('metrics/',views.metrics,name='metrics'),#Prometheus text format, only for INTERNAL_IPS
+]
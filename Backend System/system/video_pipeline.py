@@ -0,0 +1,148 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction, close_old_connections
+
+
+class VideoPipeline:
+
+    '''
+    Extracts the duration and a poster frame of uploaded product videos in a worker pool, after the request.
+
+    Uses `ffprobe` and `ffmpeg` (paths from settings.VIDEO_PIPELINE). The poster is a JPEG frame taken one
+    second in (or half way through shorter videos), stored on `Product_Videos.poster`. When the binaries are
+    not installed the video is kept as it is and the job is skipped.
+    Videos on storages without a local path (S3) are copied to a temporary file first, in chunks.
+
+    With `asynchronous=False` (VIDEO_PIPELINE_ASYNC=false, and the test settings) the job runs before
+    `process_later` returns.
+
+    Example Usage:
+        VideoPipeline.get().process_later(product_video)
+    '''
+
+    POSTER_AT_SECONDS = 1.0
+    COPY_CHUNK_SIZE = 1024 * 1024
+
+    #created on first use from settings.VIDEO_PIPELINE
+    _pipeline = None
+
+    def __init__(self, max_workers=1, ffmpeg='ffmpeg', ffprobe='ffprobe', timeout=120, asynchronous=True):
+        self.max_workers = max_workers
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.timeout = timeout
+        self.asynchronous = asynchronous
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        if cls._pipeline is None:
+            cls._pipeline = cls.from_settings()
+        return cls._pipeline
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        options = getattr(settings, 'VIDEO_PIPELINE', {})
+        return cls(
+            max_workers=options.get('MAX_WORKERS', 1),
+            ffmpeg=options.get('FFMPEG', 'ffmpeg'),
+            ffprobe=options.get('FFPROBE', 'ffprobe'),
+            timeout=options.get('TIMEOUT', 120),
+            asynchronous=options.get('ASYNC', True),
+        )
+
+    def available(self):
+        return bool(shutil.which(self.ffmpeg) and shutil.which(self.ffprobe))
+
+    def process_later(self, product_video):
+        '''Extract the duration and poster of `product_video` once the current transaction commits'''
+        if not product_video.product_videos:
+            return False
+        job = (product_video._meta.label, product_video.pk, product_video.product_videos.name)
+        if not self.asynchronous:
+            self._run(job)
+            return True
+        transaction.on_commit(lambda: self._submit(job))
+        return True
+
+    def _submit(self, job):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='video-pipeline')
+        self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            self.process(*job)
+        except Exception as error:
+            from .manage_error_log import ManageErrorLog
+            ManageErrorLog.log_error(type(error).__name__, f"Poster of {job[0]} {job[1]} failed: {error}")
+        finally:
+            #worker threads own their connection, the request thread's one is left alone
+            if self.asynchronous:
+                close_old_connections()
+
+    def process(self, model_label, pk, name):
+        '''Store the duration and poster frame of one video. Returns `(duration, poster name)`, or None if skipped'''
+        if not self.available():
+            return None
+        model = apps.get_model(model_label)
+        storage = model._meta.get_field('product_videos').storage
+        with self.local_copy(storage, name) as path:
+            duration = self.duration(path)
+            poster_at = min(VideoPipeline.POSTER_AT_SECONDS, duration / 2) if duration else 0
+            frame = self.frame(path, poster_at)
+
+        poster_field = model._meta.get_field('poster')
+        poster_name = poster_field.storage.save(poster_field.generate_filename(None, 'poster.jpg'), ContentFile(frame)) if frame else None
+        #the video may have been replaced in the meantime, only record this file's details
+        updated = model.objects.filter(pk=pk, product_videos=name).update(duration=duration, poster=poster_name)
+        if not updated and poster_name:
+            poster_field.storage.delete(poster_name)
+        return duration, poster_name
+
+    @contextmanager
+    def local_copy(self, storage, name):
+        '''Yield a local path of `name`, copied to a temporary file if the storage has none'''
+        try:
+            path = storage.path(name)
+        except NotImplementedError:
+            path = None
+        if path:
+            yield path
+            return
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1], delete=False) as copy, storage.open(name, 'rb') as file:
+            for chunk in file.chunks(chunk_size=VideoPipeline.COPY_CHUNK_SIZE):
+                copy.write(chunk)
+        try:
+            yield copy.name
+        finally:
+            os.remove(copy.name)
+
+    def duration(self, path):
+        result = subprocess.run(
+            [self.ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path],
+            capture_output=True, timeout=self.timeout, check=True,
+        )
+        try:
+            return float(result.stdout.decode().strip())
+        except ValueError:
+            return None
+
+    def frame(self, path, seconds):
+        result = subprocess.run(
+            [self.ffmpeg, '-v', 'error', '-ss', f'{seconds:.3f}', '-i', path, '-frames:v', '1', '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
+            capture_output=True, timeout=self.timeout, check=True,
+        )
+        return result.stdout or None
+
@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET, require_safe
+from products.catalogue_cache import CatalogueCache
+from .media_serving import MediaServer
+from .performance import registry
 
 # Create your views here.
+
+@require_GET
+def metrics(request):
+    '''
+    Prometheus scrape endpoint with the request metrics of this process and the catalogue cache counters.
+
+    Only served to addresses listed in `INTERNAL_IPS`, it is meant for the monitoring network and is not
+    behind token authentication.
+    '''
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'INTERNAL_IPS', []):
+        return HttpResponseForbidden()
+    lines = [
+        '# HELP catalogue_cache_requests_total Catalogue cache lookups of this process by result.',
+        '# TYPE catalogue_cache_requests_total counter',
+    ]
+    for entity, counts in sorted(CatalogueCache.stats().items()):
+        for result, count in sorted(counts.items()):
+            lines.append(f'catalogue_cache_requests_total{{entity="{entity}",result="{result}"}} {count}')
+    return HttpResponse(registry.render() + '\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_safe
+def media(request, path):
+    '''
+    Serve an uploaded file from `MEDIA_ROOT` through `MediaServer` (settings.MEDIA_SERVING).
+
+    The request is authorised here, the bytes are sent by the web server (X-Accel-Redirect / X-Sendfile) or with
+    `os.sendfile`. Content-hashed files are cached for a year as immutable, byte ranges are supported for videos.
+    '''
+    return MediaServer.get().serve(request, path)